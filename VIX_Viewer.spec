@@ -3,7 +3,7 @@
 
 a = Analysis(
     ['Viewer\\app.py'],
-    pathex=[],
+    pathex=['validation'],
     binaries=[],
     datas=[('Viewer/templates', 'templates'), ('Viewer/static', 'static')],
     hiddenimports=[],
@@ -1,39 +1,201 @@
+"""
+Alert Report 索引 (Indexed Alert Repository)
+
+原本每次 /api/alerts 都重新 glob Alert 目錄並完整解析每一份報表
+(Header / Summary / 數百列的 Contribution 明細)，波動大的日子一天有數十份。
+
+本模組改為常駐索引：
+    1. 每份報表只在第一次出現或 mtime / size 變動時解析一次；
+       Alert 目錄的 mtime 未變時不重新 glob，只 stat 該日期已知的檔案
+    2. 每日一份 typed 摘要表 (時間、觸發條件、前後兩筆 Summary 數值)，
+       依時間排序，時間區間查詢以 searchsorted 取範圍
+    3. Contribution 明細依 (date, time, month, strike) 排序存放，
+       Alert Modal 開啟時才以 /api/alerts/contributions 查詢單一時間點
+"""
 import os
 import glob
 import re
+import threading
+
+import numpy as np
 import pandas as pd
 
+ALERT_FILE_RE = re.compile(r'_alert_report\.(\d{6})\.tsv$')
+# Summary 區塊中可轉為數值的欄位 (摘要表另存 prev_* / curr_* 數值欄)
+SUMMARY_NUMERIC = [
+    'nearT', 'nearW', 'nearForward', 'nearK0', 'nearSigma2', 'nearSeriesCount',
+    'nextT', 'nextW', 'nextForward', 'nextK0', 'nextSigma2', 'nextSeriesCount',
+    'ori_vix', 'vix',
+]
+CONTRIB_TERMS = ['Near', 'Next']
+CONTRIB_FIELDS = [
+    'moneyness', 'prev_mid', 'prev_spread_ratio', 'prev_contrib', 'prev_weight',
+    'curr_mid', 'curr_spread_ratio', 'curr_contrib', 'curr_weight',
+    'weight_diff', 'contrib_diff_pct', 'has_changed',
+]
+
+
+def _to_float(value):
+    try:
+        return float(str(value).replace('%', ''))
+    except (TypeError, ValueError):
+        return np.nan
+
+
 class AlertLoader:
-    """讀取與解析資料來源/Alert 目錄下產生的 Alert Report TSV"""
-    
+    """讀取與解析資料來源/Alert 目錄下產生的 Alert Report TSV (增量建立的常駐索引)"""
+
     def __init__(self, source_dir):
         self.alert_dir = os.path.join(source_dir, "Alert")
-        
-    def get_alerts_by_date(self, date):
-        """讀取指定日期所有的 Alert Reports，並回傳解析後的 JSON 結構列表"""
+        self._lock = threading.Lock()
+        self._files = {}   # path -> (mtime, size, parsed)
+        self._dates = {}   # date -> 索引 (見 _build_date_index)
+
+    # -----------------------------------------------------------------
+    # 增量索引
+    # -----------------------------------------------------------------
+    @staticmethod
+    def _signature(path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_mtime, stat.st_size
+
+    def _date_files(self, date):
+        """該日期的報表路徑：目錄未變動時沿用已知清單，不重新 glob"""
+        dir_sig = self._signature(self.alert_dir)
+        index = self._dates.get(date)
+        if index is not None and index["dir_sig"] == dir_sig:
+            return index["paths"], dir_sig
+        paths = [f for f in glob.glob(os.path.join(self.alert_dir, f"{date}_alert_report.*.tsv"))
+                 if ALERT_FILE_RE.search(f)]
+        return sorted(paths), dir_sig
+
+    def _refresh(self, date):
+        """解析新出現或變動的報表，必要時重建該日期的索引"""
         if not os.path.exists(self.alert_dir):
+            return None
+        with self._lock:
+            paths, dir_sig = self._date_files(date)
+            changed = False
+            for path in paths:
+                sig = self._signature(path)
+                known = self._files.get(path)
+                if known is not None and known[:2] == sig:
+                    continue
+                time_str = ALERT_FILE_RE.search(path).group(1)
+                time_display = f"{time_str[0:2]}:{time_str[2:4]}:{time_str[4:6]}"
+                self._files[path] = (*(sig or (None, None)), self._parse_alert_file(path, time_str, time_display))
+                changed = True
+
+            index = self._dates.get(date)
+            if index is None or changed or index["paths"] != paths:
+                for path in set(index["paths"]) - set(paths) if index else ():
+                    self._files.pop(path, None)
+                parsed = [self._files[p][2] for p in paths if self._files.get(p) and self._files[p][2]]
+                index = self._build_date_index(date, paths, parsed)
+            index["dir_sig"] = dir_sig
+            self._dates[date] = index
+            return index
+
+    @staticmethod
+    def _build_date_index(date, paths, parsed):
+        """每日索引：依時間排序的摘要表 + 依 (time, month, strike) 排序的 Contribution 表"""
+        parsed = sorted(parsed, key=lambda x: x["time"])
+        summary = pd.DataFrame({
+            "time": [a["time"] for a in parsed],
+            "time_int": np.array([int(a["time"]) for a in parsed], dtype=np.int64),
+            "conditions": [a["triggered_conditions"] for a in parsed],
+        })
+        for side, key in (("prev", "prev"), ("curr", "current")):
+            for field in SUMMARY_NUMERIC:
+                summary[f"{side}_{field}"] = [_to_float(a["summary"][key].get(field)) for a in parsed]
+
+        rows = []
+        for a in parsed:
+            for term in CONTRIB_TERMS:
+                for seq, item in enumerate(a["contributions"][term]):
+                    rows.append({"time_int": int(a["time"]), "term": term, "seq": seq, **item})
+        contrib = pd.DataFrame(rows, columns=["time_int", "term", "seq", "month", "strike"] + CONTRIB_FIELDS)
+        if len(contrib):
+            # 只有當前筆的序列 strike 欄為 '-'，strike_num 為 NaN 並排在該月份最後
+            contrib["strike_num"] = pd.to_numeric(contrib["strike"], errors="coerce")
+            contrib = contrib.sort_values(["time_int", "month", "strike_num"], kind="stable").reset_index(drop=True)
+        times = contrib["time_int"].to_numpy(dtype=np.int64)
+
+        return {
+            "date": date,
+            "paths": paths,
+            "alerts": parsed,
+            "summary": summary,
+            "contrib": contrib,
+            "contrib_times": times,
+        }
+
+    def source_paths(self, date):
+        """該日期所有報表 (供 ETag 使用)"""
+        index = self._refresh(date)
+        return list(index["paths"]) if index else []
+
+    # -----------------------------------------------------------------
+    # 查詢
+    # -----------------------------------------------------------------
+    def _time_range(self, index, start=None, end=None):
+        times = index["summary"]["time_int"].to_numpy()
+        lo = int(np.searchsorted(times, int(start), side="left")) if start else 0
+        hi = int(np.searchsorted(times, int(end), side="right")) if end else len(times)
+        return lo, hi
+
+    def get_alerts_by_date(self, date, start=None, end=None, with_contributions=True):
+        """
+        讀取指定日期的 Alert Reports，並回傳解析後的 JSON 結構列表 (依時間排序)
+
+        Args:
+            start, end: HHMMSS (含)，省略表示不限
+            with_contributions: False 時不含逐履約價明細 (走勢圖紅點只需摘要)
+        """
+        index = self._refresh(date)
+        if index is None:
             return []
-            
-        pattern = os.path.join(self.alert_dir, f"{date}_alert_report.*.tsv")
-        files = glob.glob(pattern)
-        
-        alerts = []
-        for f in files:
-            # 從檔名解析出時間 HHMMSS
-            match = re.search(r'_alert_report\.(\d{6})\.tsv$', f)
-            if not match:
+        lo, hi = self._time_range(index, start, end)
+        alerts = index["alerts"][lo:hi]
+        if with_contributions:
+            return list(alerts)
+        return [{k: v for k, v in a.items() if k != "contributions"} for a in alerts]
+
+    def get_summary_table(self, date, start=None, end=None):
+        """typed 摘要表 (DataFrame：time、conditions、prev_* / curr_* 數值欄)"""
+        index = self._refresh(date)
+        if index is None:
+            return pd.DataFrame()
+        lo, hi = self._time_range(index, start, end)
+        return index["summary"].iloc[lo:hi].reset_index(drop=True)
+
+    def get_contributions(self, date, time_str, term=None, strike=None):
+        """
+        單一 Alert 時間點的逐履約價明細
+
+        Returns:
+            {"Near": [...], "Next": [...]}，各自依 |contribDiff(%)| 降序；找不到時為空 list
+        """
+        result = {t: [] for t in CONTRIB_TERMS}
+        index = self._refresh(date)
+        if index is None or not len(index["contrib"]):
+            return result
+        t = int(time_str)
+        times = index["contrib_times"]
+        lo, hi = int(np.searchsorted(times, t, side="left")), int(np.searchsorted(times, t, side="right"))
+        rows = index["contrib"].iloc[lo:hi]
+        if strike is not None:
+            rows = rows[rows["strike_num"] == float(strike)]
+        for name, group in rows.groupby("term", sort=False):
+            if term and name != term:
                 continue
-            
-            time_str = match.group(1)
-            time_display = f"{time_str[0:2]}:{time_str[2:4]}:{time_str[4:6]}"
-            
-            parsed = self._parse_alert_file(f, time_str, time_display)
-            if parsed:
-                alerts.append(parsed)
-                
-        # 依照時間排序
-        alerts.sort(key=lambda x: x["time"])
-        return alerts
+            # seq 為完整解析結果中的順序 (|contribDiff(%)| 降序)
+            group = group.sort_values("seq", kind="stable")
+            result[name] = group[["month", "strike"] + CONTRIB_FIELDS].to_dict(orient="records")
+        return result
 
     def _parse_alert_file(self, filepath, time_str, time_display):
         """解析單一 Alert 檔案的三大區塊: Header / Summary / Contributions"""
@@ -135,6 +297,9 @@ class AlertLoader:
                     month = vals[0]
                     # 左側資料 (必定存在)
                     strike = vals[3]
+                    if strike == "-" and len(vals) > 10:
+                        # 只有當前筆的序列：左側為 '-'，履約價取右側
+                        strike = vals[10]
                     moneyness = vals[2].strip()
                     prev_mid = vals[4]
                     prev_spread_ratio = vals[5]
@@ -167,6 +332,7 @@ class AlertLoader:
                     # 只有保留「右側有資料」或是「有顯示的序列」，為減少 payload 大小
                     # 依據 spec，我們需要高亮「有變化」的，所以保留 diff 相關欄位
                     item = {
+                        "month": month,
                         "strike": strike,
                         "moneyness": moneyness,
                         "prev_mid": prev_mid,
@@ -5,6 +5,10 @@ import pandas as pd
 from data_loader import DiffLoader, ProdLoader, SigmaDiffLoader
 from tick_parser import TickLoader
 from alert_loader import AlertLoader
+from cache import viewer_cache
+from warmup import CacheWarmer
+from trend_store import TrendStore
+from responses import FastJSONProvider, compress_response, not_modified, json_response, wants_columnar
 
 
 # 設定 template 和 static 資料夾路徑
@@ -16,6 +20,10 @@ if getattr(sys, 'frozen', False):
 else:
     app = Flask(__name__)
 
+# JSON 編碼 (有 orjson 時使用) 與回應壓縮
+app.json = FastJSONProvider(app)
+app.after_request(compress_response)
+
 # 專案根目錄 (VIX/)
 if getattr(sys, 'frozen', False):
     import os
@@ -30,6 +38,10 @@ prod_loader = ProdLoader(os.path.join(BASE_DIR, "output"), os.path.join(BASE_DIR
 tick_loader = TickLoader(os.path.join(BASE_DIR, "資料來源"))
 sigma_diff_loader = SigmaDiffLoader(os.path.join(BASE_DIR, "資料來源"), os.path.join(BASE_DIR, "output"))
 alert_loader = AlertLoader(os.path.join(BASE_DIR, "資料來源"))
+trend_store = TrendStore(os.path.join(BASE_DIR, "資料來源"), os.path.join(BASE_DIR, "output"))
+
+# 背景預熱最近幾天的資料，並監看檔案變動 (於伺服器啟動時才開始，見 __main__)
+cache_warmer = CacheWarmer(diff_loader, prod_loader, sigma_diff_loader)
 
 @app.route("/")
 def index():
@@ -52,6 +64,14 @@ def get_diff(date):
         per_page = min(per_page, 500)
         
         column = request.args.get("column") # 新增篩選參數
+
+        report_path = os.path.join(diff_loader.output_dir, f"validation_diff_{date}.csv")
+        if not os.path.exists(report_path):
+            raise FileNotFoundError(report_path)
+        sources = [report_path] + [prod_loader._ours_path(date, t) for t in ("Near", "Next")]
+        cached = not_modified(sources)
+        if cached is not None:
+            return cached
         
         # 取得摘要（快速，不分頁）
         summary_data = diff_loader.get_summary(date, prod_loader=prod_loader)
@@ -59,16 +79,26 @@ def get_diff(date):
         # 取得分頁資料
         page_data = diff_loader.get_page(date, page, per_page, column=column)
         
-        return jsonify({
+        return json_response({
             "date": date,
             **summary_data,
             **page_data
-        })
+        }, sources=sources)
     except FileNotFoundError:
         return jsonify({"error": "找不到該日期的差異報告"}), 404
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route("/api/diff_overview")
+def get_diff_overview():
+    """跨日一致性總覽（讀取驗證器預先彙總，可用 ?start=YYYYMMDD&end=YYYYMMDD 限定範圍）"""
+    try:
+        start = request.args.get("start")
+        end = request.args.get("end")
+        return jsonify({"days": diff_loader.get_overview(start, end, prod_loader=prod_loader)})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @app.route("/api/diff_full/<date>")
 def get_diff_full(date):
     """取得完整計算資料（每筆含差異標記），用於差異清單頁底部的完整資料表"""
@@ -80,6 +110,12 @@ def get_diff_full(date):
         filter_strike = request.args.get("strike")    # "28000" / None
         filter_time   = request.args.get("time_int")  # "84515" / None
 
+        sources = [prod_loader._ours_path(date, term),
+                   os.path.join(diff_loader.output_dir, f"validation_diff_{date}.csv")]
+        cached = not_modified(sources)
+        if cached is not None:
+            return cached
+
         # 嘗試載入差異 df，若不存在則傳 None（仍回傳完整資料，只是不標記差異）
         try:
             diff_df = diff_loader._load_df(date)
@@ -92,8 +128,9 @@ def get_diff_full(date):
             filter_cp=filter_cp,
             filter_strike=int(filter_strike) if filter_strike else None,
             filter_time=int(filter_time) if filter_time else None,
+            columnar=wants_columnar(),
         )
-        return jsonify(result)
+        return json_response(result, sources=None if result.get("error") else sources)
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -199,13 +236,8 @@ def api_explore_options():
         # 取出所有時間點（已在 sysid_map 中）
         times = sorted(sysid_map.keys())
 
-        # 從 PROD TSV 讀出所有履約價
-        import os
-        path = os.path.join(prod_loader.source_dir, date, f"{term}PROD_{date}.tsv")
-        strikes = []
-        if os.path.exists(path):
-            df_s = pd.read_csv(path, sep="\t", usecols=["strike"])
-            strikes = sorted(df_s["strike"].dropna().astype(int).unique().tolist())
+        # 從 PROD TSV 讀出所有履約價（共用快取）
+        strikes = prod_loader.get_prod_strikes(date, term)
 
         return jsonify({"strikes": strikes, "times": times})
     except Exception as e:
@@ -244,6 +276,12 @@ def api_explore_ticks_stream():
         return jsonify({"error": "缺少參數: date/term/strike/cp/time_int"}), 400
 
     try:
+        tick_file, _ = tick_loader.resolve_tick_file(date, term, int(strike), cp)
+        sources = [tick_file, prod_loader._prod_path(date, term), prod_loader._ours_path(date, term)]
+        cached = not_modified(sources)
+        if cached is not None:
+            return cached
+
         # 建立 SysID 對照表
         sysid_map = prod_loader.build_sysid_map(date, term)
         if not sysid_map:
@@ -269,25 +307,23 @@ def api_explore_ticks_stream():
             append_sysid=int(append_sysid)   if append_sysid  else None,
         )
         
-        # 標記 each snapshot 的 source 與 Outlier 判定結果
+        # 標記 each snapshot 的 source 與 Outlier 判定結果（批次查詢，一次取回所有快照列）
         if "snapshots" in result:
-            for snap in result["snapshots"]:
-                try:
-                    ours = prod_loader.get_ours_row(date, term, snap["time_int"], int(strike))
-                    prefix = "c." if cp == "Call" else "p."
-                    snap["source"] = ours.get(f"{prefix}source")
-                    snap["last_outlier"] = ours.get(f"{prefix}last_outlier")
-                    snap["min_outlier"] = ours.get(f"{prefix}min_outlier")
-                    snap["last_sysID"] = ours.get(f"{prefix}last_sysID")
-                    snap["min_sysID"] = ours.get(f"{prefix}min_sysID")
-                except Exception:
-                    snap["source"] = None
-                    snap["last_outlier"] = None
-                    snap["min_outlier"] = None
-                    snap["last_sysID"] = None
-                    snap["min_sysID"] = None
-
-        return jsonify(result)
+            prefix = "c." if cp == "Call" else "p."
+            try:
+                ours_rows = prod_loader.get_ours_rows(
+                    date, term, [(snap["time_int"], int(strike)) for snap in result["snapshots"]]
+                )
+            except Exception:
+                ours_rows = [{} for _ in result["snapshots"]]
+            for snap, ours in zip(result["snapshots"], ours_rows):
+                snap["source"] = ours.get(f"{prefix}source")
+                snap["last_outlier"] = ours.get(f"{prefix}last_outlier")
+                snap["min_outlier"] = ours.get(f"{prefix}min_outlier")
+                snap["last_sysID"] = ours.get(f"{prefix}last_sysID")
+                snap["min_sysID"] = ours.get(f"{prefix}min_sysID")
+
+        return json_response(result, sources=None if result.get("error") else sources)
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -306,6 +342,9 @@ def api_vix_trend():
         path = os.path.join(prod_loader.source_dir, date, f"sigma_{date}.tsv")
         if not os.path.exists(path):
              return jsonify({"error": "找不到 sigma 檔案"}), 404
+        cached = not_modified([path])
+        if cached is not None:
+            return cached
 
         df = pd.read_csv(path, sep="\t", dtype={"time": str})
         
@@ -318,7 +357,33 @@ def api_vix_trend():
         df = df.astype(object).where(pd.notnull(df), None)
         
         
-        return jsonify({"rows": df.to_dict(orient="records")})
+        return json_response({"rows": df.to_dict(orient="records")}, sources=[path])
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/api/vix_trend_range")
+def api_vix_trend_range():
+    """跨日 VIX 走勢 (PROD 與我們的 vix / ori_vix)，依圖寬在伺服器端降採樣
+    參數: start, end (YYYYMMDD)、width (目標點數，預設 1200)、mode (lttb / minmax / raw)、
+          key (降採樣依據的序列，預設 prod_ori_vix)、from_open (預設 1，只取 09:00 之後)
+    Alert 點與 2.5% 過濾事件一定保留 (is_alert / is_filter 欄)
+    """
+    try:
+        width = min(max(request.args.get("width", 1200, type=int), 10), 20000)
+        mode = request.args.get("mode", "lttb")
+        if mode not in ("lttb", "minmax", "raw"):
+            return jsonify({"error": f"不支援的 mode: {mode}"}), 400
+        result = trend_store.query(
+            start=request.args.get("start"),
+            end=request.args.get("end"),
+            width=width,
+            mode=mode,
+            key=request.args.get("key", "prod_ori_vix"),
+            from_open=request.args.get("from_open", "1") != "0",
+        )
+        return jsonify(result)
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -326,17 +391,57 @@ def api_vix_trend():
 
 @app.route("/api/alerts")
 def get_alerts():
-    """取得特定日期所有 Alert 的時間點列表及解析後的完整內容"""
+    """取得特定日期所有 Alert 的時間點列表及解析後的內容
+    參數: date、start / end (HHMMSS，可省略)、summary=1 時不含逐履約價明細
+    (走勢圖紅點只需摘要，明細由 /api/alerts/contributions 於開啟 Modal 時再取)
+    """
     date = request.args.get("date")
     if not date:
         return jsonify({"error": "缺少參數 date"}), 400
 
     try:
-        alerts = alert_loader.get_alerts_by_date(date)
-        return jsonify({
+        sources = alert_loader.source_paths(date)
+        cached = not_modified(sources)
+        if cached is not None:
+            return cached
+        alerts = alert_loader.get_alerts_by_date(
+            date,
+            start=request.args.get("start"),
+            end=request.args.get("end"),
+            with_contributions=request.args.get("summary") != "1",
+        )
+        return json_response({
             "date": date,
             "alerts": alerts
-        })
+        }, sources=sources)
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/api/alerts/contributions")
+def get_alert_contributions():
+    """單一 Alert 時間點的逐履約價 Contribution 明細 (date, time，可加 term / strike 篩選)"""
+    date = request.args.get("date")
+    time_str = request.args.get("time")
+    if not all([date, time_str]):
+        return jsonify({"error": "缺少參數"}), 400
+
+    try:
+        sources = alert_loader.source_paths(date)
+        cached = not_modified(sources)
+        if cached is not None:
+            return cached
+        contributions = alert_loader.get_contributions(
+            date, time_str.zfill(6),
+            term=request.args.get("term"),
+            strike=request.args.get("strike"),
+        )
+        return json_response({
+            "date": date,
+            "time": time_str.zfill(6),
+            "contributions": contributions
+        }, sources=sources)
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -378,6 +483,47 @@ def api_explore_calc_trace():
         return jsonify({"error": str(e)}), 500
 
 
+# 單一序列重播 (專案根目錄的 series_replay.py；打包版若未附帶則回報不可用)
+_series_replay = None
+
+def get_series_replay():
+    global _series_replay
+    if _series_replay is None:
+        if BASE_DIR not in sys.path:
+            sys.path.insert(0, BASE_DIR)
+        from series_replay import SeriesReplay
+        source_dir = os.path.join(BASE_DIR, "資料來源")
+        _series_replay = SeriesReplay(source_dir, source_dir)
+    return _series_replay
+
+
+@app.route("/api/explore/replay")
+def api_explore_replay():
+    """單一序列重播：以 Tick 索引重算該序列的 Q_Last/Q_Min、EMA、Gamma、Outlier、Q_hat，
+    回傳指定時間點前後 window 個快照的逐步過程與該區間的 ticks"""
+    date     = request.args.get("date")
+    term     = request.args.get("term")
+    time_int = request.args.get("time_int")
+    strike   = request.args.get("strike")
+    cp       = request.args.get("cp")
+    window   = request.args.get("window", 2, type=int)
+
+    if not all([date, term, time_int, strike, cp]):
+        return jsonify({"error": "缺少參數"}), 400
+
+    try:
+        replayer = get_series_replay()
+    except ImportError as e:
+        return jsonify({"error": f"重播模組不可用: {e}"}), 501
+
+    try:
+        return jsonify(replayer.explain(date, term, int(strike), cp, int(time_int), window=min(window, 20)))
+    except (FileNotFoundError, KeyError) as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 @app.route("/api/explore/find_diff")
 def api_explore_find_diff():
     """在指定商品中，左右指定時間點尋找上/一個差異"""
@@ -392,33 +538,11 @@ def api_explore_find_diff():
         return jsonify({"error": "缺少參數"}), 400
 
     try:
-        # 讀入 diff CSV
-        df = diff_loader._load_df(date)
-
-        # 筛選指定商品
-        mask = (
-            (df["Term"].astype(str) == term) &
-            (df["Strike"].astype(str) == str(strike)) &
-            (df["CP"].astype(str) == cp)
-        )
-        item_df = df[mask].copy()
-        if item_df.empty:
+        row = diff_loader.find_diff(date, term, strike, cp, current_time, direction)
+        if row is None:
             return jsonify({"found": False, "message": "未找到該商品的差異記錄"})
-
-        item_df["Time"] = pd.to_numeric(item_df["Time"], errors="coerce")
-        item_df = item_df.dropna(subset=["Time"]).sort_values("Time")
-
-        cur = int(current_time)
-        if direction == "next":
-            found = item_df[item_df["Time"] > cur]
-            if found.empty:
-                return jsonify({"found": False})
-            row = found.iloc[0]
-        else:
-            found = item_df[item_df["Time"] < cur]
-            if found.empty:
-                return jsonify({"found": False})
-            row = found.iloc[-1]
+        if not row:
+            return jsonify({"found": False})
 
         return jsonify({
             "found": True,
@@ -438,14 +562,29 @@ def get_sigma_diff():
         return jsonify({"error": "缺少 date 參數"}), 400
     
     try:
-        result = sigma_diff_loader.get_diff(date)
-        return jsonify(result)
+        sources = sigma_diff_loader.source_paths(date)
+        cached = not_modified(sources)
+        if cached is not None:
+            return cached
+        result = sigma_diff_loader.get_diff(date, columnar=wants_columnar())
+        return json_response(result, sources=None if result.get("error") else sources)
     except Exception as e:
         import traceback
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/api/diagnostics/cache")
+def api_diagnostics_cache():
+    """快取診斷：使用量、命中率、淘汰次數與目前快取項目
+    加上 ?clear=1 可清空快取（例如手動更新資料後）
+    """
+    if request.args.get("clear") == "1":
+        removed = viewer_cache.invalidate()
+        return jsonify({"cleared": removed, **viewer_cache.stats(), "warmup": cache_warmer.status()})
+    return jsonify({**viewer_cache.stats(), "warmup": cache_warmer.status()})
+
+
 if __name__ == "__main__":
     import socket
     import threading
@@ -474,4 +613,6 @@ if __name__ == "__main__":
         webbrowser.open(url)
         
     threading.Thread(target=open_browser, daemon=True).start()
-    app.run(host=host, debug=False, port=port)
+    # 依 VIX_VIEWER_SERVER 選擇 gunicorn / waitress / Flask 開發伺服器 (見 serve.py)
+    from serve import run as serve_app
+    serve_app(app, host, port, on_start=cache_warmer.start)
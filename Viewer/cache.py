@@ -0,0 +1,287 @@
+"""
+Viewer 共用快取 (Bounded LRU Cache)
+
+各 Loader 原本以 dict 永久保存每個日期的 DataFrame，Viewer 長時間開著
+(例如整個月) 記憶體只會一直增加；部分查詢 (如 get_prod_row) 則完全沒快取。
+
+本模組提供單一行程共用的快取：
+    - LRU 淘汰，依 DataFrame.memory_usage(deep=True) 估算大小
+    - 總記憶體上限 (環境變數 VIX_VIEWER_CACHE_MB，預設 512 MB)
+    - 依來源檔 mtime / size 自動失效 (output/ 重新產生後不會讀到舊資料)
+    - 命中 / 未命中 / 淘汰統計，供 /api/diagnostics/cache 查詢
+    - 單一載入 (single-flight)：同一個鍵同時有多個請求未命中時只呼叫一次 loader，
+      其他請求等待並共用結果
+    - 背景預取 (prefetch)：例如開啟 Near 時順便在背景載入 Next
+"""
+import os
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_CACHE_MB = 512
+PREFETCH_WORKERS = 2
+
+
+def _file_signature(path):
+    """來源檔簽章 (mtime, size)，檔案不存在時為 None"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime, stat.st_size)
+
+
+def estimate_size(value, _depth=0):
+    """估算快取值佔用的位元組數 (DataFrame 以 deep memory_usage 計算)"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    size = sys.getsizeof(value)
+    if _depth >= 3:
+        return size
+    if isinstance(value, dict):
+        # 大型 dict 只抽樣估算，避免每次 put 都走訪全部元素
+        items = list(value.items())
+        sample = items[:200]
+        if sample:
+            per_item = sum(estimate_size(k, _depth + 1) + estimate_size(v, _depth + 1) for k, v in sample) / len(sample)
+            size += int(per_item * len(items))
+    elif isinstance(value, (list, tuple, set)):
+        items = list(value)
+        sample = items[:200]
+        if sample:
+            per_item = sum(estimate_size(v, _depth + 1) for v in sample) / len(sample)
+            size += int(per_item * len(items))
+    return size
+
+
+class _Flight:
+    """進行中的載入 (等待者共用結果或例外)"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class LRUCache:
+    """具記憶體上限與來源檔失效檢查的 LRU 快取 (執行緒安全)"""
+
+    def __init__(self, max_bytes=None, name="viewer"):
+        if max_bytes is None:
+            try:
+                mb = float(os.environ.get("VIX_VIEWER_CACHE_MB", DEFAULT_CACHE_MB))
+            except ValueError:
+                mb = DEFAULT_CACHE_MB
+            max_bytes = int(mb * 1024 * 1024)
+        self.name = name
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()   # key -> (value, size, {path: signature})
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self._inflight = {}             # key -> _Flight
+        self._executor = None           # 背景預取用 (第一次 prefetch 時建立)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.coalesced = 0              # 等待其他請求載入而未重複讀取的次數
+        self.prefetches = 0
+
+    # -----------------------------------------------------------------
+    # 基本操作
+    # -----------------------------------------------------------------
+    def get(self, key):
+        """取得快取值；不存在或來源檔已變動時回傳 None"""
+        with self._lock:
+            value = self._lookup(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def put(self, key, value, sources=(), size=None):
+        """
+        寫入快取
+
+        Args:
+            key: 快取鍵 (建議使用 tuple，例如 ("ours", date, term))
+            value: 快取值
+            sources: 此值依賴的來源檔路徑；任一檔案變動即視為失效
+            size: 已知大小 (bytes)，省略時自動估算
+        """
+        if size is None:
+            size = estimate_size(value)
+        signatures = {p: _file_signature(p) for p in sources}
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            # 單一項目超過上限就不快取 (避免把其他項目全部擠掉)
+            if size > self.max_bytes:
+                return value
+            self._entries[key] = (value, size, signatures)
+            self._bytes += size
+            self._evict()
+        return value
+
+    def get_or_load(self, key, loader, sources=()):
+        """
+        快取命中則回傳，否則呼叫 loader() 載入並寫入快取
+
+        同一個鍵同時只會有一個 loader 在執行；其他執行緒等待該次載入完成後
+        直接取用結果 (loader 拋出例外時，等待者也會收到同一個例外)
+        """
+        with self._lock:
+            value = self._lookup(key)
+            if value is not None:
+                self.hits += 1
+                return value
+            self.misses += 1
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            value = loader()
+            if value is not None:
+                self.put(key, value, sources)
+            flight.value = value
+            return value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.event.set()
+
+    def prefetch(self, key, loader, sources=()):
+        """
+        在背景執行緒載入 (已快取或正在載入時略過)
+
+        Returns:
+            bool: 是否有排入背景載入
+        """
+        with self._lock:
+            if key in self._entries or key in self._inflight:
+                return False
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS,
+                                                    thread_name_prefix=f"{self.name}-prefetch")
+            self.prefetches += 1
+
+        def task():
+            try:
+                self.get_or_load(key, loader, sources)
+            except Exception as e:
+                print(f"[cache] 背景預取失敗 {key}: {e}")
+
+        self._executor.submit(task)
+        return True
+
+    def invalidate(self, predicate=None):
+        """
+        移除快取項目
+
+        Args:
+            predicate: fn(key) -> bool，省略時清空全部
+        Returns:
+            int: 移除的項目數
+        """
+        with self._lock:
+            keys = [k for k in self._entries if predicate is None or predicate(k)]
+            for k in keys:
+                self._remove(k)
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def invalidate_sources(self, paths):
+        """
+        移除依賴任一指定來源檔的快取項目 (其他日期 / 檔案的項目不受影響)
+
+        Returns:
+            int: 移除的項目數
+        """
+        paths = {os.path.abspath(p) for p in paths}
+        with self._lock:
+            keys = [k for k, (_, _, sources) in self._entries.items()
+                    if any(os.path.abspath(p) in paths for p in sources)]
+            for k in keys:
+                self._remove(k)
+            self.invalidations += len(keys)
+            return len(keys)
+
+    # -----------------------------------------------------------------
+    # 內部
+    # -----------------------------------------------------------------
+    def _lookup(self, key):
+        """取得仍有效的快取值 (不計入統計，呼叫端須持有 _lock)"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, size, sources = entry
+        if any(_file_signature(p) != sig for p, sig in sources.items()):
+            self._remove(key)
+            self.invalidations += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._entries:
+            key = next(iter(self._entries))
+            self._remove(key)
+            self.evictions += 1
+
+    # -----------------------------------------------------------------
+    # 統計
+    # -----------------------------------------------------------------
+    def stats(self):
+        """回傳快取統計 (供診斷端點使用)"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "name": self.name,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "usage_ratio": round(self._bytes / self.max_bytes, 4) if self.max_bytes else None,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "coalesced": self.coalesced,
+                "prefetches": self.prefetches,
+                "inflight": len(self._inflight),
+                # 依最近使用排序 (最新在前)
+                "items": [
+                    {"key": "/".join(str(p) for p in (k if isinstance(k, tuple) else (k,))), "bytes": size}
+                    for k, (_, size, _) in reversed(self._entries.items())
+                ],
+            }
+
+
+# 整個 Viewer 行程共用的快取實例
+viewer_cache = LRUCache()
@@ -1,15 +1,24 @@
 import pandas as pd
+import numpy as np
 import os
+import sys
 import glob
 import re
 
+# 預先彙總的格式與讀取邏輯與驗證器共用 validation/results_store.py (打包時由 spec 的 pathex 帶入)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "validation"))
+from results_store import summary_path, read_summary_file, is_current, count_rows, report_truncated
+from cache import viewer_cache
+from responses import frame_columns
+from shared_frames import get_frame_store
+
 class DiffLoader:
 
     """讀取 validation_diff_*.csv，帶快取與分頁"""
     
-    def __init__(self, output_dir):
+    def __init__(self, output_dir, cache=None):
         self.output_dir = output_dir
-        self._cache = {}  # {date: DataFrame}
+        self.cache = cache if cache is not None else viewer_cache  # 共用 LRU 快取
     
     def list_available_dates(self):
         """掃描所有可用日期"""
@@ -23,54 +32,83 @@ class DiffLoader:
         return sorted(dates, reverse=True)
     
     def _load_df(self, date):
-        """讀取並快取 DataFrame（只讀一次）"""
-        if date in self._cache:
-            return self._cache[date]
-        
+        """讀取並快取 DataFrame（檔案重新產生時自動重讀）"""
         path = os.path.join(self.output_dir, f"validation_diff_{date}.csv")
         if not os.path.exists(path):
             raise FileNotFoundError(f"找不到差異報告: {path}")
         
-        # 使用 utf-8-sig 讀取，避免 BOM 問題
-        # low_memory=False 避免 mixed type warning
-        df = pd.read_csv(path, encoding="utf-8-sig", low_memory=False)
-        
-        # 處理 NaN → None（JSON 相容）
-        # 先轉為 object 型別，避免 float 欄位無法存入 None (會變回 NaN)
-        df = df.astype(object).where(pd.notnull(df), None)
+        def load():
+            # 使用 utf-8-sig 讀取，避免 BOM 問題
+            # low_memory=False 避免 mixed type warning
+            df = pd.read_csv(path, encoding="utf-8-sig", low_memory=False)
+            
+            # 處理 NaN → None（JSON 相容）
+            # 先轉為 object 型別，避免 float 欄位無法存入 None (會變回 NaN)
+            return df.astype(object).where(pd.notnull(df), None)
         
-        self._cache[date] = df
-        return df
+        return self.cache.get_or_load(("diff", date), load, sources=[path])
     
     # 驗證腳本 verify_full_day.py 中定義的所有比對欄位（Last_Outlier 目前未啟用驗證，故不列入）
     ALL_COMPARED_COLUMNS = ['EMA', 'Gamma', 'Q_hat_Bid', 'Q_hat_Ask', 'Q_Last_Bid', 'Q_Last_Ask']
     
-    def get_summary(self, date, prod_loader=None):
-        """取得摘要統計，包含有差異和無差異的欄位"""
+    def _load_store_summary(self, date):
+        """
+        讀取預先彙總 validation_store/{date}.json
+
+        不存在、版本不符或對應的差異報告已重新產生時回傳 None (改由 CSV 計算)
+        """
+        store_path = summary_path(date, self.output_dir)
+        if not os.path.exists(store_path):
+            return None
+        store = self.cache.get_or_load(("store_summary", date), lambda: read_summary_file(store_path),
+                                       sources=[store_path])
+        return store if is_current(store, date, self.output_dir) else None
+
+    def _compute_summary(self, date, prod_loader=None):
+        """
+        無預先彙總時，由差異報告 CSV 計算 (與彙總檔相同結構)
+
+        truncated 取自差異報告旁的 meta (無法確認時為 None)；比對筆數需提供 prod_loader
+        """
         df = self._load_df(date)
         
         # 有差異的統計 (Term → {Column: count})
-        diff_summary = {}
+        terms = {}
         if "Term" in df.columns:
             for term in df["Term"].unique():
                 if term is None:
                     continue
                 term_df = df[df["Term"] == term]
-                diff_summary[term] = term_df["Column"].value_counts().to_dict()
+                terms[term] = {
+                    "total_diffs": len(term_df),
+                    "by_column": term_df["Column"].value_counts().to_dict(),
+                }
         
         # 計算每個 Term 的總比對筆數（從 PROD CSV）
-        total_per_term = {}
+        rows_compared = {}
         if prod_loader:
             for term in ["Near", "Next"]:
-                path = os.path.join(self.output_dir, f"驗證{date}_{term}PROD.csv")
+                path = prod_loader._ours_path(date, term)
                 if os.path.exists(path):
                     try:
                         # 只讀行數，不需要全部欄位
-                        row_count = sum(1 for _ in open(path, encoding="utf-8-sig")) - 1  # 扣掉 header
+                        row_count = self.cache.get_or_load(
+                            ("row_count", date, term), lambda: count_rows(path), sources=[path]
+                        )
                         # 每行 = 1 個 strike，Call + Put 各算一筆
-                        total_per_term[term] = row_count * 2
+                        rows_compared[term] = row_count * 2
                     except:
-                        total_per_term[term] = 0
+                        rows_compared[term] = 0
+        return {"total_diffs": len(df), "rows_compared": rows_compared, "truncated": report_truncated(date, self.output_dir), "terms": terms}
+
+    def get_summary(self, date, prod_loader=None):
+        """取得摘要統計，包含有差異和無差異的欄位（優先讀取預先彙總）"""
+        store = self._load_store_summary(date)
+        if store is None:
+            store = self._compute_summary(date, prod_loader)
+
+        diff_summary = {term: s["by_column"] for term, s in store["terms"].items()}
+        total_per_term = dict(store["rows_compared"]) if prod_loader else {}
         
         # 組合無差異摘要
         no_diff_summary = {}
@@ -89,20 +127,108 @@ class DiffLoader:
                 no_diff_summary[term] = {col: total for col in self.ALL_COMPARED_COLUMNS}
         
         return {
-            "total_diffs": len(df),
+            "total_diffs": store["total_diffs"],
             "summary": diff_summary,
             "no_diff_summary": no_diff_summary,
             "total_per_term": total_per_term,
-            "all_columns": self.ALL_COMPARED_COLUMNS
+            "all_columns": self.ALL_COMPARED_COLUMNS,
+            # 驗證時達差異上限提前停止：差異 / 一致筆數都不是全天結果 (None 為無法確認)
+            "truncated": store.get("truncated"),
         }
+
+    def get_overview(self, start=None, end=None, prod_loader=None):
+        """
+        跨日一致性總覽 (每日一列)：優先讀取預先彙總，缺少時才解析該日 CSV
+
+        Args:
+            prod_loader: ProdLoader，無預先彙總時用來計算比對筆數
+
+        Returns:
+            list of dict: date, total_diffs, rows_compared, truncated, by_term, by_column
+        """
+        rows = []
+        for date in sorted(self.list_available_dates()):
+            if (start and date < start) or (end and date > end):
+                continue
+            store = self._load_store_summary(date)
+            if store is None:
+                store = self._compute_summary(date, prod_loader)
+            by_column = {}
+            for term_summary in store["terms"].values():
+                for col, n in term_summary["by_column"].items():
+                    by_column[col] = by_column.get(col, 0) + int(n)
+            rows.append({
+                "date": date,
+                "total_diffs": int(store["total_diffs"]),
+                "rows_compared": store["rows_compared"],
+                "truncated": store.get("truncated"),
+                "by_term": {t: int(s["total_diffs"]) for t, s in store["terms"].items()},
+                "by_column": by_column,
+                "precomputed": "version" in store,
+            })
+        return rows
     
+    @staticmethod
+    def _build_diff_index(df):
+        """
+        差異報告的導覽索引 (每個日期建立一次)：
+            by_column: 欄位名稱 (去空白) -> 列位置 (升序)，供分頁篩選
+            series:    (Term, Strike, CP) 字串 -> (Time 升序陣列, 對應列位置)，供上/下一個差異二分搜尋
+        鍵值與原本逐次篩選相同，皆以 astype(str) 比對
+        """
+        index = {"by_column": {}, "series": {}}
+        if "Column" in df.columns:
+            columns = df["Column"].astype(str).str.strip()
+            index["by_column"] = {k: np.asarray(v, dtype=np.int64) for k, v in columns.groupby(columns).indices.items()}
+
+        if all(c in df.columns for c in ("Term", "Strike", "CP", "Time")):
+            times = pd.to_numeric(df["Time"], errors="coerce").to_numpy(dtype=float)
+            keys = pd.DataFrame({
+                "Term": df["Term"].astype(str), "Strike": df["Strike"].astype(str), "CP": df["CP"].astype(str),
+            })
+            for key, positions in keys.groupby(["Term", "Strike", "CP"], sort=False).indices.items():
+                positions = positions[~np.isnan(times[positions])]
+                order = np.argsort(times[positions], kind="stable")
+                index["series"][key] = (times[positions][order].astype(np.int64), positions[order])
+        return index
+
+    def _diff_index(self, date):
+        path = os.path.join(self.output_dir, f"validation_diff_{date}.csv")
+        df = self._load_df(date)
+        return self.cache.get_or_load(("diff_index", date), lambda: self._build_diff_index(df), sources=[path])
+
+    def find_diff(self, date, term, strike, cp, current_time, direction="next"):
+        """
+        指定商品在 current_time 之後 (next) / 之前 (prev) 的第一筆差異 (二分搜尋)
+
+        Returns:
+            差異列 dict；該商品沒有任何差異時回傳 None，方向上找不到時回傳 {}
+        """
+        found = self._diff_index(date)["series"].get((str(term), str(strike), str(cp)))
+        if found is None:
+            return None
+        times, positions = found
+        cur = int(current_time)
+        if direction == "next":
+            pos = int(np.searchsorted(times, cur, side="right"))
+            if pos >= len(times):
+                return {}
+        else:
+            pos = int(np.searchsorted(times, cur, side="left")) - 1
+            if pos < 0:
+                return {}
+        row = self._load_df(date).iloc[int(positions[pos])].to_dict()
+        row["Time"] = int(times[pos])
+        return row
+
     def get_page(self, date, page=1, per_page=100, column=None):
         """取得分頁資料 (可選篩選特定欄位)"""
         df = self._load_df(date)
         
-        # 篩選欄位
+        # 篩選欄位 (依預先建立的欄位 -> 列位置索引)
         if column and column != "all":
-            df = df[df["Column"].astype(str).str.strip() == column.strip()]
+            positions = self._diff_index(date)["by_column"].get(column.strip(), np.empty(0, dtype=np.int64))
+            df = df.iloc[positions]
         
         total = len(df)
         total_pages = max(1, (total + per_page - 1) // per_page)
@@ -126,73 +252,161 @@ class DiffLoader:
 class ProdLoader:
     """讀取我們的計算結果和 PROD 資料 (Phase 3)"""
     
-    def __init__(self, output_dir, source_dir):
+    def __init__(self, output_dir, source_dir, cache=None):
         self.output_dir = output_dir
         self.source_dir = source_dir
-        self._cache = {}
+        self.cache = cache if cache is not None else viewer_cache  # 共用 LRU 快取
     
-    def get_ours_row(self, date, term, time_val, strike):
-        """取得我們的計算結果中特定 (time, strike) 的一列"""
-        key = f"ours_{date}_{term}"
-        if key not in self._cache:
-            path = os.path.join(self.output_dir, f"驗證{date}_{term}PROD.csv")
-            if os.path.exists(path):
-                self._cache[key] = pd.read_csv(path, encoding="utf-8-sig")
-            else:
-                return {}  # 檔案不存在
+    def _ours_path(self, date, term):
+        return os.path.join(self.output_dir, f"驗證{date}_{term}PROD.csv")
+    
+    def _prod_path(self, date, term):
+        return os.path.join(self.source_dir, date, f"{term}PROD_{date}.tsv")
+    
+    def _ours_loader(self, date, term):
+        """我們的計算結果的讀取函式 (含 time_int 欄位)"""
+        path = self._ours_path(date, term)
         
-        df = self._cache[key]
-        # time_val 格式為 84500 (int) 或 "08:45:00" (str)
-        # 我們的 CSV time 是 HH:MM:SS 格式 (str)，但 validation_diff 可能是 int (HMMSS)
-        # 需要做轉換
+        def read():
+            df = pd.read_csv(path, encoding="utf-8-sig", low_memory=False)
+            # 我們的 CSV time 可能是 HMMSS (int) 或 "HH:MM:SS" (str)，統一轉為 HMMSS int
+            df["time_int"] = pd.to_numeric(
+                df["time"].astype(str).str.replace(":", ""), errors="coerce"
+            ).fillna(0).astype(int)
+            return df
         
-        # 簡易轉換：將 CSV 的 "HH:MM:SS" 轉為 HMMSS int 做比對
-        if "time_int" not in df.columns:
-            df["time_int"] = df["time"].astype(str).str.replace(":", "").astype(int)
-            
-        row = df[(df["time_int"] == int(time_val)) & (df["strike"] == int(strike))]
-        if row.empty:
-            return {}
-        # 轉為 dict，並將 None 轉為 null (for JSON)
-        return row.astype(object).where(pd.notnull(row), None).iloc[0].to_dict()
+        return lambda: self._read_shared(f"ours_{date}_{term}", path, read)
+    
+    def _prod_loader(self, date, term):
+        """PROD TSV 的讀取函式"""
+        path = self._prod_path(date, term)
+        return lambda: self._read_shared(f"prod_{date}_{term}", path, lambda: pd.read_csv(path, sep="\t"))
+    
+    @staticmethod
+    def _read_shared(name, path, read):
+        """多 worker 模式下改由共用的 mmap 欄位檔載入 (shared_frames.py)"""
+        store = get_frame_store()
+        return read() if store is None else store.load(name, path, read)
+    
+    def _load_ours(self, date, term):
+        """讀取我們的計算結果 (含 time_int 欄位)，檔案不存在回傳 None"""
+        path = self._ours_path(date, term)
+        if not os.path.exists(path):
+            return None
+        df = self.cache.get_or_load(("ours", date, term), self._ours_loader(date, term), sources=[path])
+        self._prefetch_sibling(date, term)
+        return df
+    
+    def _load_prod(self, date, term):
+        """讀取 PROD TSV，檔案不存在回傳 None"""
+        path = self._prod_path(date, term)
+        if not os.path.exists(path):
+            return None
+        df = self.cache.get_or_load(("prod", date, term), self._prod_loader(date, term), sources=[path])
+        self._prefetch_sibling(date, term)
+        return df
+    
+    def _prefetch_sibling(self, date, term):
+        """開啟某個 Term 時，在背景預先載入同一天另一個 Term 的 ours / PROD 表"""
+        sibling = {"Near": "Next", "Next": "Near"}.get(term)
+        if sibling is None:
+            return
+        for kind, path, loader in (
+            ("ours", self._ours_path(date, sibling), self._ours_loader),
+            ("prod", self._prod_path(date, sibling), self._prod_loader),
+        ):
+            if os.path.exists(path):
+                self.cache.prefetch((kind, date, sibling), loader(date, sibling), sources=[path])
+    
+    @staticmethod
+    def _build_row_index(df, time_col):
+        """建立 (time, strike) → 列位置 的索引（同鍵只保留第一列，與原本 iloc[0] 行為一致）
+        同時保存各欄位的 numpy 陣列，取單列時不必經過 pandas 的逐欄索引
+        """
+        positions = {}
+        keys = zip(pd.to_numeric(df[time_col], errors="coerce").tolist(),
+                   pd.to_numeric(df["strike"], errors="coerce").tolist())
+        for pos, key in enumerate(keys):
+            if key not in positions:
+                positions[key] = pos
+        columns = [(str(c), df[c].to_numpy()) for c in df.columns]
+        return {"positions": positions, "columns": columns}
+    
+    def _row_index(self, kind, date, term, df):
+        """取得 ours / prod 表的 (time, strike) 索引（與 DataFrame 一起快取、一起失效）"""
+        path = self._ours_path(date, term) if kind == "ours" else self._prod_path(date, term)
+        time_col = "time_int" if kind == "ours" else "time"
+        return self.cache.get_or_load(
+            (f"{kind}_index", date, term), lambda: self._build_row_index(df, time_col), sources=[path]
+        )
+    
+    @staticmethod
+    def _to_json_value(v):
+        """numpy 純量轉為 Python 原生型別，NaN → None"""
+        if hasattr(v, "item"):
+            v = v.item()
+        if v is None or (isinstance(v, float) and v != v):
+            return None
+        return v
+    
+    def _lookup_rows(self, kind, date, term, keys):
+        df = self._load_ours(date, term) if kind == "ours" else self._load_prod(date, term)
+        if df is None:
+            return [{} for _ in keys]
+        index = self._row_index(kind, date, term, df)
+        positions, columns = index["positions"], index["columns"]
+        rows = []
+        for t, k in keys:
+            pos = positions.get((int(t), int(k)))
+            if pos is None:
+                rows.append({})
+            else:
+                rows.append({c: self._to_json_value(arr[pos]) for c, arr in columns})
+        return rows
+    
+    def get_ours_row(self, date, term, time_val, strike):
+        """取得我們的計算結果中特定 (time, strike) 的一列"""
+        return self._lookup_rows("ours", date, term, [(time_val, strike)])[0]
+    
+    def get_ours_rows(self, date, term, keys):
+        """批次取得我們的計算結果
+        keys: [(time_int, strike), ...]
+        回傳: 與 keys 對應的 dict 列表，找不到的為 {}
+        """
+        return self._lookup_rows("ours", date, term, keys)
     
     def get_prod_row(self, date, term, time_val, strike):
         """取得 PROD 中特定 (time, strike) 的一列"""
-        key = f"prod_{date}_{term}"
-        path = os.path.join(self.source_dir, date, f"{term}PROD_{date}.tsv")
-        if os.path.exists(path):
-            df = pd.read_csv(path, sep="\t")
-        else:
-            return {}
-        
-        row = df[(df["time"] == int(time_val)) & (df["strike"] == int(strike))]
-        if row.empty:
-            return {}
-        return row.astype(object).where(pd.notnull(row), None).iloc[0].to_dict()
+        return self._lookup_rows("prod", date, term, [(time_val, strike)])[0]
 
     def build_sysid_map(self, date, term):
         """從 PROD TSV 建立 Time→SysID 對照表，供探勘面板使用
         回傳: {time_int: snapshot_sysID, ...} 例如 {84515: 18505, 84530: 18600}
         """
-        cache_key = f"sysid_map_{date}_{term}"
-        if cache_key in self._cache:
-            return self._cache[cache_key]
-
-        path = os.path.join(self.source_dir, date, f"{term}PROD_{date}.tsv")
-        if not os.path.exists(path):
-            return {}
-
-        df = pd.read_csv(path, sep="\t")
-
+        df = self._load_prod(date, term)
         # 取唯一的 (time, snapshot_sysID) 組合（每個時間點只有一個 SysID）
-        if "snapshot_sysID" not in df.columns:
+        if df is None or "snapshot_sysID" not in df.columns:
             return {}
 
-        # 只取首次出現（每個 time 的值是固定的）
-        time_sysid = df[["time", "snapshot_sysID"]].dropna().drop_duplicates(subset="time")
-        result = dict(zip(time_sysid["time"].astype(int), time_sysid["snapshot_sysID"].astype(int)))
-        self._cache[cache_key] = result
-        return result
+        def build():
+            # 只取首次出現（每個 time 的值是固定的）
+            time_sysid = df[["time", "snapshot_sysID"]].dropna().drop_duplicates(subset="time")
+            return dict(zip(time_sysid["time"].astype(int), time_sysid["snapshot_sysID"].astype(int)))
+
+        return self.cache.get_or_load(
+            ("sysid_map", date, term), build, sources=[self._prod_path(date, term)]
+        )
+
+    def get_prod_strikes(self, date, term):
+        """PROD TSV 中出現的所有履約價 (排序後的 int list)"""
+        df = self._load_prod(date, term)
+        if df is None:
+            return []
+        return self.cache.get_or_load(
+            ("prod_strikes", date, term),
+            lambda: sorted(df["strike"].dropna().astype(int).unique().tolist()),
+            sources=[self._prod_path(date, term)]
+        )
 
     def get_calc_trace(self, date, term, time_int, strike):
         """取得 EMA 算式還原所需的完整中間參數
@@ -279,98 +493,174 @@ class ProdLoader:
         except:
             return None
 
-    def get_full_data(self, date, term, page=1, per_page=200, diff_df=None,
-                      filter_cp=None, filter_strike=None, filter_time=None):
-        """取得完整計算資料（含差異標記），展開為 Call/Put Long format
-
-        diff_df: DiffLoader 載入的差異 DataFrame，用來標記哪些列有差，可為 None
-        回傳: {rows, total, total_pages, page}
-        """
-        path = os.path.join(self.output_dir, f"驗證{date}_{term}PROD.csv")
-        if not os.path.exists(path):
-            return {"rows": [], "total": 0, "total_pages": 0, "page": 1, "error": f"找不到 {path}"}
-
-        cache_key = f"full_{date}_{term}"
-        if cache_key not in self._cache:
-            df = pd.read_csv(path, encoding="utf-8-sig", low_memory=False)
-            self._cache[cache_key] = df
-        df = self._cache[cache_key].copy()
-
-        # time_int 欄位（用於比對）
-        if "time_int" not in df.columns:
-            df["time_int"] = df["time"].astype(str).str.replace(":", "").apply(
-                lambda x: int(x) if x.replace(":", "").isdigit() else 0
-            )
-
-        # 展開成 Call / Put 兩列
-        col_map_c = {
+    # 完整資料表 (Long format) 的欄位對照：ours CSV 欄位 -> 統一欄名
+    FULL_SIDE_MAPS = {
+        "Call": {
             "c.ema": "EMA", "c.gamma": "Gamma",
             "c.bid": "Q_hat_Bid", "c.ask": "Q_hat_Ask",
             "c.last_bid": "Q_Last_Bid", "c.last_ask": "Q_Last_Ask",
             "c.min_bid": "Min_Bid", "c.min_ask": "Min_Ask",
-        }
-        col_map_p = {
+        },
+        "Put": {
             "p.ema": "EMA", "p.gamma": "Gamma",
             "p.bid": "Q_hat_Bid", "p.ask": "Q_hat_Ask",
             "p.last_bid": "Q_Last_Bid", "p.last_ask": "Q_Last_Ask",
             "p.min_bid": "Min_Bid", "p.min_ask": "Min_Ask",
-        }
+        },
+    }
 
-        def make_side(side_map, cp_label):
+    @classmethod
+    def _build_full_table(cls, df, term, diff_df=None):
+        """建立整天的 Long format 表 (含差異標記)，依 (time_int, strike, CP) 排序
+
+        同時建立篩選用的次要索引：
+            strike / CP -> 升序列位置陣列；time_int 已是主排序鍵，以 searchsorted 取區間
+        """
+        sides = []
+        for cp_label, side_map in cls.FULL_SIDE_MAPS.items():
             cols_needed = ["time_int", "time", "strike"] + [c for c in side_map if c in df.columns]
-            side = df[cols_needed].copy()
-            side = side.rename(columns=side_map)
+            side = df[cols_needed].rename(columns=side_map)
             side["CP"] = cp_label
             side["Term"] = term
-            return side
-
-        long_df = pd.concat([make_side(col_map_c, "Call"), make_side(col_map_p, "Put")], ignore_index=True)
+            sides.append(side)
+        long_df = pd.concat(sides, ignore_index=True)
         long_df["strike"] = pd.to_numeric(long_df["strike"], errors="coerce").fillna(0).astype(int)
 
-        # 篩選
-        if filter_cp and filter_cp != "all":
-            long_df = long_df[long_df["CP"] == filter_cp]
-        if filter_strike:
-            long_df = long_df[long_df["strike"] == int(filter_strike)]
-        if filter_time:
-            long_df = long_df[long_df["time_int"] == int(filter_time)]
-
-        # 標記是否有差異
+        # 差異標記：以 (Time, Strike, CP) 合併，取代逐列 apply
         long_df["has_diff"] = False
         long_df["diff_cols"] = ""
         if diff_df is not None and not diff_df.empty:
-            term_diffs = diff_df[diff_df["Term"].astype(str) == term].copy()
+            term_diffs = diff_df[diff_df["Term"].astype(str) == term]
             if not term_diffs.empty:
-                term_diffs["Time"] = pd.to_numeric(term_diffs["Time"], errors="coerce").fillna(0).astype(int)
-                term_diffs["Strike"] = pd.to_numeric(term_diffs["Strike"], errors="coerce").fillna(0).astype(int)
-                diff_map = term_diffs.groupby(["Time", "Strike", "CP"])["Column"].apply(
-                    lambda x: ",".join(x)
-                ).to_dict()
-                def _mark(row):
-                    key = (int(row["time_int"]), int(row["strike"]), row["CP"])
-                    return diff_map.get(key, "")
-                long_df["diff_cols"] = long_df.apply(_mark, axis=1)
+                keys = pd.DataFrame({
+                    "time_int": pd.to_numeric(term_diffs["Time"], errors="coerce").fillna(0).astype(int).to_numpy(),
+                    "strike": pd.to_numeric(term_diffs["Strike"], errors="coerce").fillna(0).astype(int).to_numpy(),
+                    "CP": term_diffs["CP"].to_numpy(),
+                    "diff_cols": term_diffs["Column"].astype(str).to_numpy(),
+                })
+                diff_map = keys.groupby(["time_int", "strike", "CP"], sort=False)["diff_cols"].agg(",".join)
+                marks = pd.MultiIndex.from_frame(long_df[["time_int", "strike", "CP"]])
+                long_df["diff_cols"] = diff_map.reindex(marks).fillna("").to_numpy()
                 long_df["has_diff"] = long_df["diff_cols"] != ""
 
-        # 排序
+        # 保留原本的數值型別 (整天約 36 萬列，轉成 Python 物件會讓快取與各 worker 的記憶體膨脹數倍)；
+        # NaN -> None 只在回應時對分頁切片處理
         long_df = long_df.sort_values(["time_int", "strike", "CP"]).reset_index(drop=True)
 
-        total = len(long_df)
+        time_values = long_df["time_int"].to_numpy(dtype="int64")
+        return {
+            "table": long_df,
+            "time": time_values,
+            "by_strike": long_df.groupby("strike", sort=False).indices,
+            "by_cp": long_df.groupby("CP", sort=False).indices,
+        }
+
+    def _full_table(self, date, term, diff_df=None):
+        """取得 (date, term) 的預先建立完整資料表；ours CSV 或差異報告重新產生時重建"""
+        df = self._load_ours(date, term)
+        if df is None:
+            return None
+        diff_path = os.path.join(self.output_dir, f"validation_diff_{date}.csv")
+        has_diff = diff_df is not None
+        return self.cache.get_or_load(
+            ("full_long", date, term, has_diff),
+            lambda: self._build_full_table(df, term, diff_df),
+            sources=[self._ours_path(date, term), diff_path],
+        )
+
+    def get_full_data(self, date, term, page=1, per_page=200, diff_df=None,
+                      filter_cp=None, filter_strike=None, filter_time=None, columnar=False):
+        """取得完整計算資料（含差異標記），展開為 Call/Put Long format
+
+        diff_df: DiffLoader 載入的差異 DataFrame，用來標記哪些列有差，可為 None
+        columnar: True 時以欄式格式回傳 {columns, data} 取代 rows
+        回傳: {rows, total, total_pages, page}
+        """
+        full = self._full_table(date, term, diff_df)
+        if full is None:
+            path = self._ours_path(date, term)
+            return {"rows": [], "total": 0, "total_pages": 0, "page": 1, "error": f"找不到 {path}"}
+
+        # 篩選：各條件取得升序列位置後求交集；無篩選時直接切片
+        positions = None
+        if filter_time:
+            lo = int(np.searchsorted(full["time"], int(filter_time), side="left"))
+            hi = int(np.searchsorted(full["time"], int(filter_time), side="right"))
+            positions = np.arange(lo, hi)
+        if filter_cp and filter_cp != "all":
+            cp_pos = full["by_cp"].get(filter_cp, np.empty(0, dtype=np.intp))
+            positions = cp_pos if positions is None else np.intersect1d(positions, cp_pos, assume_unique=True)
+        if filter_strike:
+            strike_pos = full["by_strike"].get(int(filter_strike), np.empty(0, dtype=np.intp))
+            positions = strike_pos if positions is None else np.intersect1d(positions, strike_pos, assume_unique=True)
+
+        table = full["table"]
+        total = len(table) if positions is None else len(positions)
         total_pages = max(1, (total + per_page - 1) // per_page)
         page = max(1, min(page, total_pages))
         start = (page - 1) * per_page
-        page_df = long_df.iloc[start:start + per_page].copy()
-
-        # NaN → None
-        page_df = page_df.astype(object).where(pd.notnull(page_df), None)
+        if positions is None:
+            page_df = table.iloc[start:start + per_page]
+        else:
+            page_df = table.iloc[positions[start:start + per_page]]
 
+        if columnar:
+            rows = frame_columns(page_df)
+        else:
+            rows = {"rows": page_df.astype(object).where(pd.notnull(page_df), None).to_dict(orient="records")}
         return {
-            "rows": page_df.to_dict(orient="records"),
+            **rows,
             "total": total,
             "total_pages": total_pages,
             "page": page,
         }
 
+    @staticmethod
+    def _build_contrib_index(df):
+        """建立 Contrib 檔的時間索引：依 (time, strike) 排序、預先標記 ATM，並記錄每個時間點的列範圍
+
+        ATM 判定與原本逐次篩選相同：contrib 為空 / 'X' / '' / ' ' 的列只用來標記價平履約價
+        (取該時間點第一筆)，本身不輸出
+        """
+        time_values = pd.to_numeric(df["time"], errors="coerce").to_numpy()
+        contrib_raw = df["contrib"]
+        atm_mask = (contrib_raw.isna() | contrib_raw.isin(["X", "", " "])).to_numpy()
+
+        # 每個時間點的 ATM 履約價 = 該時間點第一個 ATM 標記列的 strike
+        atm_rows = pd.DataFrame({"time": time_values[atm_mask], "strike": df["strike"].to_numpy()[atm_mask]})
+        atm_strike = atm_rows.drop_duplicates("time").set_index("time")["strike"]
+
+        rows = df[~atm_mask].copy()
+        rows_time = time_values[~atm_mask]
+        rows["is_atm"] = (rows["strike"].to_numpy() == pd.Series(rows_time).map(atm_strike).to_numpy())
+        rows["contrib_num"] = pd.to_numeric(rows["contrib"], errors="coerce").fillna(0)
+
+        # 依 (time, strike) 穩定排序，同一 strike 維持檔案內順序
+        order = np.lexsort((rows["strike"].to_numpy(), rows_time))
+        rows = rows.iloc[order].reset_index(drop=True)
+        rows_time = rows_time[order]
+
+        typed = {
+            "contrib": rows["contrib_num"].to_numpy(dtype=float),
+            "mid": pd.to_numeric(rows["mid"], errors="coerce").to_numpy(dtype=float) if "mid" in rows else None,
+            "is_atm": rows["is_atm"].to_numpy(dtype=bool),
+        }
+        # 事先轉為 JSON 相容 (NaN -> None)，查詢時只需切片
+        table = rows.astype(object).where(pd.notnull(rows), None)
+        times, starts = np.unique(rows_time, return_index=True)
+        ends = np.append(starts[1:], len(rows_time))
+        return {"table": table, "times": times, "starts": starts, "ends": ends, "typed": typed}
+
+    def _contrib_index(self, date, term):
+        path = os.path.join(self.source_dir, date, f"{term}_Contrib_{date}.tsv")
+        if not os.path.exists(path):
+            return None
+        return self.cache.get_or_load(
+            ("contrib_index", date, term),
+            lambda: self._build_contrib_index(pd.read_csv(path, sep="\t")),
+            sources=[path]
+        )
+
     def get_snapshot_with_contrib(self, date, time_int):
         """讀取 Near_Contrib 與 Next_Contrib 並組合為 T 字報價所需結構
         回傳: {"Near": [rows...], "Next": [rows...]}
@@ -378,56 +668,51 @@ class ProdLoader:
         result = {"Near": [], "Next": []}
 
         for term in ["Near", "Next"]:
-            path = os.path.join(self.source_dir, date, f"{term}_Contrib_{date}.tsv")
-            if not os.path.exists(path):
+            index = self._contrib_index(date, term)
+            if index is None:
                 continue
-            
-            df = pd.read_csv(path, sep="\t")
-            # 篩選特定時間
-            df_time = df[df["time"] == int(time_int)].copy()
-            if df_time.empty:
+            pos = int(np.searchsorted(index["times"], int(time_int)))
+            if pos >= len(index["times"]) or index["times"][pos] != int(time_int):
                 continue
-                
-            # 尋找全空(只含 strike 等基本資訊) 的 row 來取得 ATM Strike
-            # 我們可以觀察 contrib 欄位是否為空 (NaN) 或 'X'
-            atm_mask = df_time['contrib'].isna() | (df_time['contrib'] == 'X') | (df_time['contrib'] == '') | (df_time['contrib'] == ' ')
-            atm_rows = df_time[atm_mask]
-            atm_strike = atm_rows.iloc[0]['strike'] if not atm_rows.empty else None
-            
-            # 標記 ATM，並過濾掉只用來標記 ATM 但是缺乏 contrib 和 mid 等報價的「空氣列」
-            # 我們會保留該 strike 的其他正常列，這才是我們要畫的！
-            df_time["is_atm"] = (df_time["strike"] == atm_strike)
-            df_time = df_time[~df_time.index.isin(atm_rows.index)]
-            
-            # 確保有 contrib 欄位 (原本為科學記號字串或數值)
-            df_time["contrib_num"] = pd.to_numeric(df_time["contrib"], errors="coerce").fillna(0)
-            
-            # NaN -> None
-            df_time = df_time.astype(object).where(pd.notnull(df_time), None)
-            
-            # 依履約價排序
-            df_time = df_time.sort_values("strike")
-            
-            result[term] = df_time.to_dict(orient="records")
+            lo, hi = int(index["starts"][pos]), int(index["ends"][pos])
+            result[term] = index["table"].iloc[lo:hi].to_dict(orient="records")
 
         return result
 
 class SigmaDiffLoader:
     """讀取 PROD 的 sigma_YYYYMMDD.tsv 與我們產出的 my_sigma_YYYYMMDD.tsv 進行差異比對"""
-    def __init__(self, prod_dir, my_dir):
+    def __init__(self, prod_dir, my_dir, cache=None):
         self.prod_dir = prod_dir  # 資料來源目錄
         self.my_dir = my_dir      # output 目錄
-        self._cache = {}
+        self.cache = cache if cache is not None else viewer_cache  # 共用 LRU 快取
 
-    def get_diff(self, date):
+    def source_paths(self, date):
+        """[PROD sigma 檔, 我們的 sigma 檔]"""
         # PROD 檔案預期在 資料來源/YYYYMMDD/sigma_YYYYMMDD.tsv
         prod_path = os.path.join(self.prod_dir, date, f"sigma_{date}.tsv")
         # 我們自算的檔案預期在 output/my_sigma_YYYYMMDD.tsv
         my_path = os.path.join(self.my_dir, f"my_sigma_{date}.tsv")
+        return [prod_path, my_path]
 
+    def get_diff(self, date, columnar=False):
+        """columnar: True 時以欄式格式回傳 {columns, data} 取代 rows"""
+        prod_path, my_path = self.source_paths(date)
         if not os.path.exists(prod_path) or not os.path.exists(my_path):
             return {"error": "缺少 PROD 或是 My 的 sigma 檔案", "rows": []}
 
+        df = self.cache.get_or_load(
+            ("sigma_diff", date), lambda: self._build_diff(prod_path, my_path),
+            sources=[prod_path, my_path]
+        )
+        if columnar:
+            return {"error": None, **frame_columns(df)}
+        return {
+            "error": None,
+            "rows": df.astype(object).where(pd.notnull(df), None).to_dict(orient="records")
+        }
+
+    def _build_diff(self, prod_path, my_path):
+        """合併 PROD 與我們的 sigma 檔並計算差異"""
         df_prod = pd.read_csv(prod_path, sep="\t", dtype={"time": str})
         df_my = pd.read_csv(my_path, sep="\t", dtype={"time": str})
 
@@ -450,13 +735,5 @@ class SigmaDiffLoader:
         calc_diff("vix")
         calc_diff("ori_vix")
 
-        df = df.astype(object).where(pd.notnull(df), None)
-        
-        # 依照時間排序
-        df = df.sort_values(by="time").reset_index(drop=True)
-
-        result = {
-            "error": None,
-            "rows": df.to_dict(orient="records")
-        }
-        return result
+        # 依照時間排序 (NaN 於輸出時才轉為 null)
+        return df.sort_values(by="time").reset_index(drop=True)
@@ -0,0 +1,185 @@
+"""
+Viewer API 回應層 (JSON 序列化 / 壓縮 / 快取驗證)
+
+原本各端點都以 df.astype(object).where(pd.notnull(df), None) 再 to_dict(orient="records")
+交給 jsonify：每個儲存格都被包成 Python 物件，每一列都重複欄名，也沒有壓縮與快取驗證。
+
+本模組提供：
+    - FastJSONProvider：有 orjson 時以 orjson 編碼 (numpy 陣列直接序列化，NaN -> null)，
+      沒有時沿用 Flask 預設的 json
+    - frame_columns()：DataFrame -> 欄式 JSON {"columns": [...], "data": [[欄值...], ...]}
+      (端點加上 ?format=columnar 時使用，前端以 rowsFromColumnar() 還原)
+    - compress_response()：after_request 掛勾，依 Accept-Encoding 回傳 br (需 brotli 套件) 或 gzip
+    - not_modified() / json_response()：依來源檔 mtime / size 產生 ETag 與 Last-Modified，
+      瀏覽器重新驗證時直接回 304，不必重算也不必重傳
+"""
+import os
+import gzip
+import time
+import hashlib
+from email.utils import formatdate
+
+import numpy as np
+from flask import request, jsonify, current_app
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # 選用套件：沒有時退回標準 json
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # 選用套件：沒有時只提供 gzip
+    brotli = None
+
+# 小於此大小的回應不壓縮 (壓縮收益低於 CPU 成本)
+MIN_COMPRESS_BYTES = 1024
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+
+# 伺服器啟動時間：納入 ETag，程式更新後重新啟動不會讓瀏覽器沿用舊格式的回應
+_BOOT_TOKEN = str(time.time())
+
+
+# =====================================================================
+# JSON 編碼
+# =====================================================================
+def _default(obj):
+    """orjson 無法直接處理的型別 (object 陣列、numpy 純量等)"""
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if hasattr(obj, "isoformat"):
+        return obj.isoformat()
+    raise TypeError(f"無法序列化的型別: {type(obj).__name__}")
+
+
+_ORJSON_OPTIONS = (orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """jsonify 使用的 JSON Provider：有 orjson 時改用 orjson 編碼"""
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS).decode("utf-8")
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def _column_values(values):
+    """單一欄位 -> JSON 陣列值；數值欄在 orjson 下直接以 numpy 陣列序列化"""
+    values = np.asarray(values)
+    if orjson is not None and values.dtype.kind in "fiub":
+        return np.ascontiguousarray(values)
+    out = values.tolist()
+    # 標準 json 會輸出非法的 NaN，逐值轉為 None
+    return [None if isinstance(v, float) and v != v else v for v in out]
+
+
+def frame_columns(df):
+    """DataFrame -> {"columns": [欄名...], "data": [[第 1 欄所有值], [第 2 欄所有值], ...]}"""
+    return {
+        "columns": [str(c) for c in df.columns],
+        "data": [_column_values(df[c].to_numpy()) for c in df.columns],
+    }
+
+
+def wants_columnar():
+    """請求是否要求欄式格式 (?format=columnar)"""
+    return request.args.get("format") == "columnar"
+
+
+# =====================================================================
+# 壓縮
+# =====================================================================
+def compress_response(response):
+    """after_request 掛勾：JSON 回應依 Accept-Encoding 壓縮"""
+    if (response.direct_passthrough
+            or response.status_code < 200 or response.status_code >= 300
+            or response.mimetype != "application/json"
+            or "Content-Encoding" in response.headers):
+        return response
+
+    accept = request.headers.get("Accept-Encoding", "").lower()
+    if brotli is not None and "br" in accept:
+        encoding = "br"
+    elif "gzip" in accept:
+        encoding = "gzip"
+    else:
+        return response
+
+    data = response.get_data()
+    if len(data) < MIN_COMPRESS_BYTES:
+        return response
+    if encoding == "br":
+        body = brotli.compress(data, quality=BROTLI_QUALITY)
+    else:
+        body = gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+    response.set_data(body)
+    response.headers["Content-Encoding"] = encoding
+    response.headers["Content-Length"] = str(len(body))
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+# =====================================================================
+# 快取驗證 (ETag / Last-Modified)
+# =====================================================================
+def _validators(sources):
+    """依請求路徑與來源檔簽章計算 (ETag, 最新 mtime)"""
+    signatures = []
+    latest = None
+    for path in sources:
+        try:
+            stat = os.stat(path)
+        except (OSError, TypeError):
+            signatures.append((path, None))
+            continue
+        signatures.append((path, stat.st_mtime, stat.st_size))
+        latest = stat.st_mtime if latest is None else max(latest, stat.st_mtime)
+    digest = hashlib.sha1(repr((_BOOT_TOKEN, request.full_path, signatures)).encode("utf-8")).hexdigest()
+    # 壓縮與否會改變位元組內容，因此使用弱 ETag
+    return f'W/"{digest[:24]}"', latest
+
+
+def _set_validators(response, etag, latest):
+    response.headers["ETag"] = etag
+    if latest is not None:
+        response.headers["Last-Modified"] = formatdate(latest, usegmt=True)
+    # 每次都向伺服器重新驗證 (來源檔可能隨時重新產生)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+def not_modified(sources):
+    """
+    瀏覽器帶來的 If-None-Match 與目前來源檔一致時回傳 304 回應，否則回傳 None
+
+    用法 (在重新計算前呼叫):
+        cached = not_modified(sources)
+        if cached is not None:
+            return cached
+    """
+    etag, latest = _validators(sources)
+    if etag in request.headers.get("If-None-Match", ""):
+        return _set_validators(current_app.response_class(status=304), etag, latest)
+    return None
+
+
+def json_response(payload, sources=(), status=200):
+    """jsonify 並依來源檔附加 ETag / Last-Modified"""
+    response = jsonify(payload)
+    response.status_code = status
+    if sources and status == 200:
+        _set_validators(response, *_validators(sources))
+    return response
@@ -0,0 +1,122 @@
+"""
+Viewer 正式服務模式 (Production WSGI Serving)
+
+app.py 原本以 Flask 開發伺服器 (app.run) 單一行程服務，多位分析人員透過
+FLASK_HOST=0.0.0.0 同時使用時請求會互相等待。
+
+本模組依環境變數選擇 WSGI 伺服器：
+    VIX_VIEWER_SERVER   auto (預設) | waitress | gunicorn | flask
+    VIX_VIEWER_WORKERS  gunicorn worker 行程數 (預設 min(4, CPU 數))
+    VIX_VIEWER_THREADS  每個行程的執行緒數 (預設 8)
+
+auto 的選擇順序：
+    1. gunicorn (僅 Linux / macOS，且已安裝)：多 worker 行程，
+       並自動啟用 shared_frames (VIX_VIEWER_SHARED_FRAMES=1)，
+       各 worker 以 mmap 共用同一份每日資料，不會各自複製 DataFrame
+    2. waitress (Windows 亦可用，pip install waitress)：單一行程多執行緒，
+       所有請求共用同一個 LRU 快取
+    3. Flask 開發伺服器 (threaded)：未安裝上述套件時的後備
+
+start_viewer.bat 與 PyInstaller 打包的 VIX_Viewer.exe 都經由 app.py 的 __main__ 進入本模組。
+
+用法:
+    python Viewer/app.py                                   # 自動選擇
+    VIX_VIEWER_SERVER=gunicorn VIX_VIEWER_WORKERS=4 python Viewer/app.py
+"""
+import os
+import sys
+
+DEFAULT_THREADS = 8
+
+
+def _env_int(name, default):
+    try:
+        return max(1, int(os.environ.get(name, default)))
+    except ValueError:
+        return default
+
+
+def _available(module_name):
+    try:
+        __import__(module_name)
+        return True
+    except ImportError:
+        return False
+
+
+def choose_server():
+    """依 VIX_VIEWER_SERVER 與已安裝套件決定伺服器種類"""
+    server = os.environ.get('VIX_VIEWER_SERVER', 'auto').strip().lower()
+    if server == 'auto':
+        if os.name != 'nt' and not getattr(sys, 'frozen', False) and _available('gunicorn'):
+            return 'gunicorn'
+        if _available('waitress'):
+            return 'waitress'
+        return 'flask'
+    if server in ('waitress', 'gunicorn') and not _available(server):
+        print(f"[serve] 未安裝 {server}，改用 Flask 開發伺服器 (pip install {server})")
+        return 'flask'
+    if server == 'gunicorn' and os.name == 'nt':
+        print("[serve] gunicorn 不支援 Windows，改用 waitress / Flask")
+        return 'waitress' if _available('waitress') else 'flask'
+    return server if server in ('waitress', 'gunicorn', 'flask') else 'flask'
+
+
+def _run_gunicorn(app, host, port, workers, threads, on_start=None):
+    from gunicorn.app.base import BaseApplication
+
+    class ViewerApplication(BaseApplication):
+        def __init__(self, application, options):
+            self.application = application
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return self.application
+
+    options = {
+        'bind': f"{host}:{port}",
+        'workers': workers,
+        'threads': threads,
+        'worker_class': 'gthread',
+        # 第一次載入大檔可能較久
+        'timeout': 300,
+    }
+    if on_start is not None:
+        # 背景執行緒不會跨越 fork，需在每個 worker 啟動後各自啟動
+        options['post_fork'] = lambda server, worker: on_start()
+    ViewerApplication(app, options).run()
+
+
+def run(app, host, port, on_start=None):
+    """
+    以選定的伺服器啟動 Viewer (阻塞直到結束)
+
+    Args:
+        on_start: 伺服器行程 (gunicorn 為每個 worker) 開始服務前呼叫，例如啟動背景預熱
+    """
+    server = choose_server()
+    threads = _env_int('VIX_VIEWER_THREADS', DEFAULT_THREADS)
+
+    if server == 'gunicorn':
+        workers = _env_int('VIX_VIEWER_WORKERS', min(4, os.cpu_count() or 1))
+        if workers > 1:
+            # 多行程共用 mmap 欄位檔 (各 worker 讀取時才檢查，fork 前設定即可)
+            os.environ.setdefault('VIX_VIEWER_SHARED_FRAMES', '1')
+        print(f"[serve] gunicorn: {workers} workers x {threads} threads, "
+              f"shared frames={os.environ.get('VIX_VIEWER_SHARED_FRAMES', '0')}")
+        _run_gunicorn(app, host, port, workers, threads, on_start)
+        return
+    if on_start is not None:
+        on_start()
+    if server == 'waitress':
+        from waitress import serve
+        print(f"[serve] waitress: {threads} threads")
+        serve(app, host=host, port=port, threads=threads)
+    else:
+        print("[serve] Flask 開發伺服器 (threaded)")
+        app.run(host=host, debug=False, port=port, threaded=True)
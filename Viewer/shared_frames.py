@@ -0,0 +1,142 @@
+"""
+多行程共用的唯讀 DataFrame (Memory-Mapped Shared Frames)
+
+多 worker 模式 (serve.py) 下每個行程都有自己的 LRU 快取，同一天的 ours / PROD 表
+若各自 read_csv，記憶體會隨 worker 數倍增。
+
+本模組把 Loader 讀出的 DataFrame 以欄為單位存成 .npy，之後各行程以
+np.load(mmap_mode='r') 開啟並以 copy=False 組回 DataFrame，數值欄直接共用
+同一份 OS page cache：
+    - 數值 / 布林欄：.npy mmap (不複製)
+    - 其他欄 (字串、混合型別)：存成 categorical codes + categories，
+      codes 每行程一份 (每列 1~4 bytes)，字串本身只在 categories 中出現一次
+
+存放位置：
+    環境變數 VIX_VIEWER_SHARED_DIR，預設為系統暫存目錄下的 vix_viewer_frames/。
+    每個來源檔簽章 (mtime / size) 一個子目錄，來源更新後自動改用新目錄。
+
+只在環境變數 VIX_VIEWER_SHARED_FRAMES=1 時啟用 (serve.py 多 worker 模式會自動設定)；
+單一行程的開發伺服器維持原本的 read_csv 路徑。
+"""
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+
+FRAME_VERSION = 1
+
+
+def _source_signature(path):
+    stat = os.stat(path)
+    return {'mtime': stat.st_mtime, 'size': stat.st_size}
+
+
+def _codes_dtype(n_categories):
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_categories < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+class SharedFrameStore:
+    """以 .npy 欄位檔保存、以 mmap 載入 DataFrame"""
+
+    def __init__(self, root=None):
+        self.root = root or os.environ.get('VIX_VIEWER_SHARED_DIR') or \
+            os.path.join(tempfile.gettempdir(), 'vix_viewer_frames')
+        self._lock = threading.Lock()
+
+    def _frame_dir(self, name, source_path):
+        sig = _source_signature(source_path)
+        digest = hashlib.sha1(repr((FRAME_VERSION, os.path.abspath(source_path),
+                                    sig['mtime'], sig['size'])).encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.root, name, digest)
+
+    # -----------------------------------------------------------------
+    # 寫出
+    # -----------------------------------------------------------------
+    def _write(self, df, frame_dir):
+        """寫入暫存目錄後換名；其他行程已先完成時直接沿用對方的結果"""
+        os.makedirs(os.path.dirname(frame_dir), exist_ok=True)
+        tmp_dir = f"{frame_dir}.tmp-{os.getpid()}-{threading.get_ident()}"
+        os.makedirs(tmp_dir, exist_ok=True)
+        columns = []
+        for i, col in enumerate(df.columns):
+            values = df[col].to_numpy()
+            file_name = f"col_{i}.npy"
+            if values.dtype.kind in 'fiub':
+                np.save(os.path.join(tmp_dir, file_name), np.ascontiguousarray(values))
+                columns.append({'name': str(col), 'kind': 'array', 'file': file_name})
+            else:
+                codes, uniques = pd.factorize(pd.Series(values, dtype=object), use_na_sentinel=True)
+                np.save(os.path.join(tmp_dir, file_name), codes.astype(_codes_dtype(len(uniques))))
+                columns.append({'name': str(col), 'kind': 'categorical', 'file': file_name,
+                                'categories': [v.item() if isinstance(v, np.generic) else v
+                                               for v in uniques.tolist()]})
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({'version': FRAME_VERSION, 'n_rows': len(df), 'columns': columns}, f, ensure_ascii=False)
+        try:
+            os.rename(tmp_dir, frame_dir)
+        except OSError:
+            # 其他 worker 已寫好同一份資料
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return
+        # 清除同名資料的舊版本 (Windows 上仍被 mmap 開啟的檔案會刪除失敗，下次再清)
+        parent = os.path.dirname(frame_dir)
+        for entry in os.listdir(parent):
+            path = os.path.join(parent, entry)
+            if path != frame_dir and '.tmp-' not in entry:
+                shutil.rmtree(path, ignore_errors=True)
+
+    # -----------------------------------------------------------------
+    # 載入
+    # -----------------------------------------------------------------
+    @staticmethod
+    def _open(frame_dir):
+        with open(os.path.join(frame_dir, 'meta.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        data = {}
+        for col in meta['columns']:
+            arr = np.load(os.path.join(frame_dir, col['file']), mmap_mode='r')
+            if col['kind'] == 'array':
+                data[col['name']] = arr
+            else:
+                data[col['name']] = pd.Categorical.from_codes(np.asarray(arr), categories=col['categories'])
+        return pd.DataFrame(data, copy=False)
+
+    def load(self, name, source_path, reader):
+        """
+        取得共用的 DataFrame；尚未建立 (或來源已更新) 時呼叫 reader() 讀取並寫出
+
+        Args:
+            name: 資料名稱 (如 "ours_20251231_Near")，作為子目錄名
+            source_path: 來源檔 (簽章決定是否重建)
+            reader: 無參數函式，回傳 DataFrame (須為 RangeIndex)
+        """
+        frame_dir = self._frame_dir(name, source_path)
+        if not os.path.exists(os.path.join(frame_dir, 'meta.json')):
+            with self._lock:
+                if not os.path.exists(os.path.join(frame_dir, 'meta.json')):
+                    self._write(reader().reset_index(drop=True), frame_dir)
+        return self._open(frame_dir)
+
+
+# =====================================================================
+# 行程內單例 (依環境變數決定是否啟用)
+# =====================================================================
+_STORE = None
+
+
+def get_frame_store():
+    """VIX_VIEWER_SHARED_FRAMES=1 時回傳共用的 SharedFrameStore，否則回傳 None"""
+    global _STORE
+    if os.environ.get('VIX_VIEWER_SHARED_FRAMES') != '1':
+        return None
+    if _STORE is None:
+        _STORE = SharedFrameStore()
+    return _STORE
@@ -52,7 +52,7 @@ async function loadDashboardChart() {
 
         const [trendRes, alertRes] = await Promise.all([
             fetch(`/api/vix_trend?date=${date}`),
-            fetch(`/api/alerts?date=${date}`)
+            fetch(`/api/alerts?date=${date}&summary=1`)
         ]);
 
         const data = await trendRes.json();
@@ -313,9 +313,22 @@ function switchAlertTab(tabName) {
     document.getElementById(`alert-tab-${tabName}`).style.display = 'block';
 }
 
-function showAlertModal(alertData) {
+async function showAlertModal(alertData) {
     if (!alertData) return;
 
+    // 明細於第一次開啟時才向伺服器取 (走勢圖只載入摘要)
+    if (!alertData.contributions) {
+        try {
+            const date = document.getElementById('date-selector').value;
+            const res = await fetch(`/api/alerts/contributions?date=${date}&time=${alertData.time}`);
+            const data = await res.json();
+            alertData.contributions = data.contributions || { Near: [], Next: [] };
+        } catch (e) {
+            console.error("載入 Alert 明細失敗:", e);
+            alertData.contributions = { Near: [], Next: [] };
+        }
+    }
+
     // 預設切回摘要 Tab
     switchAlertTab('summary');
 
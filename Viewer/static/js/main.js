@@ -127,6 +127,19 @@ async function loadDiffData(date, page) {
     }
 }
 
+// 欄式回應 ({columns, data}，?format=columnar) 還原為逐列物件
+function rowsFromColumnar(data) {
+    if (!data || !data.columns) return (data && data.rows) || [];
+    const n = data.data.length ? data.data[0].length : 0;
+    const rows = new Array(n);
+    for (let i = 0; i < n; i++) {
+        const row = {};
+        data.columns.forEach((col, j) => { row[col] = data.data[j][i]; });
+        rows[i] = row;
+    }
+    return rows;
+}
+
 // ===== 完整計算資料表 =====
 let fullDataPage = 1;
 
@@ -139,7 +152,7 @@ async function loadFullData(page) {
     const strike = document.getElementById("full-strike-filter").value;
     const timeInt = document.getElementById("full-time-filter").value;
 
-    let url = `${API_BASE}/diff_full/${currentDate}?term=${term}&page=${fullDataPage}&per_page=200`;
+    let url = `${API_BASE}/diff_full/${currentDate}?term=${term}&page=${fullDataPage}&per_page=200&format=columnar`;
     if (cp) url += `&cp=${cp}`;
     if (strike) url += `&strike=${strike}`;
     if (timeInt) url += `&time_int=${timeInt}`;
@@ -148,7 +161,7 @@ async function loadFullData(page) {
         const res = await fetch(url);
         const data = await res.json();
         if (data.error) { console.error(data.error); return; }
-        renderFullTable(data.rows, (fullDataPage - 1) * 200);
+        renderFullTable(rowsFromColumnar(data), (fullDataPage - 1) * 200);
         renderFullPagination(data.page, data.total_pages, data.total);
     } catch (err) {
         console.error("載入完整資料失敗:", err);
@@ -229,9 +242,16 @@ function updateColumnFilterOptions(data) {
 
 function renderSummary(data) {
     const container = document.getElementById("summary-content");
-    const { summary, no_diff_summary, total_per_term, all_columns, total_diffs } = data;
+    const { summary, no_diff_summary, total_per_term, all_columns, total_diffs, truncated } = data;
 
     let html = `<p>總差異筆數: <strong style="color: ${total_diffs > 0 ? '#d9534f' : '#5cb85c'}">${total_diffs.toLocaleString()}</strong></p>`;
+    if (truncated) {
+        // 驗證時達 --max-mismatch 上限提前停止，計數只涵蓋部分差異 / Term
+        html += `<p style="color:#f0ad4e;">⚠ 驗證達差異上限提前停止，以下差異與一致筆數並非全天結果</p>`;
+    } else if (truncated === null) {
+        // 由舊報告回補的彙總，無法確認當時是否設定差異上限
+        html += `<p style="color:#888;">無法確認此報告是否因差異上限提前停止，計數可能不是全天結果</p>`;
+    }
 
     // 收集所有 Term（合併 diff 和 no-diff 的 keys）
     const allTerms = new Set([...Object.keys(summary || {}), ...Object.keys(no_diff_summary || {})]);
@@ -17,14 +17,14 @@ async function loadSigmaDiff() {
     tbody.innerHTML = '<tr><td colspan="14">資料載入中，請稍候...</td></tr>';
 
     try {
-        const response = await fetch(`/api/sigma_diff?date=${date}`);
+        const response = await fetch(`/api/sigma_diff?date=${date}&format=columnar`);
         const data = await response.json();
 
         if (data.error) {
             throw new Error(data.error);
         }
 
-        currentSigmaData = data.rows || [];
+        currentSigmaData = rowsFromColumnar(data);
         renderSigmaTable();
     } catch (err) {
         console.error("載入 Sigma 比對失敗:", err);
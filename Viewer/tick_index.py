@@ -0,0 +1,262 @@
+"""
+Tick 檔記憶體映射索引 (Memory-Mapped Tick Index)
+
+原本 TickLoader 每次 HTTP 請求都以 chunksize 重新讀取整個月份碼 Tick 檔，
+再逐 chunk 比對 prod_id 並 iterrows，單次查詢需數秒。
+
+本模組對每個 Tick 檔只建一次索引：
+    1. 讀取 prod_id / seqno / time / bid / ask / yymmdd 欄位
+    2. 依 (prod_id, seqno) 排序後，各欄存成 .npy 二進位檔
+    3. offsets 表 (meta.json) 記錄每個 prod_id 在陣列中的 [start, end)
+之後以 np.load(mmap_mode='r') 開啟，查詢單一商品某 seqno 區間只需
+兩次 searchsorted，多個使用者同時查詢也只共用同一份 OS page cache。
+
+索引存放位置：
+    預設為 Tick 檔同層的 _tick_index/<檔名>/，可用環境變數 VIX_TICK_INDEX_DIR 指定。
+    來源檔的 mtime / size 改變時會自動重建。
+
+重建不覆寫使用中的檔案：
+    每次建置寫入新的 build-* 子資料夾，完成後以 os.replace 原子性更新 CURRENT 指標檔，
+    之後開啟的索引才改讀新資料夾。舊索引的 .npy 仍被 mmap 開啟時 (Windows 上無法覆寫、
+    POSIX 上截斷會讓查詢中的行程 SIGBUS) 保持原樣，等沒有人使用後的下一次建置再清除；
+    多個 worker 同時重建也各寫各的資料夾，最後一個換上的生效。
+"""
+import os
+import json
+import shutil
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+INDEX_VERSION = 2
+INDEX_COLUMNS = ['seqno', 'time', 'bid', 'ask', 'date']
+POINTER_FILE = 'CURRENT'     # 內容為目前使用中的 build-* 子資料夾名稱
+BUILD_PREFIX = 'build-'
+BUILD_GRACE_SECONDS = 300    # 近期仍有寫入的 build 資料夾可能是其他 worker 正在建置，不清除
+
+
+def _detect_columns(columns):
+    """依欄名關鍵字找出所需欄位 (與原本 TickLoader 的判斷規則一致)"""
+    columns = [c.strip() for c in columns]
+    return {
+        'prod_id': next((c for c in columns if 'prod_id' in c), None),
+        'date': next((c for c in columns if 'yymmdd' in c), None),
+        'seqno': next((c for c in columns if 'seqno' in c), None),
+        'time': next((c for c in columns if 'time' in c and 'yymmdd' not in c), None),
+        'bid': next((c for c in columns if 'buy_price' in c or 'best_bid' in c), None),
+        'ask': next((c for c in columns if 'sell_price' in c or 'best_ask' in c), None),
+    }
+
+
+class TickIndex:
+    """單一 Tick 檔的索引 (建置 + 以 mmap 查詢)"""
+
+    def __init__(self, tick_file, index_root=None):
+        self.tick_file = os.path.abspath(tick_file)
+        if index_root is None:
+            index_root = os.environ.get('VIX_TICK_INDEX_DIR') or \
+                os.path.join(os.path.dirname(self.tick_file), '_tick_index')
+        self.index_dir = os.path.join(index_root, os.path.basename(self.tick_file))
+        self.build_dir = None   # 目前開啟的 build-* 資料夾
+        self.meta = None
+        self.products = {}
+        self.arrays = {}
+
+    # -----------------------------------------------------------------
+    # 建置 / 載入
+    # -----------------------------------------------------------------
+    def _source_signature(self):
+        stat = os.stat(self.tick_file)
+        return {'mtime': stat.st_mtime, 'size': stat.st_size}
+
+    def _current_build(self):
+        """CURRENT 指標所指的 build 資料夾，沒有時回傳 None"""
+        try:
+            with open(os.path.join(self.index_dir, POINTER_FILE), 'r', encoding='utf-8') as f:
+                name = f.read().strip()
+        except OSError:
+            return None
+        path = os.path.join(self.index_dir, name)
+        return path if name.startswith(BUILD_PREFIX) and os.path.isdir(path) else None
+
+    def _load_meta(self, build_dir):
+        try:
+            with open(os.path.join(build_dir, 'meta.json'), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _is_fresh(self, build_dir):
+        meta = self._load_meta(build_dir) if build_dir else None
+        if meta is None:
+            return False
+        sig = self._source_signature()
+        return (meta.get('version') == INDEX_VERSION
+                and meta.get('source_mtime') == sig['mtime']
+                and meta.get('source_size') == sig['size']
+                and all(os.path.exists(os.path.join(build_dir, f"{c}.npy")) for c in INDEX_COLUMNS))
+
+    def _cleanup(self, keep):
+        """清除舊的 build 資料夾與舊版平鋪檔；仍被 mmap 開啟 (Windows) 而刪不掉的留待下次"""
+        cutoff = time.time() - BUILD_GRACE_SECONDS
+        for name in os.listdir(self.index_dir):
+            path = os.path.join(self.index_dir, name)
+            if name == keep or name == POINTER_FILE:
+                continue
+            try:
+                if name.startswith(BUILD_PREFIX) and os.path.isdir(path):
+                    if os.path.getmtime(path) < cutoff:
+                        shutil.rmtree(path)
+                elif name.endswith('.npy') or name.startswith('meta.json'):
+                    os.remove(path)  # INDEX_VERSION 2 以前直接寫在 index_dir 下的檔案
+            except OSError:
+                pass
+
+    def build(self):
+        """
+        讀取 Tick 檔，將排序後的欄位檔與 offsets 表寫入新的 build 資料夾，再切換 CURRENT 指標
+
+        Returns:
+            str: 新 build 資料夾路徑
+        """
+        print(f"[TickIndex] 建立索引: {os.path.basename(self.tick_file)}")
+        header = pd.read_csv(self.tick_file, sep="\t", nrows=0, encoding="utf-8").columns
+        raw_names = {c.strip(): c for c in header}
+        cols = _detect_columns(header)
+        if not (cols['prod_id'] and cols['seqno']):
+            raise ValueError(f"Tick 檔缺少 prod_id 或 seqno 欄位: {self.tick_file}")
+
+        usecols = [raw_names[c] for c in cols.values() if c]
+        df = pd.read_csv(self.tick_file, sep="\t", usecols=usecols, encoding="utf-8",
+                         engine="c", dtype={raw_names[cols['prod_id']]: str})
+        df.columns = [c.strip() for c in df.columns]
+
+        prod_ids = df[cols['prod_id']].astype(str).str.strip().to_numpy().astype('U')
+        seqno = pd.to_numeric(df[cols['seqno']], errors='coerce')
+        keep = seqno.notna().to_numpy()
+
+        def numeric_col(name, fill):
+            if not cols[name]:
+                return np.full(len(df), fill, dtype=float)
+            return pd.to_numeric(df[cols[name]], errors='coerce').to_numpy(dtype=float)
+
+        data = {
+            'seqno': seqno.to_numpy(dtype=float)[keep].astype(np.int64),
+            # time 原始為數字字串 (HMMSSmmm000)，以 int64 儲存，輸出時 str() 即可還原
+            'time': np.nan_to_num(numeric_col('time', -1)[keep], nan=-1).astype(np.int64),
+            'bid': numeric_col('bid', np.nan)[keep],
+            'ask': numeric_col('ask', np.nan)[keep],
+            # 交易日 (YYYYMMDD)，缺欄位時為 -1；供單一序列重播做嚴格日期過濾
+            'date': np.nan_to_num(numeric_col('date', -1)[keep], nan=-1).astype(np.int64),
+        }
+        prod_ids = prod_ids[keep]
+
+        # 依 (prod_id, seqno) 穩定排序，同一商品的 ticks 連續且 seqno 升序
+        order = np.lexsort((data['seqno'], prod_ids))
+        prod_sorted = prod_ids[order]
+        os.makedirs(self.index_dir, exist_ok=True)
+        build_dir = tempfile.mkdtemp(prefix=BUILD_PREFIX, dir=self.index_dir)
+        for name in INDEX_COLUMNS:
+            np.save(os.path.join(build_dir, f"{name}.npy"), np.ascontiguousarray(data[name][order]))
+
+        # offsets 表: prod_id -> [start, end)
+        products = {}
+        if len(prod_sorted):
+            uniq, starts = np.unique(prod_sorted, return_index=True)
+            ends = np.append(starts[1:], len(prod_sorted))
+            # np.unique 回傳已排序，與 prod_sorted 的排列一致
+            products = {str(p): [int(s), int(e)] for p, s, e in zip(uniq, starts, ends)}
+
+        sig = self._source_signature()
+        meta = {
+            'version': INDEX_VERSION,
+            'source': self.tick_file,
+            'source_mtime': sig['mtime'],
+            'source_size': sig['size'],
+            'n_rows': int(len(prod_sorted)),
+            'products': products,
+        }
+        with open(os.path.join(build_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+
+        # build 資料夾寫完才切換指標 (暫存檔 + os.replace 為原子操作)，讀取端不會看到寫一半的索引
+        fd, tmp_path = tempfile.mkstemp(prefix=POINTER_FILE + '.', dir=self.index_dir)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(os.path.basename(build_dir))
+        os.replace(tmp_path, os.path.join(self.index_dir, POINTER_FILE))
+        print(f"[TickIndex] 完成: {meta['n_rows']} 筆, {len(products)} 個商品")
+        return build_dir
+
+    def open(self):
+        """確保索引為最新並以 mmap 開啟 (讀取 CURRENT 指向的 build 資料夾)"""
+        build_dir = self._current_build()
+        if not self._is_fresh(build_dir):
+            build_dir = self.build()
+            self._cleanup(keep=os.path.basename(build_dir))
+        self.build_dir = build_dir
+        self.meta = self._load_meta(build_dir)
+        self.products = self.meta['products']
+        self.arrays = {
+            name: np.load(os.path.join(build_dir, f"{name}.npy"), mmap_mode='r')
+            for name in INDEX_COLUMNS
+        }
+        return self
+
+    def is_stale(self):
+        """來源檔是否已在索引建立後變動"""
+        if self.meta is None:
+            return True
+        sig = self._source_signature()
+        return self.meta['source_mtime'] != sig['mtime'] or self.meta['source_size'] != sig['size']
+
+    # -----------------------------------------------------------------
+    # 查詢
+    # -----------------------------------------------------------------
+    def query(self, prod_id, seq_start, seq_end):
+        """
+        取出單一商品 seqno 位於 (seq_start, seq_end] 的 ticks
+
+        Returns:
+            dict of np.ndarray: {'seqno', 'time', 'bid', 'ask', 'date'}，依 seqno 升序
+        """
+        span = self.products.get(prod_id)
+        if span is None:
+            return {name: self.arrays[name][0:0] for name in INDEX_COLUMNS}
+        start, end = span
+        seqnos = self.arrays['seqno'][start:end]
+        lo = start + int(np.searchsorted(seqnos, seq_start, side='right'))
+        hi = start + int(np.searchsorted(seqnos, seq_end, side='right'))
+        return {name: self.arrays[name][lo:hi] for name in INDEX_COLUMNS}
+
+
+# =====================================================================
+# 行程內共用的索引註冊表 (Flask 多執行緒共用同一份 mmap)
+# =====================================================================
+_INDEXES = {}
+_INDEX_LOCK = threading.Lock()
+
+
+def get_tick_index(tick_file, index_root=None):
+    """取得 (必要時建立) 指定 Tick 檔的索引"""
+    key = os.path.abspath(tick_file)
+    with _INDEX_LOCK:
+        idx = _INDEXES.get(key)
+        if idx is None or idx.is_stale():
+            idx = TickIndex(key, index_root).open()
+            _INDEXES[key] = idx
+        return idx
+
+
+if __name__ == '__main__':
+    # 預先為指定資料夾下所有 Tick 檔建立索引
+    # 用法: python Viewer/tick_index.py 資料來源/J002-11300041_20251231/temp
+    import sys
+    import glob
+
+    target_dirs = sys.argv[1:] or ['.']
+    for d in target_dirs:
+        for path in sorted(glob.glob(os.path.join(d, '*.csv'))):
+            get_tick_index(path)
@@ -1,7 +1,8 @@
-import pandas as pd
+import numpy as np
 import os
 import glob
 import re
+from tick_index import get_tick_index
 
 # 月份代碼對照表
 CALL_MONTH_CODES = {1:'A', 2:'B', 3:'C', 4:'D', 5:'E', 6:'F',
@@ -77,6 +78,26 @@ class TickLoader:
             month_code = PUT_MONTH_CODES[month]
         return f"TXO{strike}{month_code}{year_digit}"
 
+    def resolve_tick_file(self, date, term, strike, cp):
+        """
+        找出指定序列的 Tick 檔與商品代號
+
+        Returns:
+            (tick_file, prod_id)：找不到 Tick 檔時 tick_file 為 None
+        """
+        tick_dir = self._find_tick_dir(date)
+        # 確保找到正確的 csv 目錄 (有的在 temp)
+        if not glob.glob(os.path.join(tick_dir, "*.csv")):
+            tick_dir = os.path.join(tick_dir, "temp")
+
+        month, year_digit = self._determine_month_and_year(date, term)
+        prod_id = self._build_prod_id(strike, cp, month, year_digit)
+
+        # 找檔名符合的 CSV
+        code = CALL_MONTH_CODES[month] if cp.capitalize() == "Call" else PUT_MONTH_CODES[month]
+        files = glob.glob(os.path.join(tick_dir, f"*TXO{code}{year_digit}.csv"))
+        return (files[0] if files else None), prod_id
+
     def query(self, date, term, strike, cp, sys_id, prev_sys_id=None,
               curr_start=None, curr_end=None, prev_start=None, prev_end=None):
         """查詢 Tick 資料。
@@ -84,24 +105,9 @@ class TickLoader:
         否則使用預設邏輯 (prev_sys_id < seqno <= sys_id)。
         """
         try:
-            tick_dir = self._find_tick_dir(date)
-            # 確保找到正確的 csv 目錄 (有的在 temp)
-            if not glob.glob(os.path.join(tick_dir, "*.csv")):
-                tick_dir = os.path.join(tick_dir, "temp")
-
-            month, year_digit = self._determine_month_and_year(date, term)
-            prod_id = self._build_prod_id(strike, cp, month, year_digit)
-            
-            # 找檔名符合的 CSV
-            tick_file = None
-            code = CALL_MONTH_CODES[month] if cp.capitalize() == "Call" else PUT_MONTH_CODES[month]
-            pattern = os.path.join(tick_dir, f"*TXO{code}{year_digit}.csv")
-            files = glob.glob(pattern)
-            if files:
-                tick_file = files[0]
-            
+            tick_file, prod_id = self.resolve_tick_file(date, term, strike, cp)
             if not tick_file:
-                return {"error": f"找不到 Tick 檔 (TXO*{year_digit}.csv)", "prod_id": prod_id}
+                return {"error": f"找不到 Tick 檔 ({prod_id})", "prod_id": prod_id}
 
             current_ticks = []
             prev_ticks = []
@@ -128,41 +134,15 @@ class TickLoader:
             final_prev_start = prev_start if prev_start is not None else ((prev_sys_id - 500) if prev_sys_id else None)
             final_prev_end = prev_end if prev_end is not None else prev_sys_id
             
-            # 讀取 CSV (TSV)
-            chunk_iter = pd.read_csv(tick_file, sep="\t", chunksize=100000, encoding="utf-8", engine="c")
+            # 以記憶體映射索引查詢 (每個 Tick 檔只建一次索引)
+            index = get_tick_index(tick_file)
             
-            for chunk in chunk_iter:
-                chunk.columns = [c.strip() for c in chunk.columns]
-                
-                # 簡易欄位識別
-                id_col = next((c for c in chunk.columns if 'prod_id' in c), None)
-                seq_col = next((c for c in chunk.columns if 'seqno' in c), None)
-                time_col = next((c for c in chunk.columns if 'time' in c), None)
-                bid_col = next((c for c in chunk.columns if 'buy_price' in c or 'best_bid' in c), None)
-                ask_col = next((c for c in chunk.columns if 'sell_price' in c or 'best_ask' in c), None)
-                
-                if not (id_col and seq_col): continue
-
-                # 篩選 prod_id
-                chunk[id_col] = chunk[id_col].astype(str).str.strip()
-                matched = chunk[chunk[id_col] == prod_id].copy()
-                if matched.empty: continue
-                
-                # 篩選 seqno
-                matched[seq_col] = pd.to_numeric(matched[seq_col], errors='coerce')
-                
-                # Current Interval: (final_curr_start, final_curr_end]
-                curr_mask = (matched[seq_col] > final_curr_start) & (matched[seq_col] <= final_curr_end)
-                if curr_mask.any():
-                    for _, row in matched[curr_mask].iterrows():
-                        current_ticks.append(self._format_row(row, time_col, bid_col, ask_col, seq_col))
-                
-                # Prev Interval: (final_prev_start, final_prev_end]
-                if final_prev_start is not None and final_prev_end is not None:
-                    prev_mask = (matched[seq_col] > final_prev_start) & (matched[seq_col] <= final_prev_end)
-                    if prev_mask.any():
-                        for _, row in matched[prev_mask].iterrows():
-                            prev_ticks.append(self._format_row(row, time_col, bid_col, ask_col, seq_col))
+            # Current Interval: (final_curr_start, final_curr_end]
+            current_ticks = self._format_ticks(index.query(prod_id, final_curr_start, final_curr_end))
+            
+            # Prev Interval: (final_prev_start, final_prev_end]
+            if final_prev_start is not None and final_prev_end is not None:
+                prev_ticks = self._format_ticks(index.query(prod_id, final_prev_start, final_prev_end))
             
             return {
                 "prod_id": prod_id,
@@ -183,26 +163,28 @@ class TickLoader:
             traceback.print_exc()
             return {"error": str(e), "prod_id": "Error"}
 
-    def _format_row(self, row, time_col, bid_col, ask_col, seq_col):
-        t = str(row[time_col]).strip()
-        disp = t
-        # 時間格式可能是: HMMSSMMM000 (11碼) 或 HHMMSSMMM000 (12碼)
-        # 例: 84500107000 → 8:45:00.107, 134500107000 → 13:45:00.107
-        if len(t) >= 11:
-            if len(t) == 11:
-                disp = f"{t[0:1]}:{t[1:3]}:{t[3:5]}.{t[5:8]}"
-            else:
-                disp = f"{t[0:2]}:{t[2:4]}:{t[4:6]}.{t[6:9]}"
-        
-        bid = float(row[bid_col]) if bid_col and pd.notnull(row[bid_col]) else 0
-        ask = float(row[ask_col]) if ask_col and pd.notnull(row[ask_col]) else 0
-        return {
-            "time": t,
-            "time_display": disp,
-            "bid": bid,
-            "ask": ask,
-            "seqno": int(row[seq_col])
-        }
+    def _format_ticks(self, cols):
+        """將索引查詢結果 (欄位陣列) 轉為前端使用的 tick dict 列表"""
+        ticks = []
+        for t_val, bid, ask, seqno in zip(cols['time'].tolist(), cols['bid'].tolist(),
+                                          cols['ask'].tolist(), cols['seqno'].tolist()):
+            t = str(t_val)
+            disp = t
+            # 時間格式可能是: HMMSSMMM000 (11碼) 或 HHMMSSMMM000 (12碼)
+            # 例: 84500107000 → 8:45:00.107, 134500107000 → 13:45:00.107
+            if len(t) >= 11:
+                if len(t) == 11:
+                    disp = f"{t[0:1]}:{t[1:3]}:{t[3:5]}.{t[5:8]}"
+                else:
+                    disp = f"{t[0:2]}:{t[2:4]}:{t[4:6]}.{t[6:9]}"
+            ticks.append({
+                "time": t,
+                "time_display": disp,
+                "bid": 0.0 if bid != bid else bid,   # NaN -> 0
+                "ask": 0.0 if ask != ask else ask,
+                "seqno": int(seqno)
+            })
+        return ticks
 
     # ===================================================================
     # 連續河流查詢（探勘面板用）
@@ -232,21 +214,7 @@ class TickLoader:
             }
         """
         try:
-            tick_dir = self._find_tick_dir(date)
-            if not glob.glob(os.path.join(tick_dir, "*.csv")):
-                tick_dir = os.path.join(tick_dir, "temp")
-
-            month, year_digit = self._determine_month_and_year(date, term)
-            prod_id = self._build_prod_id(strike, cp, month, year_digit)
-
-            # 找 Tick 檔
-            tick_file = None
-            code = CALL_MONTH_CODES[month] if cp.capitalize() == "Call" else PUT_MONTH_CODES[month]
-            pattern = os.path.join(tick_dir, f"*TXO{code}{year_digit}.csv")
-            files = glob.glob(pattern)
-            if files:
-                tick_file = files[0]
-
+            tick_file, prod_id = self.resolve_tick_file(date, term, strike, cp)
             if not tick_file:
                 return {"error": f"找不到 Tick 檔", "prod_id": prod_id,
                         "ticks": [], "snapshots": [], "range": [0, 0]}
@@ -309,42 +277,19 @@ class TickLoader:
             # 區間陣列：[start_idx : end_idx+1]，每個 snap 是該 15s 區間的右邊界
             interval_snaps = sorted_snaps[start_idx:end_idx + 1]
 
-            # 一次性讀入、公用檔案內所有 matched
-            all_matched = []
-            for chunk in pd.read_csv(tick_file, sep="\t", chunksize=100000,
-                                     encoding="utf-8", engine="c"):
-                chunk.columns = [c.strip() for c in chunk.columns]
-                id_col  = next((c for c in chunk.columns if 'prod_id' in c), None)
-                seq_col = next((c for c in chunk.columns if 'seqno' in c), None)
-                time_col= next((c for c in chunk.columns if 'time' in c and 'yymmdd' not in c), None)
-                bid_col = next((c for c in chunk.columns if 'buy_price' in c or 'best_bid' in c), None)
-                ask_col = next((c for c in chunk.columns if 'sell_price' in c or 'best_ask' in c), None)
-
-                if not (id_col and seq_col): continue
-
-                chunk[id_col] = chunk[id_col].astype(str).str.strip()
-                matched = chunk[chunk[id_col] == prod_id].copy()
-                if matched.empty: continue
-
-                matched[seq_col] = pd.to_numeric(matched[seq_col], errors='coerce')
-                # 只保留範圍內的資料
-                in_range = matched[
-                    (matched[seq_col] > range_start_sysid) &
-                    (matched[seq_col] <= range_end_sysid)
-                ].copy()
-
-                for _, row in in_range.iterrows():
-                    bid = float(row[bid_col]) if bid_col and pd.notnull(row[bid_col]) else 0.0
-                    ask = float(row[ask_col]) if ask_col and pd.notnull(row[ask_col]) else 0.0
-                    seqno = int(row[seq_col])
-                    t = str(row[time_col]).strip()
-
-                    # 結構化資料
-                    base = self._format_row(row, time_col, bid_col, ask_col, seq_col)
-                    base["interval_idx"] = self._find_interval(seqno, interval_snaps, range_start_sysid)
-                    all_matched.append(base)
-
-            all_matched.sort(key=lambda x: x["seqno"])
+            # 以記憶體映射索引取出視窗內的所有 ticks (已依 seqno 排序)
+            cols = get_tick_index(tick_file).query(prod_id, range_start_sysid, range_end_sysid)
+            all_matched = self._format_ticks(cols)
+
+            # 每筆 tick 所屬區間：區間 i 為 (snap[i-1].sysid, snap[i].sysid]
+            # 超出最後一個 snap 的歸入最後一個區間
+            interval_sysids = np.array([s for _, s in interval_snaps], dtype=np.int64)
+            interval_idx = np.minimum(
+                np.searchsorted(interval_sysids, cols['seqno'], side='left'),
+                len(interval_snaps) - 1
+            )
+            for tick, iidx in zip(all_matched, interval_idx.tolist()):
+                tick["interval_idx"] = iidx
 
             # 對每個區間標記 LAST / MIN
             # 先按 interval_idx 分組
@@ -386,19 +331,6 @@ class TickLoader:
             traceback.print_exc()
             return {"error": str(e), "ticks": [], "snapshots": [], "range": [0, 0]}
 
-    def _find_interval(self, seqno, interval_snaps, range_start_sysid):
-        """回傳 seqno 屬於哪個區間索引
-        區間 0: (range_start_sysid, interval_snaps[0].sysid]
-        區間 1: (interval_snaps[0].sysid, interval_snaps[1].sysid]
-        以此類推
-        """
-        prev = range_start_sysid
-        for i, (t, s) in enumerate(interval_snaps):
-            if prev < seqno <= s:
-                return i
-            prev = s
-        return len(interval_snaps) - 1
-
     def _check_valid(self, bid, ask):
         """判斷一筆 Tick 是否為有效報價 (Valid Quote)
         對齊計算引擎 step0_valid_quotes.py 的 check_valid_quote 邏輯：
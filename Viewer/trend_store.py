@@ -0,0 +1,273 @@
+"""
+跨日 VIX 走勢 (Multi-Day VIX Trend Store)
+
+/api/vix_trend 每次請求讀一份 sigma_{date}.tsv，儀表板一次只能看一天；
+一季 15 秒資料約 7 萬點，直接丟給 ECharts 會拖慢互動。
+
+本模組：
+    1. 每日一份時間索引陣列 (epoch 秒) + PROD / 我們的 vix、ori_vix，
+       並預先標記 Alert 時間點與 2.5% 過濾事件，存於共用 LRU 快取
+       (依 sigma_{date}.tsv、my_sigma_{date}.tsv 的 mtime 失效)
+    2. 任意日期區間以 searchsorted 串接各日陣列
+    3. 依前端圖寬在伺服器端降採樣 (LTTB 或 min/max 分桶)，
+       並保證 Alert 點、2.5% 過濾事件與每日首尾點一定保留
+
+2.5% 過濾事件的判定與 step1_vix_calc.py 相同：09:00:00 之後，
+ori_vix 與前一筆揭示 vix 相差超過 2.5% (含第 4 次強制揭示)。
+"""
+import os
+import re
+import glob
+import numpy as np
+import pandas as pd
+
+from cache import viewer_cache
+
+SERIES = ["prod_vix", "prod_ori_vix", "my_vix", "my_ori_vix"]
+FILTER_THRESHOLD = 0.025
+OPEN_TIME = 90000  # 09:00:00 起開始揭示
+TZ_OFFSET = 8 * 3600  # 資料時間為台北時間
+
+
+def _epoch_seconds(date, times):
+    """YYYYMMDD + HHMMSS (int) -> epoch 秒 (台北時間 UTC+8)"""
+    day = int((pd.Timestamp(str(date)) - pd.Timestamp("1970-01-01")).total_seconds()) - TZ_OFFSET
+    t = np.asarray(times, dtype=np.int64)
+    return day + (t // 10000) * 3600 + (t // 100 % 100) * 60 + t % 100
+
+
+def _valid(values):
+    """-1 (無效) 與 NaN 轉為 NaN"""
+    v = pd.to_numeric(pd.Series(values), errors="coerce").to_numpy(dtype=float, copy=True)
+    v[v <= 0] = np.nan
+    return v
+
+
+def filter_events(times, vix, ori_vix):
+    """
+    2.5% 過濾事件：09:00:00 之後 (不含當天首筆揭示)，ori_vix 與前一筆揭示 vix 相差超過 2.5%
+
+    Returns:
+        np.ndarray(bool)
+    """
+    times = np.asarray(times, dtype=np.int64)
+    prev_pub = np.concatenate([[np.nan], vix[:-1]])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        change = np.abs(ori_vix - prev_pub) / prev_pub
+    after_open = times >= OPEN_TIME
+    # 當天第一筆揭示 (09:00:00 或之後第一筆) 無條件揭示，不算過濾
+    first_open = np.argmax(after_open) if after_open.any() else len(times)
+    mask = after_open & (change > FILTER_THRESHOLD)
+    mask[:first_open + 1] = False
+    return mask
+
+
+# =====================================================================
+# 降採樣
+# =====================================================================
+def lttb_indices(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets：保留形狀的降採樣，回傳選中的索引 (升序)
+
+    y 中的 NaN 點不會被選為桶代表 (整桶皆為 NaN 時取桶內第一點)
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    y_filled = np.where(np.isnan(y), np.nanmean(y) if np.isfinite(y).any() else 0.0, y)
+
+    # 首尾兩點固定，中間 n - 2 點平均分成 n_out - 2 個桶
+    every = (n - 2) / (n_out - 2)
+    bounds = (np.arange(n_out - 1) * every).astype(np.int64) + 1
+    bounds[-1] = n - 1
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    prev = 0
+    for i in range(n_out - 2):
+        lo, hi = bounds[i], max(bounds[i + 1], bounds[i] + 1)
+        # 下一個桶的平均點 (最後一桶以終點代替)
+        nlo = hi
+        nhi = bounds[i + 2] if i + 2 < len(bounds) else n
+        if nhi <= nlo:
+            nlo, nhi = n - 1, n
+        avg_x = x[nlo:nhi].mean()
+        avg_y = y_filled[nlo:nhi].mean()
+        area = np.abs((x[prev] - avg_x) * (y_filled[lo:hi] - y_filled[prev])
+                      - (x[prev] - x[lo:hi]) * (avg_y - y_filled[prev]))
+        area[np.isnan(y[lo:hi])] = -1
+        prev = lo + int(np.argmax(area))
+        selected[i + 1] = prev
+    return np.unique(selected)
+
+
+def minmax_indices(y, n_out):
+    """min/max 分桶：每桶保留最小值與最大值的點 (約 n_out 點)，回傳索引 (升序)"""
+    n = len(y)
+    n_buckets = max(n_out // 2, 1)
+    if n <= n_out:
+        return np.arange(n)
+    bucket = np.arange(n) * n_buckets // n
+    valid = ~np.isnan(y)
+    idx = np.flatnonzero(valid)
+    if len(idx) == 0:
+        return np.array([0, n - 1])
+    order = idx[np.lexsort((y[idx], bucket[idx]))]
+    b = bucket[order]
+    first = np.flatnonzero(np.r_[True, b[1:] != b[:-1]])
+    last = np.r_[first[1:] - 1, len(order) - 1]
+    return np.unique(np.concatenate([order[first], order[last], [0, n - 1]]))
+
+
+# =====================================================================
+# 資料存取
+# =====================================================================
+class TrendStore:
+    """跨日 VIX 走勢查詢 (PROD sigma 與我們的 my_sigma)"""
+
+    def __init__(self, source_dir, output_dir, cache=None):
+        self.source_dir = source_dir
+        self.output_dir = output_dir
+        self.alert_dir = os.path.join(source_dir, "Alert")
+        self.cache = cache if cache is not None else viewer_cache
+
+    def _prod_path(self, date):
+        return os.path.join(self.source_dir, date, f"sigma_{date}.tsv")
+
+    def _my_path(self, date):
+        return os.path.join(self.output_dir, f"my_sigma_{date}.tsv")
+
+    def available_dates(self):
+        """有 PROD sigma 檔的日期 (升序)"""
+        dates = []
+        for path in glob.glob(os.path.join(self.source_dir, "*", "sigma_*.tsv")):
+            match = re.search(r"sigma_(\d{8})\.tsv$", os.path.basename(path))
+            if match:
+                dates.append(match.group(1))
+        return sorted(set(dates))
+
+    def alert_times(self, date):
+        """該日 Alert 報表的時間點 (HHMMSS int，只看檔名不解析內容)"""
+        times = []
+        for path in glob.glob(os.path.join(self.alert_dir, f"{date}_alert_report.*.tsv")):
+            match = re.search(r"_alert_report\.(\d{6})\.tsv$", path)
+            if match:
+                times.append(int(match.group(1)))
+        return sorted(times)
+
+    @staticmethod
+    def _read_sigma(path):
+        df = pd.read_csv(path, sep="\t", dtype={"time": str}, usecols=lambda c: c in ("time", "vix", "ori_vix"))
+        times = pd.to_numeric(df["time"].astype(str).str[:6], errors="coerce").fillna(-1).astype(np.int64)
+        return times.to_numpy(), df["vix"].to_numpy(dtype=float), df["ori_vix"].to_numpy(dtype=float)
+
+    def _build_day(self, date):
+        times, prod_vix, prod_ori = self._read_sigma(self._prod_path(date))
+        keep = times >= 0
+        times, prod_vix, prod_ori = times[keep], prod_vix[keep], prod_ori[keep]
+        order = np.argsort(times, kind="stable")
+        times, prod_vix, prod_ori = times[order], prod_vix[order], prod_ori[order]
+
+        day = {
+            "date": date,
+            "time": times,
+            "ts": _epoch_seconds(date, times),
+            "prod_vix": _valid(prod_vix),
+            "prod_ori_vix": _valid(prod_ori),
+            "my_vix": np.full(len(times), np.nan),
+            "my_ori_vix": np.full(len(times), np.nan),
+        }
+        my_path = self._my_path(date)
+        if os.path.exists(my_path):
+            my_times, my_vix, my_ori = self._read_sigma(my_path)
+            pos = np.searchsorted(times, my_times)
+            ok = (pos < len(times)) & (times[np.minimum(pos, len(times) - 1)] == my_times)
+            day["my_vix"][pos[ok]] = _valid(my_vix)[ok]
+            day["my_ori_vix"][pos[ok]] = _valid(my_ori)[ok]
+
+        day["is_filter"] = filter_events(times, day["prod_vix"], day["prod_ori_vix"])
+        alert = np.zeros(len(times), dtype=bool)
+        alert_times = np.asarray(self.alert_times(date), dtype=np.int64)
+        if len(alert_times):
+            pos = np.searchsorted(times, alert_times)
+            ok = (pos < len(times)) & (times[np.minimum(pos, len(times) - 1)] == alert_times)
+            alert[pos[ok]] = True
+        day["is_alert"] = alert
+        return day
+
+    def load_day(self, date):
+        """單日陣列 (快取；PROD / 我們的 sigma 檔變動時重建)，無 PROD sigma 時回傳 None"""
+        if not os.path.exists(self._prod_path(date)):
+            return None
+        return self.cache.get_or_load(
+            ("trend_day", date), lambda: self._build_day(date),
+            sources=[self._prod_path(date), self._my_path(date), self.alert_dir]
+        )
+
+    def query(self, start=None, end=None, width=1200, mode="lttb", key="prod_ori_vix", from_open=True):
+        """
+        查詢日期區間的走勢並降採樣
+
+        Args:
+            start, end: YYYYMMDD (含)，省略表示不限
+            width: 目標點數 (約等於圖表像素寬)
+            mode: 'lttb' | 'minmax' | 'raw'
+            key: 降採樣依據的序列 (預設 PROD ori_vix，波動最大)
+            from_open: 只取 09:00:00 以後 (與 /api/vix_trend 一致)
+
+        Returns:
+            dict: columns/data 欄式結構 + n_raw / n / dates
+        """
+        dates = [d for d in self.available_dates()
+                 if (not start or d >= start) and (not end or d <= end)]
+        parts = []
+        for date in dates:
+            day = self.load_day(date)
+            if day is None or len(day["time"]) == 0:
+                continue
+            lo = int(np.searchsorted(day["time"], OPEN_TIME)) if from_open else 0
+            if lo < len(day["time"]):
+                parts.append((day, lo))
+
+        columns = ["ts", "date", "time"] + SERIES + ["is_alert", "is_filter"]
+        if not parts:
+            return {"columns": columns, "data": [[] for _ in columns], "n_raw": 0, "n": 0, "dates": []}
+
+        merged = {c: np.concatenate([day[c][lo:] for day, lo in parts])
+                  for c in ["ts", "time"] + SERIES + ["is_alert", "is_filter"]}
+        merged["date"] = np.concatenate([np.full(len(day["time"]) - lo, int(day["date"])) for day, lo in parts])
+        n_raw = len(merged["ts"])
+
+        # 降採樣，並強制保留 Alert、過濾事件與每日首尾點
+        y = merged.get(key, merged["prod_ori_vix"])
+        if mode == "minmax":
+            idx = minmax_indices(y, width)
+        elif mode == "raw":
+            idx = np.arange(n_raw)
+        else:
+            idx = lttb_indices(merged["ts"], y, width)
+        day_bounds = np.cumsum([0] + [len(day["time"]) - lo for day, lo in parts])
+        forced = np.concatenate([
+            np.flatnonzero(merged["is_alert"] | merged["is_filter"]),
+            day_bounds[:-1], day_bounds[1:] - 1,
+        ])
+        idx = np.union1d(idx, forced).astype(np.int64)
+
+        # 時間軸以毫秒輸出 (ECharts time 軸)
+        out = {c: merged[c][idx] for c in merged}
+        out["ts"] = out["ts"] * 1000
+        return {
+            "columns": columns,
+            "data": [_json_column(out[c]) for c in columns],
+            "n_raw": int(n_raw),
+            "n": int(len(idx)),
+            "dates": [day["date"] for day, _ in parts],
+        }
+
+
+def _json_column(values):
+    """numpy 欄 -> JSON 陣列 (NaN -> None)"""
+    if values.dtype.kind == "f":
+        return [None if v != v else round(v, 6) for v in values.tolist()]
+    return values.tolist()
@@ -0,0 +1,179 @@
+"""
+Viewer 背景預熱與檔案監看 (Background Warm-up / File Watch)
+
+批次執行重新產生 output/驗證*_PROD.csv、validation_diff_*.csv、my_sigma_*.tsv 後，
+快取雖會在下次存取時依 mtime 失效，但第一次點選新的一天仍要等數秒的冷載入，
+舊資料也會一直佔著快取空間直到被存取。
+
+本模組啟動一個背景執行緒：
+    1. 啟動時預先載入並建立索引：最近 N 天的差異報告 (含導覽索引)、摘要、ours / PROD 表、
+       (time, strike) 索引、完整資料表、Contrib 時間索引與 Sigma 比對
+    2. 每隔數秒以 mtime / size 輪詢 output/ 與 資料來源/ 的相關檔案
+    3. 有檔案變動時只移除依賴這些檔案的快取項目 (LRUCache.invalidate_sources)，
+       並重新預熱受影響且屬於最近 N 天的日期
+
+環境變數：
+    VIX_VIEWER_WARM_DATES     預熱的最近天數 (預設 3，0 表示停用)
+    VIX_VIEWER_WARM_INTERVAL  輪詢間隔秒數 (預設 10)
+"""
+import os
+import re
+import glob
+import time
+import threading
+
+DEFAULT_WARM_DATES = 3
+DEFAULT_WARM_INTERVAL = 10
+TERMS = ["Near", "Next"]
+
+# 監看的檔案樣式 (相對於 output/ 或 資料來源/)，各樣式的第一個群組為日期
+OUTPUT_PATTERNS = [
+    ("validation_diff_*.csv", r"validation_diff_(\d{8})\.csv$"),
+    ("驗證*_*PROD.csv", r"驗證(\d{8})_\w+PROD\.csv$"),
+    ("my_sigma_*.tsv", r"my_sigma_(\d{8})\.tsv$"),
+    (os.path.join("validation_store", "*.json"), r"(\d{8})\.json$"),
+]
+SOURCE_PATTERNS = [
+    (os.path.join("*", "*PROD_*.tsv"), r"\w+PROD_(\d{8})\.tsv$"),
+    (os.path.join("*", "sigma_*.tsv"), r"sigma_(\d{8})\.tsv$"),
+    (os.path.join("*", "*_Contrib_*.tsv"), r"\w+_Contrib_(\d{8})\.tsv$"),
+]
+
+
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+class CacheWarmer:
+    """背景預熱最近 N 天的 Viewer 資料，並在檔案變動時精準失效"""
+
+    def __init__(self, diff_loader, prod_loader, sigma_diff_loader, n_dates=None, interval=None):
+        self.diff_loader = diff_loader
+        self.prod_loader = prod_loader
+        self.sigma_diff_loader = sigma_diff_loader
+        self.cache = prod_loader.cache
+        self.n_dates = _env_int("VIX_VIEWER_WARM_DATES", DEFAULT_WARM_DATES) if n_dates is None else n_dates
+        self.interval = _env_int("VIX_VIEWER_WARM_INTERVAL", DEFAULT_WARM_INTERVAL) if interval is None else interval
+        self._snapshot = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self.warmed = []        # 最近一次預熱的日期
+        self.last_changes = []  # 最近一次偵測到的變動檔案
+
+    # -----------------------------------------------------------------
+    # 檔案掃描
+    # -----------------------------------------------------------------
+    def scan(self):
+        """回傳 {path: (mtime, size, date)}"""
+        files = {}
+        for base, patterns in ((self.prod_loader.output_dir, OUTPUT_PATTERNS),
+                               (self.prod_loader.source_dir, SOURCE_PATTERNS)):
+            for pattern, regex in patterns:
+                for path in glob.glob(os.path.join(base, pattern)):
+                    match = re.search(regex, os.path.basename(path))
+                    if not match:
+                        continue
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    files[os.path.abspath(path)] = (stat.st_mtime, stat.st_size, match.group(1))
+        return files
+
+    def recent_dates(self, files=None):
+        """output/ 中有結果的最近 N 天 (新到舊)"""
+        files = self.scan() if files is None else files
+        output_dir = os.path.abspath(self.prod_loader.output_dir)
+        dates = {date for path, (_, _, date) in files.items() if path.startswith(output_dir)}
+        return sorted(dates, reverse=True)[:self.n_dates]
+
+    # -----------------------------------------------------------------
+    # 預熱
+    # -----------------------------------------------------------------
+    def warm_date(self, date):
+        """載入並建立單一日期的所有常用快取項目"""
+        t0 = time.perf_counter()
+        try:
+            diff_df = self.diff_loader._load_df(date)
+            self.diff_loader._diff_index(date)
+            self.diff_loader.get_summary(date, prod_loader=self.prod_loader)
+        except FileNotFoundError:
+            diff_df = None
+
+        for term in TERMS:
+            if self.prod_loader._load_ours(date, term) is not None:
+                # 建立 (time, strike) 索引與完整資料表 (第一頁即觸發整表建立)
+                self.prod_loader.get_ours_row(date, term, 0, 0)
+                self.prod_loader.get_full_data(date, term, page=1, diff_df=diff_df)
+            if self.prod_loader._load_prod(date, term) is not None:
+                self.prod_loader.get_prod_row(date, term, 0, 0)
+                self.prod_loader.build_sysid_map(date, term)
+                self.prod_loader.get_prod_strikes(date, term)
+            self.prod_loader._contrib_index(date, term)
+
+        self.sigma_diff_loader.get_diff(date)
+        print(f"[warmup] {date} 預熱完成 ({time.perf_counter() - t0:.1f}s)")
+
+    def _warm(self, dates):
+        for date in dates:
+            if self._stop.is_set():
+                return
+            try:
+                self.warm_date(date)
+            except Exception as e:
+                print(f"[warmup] {date} 預熱失敗: {e}")
+
+    def poll_once(self):
+        """比對檔案快照：失效變動檔案的快取並重新預熱受影響的最近日期"""
+        files = self.scan()
+        changed = [p for p, sig in files.items() if self._snapshot.get(p) != sig]
+        removed = [p for p in self._snapshot if p not in files]
+        self._snapshot = files
+        if not (changed or removed):
+            return []
+
+        paths = changed + removed
+        n = self.cache.invalidate_sources(paths)
+        self.last_changes = paths
+        recent = self.recent_dates(files)
+        affected = {files[p][2] for p in changed} & set(recent)
+        print(f"[warmup] 偵測到 {len(paths)} 個檔案變動，移除 {n} 個快取項目")
+        self._warm(sorted(affected, reverse=True))
+        self.warmed = recent
+        return paths
+
+    # -----------------------------------------------------------------
+    # 背景執行緒
+    # -----------------------------------------------------------------
+    def _run(self):
+        self._snapshot = self.scan()
+        self.warmed = self.recent_dates(self._snapshot)
+        self._warm(self.warmed)
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll_once()
+            except Exception as e:
+                print(f"[warmup] 輪詢失敗: {e}")
+
+    def start(self):
+        """啟動背景預熱 (n_dates <= 0 時不啟動)"""
+        if self.n_dates <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return self
+        self._thread = threading.Thread(target=self._run, name="viewer-warmup", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def status(self):
+        return {
+            "enabled": self._thread is not None and self._thread.is_alive(),
+            "n_dates": self.n_dates,
+            "interval": self.interval,
+            "warmed": self.warmed,
+            "last_changes": [os.path.basename(p) for p in self.last_changes],
+        }
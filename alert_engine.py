@@ -0,0 +1,683 @@
+"""
+VIX Alert 條件引擎 (Alert Condition Engine)
+
+資料來源/Alert/*_alert_report.HHMMSS.tsv 由外部系統產生，Viewer 只能被動解析；
+但 8 個觸發條件全部可由我們已有的 sigma / Forward / Contrib 資料推得：
+
+    condition1: ori_VIX 與前一筆相比變動 >= 2%
+    condition2: ori_VIX 變動 <= 0.8%，但 Forward 變動 >= 0.25%
+    condition3: 開盤 (09:00:00 後第一筆) 與前一交易日收盤相比，
+                ori_VIX 變動 >= 6%，或 ori_VIX 變動 <= 3% 但 Forward 變動 >= 0.75%
+    condition4: ori_VIX 連續 4 次 (含) 以上未變動
+    condition5: 近月使用前一筆 Sigma (nearType 含 B)
+    condition6: 次近月使用前一筆 Sigma (nextType 含 B) 且次近月權重 >= 50%
+    condition7: 2.5% 指數過濾連續觸發 4 次 (即 step1_vix_calc.py 的強制揭示)
+    condition8: 任一月份參與 Sigma 計算的序列數較前一筆減少 >= 15%
+
+本模組提供兩種計算方式：
+    1. evaluate_conditions(): 整天一次向量化計算所有條件 (numpy，無逐筆迴圈)
+    2. AlertStream: 逐筆推入快照的串流版本，每筆 O(1) 判斷條件、
+       觸發時 O(履約價數) 產生 Contribution 比對表；結果與 (1) 完全相同
+
+兩者皆可輸出與外部系統相同格式的 Alert Report (Header / Summary / Contribution 明細)，
+可直接由 Viewer 的 AlertLoader 解析。
+
+判定規則補充：
+    - 只評估 09:00:00 (含) 以後的快照；開盤第一筆只與前一交易日收盤比較 (condition3)，
+      其餘「與前一筆比較」的條件 (1, 2, 4, 8) 從第二筆開始
+    - Forward 變動取近月與次近月兩者中較大者
+    - Contrib 檔 (Near_Contrib / Next_Contrib) 不存在時仍可判斷條件，報表的明細區塊只有表頭
+
+用法:
+    python alert_engine.py --date 20251210                    # PROD sigma，輸出至 output/Alert
+    python alert_engine.py --date 20251210 --sigma ours       # 使用我們的 my_sigma
+    python alert_engine.py --date 20251210 --stream           # 以串流版本逐筆計算 (並與向量化結果比對)
+"""
+import os
+import sys
+import time
+import argparse
+
+if hasattr(sys.stdout, 'reconfigure'):
+    sys.stdout.reconfigure(encoding='utf-8')
+
+import numpy as np
+import pandas as pd
+
+# =====================================================================
+# 常數
+# =====================================================================
+OPEN_TIME = "090000"
+ORI_VIX_JUMP = 0.02           # condition1
+FLAT_ORI_VIX = 0.008          # condition2
+FLAT_FORWARD_MOVE = 0.0025    # condition2
+OPEN_ORI_VIX_JUMP = 0.06      # condition3
+OPEN_FLAT_ORI_VIX = 0.03      # condition3
+OPEN_FORWARD_MOVE = 0.0075    # condition3
+UNCHANGED_TIMES = 4           # condition4
+NEXT_WEIGHT_MIN = 0.5         # condition6
+FILTER_THRESHOLD = 0.025      # condition7 (與 step1_vix_calc.py 相同)
+FILTER_TIMES = 4              # condition7
+SERIES_DROP = 0.15            # condition8
+N_CONDITIONS = 8
+
+CONDITION_TEXT = [
+    "ori_VIX changes >= 2%",
+    "ori_VIX changes <= 0.8% while forward changes >= 0.25%",
+    "ori_VIX changes >= 6% or ori_VIX changes <= 3% while forward changes >= 0.75% "
+    "between open (09:00:00) today and close of the previous trading day",
+    "ori_VIX did not change for at least 4 times",
+    "using last near sigma",
+    "using last next sigma when next term weight >= 50%",
+    "Index level filtering has been triggered for 4 times in a row (2.5%)",
+    "The number of option series used for sigma calculation decreases for at least 15%",
+]
+
+TERMS = ["Near", "Next"]
+# 快照欄位 (Summary 區塊的來源)
+SNAPSHOT_COLUMNS = [
+    "time",
+    "nearT", "nearW", "nearForward", "nearK0", "nearSigma2", "nearSeries", "nearType",
+    "nextT", "nextW", "nextForward", "nextK0", "nextSigma2", "nextSeries", "nextType",
+    "ori_vix", "vix",
+]
+SUMMARY_HEADER = [
+    "date", "time",
+    "nearT", "nearW", "nearForward", "nearK0", "nearSigma^2", "No of nearSeries", "nearType",
+    "nextT", "nextW", "nextForward", "nextK0", "nextSigma^2", "No of nextSeries", "nextType",
+    "ori_vix", "vix", "ori_vix_change",
+]
+CONTRIB_HEADER = [
+    "month", "time", "moneyness", "strike", "mid", "spreadRatio", "contrib", "contribWeight",
+    "time", "moneyness", "strike", "mid", "spreadRatio", "contrib", "contribWeight",
+    "contribWeightDiff", "contribDiff(%)",
+]
+
+
+# =====================================================================
+# 資料載入
+# =====================================================================
+def _zfill_time(series):
+    return series.astype(str).str.split(".").str[0].str.zfill(6)
+
+
+def _sigma_path(date_str, source_dir, output_dir, sigma):
+    if sigma == "ours":
+        return os.path.join(output_dir, f"my_sigma_{date_str}.tsv")
+    return os.path.join(source_dir, date_str, f"sigma_{date_str}.tsv")
+
+
+def load_snapshots(date_str, source_dir="資料來源", output_dir="output", sigma="prod"):
+    """
+    合併 sigma 與 Near / Next Forward 為逐時間點的快照表 (SNAPSHOT_COLUMNS)
+
+    Args:
+        sigma: 'prod' 使用 資料來源/{date}/sigma_{date}.tsv；'ours' 使用 output/my_sigma_{date}.tsv
+    """
+    path = _sigma_path(date_str, source_dir, output_dir, sigma)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Missing sigma file: {path}")
+    df = pd.read_csv(path, sep="\t", dtype={"time": str, "nearType": str, "nextType": str})
+    df["time"] = _zfill_time(df["time"])
+    df = df.drop_duplicates("time").sort_values("time").reset_index(drop=True)
+
+    snap = pd.DataFrame({"time": df["time"]})
+    for prefix, term in (("near", "Near"), ("next", "Next")):
+        snap[f"{prefix}T"] = pd.to_numeric(df[f"{prefix}T"], errors="coerce")
+        snap[f"{prefix}W"] = pd.to_numeric(df[f"{prefix}W"], errors="coerce")
+        snap[f"{prefix}Sigma2"] = pd.to_numeric(df[f"{prefix}Sigma2"], errors="coerce")
+        snap[f"{prefix}Series"] = pd.to_numeric(df[f"{prefix}_contrib_rows"], errors="coerce").fillna(0).astype(np.int64)
+        snap[f"{prefix}Type"] = df[f"{prefix}Type"].fillna("").astype(str)
+
+        fwd_path = os.path.join(source_dir, date_str, f"{term}_Forward_{date_str}.tsv")
+        if os.path.exists(fwd_path):
+            fwd = pd.read_csv(fwd_path, sep="\t", dtype={"time": str})
+            fwd["time"] = _zfill_time(fwd["time"])
+            fwd = fwd.drop_duplicates("time").set_index("time")
+            snap[f"{prefix}Forward"] = pd.to_numeric(fwd["tw_fwd"], errors="coerce").reindex(snap["time"]).to_numpy()
+            snap[f"{prefix}K0"] = pd.to_numeric(fwd["k0"], errors="coerce").reindex(snap["time"]).to_numpy()
+        else:
+            snap[f"{prefix}Forward"] = np.nan
+            snap[f"{prefix}K0"] = np.nan
+
+    snap["ori_vix"] = pd.to_numeric(df["ori_vix"], errors="coerce")
+    snap["vix"] = pd.to_numeric(df["vix"], errors="coerce")
+    return snap[SNAPSHOT_COLUMNS]
+
+
+def load_previous_close(date_str, source_dir="資料來源"):
+    """
+    前一交易日收盤：最後一筆有效 ori_vix 與當時的近月 / 次近月 Forward
+
+    Returns:
+        dict {"ori_vix", "nearForward", "nextForward"}，找不到前一日資料時回傳 None
+    """
+    folders = sorted(f for f in os.listdir(source_dir) if f.isdigit() and len(f) == 8 and f < date_str) \
+        if os.path.isdir(source_dir) else []
+    for prev_date in reversed(folders):
+        sigma_path = os.path.join(source_dir, prev_date, f"sigma_{prev_date}.tsv")
+        if not os.path.exists(sigma_path):
+            continue
+        try:
+            snap = load_snapshots(prev_date, source_dir)
+        except Exception as e:
+            print(f"讀取前一交易日 {prev_date} 失敗: {e}")
+            return None
+        valid = snap[snap["ori_vix"] > 0]
+        if valid.empty:
+            return None
+        last = valid.iloc[-1]
+        return {"ori_vix": float(last["ori_vix"]),
+                "nearForward": float(last["nearForward"]),
+                "nextForward": float(last["nextForward"])}
+    return None
+
+
+def load_months(date_str, source_dir="資料來源"):
+    """近月 / 次近月到期月份 (YYYYMM)，取自 month_change_{date}.tsv"""
+    path = os.path.join(source_dir, date_str, f"month_change_{date_str}.tsv")
+    if not os.path.exists(path):
+        return {"Near": "", "Next": ""}
+    row = pd.read_csv(path, sep="\t", dtype=str).iloc[0]
+    return {"Near": str(row["near_month"]), "Next": str(row["next_month"])}
+
+
+# =====================================================================
+# Contribution 時間索引
+# =====================================================================
+def _side_spread(bid, ask):
+    bid = pd.to_numeric(bid, errors="coerce").to_numpy(dtype=float)
+    ask = pd.to_numeric(ask, errors="coerce").to_numpy(dtype=float)
+    return ask - bid
+
+
+class ContribIndex:
+    """
+    單一月份的 Contrib 檔：依 (time, strike) 排序，預先算好 spreadRatio 與每個時間點的列範圍
+
+    ATM 判定與 Viewer 相同：contrib 為空 / 'X' 的列只標記價平履約價，本身不參與計算
+    spreadRatio：價外序列為有報價那一邊的 (ask - bid) / mid；價平為買賣權價差平均 / mid
+    """
+
+    def __init__(self, df):
+        time_values = pd.to_numeric(df["time"], errors="coerce").fillna(-1).astype(np.int64).to_numpy()
+        contrib = pd.to_numeric(df["contrib"], errors="coerce").to_numpy(dtype=float)
+        marker = np.isnan(contrib)
+        strikes = pd.to_numeric(df["strike"], errors="coerce").to_numpy(dtype=float)
+
+        # 每個時間點的 ATM 履約價 = 第一筆標記列
+        atm = pd.Series(strikes[marker], index=time_values[marker])
+        atm = atm[~atm.index.duplicated()]
+
+        keep = ~marker
+        c_spread = _side_spread(df["c.bid"], df["c.ask"])[keep]
+        p_spread = _side_spread(df["p.bid"], df["p.ask"])[keep]
+        mid = pd.to_numeric(df["mid"], errors="coerce").to_numpy(dtype=float)[keep]
+        times, strikes, contrib = time_values[keep], strikes[keep], contrib[keep]
+        is_atm = strikes == atm.reindex(times).to_numpy()
+
+        spread = np.where(np.isnan(c_spread), p_spread, np.where(np.isnan(p_spread), c_spread, (c_spread + p_spread) / 2))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            spread_ratio = spread / mid
+
+        order = np.lexsort((strikes, times))
+        self.time = times[order]
+        self.strike = strikes[order]
+        self.mid = mid[order]
+        self.spread_ratio = spread_ratio[order]
+        self.contrib = contrib[order]
+        self.is_atm = is_atm[order]
+        self.times, self.starts = np.unique(self.time, return_index=True)
+        self.ends = np.append(self.starts[1:], len(self.time))
+
+    @classmethod
+    def load(cls, date_str, term, source_dir="資料來源"):
+        path = os.path.join(source_dir, date_str, f"{term}_Contrib_{date_str}.tsv")
+        if not os.path.exists(path):
+            return None
+        return cls(pd.read_csv(path, sep="\t", dtype=str))
+
+    def snapshot(self, time_str):
+        """單一時間點的序列 (strike 升序)，無資料時回傳 None"""
+        t = int(time_str)
+        pos = int(np.searchsorted(self.times, t))
+        if pos >= len(self.times) or self.times[pos] != t:
+            return None
+        lo, hi = int(self.starts[pos]), int(self.ends[pos])
+        return make_contrib_snapshot(time_str, self.strike[lo:hi], self.mid[lo:hi],
+                                     self.spread_ratio[lo:hi], self.contrib[lo:hi], self.is_atm[lo:hi])
+
+
+def make_contrib_snapshot(time_str, strike, mid, spread_ratio, contrib, is_atm):
+    """單一時間點、單一月份的序列；strike 須為升序。contribWeight = contrib / 該月份 contrib 總和"""
+    contrib = np.asarray(contrib, dtype=float)
+    total = np.nansum(contrib)
+    return {
+        "time": time_str,
+        "strike": np.asarray(strike, dtype=float),
+        "mid": np.asarray(mid, dtype=float),
+        "spread_ratio": np.asarray(spread_ratio, dtype=float),
+        "contrib": contrib,
+        "weight": contrib / total if total > 0 else np.full(len(contrib), np.nan),
+        "is_atm": np.asarray(is_atm, dtype=bool),
+    }
+
+
+def diff_contrib(prev, curr):
+    """
+    前一筆與當前筆的逐履約價比對 (兩者 strike 皆已排序，O(履約價數))
+
+    Returns:
+        list of (prev_pos | None, curr_pos | None)，依 strike 升序
+    """
+    prev_strike = prev["strike"] if prev is not None else np.empty(0)
+    curr_strike = curr["strike"] if curr is not None else np.empty(0)
+    strikes = np.union1d(prev_strike, curr_strike)
+    pairs = []
+    for side in (prev_strike, curr_strike):
+        pos = np.searchsorted(side, strikes)
+        hit = (pos < len(side)) & (side[np.minimum(pos, max(len(side) - 1, 0))] == strikes) if len(side) else \
+            np.zeros(len(strikes), dtype=bool)
+        pairs.append([int(p) if h else None for p, h in zip(pos, hit)])
+    return list(zip(*pairs))
+
+
+# =====================================================================
+# 向量化條件判斷
+# =====================================================================
+def _run_length(flags):
+    """flags 連續為 True 的長度 (到每個位置為止)"""
+    flags = np.asarray(flags, dtype=bool)
+    idx = np.arange(len(flags))
+    last_false = np.maximum.accumulate(np.where(~flags, idx, -1))
+    return idx - last_false
+
+
+def _rel_change(curr, prev):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.abs(curr - prev) / prev
+
+
+def evaluate_conditions(snap, prev_close=None):
+    """
+    整天快照一次計算 8 個條件
+
+    Args:
+        snap: load_snapshots() 的結果 (依 time 排序)
+        prev_close: load_previous_close() 的結果，None 時不判斷 condition3
+
+    Returns:
+        DataFrame: time、ori_vix_change、cond1 ~ cond8 (bool)，只含 09:00:00 以後的列
+    """
+    times = snap["time"].to_numpy()
+    ori = snap["ori_vix"].to_numpy(dtype=float)
+    vix = snap["vix"].to_numpy(dtype=float)
+    near_fwd = snap["nearForward"].to_numpy(dtype=float)
+    next_fwd = snap["nextForward"].to_numpy(dtype=float)
+    n = len(snap)
+
+    session = times >= OPEN_TIME
+    open_pos = int(np.argmax(session)) if session.any() else n
+    is_open = np.zeros(n, dtype=bool)
+    if open_pos < n:
+        is_open[open_pos] = True
+    # 與前一筆比較的條件從開盤第二筆開始
+    intraday = session & ~is_open
+
+    prev = lambda a: np.concatenate([[np.nan], a[:-1]])
+    ori_prev = prev(ori)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ori_change = (ori - ori_prev) / ori_prev
+    ori_move = np.abs(ori_change)
+    fwd_move = np.fmax(_rel_change(near_fwd, prev(near_fwd)), _rel_change(next_fwd, prev(next_fwd)))
+
+    cond = np.zeros((N_CONDITIONS, n), dtype=bool)
+    cond[0] = intraday & (ori_move >= ORI_VIX_JUMP)
+    cond[1] = intraday & (ori_move <= FLAT_ORI_VIX) & (fwd_move >= FLAT_FORWARD_MOVE)
+
+    if prev_close is not None and open_pos < n:
+        open_move = _rel_change(ori[open_pos], prev_close["ori_vix"])
+        open_fwd = np.fmax(_rel_change(near_fwd[open_pos], prev_close["nearForward"]),
+                           _rel_change(next_fwd[open_pos], prev_close["nextForward"]))
+        cond[2, open_pos] = (open_move >= OPEN_ORI_VIX_JUMP) or \
+            (open_move <= OPEN_FLAT_ORI_VIX and open_fwd >= OPEN_FORWARD_MOVE)
+
+    # 未變動次數只在盤中累計 (開盤第一筆不算)
+    unchanged = intraday & (np.round(ori, 10) == np.round(ori_prev, 10))
+    cond[3] = _run_length(unchanged) >= UNCHANGED_TIMES
+
+    near_type = snap["nearType"].astype(str)
+    next_type = snap["nextType"].astype(str)
+    cond[4] = session & near_type.str.contains("B", regex=False).to_numpy()
+    cond[5] = session & next_type.str.contains("B", regex=False).to_numpy() & \
+        (snap["nextW"].to_numpy(dtype=float) >= NEXT_WEIGHT_MIN)
+
+    # 2.5% 過濾：ori_vix 與前一筆揭示 vix 相差超過 2.5%，第 4 次強制揭示後重新計數
+    exceed = intraday & (ori > 0) & (_rel_change(ori, prev(vix)) > FILTER_THRESHOLD)
+    run = _run_length(exceed)
+    cond[6] = (run > 0) & (run % FILTER_TIMES == 0)
+
+    for prefix in ("near", "next"):
+        series = snap[f"{prefix}Series"].to_numpy(dtype=float)
+        series_prev = prev(series)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            drop = (series_prev - series) / series_prev
+        cond[7] |= intraday & (series_prev > 0) & (drop >= SERIES_DROP)
+
+    out = pd.DataFrame({"time": times, "ori_vix_change": ori_change})
+    for i in range(N_CONDITIONS):
+        out[f"cond{i + 1}"] = cond[i]
+    return out[session].reset_index(drop=True)
+
+
+def triggered(conds_row):
+    """條件列 -> 觸發的條件編號 list"""
+    return [i + 1 for i in range(N_CONDITIONS) if bool(conds_row[f"cond{i + 1}"])]
+
+
+# =====================================================================
+# 串流版本
+# =====================================================================
+class AlertStream:
+    """
+    逐筆推入快照的 Alert 判斷 (與 evaluate_conditions 結果相同)
+
+    每筆快照只與前一筆比較，狀態只有數個計數器；觸發時才以 diff_contrib 產生明細 (O(履約價數))
+
+    用法:
+        stream = AlertStream(date, months, prev_close)
+        for snapshot, contribs in feed:
+            alert = stream.push(snapshot, contribs)
+            if alert: write_report(output_dir, alert)
+    """
+
+    def __init__(self, date_str, months=None, prev_close=None):
+        self.date = date_str
+        self.months = months or {"Near": "", "Next": ""}
+        self.prev_close = prev_close
+        self.prev = None
+        self.prev_contribs = {}
+        self.seen_open = False
+        self.unchanged_run = 0
+        self.filter_run = 0
+
+    def _conditions(self, snap):
+        prev = self.prev
+        conds = [False] * N_CONDITIONS
+        ori = float(snap["ori_vix"])
+
+        ori_change = np.nan
+        if prev is not None:
+            with np.errstate(invalid="ignore", divide="ignore"):
+                ori_change = (ori - float(prev["ori_vix"])) / float(prev["ori_vix"])
+
+        if snap["time"] < OPEN_TIME:
+            return None, ori_change
+
+        is_open = not self.seen_open
+        self.seen_open = True
+        if is_open:
+            self.unchanged_run = 0
+            self.filter_run = 0
+            if self.prev_close is not None:
+                open_move = _rel_change(ori, self.prev_close["ori_vix"])
+                open_fwd = np.fmax(_rel_change(float(snap["nearForward"]), self.prev_close["nearForward"]),
+                                   _rel_change(float(snap["nextForward"]), self.prev_close["nextForward"]))
+                conds[2] = bool((open_move >= OPEN_ORI_VIX_JUMP) or
+                                (open_move <= OPEN_FLAT_ORI_VIX and open_fwd >= OPEN_FORWARD_MOVE))
+        else:
+            ori_move = abs(ori_change)
+            fwd_move = np.fmax(_rel_change(float(snap["nearForward"]), float(prev["nearForward"])),
+                               _rel_change(float(snap["nextForward"]), float(prev["nextForward"])))
+            conds[0] = bool(ori_move >= ORI_VIX_JUMP)
+            conds[1] = bool(ori_move <= FLAT_ORI_VIX and fwd_move >= FLAT_FORWARD_MOVE)
+
+            if round(ori, 10) == round(float(prev["ori_vix"]), 10):
+                self.unchanged_run += 1
+            else:
+                self.unchanged_run = 0
+
+            if ori > 0 and _rel_change(ori, float(prev["vix"])) > FILTER_THRESHOLD:
+                self.filter_run += 1
+            else:
+                self.filter_run = 0
+            conds[6] = self.filter_run > 0 and self.filter_run % FILTER_TIMES == 0
+
+            for prefix in ("near", "next"):
+                prev_series = float(prev[f"{prefix}Series"])
+                if prev_series > 0 and (prev_series - float(snap[f"{prefix}Series"])) / prev_series >= SERIES_DROP:
+                    conds[7] = True
+        conds[3] = self.unchanged_run >= UNCHANGED_TIMES
+        conds[4] = "B" in str(snap["nearType"])
+        conds[5] = "B" in str(snap["nextType"]) and float(snap["nextW"]) >= NEXT_WEIGHT_MIN
+        return conds, ori_change
+
+    def push(self, snap, contribs=None):
+        """
+        推入一筆快照
+
+        Args:
+            snap: dict / Series，欄位同 SNAPSHOT_COLUMNS
+            contribs: {"Near": make_contrib_snapshot(...), "Next": ...}，可省略
+
+        Returns:
+            觸發時回傳 Alert dict (可交給 format_report)，否則 None
+        """
+        contribs = contribs or {}
+        conds, ori_change = self._conditions(snap)
+        alert = None
+        if conds is not None and any(conds):
+            alert = build_alert(self.date, self.months, [i + 1 for i, c in enumerate(conds) if c],
+                                self.prev, snap, ori_change,
+                                {term: (self.prev_contribs.get(term), contribs.get(term)) for term in TERMS})
+        self.prev = dict(snap)
+        self.prev_contribs = contribs
+        return alert
+
+
+# =====================================================================
+# 報表
+# =====================================================================
+def build_alert(date_str, months, conditions, prev, curr, ori_change, contrib_pairs):
+    """組合單一 Alert 的內容 (format_report 的輸入)"""
+    return {
+        "date": date_str,
+        "time": curr["time"],
+        "conditions": conditions,
+        "prev": dict(prev) if prev is not None else None,
+        "curr": dict(curr),
+        "ori_vix_change": ori_change,
+        "months": months,
+        "contribs": contrib_pairs,
+    }
+
+
+def _fmt(value, spec):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return str(value)
+    if np.isnan(value):
+        return ""
+    return format(value, spec)
+
+
+def _fmt_int(value):
+    try:
+        return str(int(float(value)))
+    except (TypeError, ValueError):
+        return ""
+
+
+def _fmt_mid(value):
+    text = _fmt(value, ".10f")
+    return text.rstrip("0").rstrip(".") if "." in text else text
+
+
+def _fmt_pct(value):
+    text = _fmt(value * 100 if value is not None else np.nan, ".8f")
+    return f"{text}%" if text else ""
+
+
+def _summary_row(date_str, snap, ori_change=None):
+    row = [date_str, snap["time"]]
+    for prefix in ("near", "next"):
+        row += [
+            _fmt(snap[f"{prefix}T"], ".10f"), _fmt(snap[f"{prefix}W"], ".10f"),
+            _fmt(snap[f"{prefix}Forward"], ".10f"), _fmt_int(snap[f"{prefix}K0"]),
+            _fmt(snap[f"{prefix}Sigma2"], ".10f"), _fmt_int(snap[f"{prefix}Series"]),
+            str(snap[f"{prefix}Type"]),
+        ]
+    row += [_fmt(snap["ori_vix"], ".10f"), _fmt(snap["vix"], ".2f")]
+    if ori_change is not None:
+        row.append(_fmt(ori_change, ".10f"))
+    return row
+
+
+def _contrib_side(snap, pos):
+    return [
+        snap["time"],
+        "ATM" if snap["is_atm"][pos] else "   ",
+        _fmt_int(snap["strike"][pos]),
+        _fmt_mid(snap["mid"][pos]),
+        _fmt(snap["spread_ratio"][pos], ".10f"),
+        _fmt(snap["contrib"][pos], ".10f"),
+        _fmt_pct(snap["weight"][pos]),
+    ]
+
+
+def _contrib_rows(month, prev, curr):
+    rows = []
+    for p, c in diff_contrib(prev, curr):
+        if p is not None:
+            left = [month] + _contrib_side(prev, p)
+        else:
+            left = [month, "-", "   ", "-", "-", "-" * 10, "-" * 10, "-" * 10]
+        if c is None:
+            rows.append(left)
+            continue
+        right = _contrib_side(curr, c)
+        if p is not None:
+            weight_diff = curr["weight"][c] - prev["weight"][p]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                contrib_diff = (curr["contrib"][c] - prev["contrib"][p]) / prev["contrib"][p]
+            rows.append(left + right + [_fmt_pct(weight_diff), _fmt_pct(contrib_diff)])
+        else:
+            rows.append(left + right + [_fmt_pct(curr["weight"][c])])
+    return rows
+
+
+def format_report(alert, link=""):
+    """Alert dict -> 與外部系統相同格式的 Alert Report 文字"""
+    t = alert["time"]
+    lines = [
+        f'Detailed Report:\t=HYPERLINK("{link}")',
+        f"({t[0:2]}:{t[2:4]}:{t[4:6]})VIX alert is triggered by condition "
+        + " & ".join(str(c) for c in alert["conditions"]),
+    ]
+    lines += [f"condition{i + 1}: {text}" for i, text in enumerate(CONDITION_TEXT)]
+    lines.append("")
+    lines.append("\t".join(SUMMARY_HEADER))
+    if alert["prev"] is not None:
+        lines.append("\t".join(_summary_row(alert["date"], alert["prev"])))
+    lines.append("\t".join(_summary_row(alert["date"], alert["curr"], alert["ori_vix_change"])))
+    lines.append("\t".join(CONTRIB_HEADER))
+    for term in TERMS:
+        prev, curr = alert["contribs"].get(term, (None, None))
+        if prev is None and curr is None:
+            continue
+        lines += ["\t".join(row) for row in _contrib_rows(alert["months"].get(term, ""), prev, curr)]
+    lines.append("")
+    return "\n".join(lines) + "\n"
+
+
+def write_report(output_dir, alert):
+    """寫出 {date}_alert_report.{HHMMSS}.tsv，回傳檔案路徑"""
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, f"{alert['date']}_alert_report.{alert['time']}.tsv")
+    with open(path, "w", encoding="utf-8", newline="\n") as f:
+        f.write(format_report(alert, link=os.path.abspath(output_dir)))
+    return path
+
+
+# =====================================================================
+# 整天計算
+# =====================================================================
+def _snapshot_contribs(indexes, time_str):
+    return {term: index.snapshot(time_str) for term, index in indexes.items() if index is not None}
+
+
+def run_day(date_str, source_dir="資料來源", output_dir="output", sigma="prod"):
+    """
+    向量化計算整天的 Alert
+
+    Returns:
+        (conds DataFrame, alerts list)
+    """
+    snap = load_snapshots(date_str, source_dir, output_dir, sigma)
+    prev_close = load_previous_close(date_str, source_dir)
+    months = load_months(date_str, source_dir)
+    indexes = {term: ContribIndex.load(date_str, term, source_dir) for term in TERMS}
+
+    conds = evaluate_conditions(snap, prev_close)
+    hit = conds[[f"cond{i + 1}" for i in range(N_CONDITIONS)]].any(axis=1).to_numpy()
+
+    # 只有觸發的時間點才需要前後兩筆快照與 Contrib 明細
+    pos_by_time = pd.Series(np.arange(len(snap)), index=snap["time"])
+    records = snap.to_dict(orient="records")
+    alerts = []
+    for _, row in conds[hit].iterrows():
+        pos = int(pos_by_time[row["time"]])
+        prev = records[pos - 1] if pos > 0 else None
+        prev_contribs = _snapshot_contribs(indexes, prev["time"]) if prev is not None else {}
+        curr_contribs = _snapshot_contribs(indexes, row["time"])
+        pairs = {term: (prev_contribs.get(term), curr_contribs.get(term)) for term in TERMS}
+        alerts.append(build_alert(date_str, months, triggered(row), prev, records[pos],
+                                  row["ori_vix_change"], pairs))
+    return conds, alerts
+
+
+def run_day_stream(date_str, source_dir="資料來源", output_dir="output", sigma="prod"):
+    """以 AlertStream 逐筆重播整天快照，回傳 alerts list"""
+    snap = load_snapshots(date_str, source_dir, output_dir, sigma)
+    indexes = {term: ContribIndex.load(date_str, term, source_dir) for term in TERMS}
+    stream = AlertStream(date_str, load_months(date_str, source_dir), load_previous_close(date_str, source_dir))
+    alerts = []
+    for record in snap.to_dict(orient="records"):
+        alert = stream.push(record, _snapshot_contribs(indexes, record["time"]))
+        if alert is not None:
+            alerts.append(alert)
+    return alerts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="VIX Alert 條件引擎：計算 8 個觸發條件並輸出 Alert Report")
+    parser.add_argument("--date", type=str, required=True, help="計算日期 YYYYMMDD")
+    parser.add_argument("--source", type=str, default="資料來源", help="輸入資料夾路徑")
+    parser.add_argument("--output", type=str, default="output", help="我們的 my_sigma 所在資料夾")
+    parser.add_argument("--sigma", choices=["prod", "ours"], default="prod", help="使用 PROD sigma 或我們的 my_sigma")
+    parser.add_argument("--report-dir", type=str, default=None, help="Alert Report 輸出資料夾 (預設 output/Alert)")
+    parser.add_argument("--stream", action="store_true", help="以串流版本逐筆計算，並與向量化結果比對")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    conds, alerts = run_day(args.date, args.source, args.output, args.sigma)
+    print(f"向量化計算: {len(conds)} 筆快照，{len(alerts)} 筆 Alert ({time.perf_counter() - t0:.3f}s)")
+
+    if args.stream:
+        t0 = time.perf_counter()
+        stream_alerts = run_day_stream(args.date, args.source, args.output, args.sigma)
+        same = [format_report(a) for a in stream_alerts] == [format_report(a) for a in alerts]
+        print(f"串流計算: {len(stream_alerts)} 筆 Alert ({time.perf_counter() - t0:.3f}s)，"
+              f"與向量化結果{'一致' if same else '不一致'}")
+        if not same:
+            sys.exit(1)
+
+    report_dir = args.report_dir or os.path.join(args.output, "Alert")
+    for alert in alerts:
+        path = write_report(report_dir, alert)
+        print(f"  {alert['time']} condition {' & '.join(map(str, alert['conditions']))} -> {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -56,13 +56,8 @@ def main(target_date=None, process_all_times=True, target_time=None, max_time_po
         scheduler = SnapshotScheduler(prod_path)
         schedule, initial_sys_id, prod_strikes = scheduler.load_schedule()
         
-        time_points = schedule['orig_time_str'].tolist()
-        print(f"  共 {len(time_points)} 個時間點")
-        
-        schedule_times = []
-        for time_str in time_points:
-            target_row = schedule[schedule['orig_time_str'] == time_str].iloc[0]
-            schedule_times.append((target_row['time_obj'], target_row['sys_id'], time_str))
+        schedule_times = SnapshotScheduler.to_schedule_times(schedule)
+        print(f"  共 {len(schedule_times)} 個時間點")
             
         reconstructor = SnapshotReconstructor(ticks)
         snapshot_df = reconstructor.reconstruct_all(schedule_times, initial_sys_id, prod_strikes=prod_strikes)
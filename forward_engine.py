@@ -0,0 +1,426 @@
+"""
+遠期價格引擎 (Forward Price Engine)
+
+Step 1 的遠期價格 F 與價平序列 K0 原本直接讀 PROD 的 Near_Forward / Next_Forward (tw_fwd, k0)。
+本模組依 docs/參考資料/官方編製方法.md 附錄5，由 TX 期貨逐筆資料自行決定每 15 秒的 F：
+
+    1. 原則：該 15 秒對應月份 TX 最後 1 筆成交價                              type 1
+    2. 成交價在最新最佳買/賣報價範圍外 -> 最新最佳買/賣中價                   type 4
+    3. 有成交價但無雙邊報價 -> 最後 1 筆成交價                                 type 3
+    4. 無成交價 -> 最新最佳買/賣中價                                           type 2
+    5. 無成交價也無雙邊報價 -> Put-Call Parity (Cboe 3(a)(ii))                type 5
+    例外：15 秒內最佳買價均為漲停價 (或最佳賣價均為跌停價) 時改用 Put-Call Parity，
+          直到某個 15 秒內完全沒有漲 (跌) 停價才恢復上述原則
+    (PROD Forward 檔中實際出現的是 type 1 / 2 / 4；3、5 為本模組依規則補上的代碼)
+
+整天一次計算 (無逐窗迴圈)：
+    - 逐筆時間以 searchsorted 對應到快照窗 (前一快照, 本快照]，開盤前的資料併入第一窗
+    - 每窗最後 1 筆成交價：依窗號排序後取每段最後一筆 (segmented last-value)
+    - 最新最佳買/賣：報價時間對快照時間 searchsorted(side='right') - 1
+    - Put-Call Parity：我們 Step 0 產出的 Q_hat 表 (output/驗證{date}_{term}PROD.csv)
+      每個時間點取 |Call 中價 - Put 中價| 最小的履約價 K*，F = K* + e^(RT) (C - P)
+    - K0：履約價格等於或略低於 F，以 (時間, 履約價) 複合鍵一次 searchsorted
+
+F 無法決定 (type 5 且無 Q_hat) 時沿用前一筆。
+
+TX 逐筆資料與 TXO 共用 reconstruct_order_book.RawDataLoader (svel_i081_* 欄位、Tab 分隔、嚴格日期過濾、
+商品代號解析)，期貨代號為 TXF + 月份碼 + 年份碼 (例: TXFA6)；成交價欄位見 TRADE_PRICE_COLUMNS。
+
+用法:
+    python forward_engine.py --date 20251231 --term Near --from-prodf     # 由 NearProdF 重算並與 Near_Forward 比對
+    python forward_engine.py --date 20251231 --term Near --raw-dir <TX 逐筆資料夾> --output output
+"""
+import os
+import sys
+import time
+import argparse
+
+if hasattr(sys.stdout, 'reconfigure'):
+    sys.stdout.reconfigure(encoding='utf-8')
+
+import numpy as np
+import pandas as pd
+
+from vix_calendar import DEFAULT_SCHEDULE, schedule_seconds, day_calendar
+from reconstruct_order_book import RawDataLoader
+
+# =====================================================================
+# 常數
+# =====================================================================
+TYPE_TRADE = 1               # 最後成交價
+TYPE_MID_NO_TRADE = 2        # 無成交 -> 中價
+TYPE_TRADE_NO_QUOTE = 3      # 有成交、無雙邊報價 -> 成交價
+TYPE_MID_OUTSIDE = 4         # 成交價在買賣價外 -> 中價
+TYPE_PARITY = 5              # Put-Call Parity
+
+FORWARD_COLUMNS = ["date", "time", "txf_px", "txf_mid_px", "txf_or_mid", "cboe_fwd", "tw_fwd", "k0", "type"]
+COMPARE_COLUMNS = ["txf_px", "txf_mid_px", "txf_or_mid", "tw_fwd", "type"]
+
+TX_PRODUCT = "TXF"
+# 原始資料中的成交價欄位 (依序嘗試)，只有報價的逐筆資料可不含此欄
+TRADE_PRICE_COLUMNS = ["svel_i081_match_price", "match_price"]
+
+US = 1_000_000
+STRIKE_KEY_SCALE = 1_000_000  # (窗號, 履約價) 複合鍵：窗號 * SCALE + 履約價
+
+
+# =====================================================================
+# TX 逐筆資料
+# =====================================================================
+def tick_time_us(values):
+    """HHMMSSffffff (字串或整數) -> 當日微秒 (np.int64)"""
+    t = pd.to_numeric(pd.Series(values).astype(str).str.strip(), errors="coerce").fillna(-1).to_numpy(dtype=np.int64)
+    return (t // 10**10 * 3600 + t // 10**8 % 100 * 60 + t // 10**6 % 100) * US + t % 10**6
+
+
+def load_tx_ticks(raw_dir, target_date, yyyymm):
+    """
+    讀取 TX 期貨逐筆資料 (RawDataLoader.load_all，與 TXO 相同的讀檔 / 日期過濾 / 代號解析)
+
+    Returns:
+        DataFrame: time_us / seqno / bid / ask / trade_px，依 (time_us, seqno) 排序；
+                   報價欄位空白表示該筆只有成交，trade_px 空白表示該筆只有報價
+    """
+    df = RawDataLoader(raw_dir, target_date, include_futures=True).load_all()
+    if df is None:
+        raise FileNotFoundError(f"在 {raw_dir} 找不到可讀取的逐筆資料")
+    df = df[(df["Product"] == TX_PRODUCT) & (df["YYYYMM"] == int(yyyymm))]
+    if df.empty:
+        raise FileNotFoundError(f"{raw_dir} 中沒有 {target_date} {TX_PRODUCT} {yyyymm} 的資料")
+
+    trade_col = next((c for c in TRADE_PRICE_COLUMNS if c in df.columns), None)
+    ticks = pd.DataFrame({
+        "time_us": tick_time_us(df["svel_i081_time"]),
+        "seqno": df["svel_i081_seqno"].to_numpy(dtype=np.int64),
+        "bid": pd.to_numeric(df["svel_i081_best_buy_price1"], errors="coerce").to_numpy(),
+        "ask": pd.to_numeric(df["svel_i081_best_sell_price1"], errors="coerce").to_numpy(),
+        "trade_px": (pd.to_numeric(df[trade_col], errors="coerce").to_numpy()
+                     if trade_col else np.full(len(df), np.nan)),
+    })
+    return ticks.sort_values(["time_us", "seqno"], kind="stable").reset_index(drop=True)
+
+
+def ticks_from_prod_f(prod_f):
+    """
+    由 PROD 的 NearProdF / NextProdF (每 15 秒的 bid / ask / rpt_px) 組出等價的逐筆資料
+
+    每個快照一筆：報價為該時點最新最佳買賣價，rpt_px > 0 時同時視為該窗最後成交價
+    """
+    times = prod_f["time"].astype(str).str.zfill(6)
+    rpt = pd.to_numeric(prod_f["rpt_px"], errors="coerce").to_numpy(dtype=float)
+    return pd.DataFrame({
+        "time_us": schedule_seconds(times) * US,
+        "seqno": np.arange(len(prod_f), dtype=np.int64),
+        "bid": pd.to_numeric(prod_f["bid"], errors="coerce").to_numpy(dtype=float),
+        "ask": pd.to_numeric(prod_f["ask"], errors="coerce").to_numpy(dtype=float),
+        "trade_px": np.where(rpt > 0, rpt, np.nan),
+    })
+
+
+def load_prod_f(date_str, term, source_dir="資料來源"):
+    path = os.path.join(source_dir, date_str, f"{term}ProdF_{date_str}.tsv")
+    return pd.read_csv(path, sep="\t", dtype={"time": str})
+
+
+# =====================================================================
+# 每窗 TX 成交價 / 中價
+# =====================================================================
+def _last_per_segment(seg, values, n):
+    """seg 已排序 (非遞減)：每段最後一筆的值，沒有資料的段為 NaN"""
+    out = np.full(n, np.nan)
+    if len(seg) == 0:
+        return out
+    last = np.flatnonzero(np.r_[seg[1:] != seg[:-1], True])
+    out[seg[last]] = values[last]
+    return out
+
+
+def determine_tx_forward(ticks, schedule=DEFAULT_SCHEDULE, limits=None):
+    """
+    附錄5 原則 1~4 與漲跌停例外 (不含 Put-Call Parity 的計算)
+
+    Args:
+        ticks: time_us / seqno / bid / ask / trade_px (見 load_tx_ticks)
+        schedule: 快照時間 (HHMMSS 字串序列)
+        limits: (漲停價, 跌停價)，省略表示不檢查漲跌停
+
+    Returns:
+        dict of np.ndarray (長度 = 快照數):
+            txf_px (無成交為 0)、txf_mid_px (無雙邊報價為 0)、txf_or_mid、type、
+            need_parity (type 5 或漲跌停期間)
+    """
+    snap_us = schedule_seconds(schedule) * US
+    n = len(snap_us)
+    ticks = ticks.sort_values(["time_us", "seqno"], kind="stable")
+    tick_us = ticks["time_us"].to_numpy(dtype=np.int64)
+    bid = ticks["bid"].to_numpy(dtype=float)
+    ask = ticks["ask"].to_numpy(dtype=float)
+    trade = ticks["trade_px"].to_numpy(dtype=float)
+
+    # 逐筆 -> 快照窗 (前一快照, 本快照]；收盤快照之後的資料不使用
+    wid = np.searchsorted(snap_us, tick_us, side="left")
+    in_day = wid < n
+
+    # 每窗最後 1 筆成交價
+    is_trade = in_day & (trade > 0)
+    txf_px = np.nan_to_num(_last_per_segment(wid[is_trade], trade[is_trade], n), nan=0.0)
+
+    # 每個快照時點的最新最佳買 / 賣 (延續前面窗的報價)
+    is_quote = ~(np.isnan(bid) & np.isnan(ask))
+    q_us, q_bid, q_ask = tick_us[is_quote], np.nan_to_num(bid[is_quote]), np.nan_to_num(ask[is_quote])
+    q_pos = np.searchsorted(q_us, snap_us, side="right") - 1
+    has_quote = q_pos >= 0
+    cur_bid = np.where(has_quote, q_bid[np.maximum(q_pos, 0)], 0.0)
+    cur_ask = np.where(has_quote, q_ask[np.maximum(q_pos, 0)], 0.0)
+    two_sided = (cur_bid > 0) & (cur_ask > 0)
+    txf_mid_px = np.where(two_sided, (cur_bid + cur_ask) / 2.0, 0.0)
+
+    has_trade = txf_px > 0
+    inside = (txf_px >= cur_bid) & (txf_px <= cur_ask)
+    ftype = np.select(
+        [has_trade & two_sided & inside, has_trade & two_sided, has_trade, two_sided],
+        [TYPE_TRADE, TYPE_MID_OUTSIDE, TYPE_TRADE_NO_QUOTE, TYPE_MID_NO_TRADE],
+        default=TYPE_PARITY,
+    )
+    txf_or_mid = np.where(ftype == TYPE_TRADE, txf_px,
+                          np.where(ftype == TYPE_TRADE_NO_QUOTE, txf_px, txf_mid_px))
+    txf_or_mid = np.where(ftype == TYPE_PARITY, 0.0, txf_or_mid)
+
+    need_parity = ftype == TYPE_PARITY
+    if limits is not None:
+        need_parity |= limit_locked(wid[is_quote & in_day], q_bid[in_day[is_quote]], q_ask[in_day[is_quote]],
+                                    q_pos, q_bid, q_ask, n, limits)
+    return {
+        "txf_px": txf_px,
+        "txf_mid_px": txf_mid_px,
+        "txf_or_mid": txf_or_mid,
+        "type": ftype,
+        "need_parity": need_parity,
+    }
+
+
+def limit_locked(q_wid, q_win_bid, q_win_ask, q_pos, q_bid, q_ask, n, limits):
+    """
+    漲跌停例外：某窗內最佳買價均為漲停價 (或最佳賣價均為跌停價) 起改用 Put-Call Parity，
+    直到某窗內完全沒有漲 (跌) 停價才恢復；窗內沒有新報價時以最新報價判斷
+
+    Returns:
+        np.ndarray(bool): 各窗是否處於漲跌停狀態
+    """
+    limit_up, limit_down = limits
+    locked = (q_win_bid == limit_up) | (q_win_ask == limit_down)
+    count = np.bincount(q_wid, minlength=n)[:n]
+    n_locked = np.bincount(q_wid, weights=locked.astype(float), minlength=n)[:n]
+
+    latest_locked = np.zeros(n, dtype=bool)
+    ok = q_pos >= 0
+    latest_locked[ok] = (q_bid[q_pos[ok]] == limit_up) | (q_ask[q_pos[ok]] == limit_down)
+
+    all_locked = np.where(count > 0, n_locked == count, latest_locked)
+    none_locked = np.where(count > 0, n_locked == 0, ~latest_locked)
+    # 狀態：全部漲跌停 -> 1，完全沒有 -> 0，其餘沿用前一窗
+    state = pd.Series(np.where(all_locked, 1.0, np.where(none_locked, 0.0, np.nan)))
+    return state.ffill().fillna(0.0).to_numpy() > 0
+
+
+# =====================================================================
+# Put-Call Parity 與 K0 (Q_hat 表)
+# =====================================================================
+def load_qhat(date_str, term, output_dir="output"):
+    """Step 0 產出的 Q_hat 表 (time / strike / c.bid / c.ask / p.bid / p.ask)，不存在時回傳 None"""
+    path = os.path.join(output_dir, f"驗證{date_str}_{term}PROD.csv")
+    if not os.path.exists(path):
+        return None
+    return pd.read_csv(path, usecols=["time", "strike", "c.bid", "c.ask", "p.bid", "p.ask"],
+                       dtype={"time": str})
+
+
+def _qhat_arrays(qhat, schedule):
+    """Q_hat 表 -> (窗號, 履約價, Call 中價, Put 中價)，依 (窗號, 履約價) 排序、只保留排程內的時間"""
+    times = qhat["time"].astype(str).str.zfill(6)
+    sched = np.asarray(schedule)
+    order = np.argsort(sched, kind="stable")
+    pos = np.searchsorted(sched[order], times.to_numpy())
+    pos = np.minimum(pos, len(sched) - 1)
+    ok = sched[order][pos] == times.to_numpy()
+    win = order[pos][ok]
+
+    def mid(bid_col, ask_col):
+        b = pd.to_numeric(qhat[bid_col], errors="coerce").to_numpy(dtype=float)[ok]
+        a = pd.to_numeric(qhat[ask_col], errors="coerce").to_numpy(dtype=float)[ok]
+        return np.where((b > 0) & (a > 0), (b + a) / 2.0, np.nan)
+
+    strike = pd.to_numeric(qhat["strike"], errors="coerce").to_numpy(dtype=float)[ok]
+    c_mid, p_mid = mid("c.bid", "c.ask"), mid("p.bid", "p.ask")
+    idx = np.lexsort((strike, win))
+    return win[idx], strike[idx], c_mid[idx], p_mid[idx]
+
+
+def parity_forward(qhat_arrays, rate, T, n):
+    """
+    Cboe 3(a)(ii)：每個時間點取 |C - P| 最小的履約價 K*，F = K* + e^(RT) (C - P)
+
+    Returns:
+        np.ndarray: 各窗的 Put-Call Parity 遠期價格 (無雙邊中價的窗為 NaN)
+    """
+    win, strike, c_mid, p_mid = qhat_arrays
+    valid = ~(np.isnan(c_mid) | np.isnan(p_mid))
+    win, strike, diff = win[valid], strike[valid], (c_mid - p_mid)[valid]
+    out = np.full(n, np.nan)
+    if len(win) == 0:
+        return out
+    # 同一窗內依 |C - P| (再依履約價) 排序，每段第一筆即 K*
+    idx = np.lexsort((strike, np.abs(diff), win))
+    first = idx[np.r_[True, win[idx][1:] != win[idx][:-1]]]
+    w = win[first]
+    out[w] = strike[first] + np.exp(rate * np.asarray(T)[w]) * diff[first]
+    return out
+
+
+def strike_floor(forward, qhat_arrays=None, strikes=None):
+    """
+    K0：履約價格等於或略低於 F
+
+    有 Q_hat 表時以該時間點實際出現的履約價為準 ((窗號, 履約價) 複合鍵一次 searchsorted)，
+    該時點不在 Q_hat 表中時改用 strikes (全日履約價格序列)
+    """
+    n = len(forward)
+    k0 = np.zeros(n)
+    fwd = np.nan_to_num(forward, nan=0.0)
+    done = np.zeros(n, dtype=bool)
+    if qhat_arrays is not None and len(qhat_arrays[0]):
+        win, strike = qhat_arrays[0], qhat_arrays[1]
+        keys = win.astype(float) * STRIKE_KEY_SCALE + strike
+        query = np.arange(n, dtype=float) * STRIKE_KEY_SCALE + fwd
+        pos = np.searchsorted(keys, query, side="right") - 1
+        ok = (pos >= 0) & (fwd > 0)
+        ok[ok] = win[pos[ok]] == np.flatnonzero(ok)
+        k0[ok] = strike[pos[ok]]
+        done = ok
+    if strikes is not None and len(strikes):
+        strikes = np.sort(np.asarray(strikes, dtype=float))
+        pos = np.searchsorted(strikes, fwd, side="right") - 1
+        fill = ~done & (pos >= 0) & (fwd > 0)
+        k0[fill] = strikes[pos[fill]]
+    return k0
+
+
+# =====================================================================
+# 整天計算
+# =====================================================================
+def compute_forwards(date_str, term, ticks, qhat=None, strikes=None, limits=None,
+                     source_dir="資料來源", schedule=DEFAULT_SCHEDULE):
+    """
+    計算整天每個快照的 F 與 K0
+
+    Args:
+        term: 'Near' / 'Next'
+        ticks: 該月份 TX 逐筆資料 (load_tx_ticks / ticks_from_prod_f)
+        qhat: Step 0 的 Q_hat 表 (load_qhat)，Put-Call Parity 與 K0 使用
+        strikes: 全日履約價格序列 (Q_hat 表缺少某時點時決定 K0 用)
+        limits: (漲停價, 跌停價)
+
+    Returns:
+        DataFrame: 與 {term}_Forward_{date}.tsv 相同欄位
+    """
+    schedule = tuple(schedule)
+    n = len(schedule)
+    tx = determine_tx_forward(ticks, schedule, limits)
+
+    cboe_fwd = np.full(n, np.nan)
+    qhat_arrays = _qhat_arrays(qhat, schedule) if qhat is not None else None
+    if qhat_arrays is not None:
+        rate = pd.read_csv(os.path.join(source_dir, date_str, f"rate_{date_str}.tsv"), sep="\t").iloc[0]
+        T = day_calendar(date_str, source_dir, schedule)[f"{term.lower()}T"].to_numpy()
+        cboe_fwd = parity_forward(qhat_arrays, float(rate[f"{term.lower()}_r"]), T, n)
+
+    tw_fwd = np.where(tx["need_parity"], cboe_fwd, tx["txf_or_mid"])
+    ftype = np.where(tx["need_parity"], TYPE_PARITY, tx["type"])
+    # 仍無法決定的時點沿用前一筆 F
+    tw_fwd = pd.Series(np.where(tw_fwd > 0, tw_fwd, np.nan)).ffill().fillna(0.0).to_numpy()
+
+    return pd.DataFrame({
+        "date": date_str,
+        "time": list(schedule),
+        "txf_px": tx["txf_px"],
+        "txf_mid_px": tx["txf_mid_px"],
+        "txf_or_mid": tx["txf_or_mid"],
+        "cboe_fwd": np.nan_to_num(cboe_fwd, nan=0.0),
+        "tw_fwd": tw_fwd,
+        "k0": strike_floor(tw_fwd, qhat_arrays, strikes),
+        "type": ftype.astype(int),
+    })[FORWARD_COLUMNS]
+
+
+def write_forward(df, output_dir, date_str, term):
+    """寫出與 PROD 相同格式的 {term}_Forward_{date}.tsv"""
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, f"{term}_Forward_{date_str}.tsv")
+    df.to_csv(path, sep="\t", index=False, float_format="%.4f")
+    return path
+
+
+def compare_with_prod(ours, date_str, term, source_dir="資料來源"):
+    """與 PROD {term}_Forward 比對，回傳各欄不一致筆數 (k0 另計)"""
+    prod = pd.read_csv(os.path.join(source_dir, date_str, f"{term}_Forward_{date_str}.tsv"),
+                       sep="\t", dtype={"time": str})
+    prod["time"] = prod["time"].str.zfill(6)
+    merged = prod.merge(ours, on="time", suffixes=("_prod", "_ours"), how="left")
+    result = {}
+    for col in COMPARE_COLUMNS + ["k0"]:
+        a = pd.to_numeric(merged[f"{col}_prod"], errors="coerce").to_numpy(dtype=float)
+        b = pd.to_numeric(merged[f"{col}_ours"], errors="coerce").to_numpy(dtype=float)
+        result[col] = int(np.sum(~np.isclose(a, b, atol=1e-4, equal_nan=True)))
+    return result, len(merged)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TX 遠期價格 F / K0 計算 (附錄5)")
+    parser.add_argument("--date", type=str, required=True, help="YYYYMMDD")
+    parser.add_argument("--term", type=str, default="Near", choices=["Near", "Next"])
+    parser.add_argument("--source", type=str, default="資料來源", help="輸入資料夾路徑")
+    parser.add_argument("--output", type=str, default=None, help="輸出資料夾 (省略則不寫檔)")
+    parser.add_argument("--qhat-dir", type=str, default="output", help="Step 0 Q_hat 表所在資料夾")
+    parser.add_argument("--raw-dir", type=str, default=None, help="TX 期貨逐筆資料夾")
+    parser.add_argument("--from-prodf", action="store_true", help="由 PROD 的 {term}ProdF 組出逐筆資料")
+    parser.add_argument("--strike-step", type=float, default=None, help="Q_hat 表不存在時的等距履約價間距 (K0 僅為近似)")
+    args = parser.parse_args()
+
+    date_str, term = args.date, args.term
+    months = pd.read_csv(os.path.join(args.source, date_str, f"month_change_{date_str}.tsv"), sep="\t").iloc[0]
+    yyyymm = int(months[f"{term.lower()}_month"])
+
+    if args.from_prodf or not args.raw_dir:
+        ticks = ticks_from_prod_f(load_prod_f(date_str, term, args.source))
+    else:
+        ticks = load_tx_ticks(args.raw_dir, date_str, yyyymm)
+    qhat = load_qhat(date_str, term, args.qhat_dir)
+    strikes = None
+    if args.strike_step:
+        strikes = np.arange(0.0, 100000.0, args.strike_step)
+
+    t0 = time.perf_counter()
+    df = compute_forwards(date_str, term, ticks, qhat=qhat, strikes=strikes, source_dir=args.source)
+    elapsed = time.perf_counter() - t0
+    print(f"[{term}] {date_str} TX {yyyymm}: {len(ticks)} 筆逐筆資料 -> {len(df)} 個快照 ({elapsed * 1000:.1f} ms)")
+    print(f"  type 分布: {df['type'].value_counts().sort_index().to_dict()}")
+
+    if args.output:
+        print(f"  已寫出: {write_forward(df, args.output, date_str, term)}")
+
+    prod_path = os.path.join(args.source, date_str, f"{term}_Forward_{date_str}.tsv")
+    if os.path.exists(prod_path):
+        mismatches, n = compare_with_prod(df, date_str, term, args.source)
+        # 有履約價來源 (Q_hat 表或 --strike-step) 時 k0 一併列入通過條件
+        checked = COMPARE_COLUMNS + (["k0"] if qhat is not None or strikes is not None else [])
+        status = "[PASS]" if not any(mismatches[c] for c in checked) else "[FAIL]"
+        print(f"{status} 與 PROD {term}_Forward 比對 {n} 筆，不一致: {mismatches}")
+        if qhat is None and strikes is None:
+            print("  (無 Q_hat 表也未指定 --strike-step，k0 無法決定，未列入通過條件)")
+        elif qhat is None and mismatches["k0"]:
+            print(f"  k0 不一致 {mismatches['k0']} 筆：--strike-step 為等距履約價，"
+                  f"與當日實際掛牌履約價不同時需改用 Step 0 的 Q_hat 表")
+
+
+if __name__ == "__main__":
+    main()
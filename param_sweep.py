@@ -0,0 +1,460 @@
+"""
+篩選參數敏感度分析 (EMA / Gamma / Lambda Parameter Sweep)
+
+step0_process_quotes 的 ALPHA / GAMMA_0 / GAMMA_1 / GAMMA_2 / LAMBDA 是模組常數，
+想比較不同參數只能改常數後整天重跑 Step 0 (逐序列、逐列 Python 迴圈)，一組參數一個月就要數小時。
+
+EMA / 異常值判定 / Q_hat 的遞迴只依賴「同一序列前一時點」的狀態，
+快照重建 (Q_Last_Valid / Q_Min_Valid) 則與參數無關。本模組因此：
+    1. 每個日期、月份只讀一次快照報價 (Step 0 輸出的 c./p.last_* 與 min_*)，排成 (時間, 序列) 密集陣列
+    2. 沿時間軸走一次遞迴，每一步同時更新 (參數組, 序列) 陣列 — K 組參數共用同一趟掃描
+    3. Q_hat 直接交給 sigma_engine 一次算出 (參數組, 時間) 的 Sigma^2 與 ORI VIX
+
+遞迴規則與 add_ema_and_outlier_detection 逐項相同 (第一筆 / 09:00:00 重置、Code 5 / 6 例外、
+Gamma 的 1e-9 容差、Condition 1~4、Q_Last -> Q_Min -> Replacement 優先順序)；
+--check 會以合成資料經 validation/equivalence_harness.py (ema / sweep) 比對預設參數下的結果。
+
+每組參數回報：
+    last_outlier_rate / min_outlier_rate  有效 Q_Last / Q_Min 被判為異常值的比例
+    replacement_share                     Q_hat 沿用前值 (Replacement) 的比例
+    vix_mad_base / vix_max_base           ORI VIX 與預設參數結果的平均 / 最大絕對差異
+    vix_mad_prod                          ORI VIX 與 PROD sigma ori_vix 的平均絕對差異
+
+用法:
+    python param_sweep.py --start 20251201 --end 20251231 --alpha 0.9 0.95 0.98 --lambda 10 15 20
+    python param_sweep.py --check
+"""
+import os
+import sys
+import time
+import argparse
+import itertools
+from datetime import datetime, timedelta
+
+if hasattr(sys.stdout, 'reconfigure'):
+    sys.stdout.reconfigure(encoding='utf-8')
+
+import numpy as np
+import pandas as pd
+
+import step0_process_quotes as step0
+from vix_calendar import DEFAULT_SCHEDULE, year_seconds
+from sigma_engine import TERMS, term_sigma2, ori_vix, load_term_inputs
+
+PARAM_KEYS = ("ALPHA", "GAMMA_0", "GAMMA_1", "GAMMA_2", "LAMBDA")
+DEFAULT_PARAMS = {key: float(getattr(step0, key)) for key in PARAM_KEYS}
+MARKET_OPEN_TIME = "090000"  # EMA / Q_hat 重置時間 (與 step0 MARKET_OPEN_TIMES 相同)
+DEFAULT_CHUNK = 32           # 一次遞迴的參數組數 (限制 (參數組, 時間, 序列) 陣列的記憶體)
+SIGMA_BATCH = 8              # 一次計算 Sigma^2 的參數組數
+
+SOURCE_LAST, SOURCE_MIN, SOURCE_REPLACEMENT = 0, 1, 2
+
+
+def param_grid(**values):
+    """
+    參數組合 (笛卡兒積)，未指定的參數使用 step0 目前的常數
+
+    例: param_grid(ALPHA=[0.9, 0.95], LAMBDA=[10, 15]) -> 4 組
+
+    Returns:
+        list[dict]
+    """
+    axes = [[float(v) for v in values.get(key) or [DEFAULT_PARAMS[key]]] for key in PARAM_KEYS]
+    return [dict(zip(PARAM_KEYS, combo)) for combo in itertools.product(*axes)]
+
+
+# =====================================================================
+# 快照報價 -> 密集陣列
+# =====================================================================
+def _parse_float(series):
+    """
+    字串 "null" 表示無效的報價欄位 -> float 陣列
+
+    pd.to_numeric 的快速解析在最後一位可能與 float() 不同 (例如 "127.19999999999999")，
+    這裡改用 numpy 的字串轉換，結果與 legacy 的 float() 相同
+    """
+    text = series.astype(str).to_numpy()
+    return np.where(np.isin(text, ["null", "", "None"]), "nan", text).astype(float)
+
+
+class QuoteGrid:
+    """
+    單一月份整天的有效報價，形狀 (時間, 序列)；序列軸前半為 Call、後半為 Put (皆依履約價升序)
+
+    last_* / min_* 在報價無效 (不符 bid >= 0, ask > 0, ask > bid) 處為 NaN；
+    present 標記該 (時間, 序列) 是否有資料列 (沒有資料列時遞迴狀態原樣保留，與逐序列處理相同)
+    """
+
+    def __init__(self, times, strikes, fields, present):
+        self.times = np.asarray(times)
+        self.strikes = np.asarray(strikes, dtype=float)
+        self.present = present
+        for name, values in fields.items():
+            setattr(self, name, values)
+
+    @property
+    def n_strikes(self):
+        return len(self.strikes)
+
+    @classmethod
+    def _build(cls, times, strikes, is_call, columns):
+        """times / strikes / is_call 為逐列陣列；columns: {欄位名: 逐列數值}"""
+        t_axis = np.unique(times)
+        k_axis = np.unique(strikes)
+        t_idx = np.searchsorted(t_axis, times)
+        s_idx = np.searchsorted(k_axis, strikes) + np.where(is_call, 0, len(k_axis))
+        shape = (len(t_axis), 2 * len(k_axis))
+
+        present = np.zeros(shape, dtype=bool)
+        present[t_idx, s_idx] = True
+        fields = {}
+        for name, values in columns.items():
+            grid = np.full(shape, np.nan)
+            grid[t_idx, s_idx] = values
+            fields[name] = grid
+        return cls(t_axis, k_axis, fields, present)
+
+    @classmethod
+    def from_quotes(cls, quotes_df):
+        """prepare_snapshot_quotes 的輸出 (Q_Last_Valid_* / Q_Min_Valid_*，無效為字串 "null")"""
+        columns = {}
+        for src, prefix in (("Q_Last_Valid", "last"), ("Q_Min_Valid", "min")):
+            for field in ("Bid", "Ask", "Spread", "Mid"):
+                columns[f"{prefix}_{field.lower()}"] = _parse_float(quotes_df[f"{src}_{field}"])
+        times = quotes_df["Time"].astype(str).str.zfill(6).to_numpy()
+        return cls._build(times, quotes_df["Strike"].to_numpy(dtype=float),
+                          (quotes_df["CP"] == "Call").to_numpy(), columns)
+
+    @classmethod
+    def from_prod_format(cls, df):
+        """Step 0 輸出 (驗證{date}_{term}PROD.csv)：每列一個履約價，null 已補 0，依有效報價規則還原"""
+        n = len(df)
+        times = df["time"].astype(str).str.zfill(6).to_numpy()
+        strikes = pd.to_numeric(df["strike"], errors="coerce").to_numpy(dtype=float)
+        columns = {}
+        for prefix in ("last", "min"):
+            bids, asks = [], []
+            for side in ("c", "p"):
+                bids.append(pd.to_numeric(df[f"{side}.{prefix}_bid"], errors="coerce").to_numpy(dtype=float))
+                asks.append(pd.to_numeric(df[f"{side}.{prefix}_ask"], errors="coerce").to_numpy(dtype=float))
+            bid, ask = np.concatenate(bids), np.concatenate(asks)
+            valid = (bid >= 0) & (ask > 0) & (ask > bid)
+            columns[f"{prefix}_bid"] = np.where(valid, bid, np.nan)
+            columns[f"{prefix}_ask"] = np.where(valid, ask, np.nan)
+            columns[f"{prefix}_spread"] = np.where(valid, ask - bid, np.nan)
+            columns[f"{prefix}_mid"] = np.where(valid, (bid + ask) / 2, np.nan)
+        is_call = np.r_[np.ones(n, dtype=bool), np.zeros(n, dtype=bool)]
+        return cls._build(np.r_[times, times], np.r_[strikes, strikes], is_call, columns)
+
+
+def load_grid(date_str, term, output_dir="output"):
+    """讀取 Step 0 輸出並轉為 QuoteGrid，檔案不存在時回傳 None"""
+    path = os.path.join(output_dir, f"驗證{date_str}_{term}PROD.csv")
+    if not os.path.exists(path):
+        return None
+    cols = ["time", "strike"] + [f"{s}.{p}_{f}" for s in ("c", "p") for p in ("last", "min") for f in ("bid", "ask")]
+    return QuoteGrid.from_prod_format(pd.read_csv(path, usecols=cols, dtype={"time": str}))
+
+
+# =====================================================================
+# 批次遞迴 (EMA -> Gamma -> Outlier -> Q_hat)
+# =====================================================================
+def _param_column(params, key):
+    return np.array([p[key] for p in params], dtype=float)[:, None]
+
+
+def _is_outlier(bid, ask, spread, mid, ema, hat_mid_prev, exempt, g0, g1, g2, lam):
+    """check_outlier + determine_gamma；輸入為 (參數組, 序列) 或可廣播的陣列，無效報價回傳 False"""
+    prev_ok = ~np.isnan(hat_mid_prev)
+    gamma = np.where(~(bid > 0), g0,
+                     np.where(~prev_ok, g2, np.where(mid <= hat_mid_prev + 1e-9, g1, g2)))
+    cond_1 = spread <= gamma * ema               # EMA 為 NaN 時比較結果為 False
+    cond_2 = spread <= lam
+    cond_3 = prev_ok & (bid > hat_mid_prev)
+    cond_4 = prev_ok & (ask < hat_mid_prev) & (bid > 0)
+    return ~np.isnan(bid) & ~exempt & ~(cond_1 | cond_2 | cond_3 | cond_4)
+
+
+def run_filter(grid, params):
+    """
+    K 組參數同時跑完一整天的篩選
+
+    Returns:
+        dict:
+            hat_bid / hat_mid      (K, 時間, 序列) 篩選後報價 (無值為 NaN)
+            source                 (K, 時間, 序列) SOURCE_LAST / SOURCE_MIN / SOURCE_REPLACEMENT，無資料列為 -1
+            last_outlier / min_outlier / replacement  (K,) 次數
+            last_valid / min_valid / rows             有效 Q_Last、有效 Q_Min、資料列數 (與參數無關)
+    """
+    k = len(params)
+    alpha = _param_column(params, "ALPHA")
+    g0, g1, g2 = (_param_column(params, key) for key in ("GAMMA_0", "GAMMA_1", "GAMMA_2"))
+    lam = _param_column(params, "LAMBDA")
+
+    n_times, n_series = grid.present.shape
+    shape = (k, n_series)
+    ema_prev = np.full(shape, np.nan)
+    hat_bid = np.full(shape, np.nan)
+    hat_ask = np.full(shape, np.nan)
+    hat_mid = np.full(shape, np.nan)
+    seen = np.zeros(n_series, dtype=bool)
+
+    out_bid = np.full((k, n_times, n_series), np.nan)
+    out_mid = np.full((k, n_times, n_series), np.nan)
+    source = np.full((k, n_times, n_series), -1, dtype=np.int8)
+    last_outlier = np.zeros(k, dtype=np.int64)
+    min_outlier = np.zeros(k, dtype=np.int64)
+
+    for t in range(n_times):
+        present = grid.present[t]
+        restart = present & (~seen | (grid.times[t] == MARKET_OPEN_TIME))
+        seen |= present
+
+        # 重置：EMA_t-1 與 Q_hat_t-1 皆視為 null
+        prev_ema = np.where(restart, np.nan, ema_prev)
+        prev_bid = np.where(restart, np.nan, hat_bid)
+        prev_ask = np.where(restart, np.nan, hat_ask)
+        prev_mid = np.where(restart, np.nan, hat_mid)
+
+        # EMA (calculate_ema_for_series)：只依 Q_Min_Valid_Spread
+        m_spread = grid.min_spread[t]
+        m_ok = ~np.isnan(m_spread)
+        ema = np.where(np.isnan(prev_ema), m_spread,
+                       np.where(m_ok, alpha * prev_ema + (1 - alpha) * m_spread, prev_ema))
+
+        # 第一筆 (Code 5) 與 EMA_t-1 為 null (Code 6) 一律非異常值
+        exempt = restart | np.isnan(prev_ema)
+        out_last = _is_outlier(grid.last_bid[t], grid.last_ask[t], grid.last_spread[t], grid.last_mid[t],
+                               ema, prev_mid, exempt, g0, g1, g2, lam)
+        out_min = _is_outlier(grid.min_bid[t], grid.min_ask[t], m_spread, grid.min_mid[t],
+                              ema, prev_mid, exempt, g0, g1, g2, lam)
+
+        use_last = ~np.isnan(grid.last_bid[t]) & ~out_last
+        use_min = ~use_last & m_ok & ~out_min
+        new_bid = np.where(use_last, grid.last_bid[t], np.where(use_min, grid.min_bid[t], prev_bid))
+        new_ask = np.where(use_last, grid.last_ask[t], np.where(use_min, grid.min_ask[t], prev_ask))
+        new_mid = np.where(use_last, grid.last_mid[t], np.where(use_min, grid.min_mid[t], prev_mid))
+
+        # 沒有資料列的序列維持原狀態
+        ema_prev = np.where(present, ema, ema_prev)
+        hat_bid = np.where(present, new_bid, hat_bid)
+        hat_ask = np.where(present, new_ask, hat_ask)
+        hat_mid = np.where(present, new_mid, hat_mid)
+
+        out_bid[:, t] = np.where(present, new_bid, np.nan)
+        out_mid[:, t] = np.where(present, new_mid, np.nan)
+        source[:, t] = np.where(present, np.where(use_last, SOURCE_LAST,
+                                                  np.where(use_min, SOURCE_MIN, SOURCE_REPLACEMENT)), -1)
+        last_outlier += (out_last & present).sum(axis=1)
+        min_outlier += (out_min & present).sum(axis=1)
+
+    return {
+        "hat_bid": out_bid,
+        "hat_mid": out_mid,
+        "source": source,
+        "last_outlier": last_outlier,
+        "min_outlier": min_outlier,
+        "replacement": (source == SOURCE_REPLACEMENT).sum(axis=(1, 2)),
+        "last_valid": int((~np.isnan(grid.last_bid) & grid.present).sum()),
+        "min_valid": int((~np.isnan(grid.min_bid) & grid.present).sum()),
+        "rows": int(grid.present.sum()),
+    }
+
+
+def _term_arrays(grid, result, schedule):
+    """run_filter 的 Q_hat (K, 時間, 序列) -> 依 schedule 對齊的 c_bid / c_mid / p_bid / p_mid (K, 時間, 履約價)"""
+    n = grid.n_strikes
+    t_idx = pd.Index(grid.times).get_indexer(list(schedule))
+    ok = t_idx >= 0
+    arrays = {}
+    for name, values in (("bid", result["hat_bid"]), ("mid", result["hat_mid"])):
+        aligned = np.full((values.shape[0], len(schedule), values.shape[2]), np.nan)
+        aligned[:, ok] = values[:, t_idx[ok]]
+        arrays[f"c_{name}"] = aligned[..., :n]
+        arrays[f"p_{name}"] = aligned[..., n:]
+    return arrays
+
+
+# =====================================================================
+# 單日 / 多日
+# =====================================================================
+def sweep_day(date_str, params, source_dir="資料來源", output_dir="output",
+              chunk=DEFAULT_CHUNK, schedule=DEFAULT_SCHEDULE):
+    """
+    單日所有參數組的篩選統計與 ORI VIX
+
+    Returns:
+        dict (缺 Step 0 輸出時回傳 None):
+            stats: {term: {last_outlier, min_outlier, replacement (K,), last_valid, min_valid, rows}}
+            ori_vix: (K, 時間)
+    """
+    grids = {term: load_grid(date_str, term, output_dir) for term in TERMS}
+    if any(g is None for g in grids.values()):
+        return None
+    inputs = {term: load_term_inputs(date_str, term, source_dir, schedule) for term in TERMS}
+
+    k = len(params)
+    sigma2 = {term: np.full((k, len(schedule)), -1.0) for term in TERMS}
+    stats = {}
+    for term in TERMS:
+        grid, inp = grids[term], inputs[term]
+        parts = []
+        for lo in range(0, k, chunk):
+            result = run_filter(grid, params[lo:lo + chunk])
+            parts.append(result)
+            arrays = _term_arrays(grid, result, schedule)
+            for b in range(0, len(params[lo:lo + chunk]), SIGMA_BATCH):
+                batch = {name: a[b:b + SIGMA_BATCH] for name, a in arrays.items()}
+                s2, _, _ = term_sigma2(grid.strikes, inp["k0"], inp["fwd"], inp["T"], inp["rate"], **batch)
+                sigma2[term][lo + b:lo + b + len(s2)] = s2
+        stats[term] = {
+            key: np.concatenate([p[key] for p in parts]) for key in ("last_outlier", "min_outlier", "replacement")
+        }
+        stats[term].update({key: parts[0][key] for key in ("last_valid", "min_valid", "rows")})
+
+    vix = ori_vix(inputs["Near"]["T"], inputs["Near"]["W"], sigma2["Near"],
+                  inputs["Next"]["T"], inputs["Next"]["W"], sigma2["Next"], year_seconds(date_str))
+    return {"stats": stats, "ori_vix": vix}
+
+
+def _prod_ori_vix(date_str, source_dir, schedule):
+    path = os.path.join(source_dir, date_str, f"sigma_{date_str}.tsv")
+    if not os.path.exists(path):
+        return None
+    df = pd.read_csv(path, sep="\t", dtype={"time": str})
+    df["time"] = df["time"].str.zfill(6)
+    series = df.drop_duplicates("time", keep="last").set_index("time")["ori_vix"]
+    return pd.to_numeric(series.reindex(list(schedule)), errors="coerce").to_numpy(dtype=float)
+
+
+def run_sweep(start, end, params, source_dir="資料來源", output_dir="output", chunk=DEFAULT_CHUNK):
+    """
+    日期區間內所有參數組的彙總統計 (預設參數一併計算作為 VIX 差異基準)
+
+    Returns:
+        DataFrame：每組參數一列
+    """
+    params = list(params)
+    base_idx = next((i for i, p in enumerate(params) if p == DEFAULT_PARAMS), None)
+    if base_idx is None:
+        params = params + [dict(DEFAULT_PARAMS)]
+        base_idx = len(params) - 1
+    k = len(params)
+
+    counts = {key: np.zeros(k) for key in ("last_outlier", "min_outlier", "replacement")}
+    totals = {key: 0 for key in ("last_valid", "min_valid", "rows")}
+    dev_base = np.zeros(k)
+    max_base = np.zeros(k)
+    n_base = np.zeros(k)
+    dev_prod = np.zeros(k)
+    n_prod = np.zeros(k)
+    days = []
+
+    day = datetime.strptime(start, "%Y%m%d")
+    end_day = datetime.strptime(end, "%Y%m%d")
+    while day <= end_day:
+        date_str = day.strftime("%Y%m%d")
+        day += timedelta(days=1)
+        if not os.path.isdir(os.path.join(source_dir, date_str)):
+            continue
+        t0 = time.perf_counter()
+        try:
+            result = sweep_day(date_str, params, source_dir, output_dir, chunk)
+        except (FileNotFoundError, ValueError, KeyError) as e:
+            print(f"[SKIP] {date_str}: {e}")
+            continue
+        if result is None:
+            print(f"[SKIP] {date_str}: 找不到 Step 0 輸出 ({output_dir}/驗證{date_str}_*PROD.csv)")
+            continue
+
+        for term_stats in result["stats"].values():
+            for key in counts:
+                counts[key] += term_stats[key]
+            for key in totals:
+                totals[key] += term_stats[key]
+
+        vix = result["ori_vix"]
+        base = vix[base_idx]
+        ok = (vix > 0) & (base > 0)
+        diff = np.where(ok, np.abs(vix - base), 0.0)
+        dev_base += diff.sum(axis=1)
+        max_base = np.maximum(max_base, diff.max(axis=1))
+        n_base += ok.sum(axis=1)
+
+        prod = _prod_ori_vix(date_str, source_dir, DEFAULT_SCHEDULE)
+        if prod is not None:
+            ok = (vix > 0) & (prod > 0)
+            dev_prod += np.where(ok, np.abs(vix - prod), 0.0).sum(axis=1)
+            n_prod += ok.sum(axis=1)
+        days.append(date_str)
+        print(f"[{datetime.now().strftime('%H:%M:%S')}] {date_str}: {k} 組參數 ({time.perf_counter() - t0:.2f}s)")
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        report = pd.DataFrame(params)
+        report["last_outlier_rate"] = counts["last_outlier"] / max(totals["last_valid"], 1)
+        report["min_outlier_rate"] = counts["min_outlier"] / max(totals["min_valid"], 1)
+        report["replacement_share"] = counts["replacement"] / max(totals["rows"], 1)
+        report["vix_mad_base"] = dev_base / n_base
+        report["vix_max_base"] = max_base
+        report["vix_mad_prod"] = dev_prod / n_prod
+    report["is_default"] = False
+    report.loc[base_idx, "is_default"] = True
+    report["days"] = len(days)
+    return report
+
+
+# =====================================================================
+# 與 add_ema_and_outlier_detection 比對
+# =====================================================================
+def check_against_legacy(seeds=(0, 1, 2)):
+    """預設參數下，以合成資料經 equivalence_harness (ema / sweep) 比對 Q_hat 與來源是否與 add_ema_and_outlier_detection 一致"""
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "validation"))
+    from equivalence_harness import run_suite, print_report
+
+    all_ok = True
+    for seed in seeds:
+        for report in run_suite("sweep", stages=["ema"], synthetic_kwargs={"seed": seed}):
+            print(f"\n合成資料 seed={seed}")
+            print_report(report)
+            all_ok &= report["passed"]
+    return all_ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Step 0 篩選參數 (ALPHA / GAMMA / LAMBDA) 敏感度分析")
+    parser.add_argument("--start", type=str, help="開始日期 (YYYYMMDD)")
+    parser.add_argument("--end", type=str, help="結束日期 (YYYYMMDD)")
+    parser.add_argument("--source", type=str, default="資料來源", help="輸入資料夾路徑")
+    parser.add_argument("--output", type=str, default="output", help="Step 0 輸出資料夾 (報告也寫在這裡)")
+    parser.add_argument("--alpha", type=float, nargs="+", help="ALPHA 候選值")
+    parser.add_argument("--gamma-0", type=float, nargs="+", help="GAMMA_0 候選值")
+    parser.add_argument("--gamma-1", type=float, nargs="+", help="GAMMA_1 候選值")
+    parser.add_argument("--gamma-2", type=float, nargs="+", help="GAMMA_2 候選值")
+    parser.add_argument("--lambda", dest="lam", type=float, nargs="+", help="LAMBDA 候選值")
+    parser.add_argument("--chunk", type=int, default=DEFAULT_CHUNK, help="一次遞迴的參數組數")
+    parser.add_argument("--check", action="store_true", help="以合成資料比對預設參數與 add_ema_and_outlier_detection")
+    args = parser.parse_args()
+
+    if args.check:
+        sys.exit(0 if check_against_legacy() else 1)
+    if not args.start or not args.end:
+        parser.error("需要 --start 與 --end (或使用 --check)")
+
+    params = param_grid(ALPHA=args.alpha, GAMMA_0=args.gamma_0, GAMMA_1=args.gamma_1,
+                        GAMMA_2=args.gamma_2, LAMBDA=args.lam)
+    print(f"共 {len(params)} 組參數，區間 {args.start} ~ {args.end}")
+    t0 = time.perf_counter()
+    report = run_sweep(args.start, args.end, params, args.source, args.output, args.chunk)
+    if report["days"].iloc[0] == 0:
+        print("區間內沒有可用的 Step 0 輸出")
+        return
+
+    out_path = os.path.join(args.output, f"param_sweep_{args.start}_{args.end}.csv")
+    report.to_csv(out_path, index=False, encoding="utf-8-sig")
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(report.sort_values("vix_mad_base").to_string(index=False, float_format=lambda v: f"{v:.6g}"))
+    print(f"\n報告已寫入 {out_path} (總耗時 {time.perf_counter() - t0:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
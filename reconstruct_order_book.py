@@ -25,18 +25,25 @@ import sys
 pd.set_option('display.max_columns', None)
 pd.set_option('display.width', 1000)
 
+# 週三到期的台指週選擇權 (第 1、2、4、5 週；第 3 週即月選 TXO)，月份 / 年份碼規則與 TXO 相同
+WEEKLY_PRODUCTS = ('TX1', 'TX2', 'TX4', 'TX5')
+# 台指期貨 (遠期價格 F 用)：PP + T + CC 共 5 碼 (如 TXFA6)，月份碼 A-L、年份碼規則與 TXO 相同
+FUTURES_PRODUCTS = ('TXF',)
+
 class ProductParser:
     """
     負責解析商品代號 (Product ID) 的類別。
-    遵循規則: PP + T + AAAAA + CC (共 10 碼)
+    遵循規則: PP + T + AAAAA + CC (共 10 碼)；期貨 (FUTURES_PRODUCTS) 為 PP + T + CC (共 5 碼)
     """
     
-    def __init__(self, target_product='TXO'):
+    def __init__(self, target_product='TXO', extra_products=()):
         """
         初始化解析器。
         :param target_product: 目標商品代碼，預設為 'TXO' (台指選擇權)。
+        :param extra_products: 額外接受的商品代碼 (如週選 WEEKLY_PRODUCTS、期貨 FUTURES_PRODUCTS)，Product 欄位保留原代碼以區分到期日。
         """
         self.target_product = target_product
+        self.accepted_products = {target_product, *extra_products}
         # 建立月份代碼對應表
         # Call: A-L (1-12月)
         # Put: M-X (1-12月)
@@ -49,9 +56,12 @@ class ProductParser:
         
         :param prod_id: 商品代號字串 (如 'TXO22400A6')
         :return: 字典，包含解析後的欄位 (Product, Strike, CP, Year, Month, YYYYMM)，若解析失敗返回 None。
+                 期貨的 Strike / CP 為 None。
         """
         try:
             prod_id = prod_id.strip()
+            if len(prod_id) == 5:
+                return self._parse_futures(prod_id)
             if len(prod_id) != 10:
                 return None
             
@@ -65,7 +75,7 @@ class ProductParser:
             # 使用者需求: 只有 'O' 是標準商品，其他可能是週選或調整
             # 我們先只鎖定 'O' (標準月選)，除非未來需要納入週選
             product_code = pp + t
-            if product_code != self.target_product:
+            if product_code not in self.accepted_products:
                 return None
                 
             # 2. 解析履約價
@@ -110,19 +120,41 @@ class ProductParser:
         except Exception:
             return None
 
+    def _parse_futures(self, prod_id):
+        """期貨代號 PP + T + CC (如 'TXFA6')，只接受 FUTURES_PRODUCTS 中且已列入 accepted_products 者"""
+        product_code = prod_id[0:3]
+        if product_code not in FUTURES_PRODUCTS or product_code not in self.accepted_products:
+            return None
+        month = self.call_month_map.get(prod_id[3])
+        if month is None or not prod_id[4].isdigit():
+            return None
+        year = int("202" + prod_id[4])
+        return {
+            'Product': product_code,
+            'Strike': None,
+            'CP': None,
+            'Year': year,
+            'Month': month,
+            'YYYYMM': year * 100 + month,
+            'ProdID': prod_id
+        }
+
 class RawDataLoader:
     """
     負責讀取與前處理原始Tick資料的類別。
     """
     
-    def __init__(self, raw_data_dir, target_date):
+    def __init__(self, raw_data_dir, target_date, include_weeklies=False, include_futures=False):
         """
         :param raw_data_dir: 原始 CSV 檔案所在的資料夾路徑。
         :param target_date: 目標交易日期字串 (如 '20251231')，用於嚴格過濾。
+        :param include_weeklies: 是否一併解析週選 (WEEKLY_PRODUCTS)，只影響 load_all。
+        :param include_futures: 是否一併解析台指期貨 (FUTURES_PRODUCTS)，只影響 load_all。
         """
         self.raw_data_dir = raw_data_dir
         self.target_date = str(target_date)
-        self.parser = ProductParser()
+        extra = (WEEKLY_PRODUCTS if include_weeklies else ()) + (FUTURES_PRODUCTS if include_futures else ())
+        self.parser = ProductParser(extra_products=extra)
         
     def load_and_filter(self):
         """
@@ -132,11 +164,49 @@ class RawDataLoader:
             - next_df: 次近月合約的 Ticks DataFrame
             - term_info: 字典，紀錄判斷出的近月與次近月月份 (YYYYMM)
         """
+        full_df = self.load_all()
+        if full_df is None:
+            return None, None, None
+        # 近月 / 次近月只看月選 TXO
+        full_df = full_df[full_df['Product'] == self.parser.target_product]
+            
+        # 3. 動態判斷 Near/Next Term (Dynamic Term Sorting)
+        # 掃描所有出現的 YYYYMM，排序
+        all_months = sorted(full_df['YYYYMM'].unique())
+        print(f"偵測到的到期月份: {all_months}")
+        
+        if len(all_months) < 2:
+            print("錯誤: 資料中不足兩個到期月份，無法區分近月與次近月。")
+            return None, None, None
+            
+        near_term = all_months[0]
+        next_term = all_months[1]
+        
+        term_info = {'Near': near_term, 'Next': next_term}
+        print(f"動態判斷結果: 近月(Near)={near_term}, 次近月(Next)={next_term}")
+        
+        # 4. 分割資料
+        near_df = full_df[full_df['YYYYMM'] == near_term].copy()
+        next_df = full_df[full_df['YYYYMM'] == next_term].copy()
+        
+        # 建立索引以加速後續搜尋 (Strike, SeqNo)
+        # 後續篩選邏輯: 找 Time/SeqNo <= Snapshot Time/SeqNo
+        # 這裡我們主要依 sequence number 排序
+        near_df.sort_values('svel_i081_seqno', inplace=True)
+        next_df.sort_values('svel_i081_seqno', inplace=True)
+        
+        return near_df, next_df, term_info
+
+    def load_all(self):
+        """
+        讀取並解析所有可辨識商品的 Ticks (不區分到期月份)。
+        :return: DataFrame (含 Product, Strike, CP, Year, Month, YYYYMM, ProdID 欄位)，失敗時返回 None。
+        """
         all_files = glob.glob(os.path.join(self.raw_data_dir, "*.csv"))
         if not all_files:
             print(f"錯誤: 在 {self.raw_data_dir} 找不到任何 CSV 檔案。")
-            return None, None, None
-            
+            return None
+
         print(f"找到 {len(all_files)} 個原始資料檔，開始讀取...")
         
         df_list = []
@@ -172,7 +242,7 @@ class RawDataLoader:
                 print(f"  - 讀取失敗: {e}")
         
         if not df_list:
-            return None, None, None
+            return None
             
         full_df = pd.concat(df_list, ignore_index=True)
         print(f"原始資料合併完成，共 {len(full_df)} 筆 Ticks。")
@@ -194,54 +264,39 @@ class RawDataLoader:
         
         if meta_df.empty:
             print("錯誤: 無法解析任何 Product ID。")
-            return None, None, None
+            return None
 
         # 將解析結果併回原始資料
         full_df = full_df.merge(meta_df, left_on='svel_i081_prod_id', right_on='ProdID', how='inner')
         print(f"商品解析完成，剩餘有效 Ticks: {len(full_df)}")
-        
-        # 3. 動態判斷 Near/Next Term (Dynamic Term Sorting)
-        # 掃描所有出現的 YYYYMM，排序
-        all_months = sorted(full_df['YYYYMM'].unique())
-        print(f"偵測到的到期月份: {all_months}")
-        
-        if len(all_months) < 2:
-            print("錯誤: 資料中不足兩個到期月份，無法區分近月與次近月。")
-            return None, None, None
-            
-        near_term = all_months[0]
-        next_term = all_months[1]
-        
-        term_info = {'Near': near_term, 'Next': next_term}
-        print(f"動態判斷結果: 近月(Near)={near_term}, 次近月(Next)={next_term}")
-        
-        # 4. 分割資料
-        near_df = full_df[full_df['YYYYMM'] == near_term].copy()
-        next_df = full_df[full_df['YYYYMM'] == next_term].copy()
-        
-        # 建立索引以加速後續搜尋 (Strike, SeqNo)
-        # 後續篩選邏輯: 找 Time/SeqNo <= Snapshot Time/SeqNo
-        # 這裡我們主要依 sequence number 排序
-        near_df.sort_values('svel_i081_seqno', inplace=True)
-        next_df.sort_values('svel_i081_seqno', inplace=True)
-        
-        return near_df, next_df, term_info
+        return full_df
 
-        return near_df, next_df, term_info
+# 排程快取: {PROD 檔絕對路徑: ((mtime, size), (schedule_df, initial_sys_id, prod_strikes))}
+# 同一個行程內重複載入同一份 PROD 檔 (Near/Next 重跑、Viewer、驗證工具) 時直接取用
+_SCHEDULE_CACHE = {}
 
 class SnapshotScheduler:
     """
     負責讀取 PROD 檔案並建立快照排程 (Schedule)。
     """
+    # 排程只需要這三個欄位，其餘 40 多欄不讀取
+    SCHEDULE_COLUMNS = ['time', 'strike', 'snapshot_sysID']
+
     def __init__(self, prod_file_path):
         self.prod_file_path = prod_file_path
         
-    def load_schedule(self):
+    def load_schedule(self, quiet=False):
         """
         讀取 NearPROD 或 NextPROD，提取 Snapshot 觸發點與 Strike 列表。
         
+        只讀取 time / strike / snapshot_sysID 三個欄位，以向量化方式去重；
+        解析結果依檔案 (路徑, mtime, size) 快取，檔案未變動時不會重新讀取。
+        
+        :param quiet: 不列印進度訊息 (錯誤訊息仍會列印)；Viewer 等多執行緒環境使用
+        
         :return: tuple (schedule_df, initial_sys_id, prod_strikes)
-            - schedule_df: DataFrame (columns: ['time_obj', 'sys_id', 'orig_time_str'])
+            - schedule_df: DataFrame (columns: ['time_int', 'sys_id', 'orig_time_str'])
+                time_int 為整數時間 (如 84515)，orig_time_str 為 PROD 檔原始字串
             - initial_sys_id: Line 2 的 SysID (054500 的 Target_SysID)，作為計算 084515 的 prev_sys_id
             - prod_strikes: 排序後的 Strike 列表 (int)，來自 PROD 檔案，全天固定
         """
@@ -249,77 +304,89 @@ class SnapshotScheduler:
             print(f"錯誤: 找不到 PROD 檔案: {self.prod_file_path}")
             return pd.DataFrame(), 0, []
             
-        print(f"讀取排程檔: {os.path.basename(self.prod_file_path)}")
-        
-        schedule_list = []
-        initial_sys_id = 0  # Line 2 的 SysID，作為第一筆的 prev_sys_id
+        abs_path = os.path.abspath(self.prod_file_path)
+        stat = os.stat(abs_path)
+        file_sig = (stat.st_mtime, stat.st_size)
+        cached = _SCHEDULE_CACHE.get(abs_path)
+        if cached is not None and cached[0] == file_sig:
+            schedule_df, initial_sys_id, prod_strikes = cached[1]
+            if not quiet:
+                print(f"排程快取命中: {os.path.basename(self.prod_file_path)}")
+            return schedule_df.copy(), initial_sys_id, list(prod_strikes)
+            
+        if not quiet:
+            print(f"讀取排程檔: {os.path.basename(self.prod_file_path)}")
         
-        with open(self.prod_file_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
+        # 1. 只讀 Header 與 Line 2
+        with open(abs_path, 'r', encoding='utf-8') as f:
+            header_line = f.readline()
+            line2 = f.readline()
+            
+        if not line2:
+            return pd.DataFrame(), 0, []
             
-        if len(lines) < 2:
+        header_parts = header_line.strip().split('\t')
+        if any(c not in header_parts for c in self.SCHEDULE_COLUMNS):
+            print("錯誤: PROD 檔缺少 time, snapshot_sysID 或 strike 欄位")
             return pd.DataFrame(), 0, []
             
-        # 1. 處理 Line 2 特例 (054500 Start Row)
+        # 處理 Line 2 特例 (054500 Start Row)
         # 格式: 84500 <tab> 22934
         # 這個 SysID 是計算第一筆 (084515) 時的 prev_sys_id
-        line2_parts = lines[1].strip().split('\t')
+        initial_sys_id = 0
+        line2_parts = line2.strip().split('\t')
         if len(line2_parts) >= 2:
             start_time_str = line2_parts[0].zfill(6) # 補零: 84500 -> 084500
             initial_sys_id = int(line2_parts[1])
-            print(f"  初始 SysID (Line 2, {start_time_str}): {initial_sys_id}")
+            if not quiet:
+                print(f"  初始 SysID (Line 2, {start_time_str}): {initial_sys_id}")
         
-        # 2. 處理 Line 3+ 標準列
-        # 抓取 Header 索引
-        header_parts = lines[0].strip().split('\t')
-        try:
-            time_idx = header_parts.index('time')
-            sys_id_idx = header_parts.index('snapshot_sysID')
-            strike_idx = header_parts.index('strike')  # 第一個 strike 欄位
-        except ValueError:
-            print("錯誤: PROD 檔缺少 time, snapshot_sysID 或 strike 欄位")
-            return pd.DataFrame(), initial_sys_id, []
-            
-        # 遍歷剩餘行數
+        # 2. 處理 Line 3+ 標準列：欄位選擇式讀取
         # 注意: PROD 檔是每個 Strike 一行，所以 Time/SysID 會重複
-        # 我們需要去重 (Deduplicate)，只取每個時間點一次
-        # 同時擷取全天固定的 Strike 列表
-        seen_times = set()
-        seen_strikes = set()
-        first_time_found = False
-            
-        for line in lines[2:]:
-            parts = line.strip().split('\t')
-            if len(parts) <= max(time_idx, sys_id_idx, strike_idx):
-                continue
-                
-            t_str = parts[time_idx].strip()
-            
-            # 擷取 Strike（只需從第一個時間點擷取，因為全天固定）
-            if not first_time_found or (len(seen_times) == 1 and t_str in seen_times):
-                try:
-                    strike_val = int(parts[strike_idx])
-                    seen_strikes.add(strike_val)
-                except ValueError:
-                    pass
-                first_time_found = True
-            
-            # PROD 檔 Time 可能是 084515
-            if t_str not in seen_times:
-                s_id = int(parts[sys_id_idx])
-                t_obj = datetime.strptime(t_str, "%H%M%S")
-                
-                schedule_list.append({
-                    'time_obj': t_obj,
-                    'sys_id': s_id,
-                    'orig_time_str': t_str
-                })
-                seen_times.add(t_str)
-                
-        prod_strikes = sorted(seen_strikes)
-        df = pd.DataFrame(schedule_list)
-        print(f"排程載入完成，共 {len(df)} 個快照時間點，{len(prod_strikes)} 個 Strike。")
-        return df, initial_sys_id, prod_strikes
+        df = pd.read_csv(
+            abs_path, sep='\t', encoding='utf-8',
+            usecols=self.SCHEDULE_COLUMNS,
+            skiprows=[1],
+            dtype={'time': str},
+        )
+        df['time'] = df['time'].str.strip()
+        df['snapshot_sysID'] = pd.to_numeric(df['snapshot_sysID'], errors='coerce')
+        df = df.dropna(subset=['time', 'snapshot_sysID'])
+        
+        if df.empty:
+            return pd.DataFrame(), initial_sys_id, []
+        
+        # 擷取 Strike（只需從第一個時間點擷取，因為全天固定）
+        first_time = df['time'].iloc[0]
+        first_strikes = pd.to_numeric(df.loc[df['time'] == first_time, 'strike'], errors='coerce')
+        prod_strikes = sorted(int(k) for k in first_strikes.dropna().unique())
+        
+        # 每個時間點只取第一次出現的 SysID
+        first_rows = df.drop_duplicates(subset='time', keep='first')
+        schedule_df = pd.DataFrame({
+            'time_int': first_rows['time'].astype('int64').to_numpy(),
+            'sys_id': first_rows['snapshot_sysID'].astype('int64').to_numpy(),
+            'orig_time_str': first_rows['time'].to_numpy(dtype=object),
+        })
+        
+        _SCHEDULE_CACHE[abs_path] = (file_sig, (schedule_df, initial_sys_id, prod_strikes))
+        if not quiet:
+            print(f"排程載入完成，共 {len(schedule_df)} 個快照時間點，{len(prod_strikes)} 個 Strike。")
+        return schedule_df.copy(), initial_sys_id, list(prod_strikes)
+
+    @staticmethod
+    def to_schedule_times(schedule_df):
+        """
+        將 schedule_df 轉為 reconstruct_all 所需的 [(time_int, sys_id, time_str), ...]
+        (直接 zip 欄位，不逐時間點過濾)
+        """
+        if schedule_df.empty:
+            return []
+        return list(zip(
+            schedule_df['time_int'].tolist(),
+            schedule_df['sys_id'].tolist(),
+            schedule_df['orig_time_str'].tolist(),
+        ))
 
 class SnapshotReconstructor:
     """
@@ -382,7 +449,7 @@ class SnapshotReconstructor:
             - 若 Spread 相同，取 SeqNo 最大的（最新的）
             
         Args:
-            target_time_obj: 目標時間 (datetime)
+            target_time_obj: 目標時間 (僅供識別，不參與計算；可為 time_int 或 datetime)
             target_sys_id: 當前快照的 SysID (SeqNo 上限)
             prev_sys_id: 前一個快照的 SysID (用於計算區間起始，預設為 0)
             prod_strikes: PROD 檔案的 Strike 列表 (sorted int list)。
@@ -515,7 +582,7 @@ class SnapshotReconstructor:
         
         return result
 
-    def reconstruct_all(self, schedule_times, initial_sys_id, prod_strikes=None):
+    def reconstruct_all(self, schedule_times, initial_sys_id, prod_strikes=None, quiet=False):
         """
         【增量式】一次重建所有時間點的委託簿快照。
         
@@ -526,11 +593,13 @@ class SnapshotReconstructor:
         4. 全部時間點的結果累積為 flat list，最後一次建 DataFrame
         
         Args:
-            schedule_times: list of (time_obj, sys_id, time_str) tuples，依時間排序
+            schedule_times: list of (time_int, sys_id, time_str) tuples，依時間排序
+                            (可由 SnapshotScheduler.to_schedule_times 產生)
             initial_sys_id: 初始 SysID（排程的第一個 SysID，用作第一個時間點的 prev）
             prod_strikes: PROD 檔案的 Strike 列表 (sorted int list)。
                           若提供，則以此為模板，確保每個時間點都有完整的 strike × CP 組合。
                           若為 None，則沿用原有行為（從 Tick 資料推導）。
+            quiet: 不列印進度訊息
             
         Returns:
             單一 DataFrame，包含所有時間點的快照（含 Time, Snapshot_SysID 欄位）
@@ -540,7 +609,8 @@ class SnapshotReconstructor:
         # =================================================================
         # 預處理：排序 + 轉為 NumPy 陣列（只做一次）
         # =================================================================
-        print("增量重建：預處理資料中...")
+        if not quiet:
+            print("增量重建：預處理資料中...")
         
         # 確保按 SeqNo 排序
         ticks_sorted = self.ticks_df.sort_values('svel_i081_seqno').reset_index(drop=True)
@@ -563,7 +633,8 @@ class SnapshotReconstructor:
         
         n_ticks = len(seqnos)
         n_times = len(schedule_times)
-        print(f"  總 ticks 數: {n_ticks}, 時間點數: {n_times}")
+        if not quiet:
+            print(f"  總 ticks 數: {n_ticks}, 時間點數: {n_times}")
         
         # =================================================================
         # 有效報價判定（inline，避免函式呼叫開銷）
@@ -592,7 +663,7 @@ class SnapshotReconstructor:
         
         global_processed_up_to = init_end_idx
         
-        for t_idx, (time_obj, target_sys_id, time_str) in enumerate(schedule_times):
+        for t_idx, (time_int, target_sys_id, time_str) in enumerate(schedule_times):
             # Step B: 二分搜尋找新增 ticks 範圍
             target_end_idx = int(np.searchsorted(seqnos, target_sys_id, side='right'))
             
@@ -769,12 +840,13 @@ class SnapshotReconstructor:
                 })
             
             # 進度報告
-            if (t_idx + 1) % 100 == 0 or t_idx == 0:
+            if not quiet and ((t_idx + 1) % 100 == 0 or t_idx == 0):
                 print(f"  增量重建進度: {t_idx + 1}/{n_times} ({time_str})")
         
         # 最後一次性建 DataFrame（避免每個時間點都建一次）
         result_df = pd.DataFrame(all_rows)
-        print(f"  增量重建完成: 共 {n_times} 個時間點, {len(result_df)} 筆")
+        if not quiet:
+            print(f"  增量重建完成: 共 {n_times} 個時間點, {len(result_df)} 筆")
         return result_df
 
 from datetime import datetime, timedelta
@@ -940,7 +1012,7 @@ def main():
     # scheduler = SnapshotScheduler(os.path.join(prod_dir, f"NextPROD_{target_date}.tsv"))
     # schedule = scheduler.load_schedule()
     # target_row = schedule[schedule['orig_time_str'] == TARGET_TIME].iloc[0]
-    # t_obj = target_row['time_obj']
+    # t_obj = datetime.strptime(target_row['orig_time_str'].zfill(6), "%H%M%S")
     # sys_id = target_row['sys_id']
     
     # investigate_strike(next_ticks, t_obj, sys_id, 30800, 'Call', 'Next Call Audit')
@@ -963,14 +1035,14 @@ def main():
             print(f"  找不到時間點 {TARGET_TIME}")
             continue
             
-        t_obj = target_row.iloc[0]['time_obj']
+        t_int = target_row.iloc[0]['time_int']
         sys_id = target_row.iloc[0]['sys_id']
         print(f"  Snapshot Point: Time={TARGET_TIME}, SysID={sys_id}")
         
         # 重建 (測試用：使用 prev_sys_id=0，即搜尋從頭到 sys_id 的所有報價)
         print("  Reconstructing Order Book...")
         reconstructor = SnapshotReconstructor(ticks)
-        snapshot = reconstructor.reconstruct_at(t_obj, sys_id, prev_sys_id=0)
+        snapshot = reconstructor.reconstruct_at(t_int, sys_id, prev_sys_id=0)
         
         # 準備官方資料
         off_calls_df, off_puts_df = get_official_data(prod_path, TARGET_TIME)
@@ -4,6 +4,8 @@ VIX 計算批次執行與驗證腳本 (Batch Runner)
 功能：
 1. 指定日期範圍，逐日執行 Near/Next Term 的 VIX 計算 (Step 0 ~ Step 2)
 2. 每日跑完後自動進行數值驗證 (Verify Parity)
+   - 預設由 Step 0 以 --parity 在記憶體中直接比對 PROD 並輸出差異報告
+   - --legacy-verify 則沿用另外執行 verify_full_day.py 的舊流程
 3. 紀錄每一步驟的執行狀態與一致率
 
 使用方式：
@@ -11,7 +13,8 @@ VIX 計算批次執行與驗證腳本 (Batch Runner)
 
 相依性：
     - step0_process_quotes.py (整合了有效報價篩選、EMA 計算與 Outlier 判定)
-    - validation/quick_verify_numeric.py (Verification)
+    - validation/parity_sink.py (Step 0 內嵌驗證)
+    - validation/verify_full_day.py (--legacy-verify)
 """
 import subprocess
 import os
@@ -20,6 +23,9 @@ import argparse
 from datetime import datetime, timedelta
 import pandas as pd
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "validation"))
+from results_store import load_summary
+
 # 強制將標準輸出切換為 utf-8，避免 Windows 預設 CP950 導致中文亂碼
 if sys.stdout.encoding != 'utf-8':
     sys.stdout.reconfigure(encoding='utf-8')
@@ -69,12 +75,46 @@ def verify_date_full(date_str):
         print(f"[Error] 驗證腳本執行錯誤: {e}")
         return False, False, str(e)
 
+def check_parity_report(date_str, truncated=False):
+    """
+    讀取 Step 0 --parity 產出的差異彙總 (validation_store/{date}.json) 判定是否通過
+
+    彙總不存在時改讀 validation_diff_{date}.csv。
+    truncated=True (有設定差異上限) 時，Next Term 可能因達上限而未比對，不視為通過；
+    彙總本身標記 truncated 或無法確認 (None) 時亦同
+    """
+    summary = load_summary(date_str)
+    if summary is not None:
+        counts = {term: s['by_column'] for term, s in summary['terms'].items()}
+        truncated = truncated or summary.get('truncated') is not False
+    else:
+        report_path = os.path.join("output", f"validation_diff_{date_str}.csv")
+        if not os.path.exists(report_path):
+            print(f"[Error] 找不到差異報告: {report_path}")
+            return False, False, False
+        diff_df = pd.read_csv(report_path, dtype=str, encoding='utf-8-sig')
+        counts = {}
+        for (term, column), count in diff_df.groupby(['Term', 'Column'], sort=False).size().items():
+            counts.setdefault(term, {})[column] = int(count)
+
+    if not counts:
+        print(f"[PASS] {date_str} 全天驗證通過 (100% 一致)")
+        return True, True, True
+
+    print(f"[FAIL] {date_str} 驗證失敗/有差異")
+    for term, columns in counts.items():
+        for column, count in columns.items():
+            print(f"   {term} 發現差異: {column} - {count} 筆")
+    return False, 'Near' not in counts, (not truncated) and 'Next' not in counts
+
 def main():
     parser = argparse.ArgumentParser(description="VIX 批次計算與驗證")
     parser.add_argument("--date", type=str, help="單一執行日期 (YYYYMMDD)")
     parser.add_argument("--start", type=str, help="開始日期 (YYYYMMDD)")
     parser.add_argument("--end", type=str, help="結束日期 (YYYYMMDD)")
     parser.add_argument("--stop-on-error", action="store_true", help="遇到錯誤是否停止 (預設: 繼續跑下一天)")
+    parser.add_argument("--max-mismatch", type=int, default=None, help="每日差異上限，達上限即停止該日比對 (快速分流)")
+    parser.add_argument("--legacy-verify", action="store_true", help="改用另外執行 verify_full_day.py 的舊驗證流程")
     
     args = parser.parse_args()
     
@@ -114,13 +154,22 @@ def main():
         
         # 1. 執行整合處理 (有效報價篩選 + EMA 計算 + Outlier 判定)
         cmd_process = f"python -u step0_process_quotes.py {date_str}"
+        if not args.legacy_verify:
+            cmd_process += " --parity"
+            if args.max_mismatch is not None:
+                cmd_process += f" --max-mismatch {args.max_mismatch}"
         if not run_command(cmd_process, f"Step 0: 報價處理與異常值偵測 ({date_str})"):
             success = False
                 
         # 3. 驗證 (Near & Next 一併驗證)
         verify_success = False
+        near_ok = next_ok = False
         if success:
-            verify_success, _, _ = verify_date_full(date_str)
+            if args.legacy_verify:
+                verify_success, _, _ = verify_date_full(date_str)
+                near_ok = next_ok = verify_success
+            else:
+                verify_success, near_ok, next_ok = check_parity_report(date_str, truncated=args.max_mismatch is not None)
             
             if not verify_success:
                 success = False
@@ -133,8 +182,8 @@ def main():
         summary.append({
             "date": date_str, 
             "status": status,
-            "near": "OK" if verify_success else "Check",
-            "next": "OK" if verify_success else "Check"
+            "near": "OK" if near_ok else "Check",
+            "next": "OK" if next_ok else "Check"
         })
         
         if not success and args.stop_on_error:
@@ -0,0 +1,232 @@
+"""
+單一序列快速重播 (Single-Series Replay)
+
+當 validation_diff 出現 (date, term, strike, CP, time) 的差異時，
+原本只能重跑整個 step0_process_quotes.py，或用 validation/analyze_gamma_*.py
+這類腳本重新讀取所有完整 CSV。
+
+Step 0 的重建與 EMA / Gamma / Outlier / Q_hat 判定都是「逐序列」獨立計算，
+因此只需該商品的 ticks 即可得到與全天計算完全相同的結果：
+    1. 從 Tick 索引 (Viewer/tick_index.py) 取出單一商品的 ticks (mmap，不讀整個 Tick 檔)
+    2. 以 PROD 排程 (SnapshotScheduler 快取) 重建該序列的 Q_Last / Q_Min 時間軸
+    3. 重播 EMA / Gamma / Outlier / Q_hat，保留每一步的判斷過程欄位
+
+用法:
+    python series_replay.py 20251231 Near 27400 Put
+    python series_replay.py 20251231 Near 27400 Put --time 84530 --window 3
+
+Viewer 的 /api/explore/replay 亦使用本模組。
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, PROJECT_ROOT)
+# Viewer 目錄放在最後，避免遮蔽專案根目錄的同名模組
+sys.path.append(os.path.join(PROJECT_ROOT, 'Viewer'))
+
+from reconstruct_order_book import SnapshotScheduler, SnapshotReconstructor
+from step0_process_quotes import prepare_snapshot_quotes, add_ema_and_outlier_detection
+from vix_utils import DataPathManager
+from tick_index import get_tick_index
+from tick_parser import TickLoader
+
+# 重播結果中說明「為什麼」的欄位 (依計算順序)
+TRACE_COLUMNS = [
+    'Time', 'Snapshot_SysID', 'Prev_Snapshot_SysID', 'Tick_Count',
+    'Q_last_Bid', 'Q_last_Ask', 'Q_last_SysID', 'Q_last_Valid',
+    'Q_min_Bid', 'Q_min_Ask', 'Q_min_SysID', 'Q_min_Valid',
+    'EMA', 'EMA_Process',
+    'Q_Last_Valid_Gamma', 'Q_Min_Valid_Gamma', 'Gamma_Process',
+    'Q_Last_Valid_Is_Outlier', 'Q_Last_Valid_Outlier_Reason',
+    'Q_Min_Valid_Is_Outlier', 'Q_Min_Valid_Outlier_Reason',
+    'Q_hat_Bid', 'Q_hat_Ask', 'Q_hat_Mid', 'Q_hat_Source',
+]
+
+
+class SeriesReplay:
+    """以 Tick 索引重播單一 (term, strike, CP) 序列的 Step 0 計算"""
+
+    def __init__(self, raw_base_dir=None, prod_base_dir=None):
+        paths = DataPathManager()
+        self.raw_base_dir = raw_base_dir or paths.raw_base_dir
+        self.prod_base_dir = prod_base_dir or paths.prod_base_dir
+        self.tick_loader = TickLoader(self.raw_base_dir)
+
+    # -----------------------------------------------------------------
+    # 輸入資料
+    # -----------------------------------------------------------------
+    def prod_path(self, date, term):
+        return os.path.join(self.prod_base_dir, date, f"{term}PROD_{date}.tsv")
+
+    def load_schedule(self, date, term, quiet=False):
+        """PROD 排程 (同一行程內依檔案簽章快取)"""
+        schedule, initial_sys_id, prod_strikes = SnapshotScheduler(self.prod_path(date, term)).load_schedule(quiet=quiet)
+        if schedule.empty:
+            raise FileNotFoundError(f"找不到或無法解析 PROD 排程: {self.prod_path(date, term)}")
+        return schedule, initial_sys_id, prod_strikes
+
+    def load_ticks(self, date, term, strike, cp):
+        """
+        從 Tick 索引取出單一商品的 ticks，欄位格式同 RawDataLoader 的輸出
+
+        與 RawDataLoader 相同：只保留 yymmdd == date 的資料 (索引無日期欄時不過濾)
+        """
+        tick_file, prod_id = self.tick_loader.resolve_tick_file(date, term, strike, cp)
+        if not tick_file:
+            raise FileNotFoundError(f"找不到 Tick 檔 ({prod_id})")
+
+        cols = get_tick_index(tick_file).query(prod_id, -1, np.iinfo(np.int64).max)
+        keep = (cols['date'] == int(date)) | (cols['date'] < 0)
+        ticks = pd.DataFrame({
+            'svel_i081_yymmdd': str(date),
+            'svel_i081_prod_id': prod_id,
+            'svel_i081_time': [str(t) for t in cols['time'][keep].tolist()],
+            'svel_i081_best_buy_price1': np.asarray(cols['bid'][keep], dtype=float),
+            'svel_i081_best_sell_price1': np.asarray(cols['ask'][keep], dtype=float),
+            'svel_i081_seqno': np.asarray(cols['seqno'][keep], dtype=np.int64),
+        })
+        ticks['Strike'] = int(strike)
+        ticks['CP'] = cp
+        ticks['ProdID'] = prod_id
+        return ticks, prod_id
+
+    # -----------------------------------------------------------------
+    # 重播
+    # -----------------------------------------------------------------
+    def replay(self, date, term, strike, cp, quiet=True):
+        """
+        重播單一序列全天的 Step 0 計算
+
+        quiet=True 時各引擎不列印進度 (以參數關閉，不替換全域 sys.stdout，
+        Viewer 多執行緒處理請求時不影響其他請求的輸出)
+
+        Returns:
+            dict: {
+                'prod_id', 'trace' (DataFrame，每個快照一列，含所有中間欄位),
+                'ticks' (DataFrame)，'timings' (各階段耗時 ms)
+            }
+        """
+        strike = int(strike)
+        cp = cp.capitalize()
+        timings = {}
+        t0 = time.perf_counter()
+
+        schedule, initial_sys_id, _ = self.load_schedule(date, term, quiet=quiet)
+        schedule_times = SnapshotScheduler.to_schedule_times(schedule)
+        ticks, prod_id = self.load_ticks(date, term, strike, cp)
+        timings['load_ms'] = (time.perf_counter() - t0) * 1000
+
+        t1 = time.perf_counter()
+        # 以單一 strike 為模板，確保沒有 tick 的時間點也有列
+        snapshot_df = SnapshotReconstructor(ticks).reconstruct_all(
+            schedule_times, initial_sys_id, prod_strikes=[strike], quiet=quiet)
+        snapshot_df = snapshot_df[snapshot_df['CP'] == cp].reset_index(drop=True)
+        timings['reconstruct_ms'] = (time.perf_counter() - t1) * 1000
+
+        t2 = time.perf_counter()
+        quotes = prepare_snapshot_quotes(snapshot_df, term)
+        trace = add_ema_and_outlier_detection(quotes, term, quiet=quiet)
+        timings['ema_outlier_ms'] = (time.perf_counter() - t2) * 1000
+
+        # 每個快照區間 (前一快照 SysID, 本快照 SysID] 內的新 tick 數 (前一快照依排程順序)
+        sched_sys = schedule['sys_id'].to_numpy(dtype=np.int64)
+        prev_map = dict(zip(schedule['orig_time_str'].tolist(),
+                            np.concatenate([[initial_sys_id], sched_sys[:-1]]).tolist()))
+        sys_ids = trace['Snapshot_SysID'].to_numpy(dtype=np.int64)
+        prev_ids = trace['Time'].map(prev_map).to_numpy(dtype=np.int64)
+        seqnos = ticks['svel_i081_seqno'].to_numpy()
+        trace['Prev_Snapshot_SysID'] = prev_ids
+        trace['Tick_Count'] = (np.searchsorted(seqnos, sys_ids, side='right')
+                               - np.searchsorted(seqnos, prev_ids, side='right'))
+        trace['Time_int'] = pd.to_numeric(trace['Time'], errors='coerce').fillna(0).astype(int)
+        trace = trace.sort_values('Time_int', kind='stable').reset_index(drop=True)
+
+        timings['total_ms'] = (time.perf_counter() - t0) * 1000
+        return {'prod_id': prod_id, 'trace': trace, 'ticks': ticks, 'timings': timings}
+
+    def explain(self, date, term, strike, cp, time_int, window=2):
+        """
+        說明單一時間點的計算結果：回傳前後 window 個快照的逐步過程與該區間的 ticks
+
+        Returns:
+            dict (可直接 JSON 序列化)
+        """
+        result = self.replay(date, term, strike, cp)
+        trace = result['trace']
+        positions = np.flatnonzero(trace['Time_int'].to_numpy() == int(time_int))
+        if len(positions) == 0:
+            raise KeyError(f"排程中沒有時間點 {time_int}")
+        pos = int(positions[0])
+        lo, hi = max(pos - window, 0), min(pos + window + 1, len(trace))
+
+        steps = trace.iloc[lo:hi][[c for c in TRACE_COLUMNS if c in trace.columns]]
+        row = trace.iloc[pos]
+        ticks = result['ticks']
+        seq = ticks['svel_i081_seqno']
+        interval = ticks[(seq > row['Prev_Snapshot_SysID']) & (seq <= row['Snapshot_SysID'])]
+
+        return {
+            'prod_id': result['prod_id'],
+            'time': int(time_int),
+            'steps': _records(steps),
+            'interval_ticks': _records(interval[['svel_i081_seqno', 'svel_i081_time',
+                                                 'svel_i081_best_buy_price1', 'svel_i081_best_sell_price1']]
+                                       .rename(columns={'svel_i081_seqno': 'seqno', 'svel_i081_time': 'time',
+                                                        'svel_i081_best_buy_price1': 'bid',
+                                                        'svel_i081_best_sell_price1': 'ask'})),
+            'timings': {k: round(v, 2) for k, v in result['timings'].items()},
+        }
+
+
+def _records(df):
+    """DataFrame -> JSON 相容的 records (NaN / 'null' -> None，numpy 純量 -> Python 型別)"""
+    records = []
+    for rec in df.to_dict(orient='records'):
+        clean = {}
+        for k, v in rec.items():
+            if isinstance(v, np.generic):
+                v = v.item()
+            if v is None or (isinstance(v, float) and v != v) or v == 'null':
+                v = None
+            clean[k] = v
+        records.append(clean)
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description="單一序列快速重播 (Step 0)")
+    parser.add_argument("date", help="日期 (YYYYMMDD)")
+    parser.add_argument("term", choices=["Near", "Next"])
+    parser.add_argument("strike", type=int)
+    parser.add_argument("cp", choices=["Call", "Put"])
+    parser.add_argument("--time", type=int, default=None, help="聚焦的快照時間 (如 84530)")
+    parser.add_argument("--window", type=int, default=2, help="聚焦時間前後顯示的快照數")
+    args = parser.parse_args()
+
+    replayer = SeriesReplay()
+    result = replayer.replay(args.date, args.term, args.strike, args.cp)
+    trace = result['trace']
+    if args.time is not None:
+        pos = np.flatnonzero(trace['Time_int'].to_numpy() == args.time)
+        if len(pos) == 0:
+            print(f"排程中沒有時間點 {args.time}")
+            return
+        trace = trace.iloc[max(int(pos[0]) - args.window, 0):int(pos[0]) + args.window + 1]
+
+    pd.set_option('display.width', 400)
+    pd.set_option('display.max_columns', None)
+    pd.set_option('display.max_colwidth', 80)
+    print(f"商品: {result['prod_id']}  ticks: {len(result['ticks'])}  "
+          + "  ".join(f"{k}={v:.1f}" for k, v in result['timings'].items()))
+    # 轉置顯示：每個快照一欄，方便逐步比對
+    print(trace[[c for c in TRACE_COLUMNS if c in trace.columns]].set_index('Time').T.to_string())
+
+
+if __name__ == '__main__':
+    main()
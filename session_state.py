@@ -0,0 +1,147 @@
+"""
+跨日狀態 (Cross-Day Session State)
+
+Step 1 每天開盤前需要前一交易日的最後揭示 VIX 作為首筆算不出來時的替代值。
+原本的 step1_vix_calc.get_previous_day_vix 每次都列出整個 資料來源/ 目錄、
+找出前一個日期資料夾並讀取該日完整的 sigma_*.tsv；
+測試資料首日 20251201 沒有前一日，還另外寫死了 24.36 的特例。
+
+本模組以一份小型 JSON (output/session_state.json) 記錄每個交易日收盤時的狀態：
+    vix / ori_vix     最後一筆有效的揭示 VIX 與 ori_vix
+    near_sigma2 / next_sigma2   最後一筆有效的各月份 Sigma^2
+    near_forward / next_forward 收盤時的近月 / 次近月 Forward
+Step 1 於每日計算完成後寫入，隔天啟動時直接查詢前一筆 (不需掃描目錄或讀取前一日檔案)。
+批次執行 (run_step1_batch.py) 在同一個行程內共用同一個 SessionStateStore，逐日串接。
+
+前一筆狀態只有在「與目標日期之間沒有其他交易日資料夾」時才採用 (只檢查中間的日曆日，
+通常 1~3 次 stat)；否則視為過期，由呼叫端退回原本的目錄掃描。
+"""
+import os
+import json
+import bisect
+from datetime import datetime, timedelta
+
+STATE_VERSION = 1
+STATE_FILENAME = "session_state.json"
+
+# 測試資料首日 20251201 的前一交易日 (20251128) 官方揭示收盤值
+SEED_SESSIONS = {
+    "20251128": {"vix": 24.36, "source": "seed"},
+}
+
+STATE_FIELDS = ["time", "vix", "ori_vix", "near_sigma2", "next_sigma2", "near_forward", "next_forward"]
+
+
+class SessionStateStore:
+    """每日收盤狀態的持久化存放 (JSON)，查詢以日期排序清單二分搜尋"""
+
+    def __init__(self, path, seed=True):
+        self.path = path
+        self.sessions = dict(SEED_SESSIONS) if seed else {}
+        self._dirty = False
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == STATE_VERSION:
+                    self.sessions.update(data.get("sessions", {}))
+            except (OSError, ValueError) as e:
+                print(f"[session_state] 讀取 {path} 失敗，改用空白狀態: {e}")
+        self._dates = sorted(self.sessions)
+
+    @classmethod
+    def for_output(cls, output_dir):
+        """預設位置：{output_dir}/session_state.json"""
+        return cls(os.path.join(output_dir, STATE_FILENAME))
+
+    def get(self, date_str):
+        return self.sessions.get(date_str)
+
+    def previous(self, date_str, source_dir=None):
+        """
+        目標日期之前最近一個交易日的狀態
+
+        Args:
+            source_dir: 指定時檢查狀態日期與目標日期之間是否還有其他交易日資料夾，
+                        有的話表示中間的日子尚未記錄，回傳 None
+
+        Returns:
+            (prev_date, state dict) 或 None
+        """
+        pos = bisect.bisect_left(self._dates, date_str)
+        if pos == 0:
+            return None
+        prev_date = self._dates[pos - 1]
+        if source_dir is not None and _has_session_between(source_dir, prev_date, date_str):
+            return None
+        return prev_date, self.sessions[prev_date]
+
+    def record(self, date_str, state):
+        """記錄 (或覆寫) 某日收盤狀態，只更新記憶體，save() 才寫檔"""
+        self.sessions[date_str] = {k: state[k] for k in STATE_FIELDS if state.get(k) is not None}
+        if date_str not in self._dates:
+            bisect.insort(self._dates, date_str)
+        self._dirty = True
+
+    def save(self):
+        """寫入暫存檔後換名，避免寫到一半中斷留下損壞的 JSON"""
+        if not self._dirty or not self.path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        sessions = {d: s for d, s in sorted(self.sessions.items()) if s.get("source") != "seed"}
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": STATE_VERSION, "sessions": sessions}, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+        self._dirty = False
+
+
+def _has_session_between(source_dir, prev_date, date_str):
+    """prev_date 與 date_str 之間 (不含兩端) 是否還有交易日資料夾"""
+    day = datetime.strptime(prev_date, "%Y%m%d") + timedelta(days=1)
+    end = datetime.strptime(date_str, "%Y%m%d")
+    while day < end:
+        if os.path.isdir(os.path.join(source_dir, day.strftime("%Y%m%d"))):
+            return True
+        day += timedelta(days=1)
+    return False
+
+
+def fallback_vix(state):
+    """前一日替代值：最後有效的揭示 VIX，沒有時改用 ori_vix (與原本目錄掃描的規則相同)"""
+    for key in ("vix", "ori_vix"):
+        value = state.get(key)
+        if value is not None and value > 0:
+            return float(value)
+    return None
+
+
+def closing_state(df_sigma, near_fwd=None, next_fwd=None):
+    """
+    由 Step 1 當日的 my_sigma 結果 (與 Forward 表) 取出收盤狀態
+
+    Args:
+        df_sigma: calculate_vix 回傳的 sigma DataFrame
+        near_fwd / next_fwd: 以 time 為 index 的 Forward DataFrame (含 tw_fwd)
+    """
+    def last_positive(col):
+        if col not in df_sigma.columns:
+            return None
+        valid = df_sigma[df_sigma[col] > 0]
+        return float(valid[col].iloc[-1]) if not valid.empty else None
+
+    def last_forward(fwd):
+        if fwd is None or fwd.empty or "tw_fwd" not in fwd.columns:
+            return None
+        values = fwd["tw_fwd"][fwd["tw_fwd"] > 0]
+        return float(values.iloc[-1]) if not values.empty else None
+
+    return {
+        "time": str(df_sigma["time"].iloc[-1]) if len(df_sigma) else None,
+        "vix": last_positive("vix"),
+        "ori_vix": last_positive("ori_vix"),
+        "near_sigma2": last_positive("nearSigma2"),
+        "next_sigma2": last_positive("nextSigma2"),
+        "near_forward": last_forward(near_fwd),
+        "next_forward": last_forward(next_fwd),
+    }
@@ -0,0 +1,258 @@
+"""
+單一月份變異數引擎 (Term Sigma^2 Engine)
+
+step1_vix_calc.py 的 Sigma^2 直接加總 PROD Contrib 檔的 contrib 欄，
+序列篩選 (Step 0) 的結果無法一路推到 VIX。本模組依官方編製方法第 (3) 節，
+由 Q_hat 報價表 (我們 Step 0 的 c.bid / c.ask / p.bid / p.ask) 自行完成：
+
+    1. 以 K0 為界，選取履約價 < K0 的價外賣權、> K0 的價外買權；
+       剔除買價為 0 的序列，往價外方向遇連續 2 個買價為 0 後不再選取
+    2. 中價 Q(K)：價外序列為 (買 + 賣) / 2，K0 為買權與賣權中價的平均
+    3. ΔK：入選履約價左右相鄰入選履約價差的一半 (兩端取與相鄰者之差)
+    4. contrib = ΔK / K^2 * e^(RT) * Q(K)
+       Sigma^2 = (2/T) * SUM(contrib) - (1/T) * [(F/K0) - 1]^2 (同 step1_vix_calc.sigma2_from_sum)
+    5. ORI VIX：與 step1_vix_calc.calculate_vix 相同的 30 天插補 / 退化公式，算不出來時沿用前一筆
+
+全部以 (..., 時間, 履約價) 陣列一次計算，前置維度可為參數組 (param_sweep.py)。
+無法計算 (K0 無雙邊報價、任一側沒有入選的價外序列、T <= 0 或結果 <= 0) 時 Sigma^2 為 -1。
+
+用法:
+    python sigma_engine.py --date 20251231     # 以 output/驗證{date}_{term}PROD.csv 計算並與 PROD sigma 比對
+"""
+import os
+import sys
+import argparse
+
+if hasattr(sys.stdout, 'reconfigure'):
+    sys.stdout.reconfigure(encoding='utf-8')
+
+import numpy as np
+import pandas as pd
+
+from vix_calendar import DEFAULT_SCHEDULE, day_calendar, year_seconds, N30
+from forward_engine import load_qhat
+
+TERMS = ["Near", "Next"]
+ZERO_BID_STOP = 2  # 連續幾個買價為 0 後停止選取
+
+
+# =====================================================================
+# Q_hat 表 -> 密集陣列
+# =====================================================================
+def dense_qhat(qhat, schedule=DEFAULT_SCHEDULE):
+    """
+    Q_hat 表 (time / strike / c.bid / c.ask / p.bid / p.ask) -> (時間, 履約價) 密集陣列
+
+    Returns:
+        (strikes, arrays)：strikes 為升序履約價；arrays 含 c_bid / c_mid / p_bid / p_mid，
+        形狀 (len(schedule), len(strikes))，無報價處為 NaN (買價為 0 或賣價 <= 0 時中價為 NaN)
+    """
+    times = qhat["time"].astype(str).str.zfill(6).to_numpy()
+    sched = np.asarray(schedule)
+    t_idx = pd.Index(sched).get_indexer(times)
+    strikes = np.unique(pd.to_numeric(qhat["strike"], errors="coerce").dropna().to_numpy(dtype=float))
+    k_idx = np.searchsorted(strikes, pd.to_numeric(qhat["strike"], errors="coerce").to_numpy(dtype=float))
+    ok = t_idx >= 0
+
+    arrays = {}
+    for side in ("c", "p"):
+        bid = pd.to_numeric(qhat[f"{side}.bid"], errors="coerce").to_numpy(dtype=float)
+        ask = pd.to_numeric(qhat[f"{side}.ask"], errors="coerce").to_numpy(dtype=float)
+        mid = np.where((ask > 0) & (ask > bid), (bid + ask) / 2.0, np.nan)
+        for name, values in ((f"{side}_bid", bid), (f"{side}_mid", mid)):
+            grid = np.full((len(sched), len(strikes)), np.nan)
+            grid[t_idx[ok], k_idx[ok]] = values[ok]
+            arrays[name] = grid
+    return strikes, arrays
+
+
+# =====================================================================
+# 序列選取與 Sigma^2
+# =====================================================================
+def _stop_after_zero_bids(zero, axis_reversed):
+    """
+    沿價外方向 (最後一軸) 遇到連續 ZERO_BID_STOP 個零買價後的位置 (含) 標記為 True
+
+    axis_reversed: True 表示價外方向為履約價遞減 (賣權)
+    """
+    z = zero[..., ::-1] if axis_reversed else zero
+    # 以累加計算連續零買價長度：遇到非零即歸零
+    count = np.cumsum(z, axis=-1)
+    reset = np.maximum.accumulate(np.where(~z, count, 0), axis=-1)
+    run = count - reset
+    stopped = np.cumsum(run >= ZERO_BID_STOP, axis=-1) > 0
+    return stopped[..., ::-1] if axis_reversed else stopped
+
+
+def select_series(strikes, k0, c_bid, c_mid, p_bid, p_mid):
+    """
+    價外序列選取與中價
+
+    Args:
+        strikes: (N,) 升序履約價
+        k0: (T,) 各時間點價平履約價
+        c_bid ... p_mid: (..., T, N)
+
+    Returns:
+        (selected, q, ok)：selected / q 形狀 (..., T, N)；ok 形狀 (..., T) 表示可計算
+    """
+    n = len(strikes)
+    k0 = np.asarray(k0, dtype=float)
+    k0_idx = np.searchsorted(strikes, k0)
+    k0_valid = (k0_idx < n) & (strikes[np.minimum(k0_idx, n - 1)] == k0)
+    pos = np.arange(n)
+    below = pos < k0_idx[:, None]
+    above = pos > k0_idx[:, None]
+    at = (pos == k0_idx[:, None]) & k0_valid[:, None]
+
+    c_pos = c_bid > 0
+    p_pos = p_bid > 0
+    put_incl = below & p_pos & ~np.isnan(p_mid) & ~_stop_after_zero_bids(below & ~p_pos, True)
+    call_incl = above & c_pos & ~np.isnan(c_mid) & ~_stop_after_zero_bids(above & ~c_pos, False)
+    atm_ok = at & ~np.isnan(c_mid) & ~np.isnan(p_mid)
+
+    selected = put_incl | call_incl | atm_ok
+    q = np.where(put_incl, p_mid, np.where(call_incl, c_mid, np.where(atm_ok, (c_mid + p_mid) / 2.0, 0.0)))
+    ok = atm_ok.any(axis=-1) & put_incl.any(axis=-1) & call_incl.any(axis=-1)
+    return selected, q, ok
+
+
+def delta_k(strikes, selected):
+    """入選履約價的 ΔK (未入選處為 0)"""
+    n = len(strikes)
+    pos = np.broadcast_to(np.arange(n), selected.shape)
+    # 前一個 / 下一個入選位置 (不含自己)
+    prev_idx = np.maximum.accumulate(np.where(selected, pos, -1), axis=-1)
+    prev_idx = np.concatenate([np.full(selected.shape[:-1] + (1,), -1), prev_idx[..., :-1]], axis=-1)
+    next_idx = np.minimum.accumulate(np.where(selected, pos, n)[..., ::-1], axis=-1)[..., ::-1]
+    next_idx = np.concatenate([next_idx[..., 1:], np.full(selected.shape[:-1] + (1,), n)], axis=-1)
+
+    has_prev, has_next = prev_idx >= 0, next_idx < n
+    k_prev = strikes[np.clip(prev_idx, 0, n - 1)]
+    k_next = strikes[np.clip(next_idx, 0, n - 1)]
+    dk = np.where(has_prev & has_next, (k_next - k_prev) / 2.0,
+                  np.where(has_prev, strikes - k_prev, np.where(has_next, k_next - strikes, 0.0)))
+    return np.where(selected, dk, 0.0)
+
+
+def term_sigma2(strikes, k0, fwd, T, rate, c_bid, c_mid, p_bid, p_mid):
+    """
+    單一月份整天的 Sigma^2 (可帶參數組前置維度)
+
+    Args:
+        strikes: (N,)；k0 / fwd / T: (T,)；rate: 無風險利率
+        c_bid ... p_mid: (..., T, N)
+
+    Returns:
+        (sigma2, count, contrib_sum)：形狀 (..., T)；無法計算時 sigma2 = -1
+    """
+    T = np.asarray(T, dtype=float)
+    fwd = np.asarray(fwd, dtype=float)
+    k0 = np.asarray(k0, dtype=float)
+    selected, q, ok = select_series(strikes, k0, c_bid, c_mid, p_bid, p_mid)
+    dk = delta_k(strikes, selected)
+    contrib = dk / strikes ** 2 * np.exp(rate * T)[:, None] * q
+    contrib_sum = contrib.sum(axis=-1)
+    count = selected.sum(axis=-1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sigma2 = (2.0 / T) * contrib_sum - (1.0 / T) * ((fwd / k0) - 1.0) ** 2
+    valid = ok & (T > 0) & (k0 > 0) & (sigma2 > 0)
+    return np.where(valid, sigma2, -1.0), np.where(ok, count, 0), contrib_sum
+
+
+def ori_vix(near_T, near_W, near_sigma2, next_T, next_W, next_sigma2, n_year, fallback=None):
+    """
+    ORI VIX (與 step1_vix_calc.calculate_vix 情境 A / B 相同)，最後一軸為時間；
+    n_year 為計算日的 1年秒數 (year_seconds，閏年 366 日)；
+    算不出來時沿用前一筆，當天第一筆之前以 fallback 代替 (None 為 -1)
+    """
+    with np.errstate(invalid="ignore"):
+        interp = np.sqrt((near_T * near_sigma2 * near_W + next_T * next_sigma2 * next_W) * (n_year / N30)) * 100
+        single = np.sqrt(near_sigma2) * 100
+    value = np.where((near_sigma2 > 0) & (next_sigma2 > 0) & (near_W < 1.0), interp,
+                     np.where(near_sigma2 > 0, single, np.nan))
+    value = np.where(value >= 0, value, np.nan)
+    # 沿用前一筆：以最後有效位置前向填補
+    n = value.shape[-1]
+    idx = np.where(~np.isnan(value), np.arange(n), -1)
+    idx = np.maximum.accumulate(idx, axis=-1)
+    filled = np.take_along_axis(value, np.maximum(idx, 0), axis=-1)
+    return np.where(idx >= 0, filled, -1.0 if fallback is None else fallback)
+
+
+# =====================================================================
+# 單日輸入
+# =====================================================================
+def load_term_inputs(date_str, term, source_dir="資料來源", schedule=DEFAULT_SCHEDULE):
+    """
+    單一月份的 K0 / F / T / W / R (K0 與 F 取 PROD {term}_Forward，T / W 由契約日曆計算)
+
+    Returns:
+        dict: k0, fwd, T, W (np.ndarray，長度 = 快照數)、rate
+    """
+    folder = os.path.join(source_dir, date_str)
+    fwd = pd.read_csv(os.path.join(folder, f"{term}_Forward_{date_str}.tsv"), sep="\t", dtype={"time": str})
+    fwd["time"] = fwd["time"].str.zfill(6)
+    fwd = fwd.drop_duplicates("time", keep="last").set_index("time").reindex(list(schedule))
+    rate = pd.read_csv(os.path.join(folder, f"rate_{date_str}.tsv"), sep="\t").iloc[0]
+    cal = day_calendar(date_str, source_dir, schedule)
+    key = term.lower()
+    return {
+        "k0": fwd["k0"].fillna(0.0).to_numpy(dtype=float),
+        "fwd": fwd["tw_fwd"].fillna(0.0).to_numpy(dtype=float),
+        "T": cal[f"{key}T"].to_numpy(),
+        "W": cal[f"{key}W"].to_numpy(),
+        "rate": float(rate[f"{key}_r"]),
+    }
+
+
+def compute_day(date_str, qhat_by_term, source_dir="資料來源", schedule=DEFAULT_SCHEDULE, fallback_vix=None):
+    """
+    由兩個月份的 Q_hat 表計算整天 Sigma^2 與 ORI VIX
+
+    Returns:
+        DataFrame: time / nearSigma2 / nextSigma2 / near_contrib_rows / next_contrib_rows / ori_vix
+    """
+    out = {"time": list(schedule)}
+    inputs = {}
+    for term in TERMS:
+        inputs[term] = load_term_inputs(date_str, term, source_dir, schedule)
+        strikes, arrays = dense_qhat(qhat_by_term[term], schedule)
+        sigma2, count, _ = term_sigma2(strikes, inputs[term]["k0"], inputs[term]["fwd"], inputs[term]["T"],
+                                       inputs[term]["rate"], **arrays)
+        key = term.lower()
+        out[f"{key}Sigma2"] = sigma2
+        out[f"{key}_contrib_rows"] = count
+    out["ori_vix"] = ori_vix(inputs["Near"]["T"], inputs["Near"]["W"], out["nearSigma2"],
+                             inputs["Next"]["T"], inputs["Next"]["W"], out["nextSigma2"],
+                             year_seconds(date_str), fallback_vix)
+    return pd.DataFrame(out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="由 Q_hat 表計算 Sigma^2 / ORI VIX 並與 PROD sigma 比對")
+    parser.add_argument("--date", type=str, required=True, help="YYYYMMDD")
+    parser.add_argument("--source", type=str, default="資料來源", help="輸入資料夾路徑")
+    parser.add_argument("--qhat-dir", type=str, default="output", help="Step 0 Q_hat 表所在資料夾")
+    args = parser.parse_args()
+
+    qhat = {term: load_qhat(args.date, term, args.qhat_dir) for term in TERMS}
+    missing = [term for term, df in qhat.items() if df is None]
+    if missing:
+        print(f"找不到 Q_hat 表 ({', '.join(missing)})，請先執行 step0_process_quotes.py {args.date}")
+        return
+    ours = compute_day(args.date, qhat, args.source)
+
+    prod = pd.read_csv(os.path.join(args.source, args.date, f"sigma_{args.date}.tsv"), sep="\t", dtype={"time": str})
+    prod["time"] = prod["time"].str.zfill(6)
+    merged = prod.merge(ours, on="time", suffixes=("_prod", "_ours"))
+    for col in ["nearSigma2", "nextSigma2", "near_contrib_rows", "next_contrib_rows", "ori_vix"]:
+        a = pd.to_numeric(merged[f"{col}_prod"], errors="coerce")
+        b = pd.to_numeric(merged[f"{col}_ours"], errors="coerce")
+        diff = (a - b).abs()
+        print(f"{col:<18} 最大差異 {diff.max():.6g}，> 1e-4 共 {(diff > 1e-4).sum()} 筆 / {len(merged)}")
+
+
+if __name__ == "__main__":
+    main()
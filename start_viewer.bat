@@ -11,6 +11,8 @@ if %errorlevel% neq 0 (
     pause
     exit /b
 )
+:: 多人同時連線時使用 waitress (安裝失敗時自動退回 Flask 開發伺服器)
+pip install waitress >nul 2>&1
 
 :: 設定允許外部連線 (綁定 0.0.0.0)
 set FLASK_HOST=0.0.0.0
@@ -798,14 +798,7 @@ def main(process_all_times=False, target_time=None, end_time=None, max_time_poin
             term_results = []
             
             # 建立排程參數列表
-            schedule_times = []
-            for time_str in time_points:
-                target_row = schedule[schedule['orig_time_str'] == time_str].iloc[0]
-                schedule_times.append((
-                    target_row['time_obj'],
-                    target_row['sys_id'],
-                    time_str
-                ))
+            schedule_times = SnapshotScheduler.to_schedule_times(schedule)[:len(time_points)]
             
             # 【效能優化】只建構一次 Reconstructor，一次處理所有時間點
             reconstructor = SnapshotReconstructor(ticks)
@@ -918,7 +911,7 @@ def main(process_all_times=False, target_time=None, end_time=None, max_time_poin
                 print(f"  找不到時間點 {target_time}")
                 continue
             
-            t_obj = target_row.iloc[0]['time_obj']
+            t_obj = target_row.iloc[0]['time_int']
             sys_id = target_row.iloc[0]['sys_id']
             
             # 找前一個時間點的 SysID
@@ -438,7 +438,7 @@ def check_outlier(spread, bid, ask, ema_t, gamma, Q_hat_Mid_t_minus_1, ema_t_min
 # 主要處理函式：整合步驟二與步驟三
 # ==============================================================================
 
-def add_ema_and_outlier_detection(df, term_name):
+def add_ema_and_outlier_detection(df, term_name, quiet=False):
     """
     為整個 Term（Near 或 Next）的所有序列執行步驟二與步驟三
     
@@ -456,6 +456,7 @@ def add_ema_and_outlier_detection(df, term_name):
     Args:
         df: 包含所有時間點的資料，需先經過步驟一產生 Q_*_Valid_* 欄位
         term_name: 'Near' 或 'Next'
+        quiet: 不列印逐序列進度 (Viewer 單一序列重播使用)
         
     Returns:
         DataFrame: 新增 EMA、Gamma、異常值判定、Q_hat_* 等欄位
@@ -464,7 +465,8 @@ def add_ema_and_outlier_detection(df, term_name):
     all_series = []
     
     for (strike, cp), group in df.groupby(['Strike', 'CP'], sort=False):
-        print(f"  處理序列: Strike={strike}, CP={cp}")
+        if not quiet:
+            print(f"  處理序列: Strike={strike}, CP={cp}")
         series_df = calculate_ema_for_series(group)
         all_series.append(series_df)
     
@@ -1081,8 +1083,70 @@ def save_prod_format(df, output_path, snapshot_sysid_col='Snapshot_SysID', date_
 
 
 
+def prepare_snapshot_quotes(snapshot_df, term_name):
+    """
+    將 reconstruct_all 的輸出轉為 EMA / Outlier 計算所需的欄位格式
+
+    - 重新命名 My_Last_* / My_Min_* 為 Q_last_* / Q_min_*
+    - 依有效報價規則 (bid >= 0, ask > 0, ask > bid) 產生 Q_Last_Valid_* / Q_Min_Valid_*
+      無效時填入字串 "null"
+
+    Args:
+        snapshot_df: SnapshotReconstructor.reconstruct_all 的結果
+        term_name: 'Near' 或 'Next'
+
+    Returns:
+        DataFrame: 供 add_ema_and_outlier_detection 使用的報價表
+    """
+    snapshot_df = snapshot_df.copy()
+    # Mapping rules
+    snapshot_df['Term'] = term_name
+    snapshot_df = snapshot_df.rename(columns={
+        'My_Last_Bid': 'Q_last_Bid', 'My_Last_Ask': 'Q_last_Ask',
+        'My_Last_SysID': 'Q_last_SysID', 'My_Last_Time': 'Q_last_Time',
+        'My_Min_Bid': 'Q_min_Bid', 'My_Min_Ask': 'Q_min_Ask',
+        'My_Min_Spread': 'Q_min_Spread', 'My_Min_SysID': 'Q_min_SysID',
+    })
+
+    snapshot_df['Q_last_Spread'] = np.where(snapshot_df['Q_last_Bid'].notna() & snapshot_df['Q_last_Ask'].notna(), snapshot_df['Q_last_Ask'] - snapshot_df['Q_last_Bid'], np.nan)
+
+    qlast_valid = snapshot_df['Q_last_Bid'].notna() & snapshot_df['Q_last_Ask'].notna() & (snapshot_df['Q_last_Bid'] >= 0) & (snapshot_df['Q_last_Ask'] > 0) & (snapshot_df['Q_last_Ask'] > snapshot_df['Q_last_Bid'])
+    qmin_valid = snapshot_df['Q_min_Bid'].notna() & snapshot_df['Q_min_Ask'].notna() & (snapshot_df['Q_min_Bid'] >= 0) & (snapshot_df['Q_min_Ask'] > 0) & (snapshot_df['Q_min_Ask'] > snapshot_df['Q_min_Bid'])
+
+    snapshot_df['Q_last_Valid'] = qlast_valid
+    snapshot_df['Q_min_Valid'] = qmin_valid
+
+    snapshot_df['Q_Last_Valid_Bid'] = np.where(qlast_valid, snapshot_df['Q_last_Bid'], "null")
+    snapshot_df['Q_Last_Valid_Ask'] = np.where(qlast_valid, snapshot_df['Q_last_Ask'], "null")
+    snapshot_df['Q_Last_Valid_Spread'] = np.where(qlast_valid, snapshot_df['Q_last_Ask'] - snapshot_df['Q_last_Bid'], "null")
+    snapshot_df['Q_Last_Valid_Mid'] = np.where(qlast_valid, (snapshot_df['Q_last_Bid'] + snapshot_df['Q_last_Ask']) / 2, "null")
+
+    snapshot_df['Q_Min_Valid_Bid'] = np.where(qmin_valid, snapshot_df['Q_min_Bid'], "null")
+    snapshot_df['Q_Min_Valid_Ask'] = np.where(qmin_valid, snapshot_df['Q_min_Ask'], "null")
+    snapshot_df['Q_Min_Valid_Spread'] = np.where(qmin_valid, snapshot_df['Q_min_Ask'] - snapshot_df['Q_min_Bid'], "null")
+    snapshot_df['Q_Min_Valid_Mid'] = np.where(qmin_valid, (snapshot_df['Q_min_Bid'] + snapshot_df['Q_min_Ask']) / 2, "null")
+
+    report_cols = [
+        'Term', 'Time', 'Snapshot_SysID', 'Strike', 'CP',
+        'Q_last_Bid', 'Q_last_Ask', 'Q_last_Spread', 'Q_last_SysID', 'Q_last_Time', 'Q_last_Valid',
+        'Q_Last_Valid_Bid', 'Q_Last_Valid_Ask', 'Q_Last_Valid_Spread', 'Q_Last_Valid_Mid',
+        'Q_min_Bid', 'Q_min_Ask', 'Q_min_Spread', 'Q_min_SysID', 'Q_min_Valid',
+        'Q_Min_Valid_Bid', 'Q_Min_Valid_Ask', 'Q_Min_Valid_Spread', 'Q_Min_Valid_Mid',
+    ]
+    return snapshot_df[[c for c in report_cols if c in snapshot_df.columns]]
+
 
-def main(target_date=None, process_all_times=True, target_time=None, max_time_points=None, end_time=None):
+
+def main(target_date=None, process_all_times=True, target_time=None, max_time_points=None, end_time=None,
+         parity=False, max_mismatches=None):
+    """
+    Step 0 主流程：重建快照 -> EMA / Outlier -> 輸出 PROD 格式
+
+    Args:
+        parity: 是否在記憶體中直接與 PROD 比對並輸出 validation_diff_{date}.csv
+                (取代另外執行 validation/verify_full_day.py)
+        max_mismatches: parity 模式的差異上限，達上限後略過其餘 Term (快速分流用)
+    """
     from vix_utils import get_vix_config
     config = get_vix_config(target_time if (target_time and len(target_time) == 8) else target_date)
     final_date = config["target_date"]
@@ -1098,69 +1162,55 @@ def main(target_date=None, process_all_times=True, target_time=None, max_time_po
     
     tasks = [('Near', near_ticks, f"NearPROD_{final_date}.tsv"),
              ('Next', next_ticks, f"NextPROD_{final_date}.tsv")]
+
+    sink = None
+    if parity:
+        from validation.parity_sink import ParitySink
+        sink = ParitySink(final_date, max_mismatches=max_mismatches)
              
     for term_name, ticks, prod_filename in tasks:
+        if sink is not None and sink.exhausted:
+            sink.skip_term(term_name)
+            continue
         print(f"\n>>> 處理 {term_name} Term")
         prod_path = os.path.join(prod_dir, prod_filename)
         scheduler = SnapshotScheduler(prod_path)
         schedule, initial_sys_id, prod_strikes = scheduler.load_schedule()
         
-        time_points = schedule['orig_time_str'].tolist()
-        print(f"  共 {len(time_points)} 個時間點")
-        
-        schedule_times = []
-        for time_str in time_points:
-            target_row = schedule[schedule['orig_time_str'] == time_str].iloc[0]
-            schedule_times.append((target_row['time_obj'], target_row['sys_id'], time_str))
+        schedule_times = SnapshotScheduler.to_schedule_times(schedule)
+        print(f"  共 {len(schedule_times)} 個時間點")
             
         reconstructor = SnapshotReconstructor(ticks)
         snapshot_df = reconstructor.reconstruct_all(schedule_times, initial_sys_id, prod_strikes=prod_strikes)
         
-        # Mapping rules
-        snapshot_df['Term'] = term_name
-        snapshot_df = snapshot_df.rename(columns={
-            'My_Last_Bid': 'Q_last_Bid', 'My_Last_Ask': 'Q_last_Ask',
-            'My_Last_SysID': 'Q_last_SysID', 'My_Last_Time': 'Q_last_Time',
-            'My_Min_Bid': 'Q_min_Bid', 'My_Min_Ask': 'Q_min_Ask',
-            'My_Min_Spread': 'Q_min_Spread', 'My_Min_SysID': 'Q_min_SysID',
-        })
-        
-        snapshot_df['Q_last_Spread'] = np.where(snapshot_df['Q_last_Bid'].notna() & snapshot_df['Q_last_Ask'].notna(), snapshot_df['Q_last_Ask'] - snapshot_df['Q_last_Bid'], np.nan)
-        
-        qlast_valid = snapshot_df['Q_last_Bid'].notna() & snapshot_df['Q_last_Ask'].notna() & (snapshot_df['Q_last_Bid'] >= 0) & (snapshot_df['Q_last_Ask'] > 0) & (snapshot_df['Q_last_Ask'] > snapshot_df['Q_last_Bid'])
-        qmin_valid = snapshot_df['Q_min_Bid'].notna() & snapshot_df['Q_min_Ask'].notna() & (snapshot_df['Q_min_Bid'] >= 0) & (snapshot_df['Q_min_Ask'] > 0) & (snapshot_df['Q_min_Ask'] > snapshot_df['Q_min_Bid'])
-        
-        snapshot_df['Q_last_Valid'] = qlast_valid
-        snapshot_df['Q_min_Valid'] = qmin_valid
-        
-        snapshot_df['Q_Last_Valid_Bid'] = np.where(qlast_valid, snapshot_df['Q_last_Bid'], "null")
-        snapshot_df['Q_Last_Valid_Ask'] = np.where(qlast_valid, snapshot_df['Q_last_Ask'], "null")
-        snapshot_df['Q_Last_Valid_Spread'] = np.where(qlast_valid, snapshot_df['Q_last_Ask'] - snapshot_df['Q_last_Bid'], "null")
-        snapshot_df['Q_Last_Valid_Mid'] = np.where(qlast_valid, (snapshot_df['Q_last_Bid'] + snapshot_df['Q_last_Ask']) / 2, "null")
-        
-        snapshot_df['Q_Min_Valid_Bid'] = np.where(qmin_valid, snapshot_df['Q_min_Bid'], "null")
-        snapshot_df['Q_Min_Valid_Ask'] = np.where(qmin_valid, snapshot_df['Q_min_Ask'], "null")
-        snapshot_df['Q_Min_Valid_Spread'] = np.where(qmin_valid, snapshot_df['Q_min_Ask'] - snapshot_df['Q_min_Bid'], "null")
-        snapshot_df['Q_Min_Valid_Mid'] = np.where(qmin_valid, (snapshot_df['Q_min_Bid'] + snapshot_df['Q_min_Ask']) / 2, "null")
-        
-        report_cols = [
-            'Term', 'Time', 'Snapshot_SysID', 'Strike', 'CP',
-            'Q_last_Bid', 'Q_last_Ask', 'Q_last_Spread', 'Q_last_SysID', 'Q_last_Time', 'Q_last_Valid',
-            'Q_Last_Valid_Bid', 'Q_Last_Valid_Ask', 'Q_Last_Valid_Spread', 'Q_Last_Valid_Mid',
-            'Q_min_Bid', 'Q_min_Ask', 'Q_min_Spread', 'Q_min_SysID', 'Q_min_Valid',
-            'Q_Min_Valid_Bid', 'Q_Min_Valid_Ask', 'Q_Min_Valid_Spread', 'Q_Min_Valid_Mid',
-        ]
-        combined_df = snapshot_df[[c for c in report_cols if c in snapshot_df.columns]]
+        combined_df = prepare_snapshot_quotes(snapshot_df, term_name)
         
         # == 合併運算: 呼叫 EMA & Outlier ==
         result_with_ema = add_ema_and_outlier_detection(combined_df, term_name)
         
         out_path = os.path.join("output", f"驗證{final_date}_{term_name}PROD.csv")
-        save_prod_format(result_with_ema, out_path, snapshot_sysid_col='Snapshot_SysID', date_val=final_date)
+        prod_format_df = save_prod_format(result_with_ema, out_path, snapshot_sysid_col='Snapshot_SysID', date_val=final_date)
+
+        if sink is not None:
+            sink.check_term(term_name, prod_path, prod_format_df)
+
+    if sink is not None:
+        sink.write()
 
 if __name__ == '__main__':
-    import sys
+    import argparse
+    parser = argparse.ArgumentParser(description="Step 0: 報價處理與異常值偵測")
+    parser.add_argument("date", nargs="?", help="目標日期 (YYYYMMDD)")
+    parser.add_argument("--parity", action="store_true",
+                        help="計算後直接與 PROD 比對，輸出 output/validation_diff_{date}.csv")
+    parser.add_argument("--max-mismatch", type=int, default=None,
+                        help="parity 模式的差異上限，達上限即停止 (快速分流)")
+    cli = parser.parse_args()
+
     args = {}
-    if len(sys.argv) > 1 and sys.argv[1].isdigit():
-        args['target_date'] = sys.argv[1]
+    if cli.date and cli.date.isdigit():
+        args['target_date'] = cli.date
+    if cli.parity:
+        args['parity'] = True
+        args['max_mismatches'] = cli.max_mismatch
     main(**args)
@@ -0,0 +1,234 @@
+"""
+Step 1 多日批次引擎 (In-Process Multi-Day Step 1 Engine)
+
+run_step1_batch.py 原本每一天各啟動兩個子行程 (step1_vix_calc.py 與 validation/verify_step1.py)，
+每次都重新 import pandas、重讀檔案；step1_vix_calc.calculate_vix 又對每個時間點各自以
+time == t 篩選整份 Contrib 表 (1,200 個時間點 x 數萬筆)，一個月的 Step 1 要跑好幾分鐘。
+
+本模組在同一個行程內：
+    1. 以執行緒池同時讀取區間內所有日期的輸入檔 (load_data，I/O 與 CSV 解析可並行)
+    2. 每日的 Contrib 依時間穩定排序後一次切段彙總 SUM(contrib) 與筆數，
+       再交給 calculate_vix 的 time_inputs (ORI VIX / 2.5% 過濾邏輯完全共用，不另寫一份)
+    3. 依日期順序計算，前一日收盤狀態透過同一個 SessionStateStore 在記憶體中傳遞
+    4. 寫出與 step1_vix_calc.py 相同的 my_sigma / my_ORI_VIX，並直接呼叫 check_sigma_diff 驗證
+
+彙總時先將 NaN 補 0 再對連續切片 sum()，與 pandas Series.sum() 的 pairwise 加總順序相同，
+輸出檔與逐日執行 step1_vix_calc.py 逐位元組一致。
+
+用法:
+    python step1_engine.py --start 20251201 --end 20251231
+"""
+import os
+import sys
+import time
+import argparse
+import traceback
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from step1_vix_calc import load_data, calculate_vix, iter_time_inputs, sigma2_from_sum, resolve_fallback_vix, write_outputs
+from session_state import SessionStateStore, closing_state
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "validation"))
+from verify_step1 import check_sigma_diff
+
+DEFAULT_WORKERS = 4
+
+
+# =====================================================================
+# 單日計算
+# =====================================================================
+def contrib_sums(contrib_df):
+    """
+    每個時間點的 SUM(contrib) 與筆數
+
+    Returns:
+        {time: (contrib_sum, rows_count)}；筆數包含 contrib 為 NaN 的列 (與 len(contrib_df) 相同)
+    """
+    if contrib_df.empty:
+        return {}
+    times = contrib_df["time"].to_numpy()
+    order = np.argsort(times, kind="stable")
+    times = times[order]
+    values = contrib_df["contrib"].to_numpy(dtype=float)[order]
+    values = np.where(np.isnan(values), 0.0, values)
+
+    starts = np.flatnonzero(np.r_[True, times[1:] != times[:-1]])
+    ends = np.r_[starts[1:], len(times)]
+    return {times[s]: (values[s:e].sum(), int(e - s)) for s, e in zip(starts, ends)}
+
+
+def fast_time_inputs(data):
+    """
+    與 step1_vix_calc.iter_time_inputs 相同的逐時間點輸入，但 Contrib 只掃描一次
+
+    sigma / Forward 的時間索引有重複時 (.loc 會回傳多列) 退回參考實作
+    """
+    sigma = data["sigma"]
+    if not all(df.index.is_unique for df in (sigma, data["near_fwd"], data["next_fwd"])):
+        yield from iter_time_inputs(data)
+        return
+
+    near_sums = contrib_sums(data["near_contrib"])
+    next_sums = contrib_sums(data["next_contrib"])
+
+    def forward_lookup(fwd):
+        return {t: (v, k) for t, v, k in zip(fwd.index, fwd["tw_fwd"].to_numpy(), fwd["k0"].to_numpy())}
+
+    near_fwd = forward_lookup(data["near_fwd"])
+    next_fwd = forward_lookup(data["next_fwd"])
+
+    columns = [sigma[c].to_numpy() for c in ("nearT", "nextT", "nearW", "nextW")]
+    for t, nearT, nextT, nearW, nextW in zip(sigma.index, *columns):
+        near_fwd_val, near_k0 = near_fwd.get(t, (0, 0))
+        next_fwd_val, next_k0 = next_fwd.get(t, (0, 0))
+
+        nearSigma2, nearCount = sigma2_from_sum(nearT, near_fwd_val, near_k0, *near_sums.get(t, (0.0, 0)))
+        nextSigma2, nextCount = sigma2_from_sum(nextT, next_fwd_val, next_k0, *next_sums.get(t, (0.0, 0)))
+        yield t, nearT, nearW, nearSigma2, nearCount, nextT, nextW, nextSigma2, nextCount
+
+
+def calculate_vix_fast(data, date_str, fallback_vix=None):
+    """calculate_vix 的快速版本 (結果相同)"""
+    return calculate_vix(data, date_str, fallback_vix, time_inputs=fast_time_inputs(data))
+
+
+# =====================================================================
+# 多日批次
+# =====================================================================
+def trading_dates(start, end, source_dir):
+    """
+    日曆日逐日列出 [start, end]
+
+    Returns:
+        [(date_str, has_source)]
+    """
+    day = datetime.strptime(start, "%Y%m%d")
+    end_day = datetime.strptime(end, "%Y%m%d")
+    dates = []
+    while day <= end_day:
+        date_str = day.strftime("%Y%m%d")
+        dates.append((date_str, os.path.isdir(os.path.join(source_dir, date_str))))
+        day += timedelta(days=1)
+    return dates
+
+
+def _load(date_str, source_dir):
+    try:
+        return load_data(date_str, source_dir), None
+    except Exception:
+        # 在讀檔執行緒內先格式化 traceback，避免例外由 pool.map 拋出而中斷整個區間
+        return None, traceback.format_exc()
+
+
+def _failure(date_str, error):
+    """記錄單日失敗 (印出 traceback，summary 附上最後一行錯誤訊息)"""
+    print(f"[{datetime.now().strftime('%H:%M:%S')}] 錯誤: {date_str} 執行失敗")
+    print(error.rstrip())
+    return (date_str, "Failed", error.strip().splitlines()[-1])
+
+
+def run_range(start, end, source_dir="資料來源", output_dir="output", verify=True,
+              workers=DEFAULT_WORKERS, state_store=None):
+    """
+    依日期順序執行 Step 1 (含跨日狀態串接) 並驗證
+
+    Args:
+        start, end: YYYYMMDD (含)
+        verify: 是否以 check_sigma_diff 比對 PROD sigma
+        workers: 讀檔執行緒數
+        state_store: 共用的 SessionStateStore，省略時使用 {output_dir}/session_state.json
+
+    單日讀檔、計算、寫檔或驗證發生任何例外時僅將該日記為 Failed 並繼續下一日 (與原本逐日子行程相同)；
+    不論是否中途中斷，最後都會儲存 state_store 並印出總結報告。
+
+    Returns:
+        [(date_str, status)]，status 為 Passed / Failed / Skipped (與 run_step1_batch.py 相同)，verify=False 時為 Computed；
+        Failed 另附第三個元素為錯誤訊息
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    if state_store is None:
+        state_store = SessionStateStore.for_output(output_dir)
+
+    dates = trading_dates(start, end, source_dir)
+    to_load = [d for d, has_source in dates if has_source]
+    print(f"[{datetime.now().strftime('%H:%M:%S')}] 讀取 {len(to_load)} 個交易日的輸入檔 (workers={workers})...")
+
+    summary = []
+    try:
+        _run_dates(dates, to_load, source_dir, output_dir, verify, workers, state_store, summary)
+    finally:
+        state_store.save()
+        print_summary(summary)
+    return summary
+
+
+def _run_dates(dates, to_load, source_dir, output_dir, verify, workers, state_store, summary):
+    """run_range 的逐日迴圈，結果依序附加至 summary"""
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        # map 依輸入順序回傳，讀檔並行、計算仍逐日依序進行
+        loaded = pool.map(lambda d: _load(d, source_dir), to_load)
+        loaded_iter = iter(zip(to_load, loaded))
+
+        for date_str, has_source in dates:
+            if not has_source:
+                print(f"[SKIP] {date_str}: 找不到 PROD 資料夾")
+                summary.append((date_str, "Skipped"))
+                continue
+
+            _, (data, error) = next(loaded_iter)
+            print(f"\n{'='*60}")
+            print(f"處理日期: {date_str}")
+            print(f"{'='*60}")
+            if data is None:
+                summary.append(_failure(date_str, error))
+                continue
+
+            try:
+                t0 = time.perf_counter()
+                fallback_vix = resolve_fallback_vix(date_str, source_dir, state_store)
+                df_out_sigma, df_out_ori = calculate_vix_fast(data, date_str, fallback_vix)
+                state_store.record(date_str, closing_state(df_out_sigma, data['near_fwd'], data['next_fwd']))
+                out_sigma_path, _ = write_outputs(df_out_sigma, df_out_ori, date_str, output_dir)
+                print(f"[{datetime.now().strftime('%H:%M:%S')}] 計算完成，產出 {len(df_out_sigma)} 筆資料至 "
+                      f"{out_sigma_path} ({time.perf_counter() - t0:.2f}s)")
+
+                if not verify:
+                    summary.append((date_str, "Computed"))
+                elif check_sigma_diff(date_str, source_dir, output_dir):
+                    summary.append((date_str, "Passed"))
+                else:
+                    summary.append((date_str, "Failed"))
+            except Exception:
+                summary.append(_failure(date_str, traceback.format_exc()))
+
+
+def print_summary(summary):
+    print("\n" + "="*60)
+    print("批次執行完成: Step 1 總結報告")
+    print("="*60)
+    for row in summary:
+        detail = f" | Error: {row[2]}" if len(row) > 2 else ""
+        print(f"{row[0]} | Status: {row[1]}{detail}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="VIX Step 1 多日批次計算與驗證 (單一行程)")
+    parser.add_argument("--start", type=str, required=True, help="開始日期 (YYYYMMDD)")
+    parser.add_argument("--end", type=str, required=True, help="結束日期 (YYYYMMDD)")
+    parser.add_argument("--source", type=str, default="資料來源", help="輸入資料夾路徑")
+    parser.add_argument("--output", type=str, default="output", help="輸出資料夾路徑")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="讀檔執行緒數")
+    parser.add_argument("--no-verify", action="store_true", help="只計算，不比對 PROD sigma")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    run_range(args.start, args.end, args.source, args.output,
+              verify=not args.no_verify, workers=args.workers)
+    print(f"總耗時 {time.perf_counter() - t0:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
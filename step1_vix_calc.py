@@ -8,6 +8,9 @@ import argparse
 import pandas as pd
 import numpy as np
 from datetime import datetime
+
+from vix_calendar import day_calendar, year_seconds, N30
+from session_state import SessionStateStore, fallback_vix as state_fallback_vix, closing_state
 def load_data(date_str, source_dir):
     """
     載入計算 VIX 所需的所有輸入檔案
@@ -20,7 +23,6 @@ def load_data(date_str, source_dir):
         'next_fwd': os.path.join(date_folder, f"Next_Forward_{date_str}.tsv"),
         'rate': os.path.join(date_folder, f"rate_{date_str}.tsv"),
         'month_change': os.path.join(date_folder, f"month_change_{date_str}.tsv"),
-        'sigma': os.path.join(date_folder, f"sigma_{date_str}.tsv"),
         'near_contrib': os.path.join(date_folder, f"Near_Contrib_{date_str}.tsv"),
         'next_contrib': os.path.join(date_folder, f"Next_Contrib_{date_str}.tsv")
     }
@@ -45,10 +47,9 @@ def load_data(date_str, source_dir):
     df_rate = pd.read_csv(files['rate'], sep='\t')
     df_month_change = pd.read_csv(files['month_change'], sep='\t')
     
-    # Sigma (for T1, T2)
-    # 確保時間長度
-    df_sigma = pd.read_csv(files['sigma'], sep='\t', dtype={'time': str})
-    df_sigma['time'] = df_sigma['time'].astype(str).str.zfill(6)
+    # 各時間點的存續期間 T 與插補權重 W：由契約日曆 (rate / month_change 的到期日) 計算，
+    # 不再讀取 PROD sigma 檔 (附錄7，結果與 sigma 檔的 nearT/nearW/nextT/nextW 相同)
+    df_sigma = day_calendar(date_str, source_dir)
     
     # Contrib
     # 讀取並轉換資料型態 (X 代表無報價)
@@ -66,7 +67,6 @@ def load_data(date_str, source_dir):
     # 將需要由時間 Join 的資料先建立 Index
     df_near_fwd.set_index('time', inplace=True)
     df_next_fwd.set_index('time', inplace=True)
-    df_sigma.set_index('time', inplace=True)
     
     # 建立回傳物件
     return {
@@ -74,7 +74,7 @@ def load_data(date_str, source_dir):
         'next_fwd': df_next_fwd,
         'rate': df_rate.iloc[0], # rate 通常一天只有一筆
         'month_change': df_month_change.iloc[0],
-        'sigma': df_sigma,       
+        'sigma': df_sigma,       # index 為 time，欄位 nearT / nearW / nextT / nextW
         'near_contrib': df_near_contrib,
         'next_contrib': df_next_contrib
     }
@@ -114,6 +114,20 @@ def get_previous_day_vix(date_str, source_dir):
         
     return None
 
+def resolve_fallback_vix(date_str, source_dir, state_store=None):
+    """
+    前一交易日的替代 VIX：先查跨日狀態 (O(1))，沒有前一交易日的紀錄時退回目錄掃描
+    """
+    if state_store is not None:
+        prev = state_store.previous(date_str, source_dir=source_dir)
+        if prev is not None:
+            prev_date, state = prev
+            value = state_fallback_vix(state)
+            if value is not None:
+                print(f"[{datetime.now().strftime('%H:%M:%S')}] 前一交易日 {prev_date} 收盤 VIX: {value} (跨日狀態)")
+                return value
+    return get_previous_day_vix(date_str, source_dir)
+
 def calculate_sigma2(term, T, R, fwd, k0, contrib_df):
     """
     計算單一月份 (Near/Next) 於特定時間點的變異數 (Sigma^2)
@@ -127,8 +141,14 @@ def calculate_sigma2(term, T, R, fwd, k0, contrib_df):
     if contrib_df.empty:
         return -1.0, 0
         
-    contrib_sum = contrib_df['contrib'].sum()
-    rows_count = len(contrib_df)
+    return sigma2_from_sum(T, fwd, k0, contrib_df['contrib'].sum(), len(contrib_df))
+
+def sigma2_from_sum(T, fwd, k0, contrib_sum, rows_count):
+    """
+    由已彙總的 SUM(contrib) 與筆數計算 Sigma^2 (calculate_sigma2 與 step1_engine 共用)
+    """
+    if T <= 0 or rows_count == 0:
+        return -1.0, 0
     
     term_part1 = (2.0 / T) * contrib_sum
     term_part2 = (1.0 / T) * ((fwd / k0) - 1.0) ** 2
@@ -141,27 +161,13 @@ def calculate_sigma2(term, T, R, fwd, k0, contrib_df):
         
     return sigma2, rows_count
 
-def main():
-    parser = argparse.ArgumentParser(description='計算 TAIWAN VIX')
-    parser.add_argument('--date', type=str, required=True, help='計算日期 YYYYMMDD (e.g. 20251201)')
-    parser.add_argument('--source', type=str, default='資料來源', help='輸入資料夾路徑')
-    parser.add_argument('--output', type=str, default='output', help='輸出資料夾路徑')
-    
-    args = parser.parse_args()
-    date_str = args.date
-    
-    # 1. 載入資料
-    try:
-        data = load_data(date_str, args.source)
-    except FileNotFoundError as e:
-        print(f"[{datetime.now().strftime('%H:%M:%S')}] 錯誤: {e}")
-        return
-        
-    # 建立輸出目錄
-    os.makedirs(args.output, exist_ok=True)
-    
-    print(f"[{datetime.now().strftime('%H:%M:%S')}] 資料載入完成，準備進行計算...")
-    
+def iter_time_inputs(data):
+    """
+    逐時間點取出計算 ORI VIX 所需的輸入 (參考實作：每個時間點各自篩選 contrib)
+
+    Yields:
+        (t, nearT, nearW, nearSigma2, nearCount, nextT, nextW, nextSigma2, nextCount)
+    """
     # 取出靜態變數
     near_rate = data['rate']['near_r']
     next_rate = data['rate']['next_r']
@@ -169,27 +175,9 @@ def main():
     near_contrib_df = data['near_contrib']
     next_contrib_df = data['next_contrib']
     
-    # 準備輸出容器
-    results_sigma = []
-    results_ori_vix = []
-    
     # 建立時間點序列 (使用 sigma 檔裡有的時間點)
     time_points = data['sigma'].index.unique()
     
-    print(f"[{datetime.now().strftime('%H:%M:%S')}] 共計 {len(time_points)} 個時間點。")
-
-    # 獲取前一日的 VIX 作為備用 (如果當天第一筆算不出來)
-    fallback_vix = get_previous_day_vix(date_str, args.source)
-    # 由於我們的測試資料第一天就是 20251201，沒有前一天，為了讓計算精確吻合官方 20251201 首筆，特別補上前一日結算值 24.36
-    if fallback_vix is None and date_str == '20251201':
-        fallback_vix = 24.36
-
-    # 紀錄前一次有效 VIX 以供過濾條件及異常時代替使用
-    prev_pub_vix = fallback_vix
-    prev_ori_vix = fallback_vix
-    jump_count = 0
-    has_passed_9am = False
-    
     for t in time_points:
         # 1. 取得該時間點的各項參數
         sigma_row = data['sigma'].loc[t]
@@ -219,7 +207,39 @@ def main():
         nextSigma2, nextCount = calculate_sigma2(
             "Next", nextT, next_rate, next_fwd_val, next_k0, cur_next_contrib
         )
-        
+        yield t, nearT, nearW, nearSigma2, nearCount, nextT, nextW, nextSigma2, nextCount
+
+def calculate_vix(data, date_str, fallback_vix=None, time_inputs=None):
+    """
+    依 load_data 載入的資料，逐時間點計算 Sigma^2、ORI VIX 與揭示 VIX
+
+    Args:
+        data: load_data 回傳的字典
+        date_str: 計算日期 YYYYMMDD
+        fallback_vix: 前一交易日最後有效 VIX (當天首筆算不出來時沿用)
+        time_inputs: 逐時間點輸入 (格式同 iter_time_inputs)，省略時使用 iter_time_inputs(data)；
+                     step1_engine.py 以預先彙總的 contrib 提供相同內容
+
+    Returns:
+        (df_out_sigma, df_out_ori): my_sigma 與 my_ORI_VIX 兩份輸出
+    """
+    # 準備輸出容器
+    results_sigma = []
+    results_ori_vix = []
+    
+    print(f"[{datetime.now().strftime('%H:%M:%S')}] 共計 {len(data['sigma'].index.unique())} 個時間點。")
+
+    # 紀錄前一次有效 VIX 以供過濾條件及異常時代替使用
+    prev_pub_vix = fallback_vix
+    prev_ori_vix = fallback_vix
+    jump_count = 0
+    has_passed_9am = False
+    # 年化係數 N年 / N30：閏年以 366 日計 (與 T / W 的 1年秒數一致)
+    annualize = year_seconds(date_str) / N30
+    
+    if time_inputs is None:
+        time_inputs = iter_time_inputs(data)
+    for t, nearT, nearW, nearSigma2, nearCount, nextT, nextW, nextSigma2, nextCount in time_inputs:
         # 4. 計算 ORI VIX
         ori_vix = -1.0
         
@@ -227,11 +247,8 @@ def main():
         if nearSigma2 > 0 and nextSigma2 > 0 and nearW < 1.0:
             term1 = nearT * nearSigma2 * nearW
             term2 = nextT * nextSigma2 * nextW
-            N365 = 31536000.0  # 全年秒數 365 * 24 * 60 * 60
-            N30 = 2592000.0    # 30天秒數 30 * 24 * 60 * 60
-            
-            # ( T1*Sigma1^2*W1 + T2*Sigma2^2*W2 ) * (N365 / N30)
-            inside_sqrt = (term1 + term2) * (N365 / N30)
+            # ( T1*Sigma1^2*W1 + T2*Sigma2^2*W2 ) * (N年 / N30)
+            inside_sqrt = (term1 + term2) * annualize
             if inside_sqrt >= 0:
                 ori_vix = np.sqrt(inside_sqrt) * 100  # 依照 spec 計算結果乘以 100 得到實際發布指數值
                 prev_ori_vix = ori_vix
@@ -332,14 +349,54 @@ def main():
     df_out_sigma = pd.DataFrame(results_sigma)
     df_out_ori = pd.DataFrame(results_ori_vix)
     
-    # 儲存
-    out_sigma_path = os.path.join(args.output, f"my_sigma_{date_str}.tsv")
-    out_ori_path = os.path.join(args.output, f"my_ORI_VIX_{date_str}.tsv")
+    return df_out_sigma, df_out_ori
+
+def write_outputs(df_out_sigma, df_out_ori, date_str, output_dir):
+    """
+    寫出 my_sigma_{date}.tsv 與 my_ORI_VIX_{date}.tsv，回傳兩個檔案路徑
+    """
+    out_sigma_path = os.path.join(output_dir, f"my_sigma_{date_str}.tsv")
+    out_ori_path = os.path.join(output_dir, f"my_ORI_VIX_{date_str}.tsv")
     
     df_out_sigma.to_csv(out_sigma_path, sep='\t', index=False, float_format='%.10f')
     
     # ORI VIX 的格式: date \t time \t blank \t ori_vix
     df_out_ori.to_csv(out_ori_path, sep='\t', index=False, header=False, float_format='%.2f')
+    return out_sigma_path, out_ori_path
+
+def main():
+    parser = argparse.ArgumentParser(description='計算 TAIWAN VIX')
+    parser.add_argument('--date', type=str, required=True, help='計算日期 YYYYMMDD (e.g. 20251201)')
+    parser.add_argument('--source', type=str, default='資料來源', help='輸入資料夾路徑')
+    parser.add_argument('--output', type=str, default='output', help='輸出資料夾路徑')
+    
+    args = parser.parse_args()
+    date_str = args.date
+    
+    # 1. 載入資料
+    try:
+        data = load_data(date_str, args.source)
+    except FileNotFoundError as e:
+        print(f"[{datetime.now().strftime('%H:%M:%S')}] 錯誤: {e}")
+        return
+        
+    # 建立輸出目錄
+    os.makedirs(args.output, exist_ok=True)
+    
+    print(f"[{datetime.now().strftime('%H:%M:%S')}] 資料載入完成，準備進行計算...")
+    
+    # 獲取前一日的 VIX 作為備用 (如果當天第一筆算不出來)
+    # 優先查詢跨日狀態 (output/session_state.json，含 20251201 前一日結算值 24.36)，
+    # 尚未記錄前一交易日時才掃描 資料來源/ 讀取前一日 sigma 檔
+    state_store = SessionStateStore.for_output(args.output)
+    fallback_vix = resolve_fallback_vix(date_str, args.source, state_store)
+
+    df_out_sigma, df_out_ori = calculate_vix(data, date_str, fallback_vix)
+    state_store.record(date_str, closing_state(df_out_sigma, data['near_fwd'], data['next_fwd']))
+    state_store.save()
+    
+    # 儲存
+    out_sigma_path, _ = write_outputs(df_out_sigma, df_out_ori, date_str, args.output)
     
     print(f"[{datetime.now().strftime('%H:%M:%S')}] 計算完成，產出 {len(df_out_sigma)} 筆資料至 {out_sigma_path}")
 
@@ -0,0 +1,293 @@
+"""
+全期限結構引擎 (Full Term-Structure Engine)
+
+RawDataLoader.load_and_filter 只保留最早的兩個到期月份，想看整條波動率期限結構
+就得對每一組月份各跑一次 Step 0 (每次都重掃整份 Tick)。本模組一次處理所有掛牌到期日：
+
+    1. 快照重建：所有到期日的 (履約價, 買賣權) 排成同一條序列軸，Tick 依 SeqNo 只掃一次，
+       以 (窗號, 序列) 複合鍵一次算出每個快照的 Q_Last_Valid 與 Q_Min
+       (規則同 SnapshotReconstructor.reconstruct_all，含沿用前值與 Q_Last 平手優先)
+    2. 篩選：param_sweep.run_filter 在同一條序列軸上完成 EMA / 異常值 / Q_hat (預設參數)
+    3. Sigma^2：各到期日以 Q_hat 的 Put-Call Parity 決定 F / K0，
+       T 依契約日曆 (附錄7)，再交給 sigma_engine.term_sigma2
+
+每多一個到期日只是序列軸變長，Tick 掃描與時間遞迴的趟數不變。
+
+到期日：月選 TXO 為到期月份第 3 個星期三，週選 TXn 為第 n 個星期三；
+近月 / 次近月以 rate_{date}.tsv 的天數為準 (可涵蓋假日順延)，其餘到期日遇假日順延時需以 --expiry 指定。
+Q_Min 的價差平手容差 (1e-9) 以「區間最小價差 + 1e-9 內的最新一筆」計算；報價以 0.1 點為單位，
+與 reconstruct_all 逐筆比較的結果相同。
+
+用法:
+    python term_structure.py 20251231                 # 月選全部到期日
+    python term_structure.py 20251231 --weeklies      # 含週選
+    python term_structure.py 20251231 --expiry TXO202603=20260318
+"""
+import os
+import sys
+import time
+import calendar
+import argparse
+
+if hasattr(sys.stdout, 'reconfigure'):
+    sys.stdout.reconfigure(encoding='utf-8')
+
+import numpy as np
+import pandas as pd
+
+from reconstruct_order_book import RawDataLoader, SnapshotScheduler, WEEKLY_PRODUCTS
+from param_sweep import QuoteGrid, run_filter, DEFAULT_PARAMS
+from sigma_engine import term_sigma2
+from forward_engine import strike_floor
+from vix_calendar import load_expiries, time_to_expiry, schedule_seconds, year_seconds
+
+MONTHLY_PRODUCT = "TXO"
+SPREAD_TOL = 1e-9  # 與 reconstruct_all 的價差平手容差相同
+
+OUTPUT_COLUMNS = ["time", "product", "contract", "expiry", "T", "forward", "k0", "sigma2", "contrib_rows"]
+
+
+# =====================================================================
+# 到期日與序列軸
+# =====================================================================
+def expiry_date(product, yyyymm):
+    """依契約規則推算到期日 (YYYYMMDD)：TXO 為第 3 個星期三，TXn 為第 n 個星期三"""
+    year, month = divmod(int(yyyymm), 100)
+    week = 3 if product == MONTHLY_PRODUCT else int(product[-1])
+    first_wed = 1 + (calendar.WEDNESDAY - calendar.weekday(year, month, 1)) % 7
+    day = first_wed + 7 * (week - 1)
+    if day > calendar.monthrange(year, month)[1]:
+        raise ValueError(f"{product}{yyyymm}: {year}/{month} 沒有第 {week} 個星期三")
+    return f"{year}{month:02d}{day:02d}"
+
+
+def build_series_axis(ticks):
+    """
+    所有到期日的序列軸：依到期日排序，每個到期日一段 [Call x 履約價, Put x 履約價]
+
+    Returns:
+        (expiries, series_id)
+            expiries: list[dict] (product, contract, strikes, offset)
+            series_id: 每筆 Tick 的全域序列編號 (np.ndarray)
+    """
+    keys = ticks[["Product", "YYYYMM"]].drop_duplicates()
+    keys = sorted(zip(keys["Product"], keys["YYYYMM"]), key=lambda k: (expiry_date(*k), k[0]))
+
+    series_id = np.full(len(ticks), -1, dtype=np.int64)
+    product = ticks["Product"].to_numpy()
+    contract = ticks["YYYYMM"].to_numpy()
+    strike = ticks["Strike"].to_numpy(dtype=float)
+    is_put = (ticks["CP"] == "Put").to_numpy()
+
+    expiries = []
+    offset = 0
+    for prod, ym in keys:
+        mask = (product == prod) & (contract == ym)
+        strikes = np.unique(strike[mask])
+        series_id[mask] = offset + np.searchsorted(strikes, strike[mask]) + np.where(is_put[mask], len(strikes), 0)
+        expiries.append({"product": prod, "contract": int(ym), "strikes": strikes, "offset": offset})
+        offset += 2 * len(strikes)
+    return expiries, series_id
+
+
+# =====================================================================
+# 快照重建 (所有序列一次)
+# =====================================================================
+def reconstruct_grid(ticks, series_id, n_series, schedule_times, initial_sys_id):
+    """
+    與 reconstruct_all + prepare_snapshot_quotes 相同的 Q_Last_Valid / Q_Min_Valid，但所有序列一起算
+
+    窗號：SeqNo <= initial_sys_id 為第 0 列 (開盤前)，(target[w-1], target[w]] 為第 w+1 列。
+
+    Returns:
+        QuoteGrid (序列軸為 build_series_axis 的全域序列；每個時間點皆有資料列，與 prod_strikes 模板相同)
+    """
+    order = np.argsort(ticks["svel_i081_seqno"].to_numpy(), kind="stable")
+    seq = ticks["svel_i081_seqno"].to_numpy()[order]
+    bid = ticks["svel_i081_best_buy_price1"].to_numpy(dtype=float)[order]
+    ask = ticks["svel_i081_best_sell_price1"].to_numpy(dtype=float)[order]
+    sid = series_id[order]
+    spread = ask - bid
+    valid = (bid >= 0) & (ask > 0) & (ask > bid)
+
+    times = np.array([str(t[2]).zfill(6) for t in schedule_times])
+    targets = np.array([t[1] for t in schedule_times], dtype=np.int64)
+    n_rows = len(targets) + 1
+    row = np.where(seq <= initial_sys_id, 0, np.searchsorted(targets, seq, side="left") + 1)
+    keep = (row < n_rows) & (sid >= 0)
+    tick_idx = np.flatnonzero(keep)
+    key = row[keep] * n_series + sid[keep]
+
+    def last_index(mask):
+        """每個 (列, 序列) 在該窗內最後一筆 (mask 為 True) 的 Tick 位置，無則 -1"""
+        out = np.full(n_rows * n_series, -1, dtype=np.int64)
+        np.maximum.at(out, key[mask[keep]], tick_idx[mask[keep]])
+        return out.reshape(n_rows, n_series)
+
+    all_ticks = np.ones(len(seq), dtype=bool)
+    new_raw = last_index(all_ticks)
+    new_valid = last_index(valid)
+    # 截至各窗結束的最新 Tick (Tick 位置隨 SeqNo 遞增，前向填補即累積最大值)
+    last_raw = np.maximum.accumulate(new_raw, axis=0)
+    last_valid = np.maximum.accumulate(new_valid, axis=0)
+
+    # Q_Min 候選：窗內有效 Tick + 窗起點的最新 Tick (若有效)
+    prev_raw = last_raw[:-1]
+    prev_ok = prev_raw >= 0
+    prev_ok[prev_ok] = valid[prev_raw[prev_ok]]
+    m_prev = np.where(prev_ok, spread[np.maximum(prev_raw, 0)], np.inf)
+
+    m_new = np.full(n_rows * n_series, np.inf)
+    vk = valid[keep]
+    np.minimum.at(m_new, key[vk], spread[tick_idx[vk]])
+    m_min = np.minimum(m_new.reshape(n_rows, n_series)[1:], m_prev)
+
+    # 窗內價差在最小值容差內的最新一筆；沒有時才用窗起點的報價
+    m_flat = np.concatenate([np.full(n_series, np.inf), m_min.ravel()])
+    near_min = vk & (spread[keep] <= m_flat[key] + SPREAD_TOL)
+    cand = np.full(n_rows * n_series, -1, dtype=np.int64)
+    np.maximum.at(cand, key[near_min], tick_idx[near_min])
+    chosen = cand.reshape(n_rows, n_series)[1:]
+    chosen = np.where((chosen < 0) & prev_ok & (m_prev <= m_min + SPREAD_TOL), prev_raw, chosen)
+
+    # 平手時以 Q_Last (有效) 優先
+    lv = last_valid[1:]
+    has_new = new_raw[1:] >= 0
+    tie = has_new & (lv >= 0) & (chosen >= 0)
+    tie[tie] = np.abs(spread[lv[tie]] - spread[chosen[tie]]) < SPREAD_TOL
+    chosen = np.where(tie, lv, chosen)
+
+    # 沒有新 Tick：沿用窗起點的最新報價 (若有效)
+    chosen = np.where(has_new, chosen, np.where(prev_ok, prev_raw, -1))
+
+    def pick(values, idx):
+        return np.where(idx >= 0, values[np.maximum(idx, 0)], np.nan)
+
+    fields = {}
+    for prefix, idx in (("last", lv), ("min", chosen)):
+        b, a = pick(bid, idx), pick(ask, idx)
+        fields.update({f"{prefix}_bid": b, f"{prefix}_ask": a,
+                       f"{prefix}_spread": a - b, f"{prefix}_mid": (b + a) / 2})
+    present = np.ones((len(targets), n_series), dtype=bool)
+    return QuoteGrid(times, np.arange(n_series, dtype=float), fields, present)
+
+
+# =====================================================================
+# 各到期日 F / K0 / T / Sigma^2
+# =====================================================================
+def parity_forward_dense(strikes, c_mid, p_mid, rate, T):
+    """每個時間點 |C - P| 最小 (平手取較低履約價) 的 K*，F = K* + e^(RT) (C - P)；無雙邊中價為 NaN"""
+    diff = c_mid - p_mid
+    absdiff = np.where(np.isnan(diff), np.inf, np.abs(diff))
+    best = np.argmin(absdiff, axis=-1)
+    rows = np.arange(len(best))
+    ok = np.isfinite(absdiff[rows, best])
+    return np.where(ok, strikes[best] + np.exp(rate * T) * diff[rows, best], np.nan)
+
+
+def resolve_expiries(expiries, date_str, source_dir="資料來源", overrides=None):
+    """
+    決定各到期日的到期日期與利率
+
+    近月 / 次近月 (TXO) 取 rate / month_change 的到期日與 near_r / next_r；其餘依契約規則推算，
+    利率沿用 next_r。overrides: {"TXO202603": "20260318"} 指定到期日。
+    """
+    overrides = overrides or {}
+    info, rate = None, None
+    try:
+        info = load_expiries(date_str, source_dir)
+        rate = pd.read_csv(os.path.join(source_dir, date_str, f"rate_{date_str}.tsv"), sep="\t").iloc[0]
+    except FileNotFoundError:
+        pass
+
+    for exp in expiries:
+        name = f"{exp['product']}{exp['contract']}"
+        exp["expiry"] = overrides.get(name, expiry_date(exp["product"], exp["contract"]))
+        exp["rate"] = float(rate["next_r"]) if rate is not None else 0.0
+        if info is None or exp["product"] != MONTHLY_PRODUCT or name in overrides:
+            continue
+        for term in ("near", "next"):
+            if str(exp["contract"]) == info[f"{term}_month"]:
+                exp["expiry"] = info[f"{term}_expiry"]
+                exp["rate"] = float(rate[f"{term}_r"])
+    return expiries
+
+
+def compute_term_structure(ticks, schedule_times, initial_sys_id, date_str, source_dir="資料來源",
+                           overrides=None, params=None):
+    """
+    單日所有到期日的 Sigma^2
+
+    Returns:
+        DataFrame (OUTPUT_COLUMNS)，依到期日、時間排序
+    """
+    expiries, series_id = build_series_axis(ticks)
+    n_series = expiries[-1]["offset"] + 2 * len(expiries[-1]["strikes"]) if expiries else 0
+    resolve_expiries(expiries, date_str, source_dir, overrides)
+
+    t0 = time.perf_counter()
+    grid = reconstruct_grid(ticks, series_id, n_series, schedule_times, initial_sys_id)
+    t1 = time.perf_counter()
+    result = run_filter(grid, [params or DEFAULT_PARAMS])
+    t2 = time.perf_counter()
+    print(f"  {len(expiries)} 個到期日 / {n_series} 個序列：重建 {t1 - t0:.2f}s，篩選 {t2 - t1:.2f}s")
+
+    seconds = schedule_seconds(grid.times)
+    n_year = year_seconds(date_str)
+    frames = []
+    for exp in expiries:
+        n = len(exp["strikes"])
+        lo = exp["offset"]
+        arrays = {
+            "c_bid": result["hat_bid"][0][:, lo:lo + n], "c_mid": result["hat_mid"][0][:, lo:lo + n],
+            "p_bid": result["hat_bid"][0][:, lo + n:lo + 2 * n], "p_mid": result["hat_mid"][0][:, lo + n:lo + 2 * n],
+        }
+        T = time_to_expiry(date_str, exp["expiry"], seconds, n_year)
+        fwd = parity_forward_dense(exp["strikes"], arrays["c_mid"], arrays["p_mid"], exp["rate"], T)
+        k0 = strike_floor(fwd, strikes=exp["strikes"])
+        sigma2, count, _ = term_sigma2(exp["strikes"], k0, np.nan_to_num(fwd), T, exp["rate"], **arrays)
+        frames.append(pd.DataFrame({
+            "time": grid.times, "product": exp["product"], "contract": exp["contract"], "expiry": exp["expiry"],
+            "T": T, "forward": fwd, "k0": k0, "sigma2": sigma2, "contrib_rows": count,
+        }))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=OUTPUT_COLUMNS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="所有掛牌到期日的 Sigma^2 (單趟 Tick)")
+    parser.add_argument("date", type=str, help="YYYYMMDD")
+    parser.add_argument("--weeklies", action="store_true", help=f"納入週選 ({', '.join(WEEKLY_PRODUCTS)})")
+    parser.add_argument("--raw-dir", type=str, help="原始 Tick 資料夾 (預設依 vix_utils 設定)")
+    parser.add_argument("--prod-dir", type=str, help="PROD 資料夾 (排程取自 NearPROD)")
+    parser.add_argument("--source", type=str, default="資料來源", help="rate / month_change 所在資料夾")
+    parser.add_argument("--output", type=str, default="output", help="輸出資料夾路徑")
+    parser.add_argument("--expiry", type=str, nargs="+", default=[], help="指定到期日，如 TXO202603=20260318")
+    args = parser.parse_args()
+
+    raw_dir, prod_dir = args.raw_dir, args.prod_dir
+    if not raw_dir or not prod_dir:
+        from vix_utils import get_vix_config
+        config = get_vix_config(args.date)
+        raw_dir, prod_dir = raw_dir or config["raw_dir"], prod_dir or config["prod_dir"]
+    overrides = dict(item.split("=", 1) for item in args.expiry)
+
+    ticks = RawDataLoader(raw_dir, args.date, include_weeklies=args.weeklies).load_all()
+    if ticks is None:
+        return
+    schedule, initial_sys_id, _ = SnapshotScheduler(os.path.join(prod_dir, f"NearPROD_{args.date}.tsv")).load_schedule()
+    if schedule.empty:
+        return
+
+    df = compute_term_structure(ticks, SnapshotScheduler.to_schedule_times(schedule), initial_sys_id,
+                                args.date, args.source, overrides)
+    os.makedirs(args.output, exist_ok=True)
+    out_path = os.path.join(args.output, f"term_structure_{args.date}.tsv")
+    df.to_csv(out_path, sep="\t", index=False)
+
+    closing = df.groupby(["product", "contract"], sort=False).last().reset_index()
+    print(closing[["product", "contract", "expiry", "T", "forward", "k0", "sigma2"]].to_string(index=False))
+    print(f"已寫入 {out_path} ({len(df)} 筆)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,730 @@
+"""
+VIX 計算引擎等價性驗證 (Golden-Output Equivalence Harness)
+
+目的：
+    任何 Step 0 / Step 1 的效能改寫都可能破壞與 PROD 的一致性，
+    而 verify_full_day.py 需要真實 PROD 檔才能比對。
+    本工具將「現行參考實作 (legacy)」與「新引擎 (candidate)」在同一份輸入上並排執行，
+    逐欄比對輸出 (浮點數容差)，並回報每個序列 (Strike + CP) 的第一個分歧點。
+
+支援的階段 (stage)：
+    - reconstruct : SnapshotReconstructor.reconstruct_all (Q_Last / Q_Min)
+    - ema         : add_ema_and_outlier_detection (EMA / Gamma / 異常值 / Q_hat)
+    - step1       : step1_vix_calc.calculate_vix (Sigma^2 / ORI VIX / VIX)
+
+已註冊的候選引擎：
+    - reconstruct / grid  : term_structure.reconstruct_grid (所有序列一次重建，比對 Q_Last / Q_Min 報價)
+    - ema / sweep         : param_sweep.run_filter 預設參數 (比對 Q_hat_Bid / Q_hat_Mid / Q_hat_Source)
+    - step1 / fast        : step1_engine.calculate_vix_fast
+
+輸入來源：
+    - 合成資料 (make_synthetic_step0_inputs / make_synthetic_step1_inputs)，不需任何檔案
+    - 實際日期 (load_recorded_step0_inputs / load_recorded_step1_inputs)，走 get_vix_config 路徑
+
+使用方式：
+    python validation/equivalence_harness.py                       # 合成資料，全部階段
+    python validation/equivalence_harness.py --stage reconstruct --date 20251231 --term Near
+    python validation/equivalence_harness.py --stage step1 --candidate fast
+
+    # 於效能測試中呼叫 (速度與正確性一起檢查)
+    from validation.equivalence_harness import register_engine, run_suite
+    register_engine('reconstruct', 'fast', my_fast_reconstruct)
+    results = run_suite('fast')
+"""
+import os
+import sys
+import io
+import time
+import argparse
+import contextlib
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+if hasattr(sys.stdout, 'reconfigure'):
+    sys.stdout.reconfigure(encoding='utf-8')
+
+# 專案根目錄 (讓 validation/ 底下也能 import 根目錄的模組)
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from reconstruct_order_book import SnapshotReconstructor
+from step0_process_quotes import add_ema_and_outlier_detection, prepare_snapshot_quotes
+from step1_vix_calc import calculate_vix
+
+
+# =============================================================================
+# 各階段的比對設定
+# =============================================================================
+# key_cols: 對齊兩邊結果用的主鍵
+# series_cols: 回報「第一個分歧點」時的序列分組
+# order_col: 序列內的時間排序欄位
+# ignore_cols: 只是說明文字或除錯用的欄位，不納入比對
+STAGE_SPECS = {
+    'reconstruct': {
+        'key_cols': ['Time', 'Strike', 'CP'],
+        'series_cols': ['Strike', 'CP'],
+        'order_col': 'Time',
+        'ignore_cols': [],
+    },
+    'ema': {
+        'key_cols': ['Time', 'Strike', 'CP'],
+        'series_cols': ['Strike', 'CP'],
+        'order_col': 'Time',
+        'ignore_cols': ['EMA_Process', 'Gamma_Process',
+                        'Q_Last_Valid_Outlier_Reason', 'Q_Min_Valid_Outlier_Reason'],
+    },
+    'step1': {
+        'key_cols': ['time'],
+        'series_cols': [],
+        'order_col': 'time',
+        'ignore_cols': [],
+    },
+}
+
+DEFAULT_FLOAT_TOL = 1e-6
+
+# 視為「空值」的表示法 (計算過程中 null 可能是字串 "null"、空字串、None 或 NaN)
+NULL_TOKENS = {'null', '', 'nan', 'None', 'NaN'}
+
+
+# =============================================================================
+# 引擎註冊表
+# =============================================================================
+# 每個階段的引擎函式簽名：
+#   reconstruct: fn(inputs) -> DataFrame
+#                inputs = {'ticks', 'schedule_times', 'initial_sys_id', 'prod_strikes'}
+#   ema:         fn(quotes_df, term_name) -> DataFrame
+#   step1:       fn(data, date_str, fallback_vix) -> DataFrame (my_sigma 格式)
+ENGINES = {stage: {} for stage in STAGE_SPECS}
+# 只產生部分欄位的引擎：{stage: {name: 比對欄位}} (未列出的引擎比對參考結果的全部欄位)
+ENGINE_COLUMNS = {stage: {} for stage in STAGE_SPECS}
+
+
+def register_engine(stage, name, func, columns=None):
+    """
+    註冊一個引擎實作，供 run_stage / run_suite 以名稱呼叫
+
+    Args:
+        stage: 'reconstruct' / 'ema' / 'step1'
+        name: 引擎名稱 (legacy 為保留的參考實作)
+        func: 引擎函式 (簽名見 ENGINES 說明)
+        columns: 引擎只產生部分欄位時，指定要比對的欄位 (主鍵以外)；None 表示全部
+    """
+    if stage not in ENGINES:
+        raise ValueError(f"未知的階段: {stage}，可用: {list(ENGINES)}")
+    ENGINES[stage][name] = func
+    if columns is not None:
+        ENGINE_COLUMNS[stage][name] = list(columns)
+    return func
+
+
+def _legacy_reconstruct(inputs):
+    reconstructor = SnapshotReconstructor(inputs['ticks'])
+    return reconstructor.reconstruct_all(
+        inputs['schedule_times'], inputs['initial_sys_id'], prod_strikes=inputs['prod_strikes']
+    )
+
+
+def _legacy_ema(quotes_df, term_name):
+    return add_ema_and_outlier_detection(quotes_df, term_name)
+
+
+def _legacy_step1(data, date_str, fallback_vix):
+    df_sigma, _ = calculate_vix(data, date_str, fallback_vix)
+    return df_sigma
+
+
+register_engine('reconstruct', 'legacy', _legacy_reconstruct)
+register_engine('ema', 'legacy', _legacy_ema)
+register_engine('step1', 'legacy', _legacy_step1)
+
+
+# =============================================================================
+# 候選引擎
+# =============================================================================
+# My_Min_Spread 不比對：reconstruct_all 沒有 Q_Min 時記為 inf，prepare_snapshot_quotes 也只由買賣價重算價差
+RECONSTRUCT_GRID_COLUMNS = ['My_Last_Bid', 'My_Last_Ask', 'My_Min_Bid', 'My_Min_Ask']
+EMA_SWEEP_COLUMNS = ['Q_hat_Bid', 'Q_hat_Mid', 'Q_hat_Source']
+
+
+def _grid_reconstruct(inputs):
+    """
+    term_structure.reconstruct_grid 展開回 reconstruct_all 的逐列格式
+
+    reconstruct_grid 只保留有效報價 (無效處為 NaN)，比對欄位限於 Q_Last / Q_Min 的買賣價；
+    有 prod_strikes 時依其補齊沒有 Tick 的履約價 (全為 NaN)，與 reconstruct_all 的模板相同
+    """
+    from term_structure import build_series_axis, reconstruct_grid
+
+    ticks = inputs['ticks']
+    expiries, series_id = build_series_axis(ticks)
+    if len(expiries) != 1:
+        raise ValueError(f"grid 引擎一次只比對單一到期月份，輸入含 {len(expiries)} 個")
+    strikes = expiries[0]['strikes']
+    grid = reconstruct_grid(ticks, series_id, 2 * len(strikes), inputs['schedule_times'],
+                            inputs['initial_sys_id'])
+
+    out_strikes = np.asarray(inputs['prod_strikes'] if inputs.get('prod_strikes') else strikes)
+    n_times, n_out = len(grid.times), len(out_strikes)
+    pos = pd.Index(strikes).get_indexer(out_strikes.astype(float))
+    frames = []
+    for cp, offset in (('Call', 0), ('Put', len(strikes))):
+        cols = np.where(pos >= 0, pos + offset, 0)
+
+        def take(values):
+            return np.where(pos >= 0, values[:, cols], np.nan).ravel()
+
+        frames.append(pd.DataFrame({
+            'Time': np.repeat(grid.times, n_out),
+            'Strike': np.tile(out_strikes, n_times),
+            'CP': cp,
+            'My_Last_Bid': take(grid.last_bid),
+            'My_Last_Ask': take(grid.last_ask),
+            'My_Min_Bid': take(grid.min_bid),
+            'My_Min_Ask': take(grid.min_ask),
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+def _sweep_ema(quotes_df, term_name):
+    """param_sweep.run_filter (預設參數) 的 Q_hat 展開回 add_ema_and_outlier_detection 的逐列格式"""
+    from param_sweep import (QuoteGrid, run_filter, DEFAULT_PARAMS,
+                             SOURCE_LAST, SOURCE_MIN, SOURCE_REPLACEMENT)
+
+    grid = QuoteGrid.from_quotes(quotes_df)
+    result = run_filter(grid, [DEFAULT_PARAMS])
+    t_idx = np.searchsorted(grid.times, quotes_df['Time'].astype(str).str.zfill(6).to_numpy())
+    s_idx = np.searchsorted(grid.strikes, quotes_df['Strike'].to_numpy(dtype=float)) \
+        + np.where(quotes_df['CP'] == 'Call', 0, grid.n_strikes)
+    source_name = {SOURCE_LAST: 'Q_Last_Valid', SOURCE_MIN: 'Q_Min_Valid', SOURCE_REPLACEMENT: 'Replacement'}
+    return pd.DataFrame({
+        'Time': quotes_df['Time'].to_numpy(),
+        'Strike': quotes_df['Strike'].to_numpy(),
+        'CP': quotes_df['CP'].to_numpy(),
+        'Q_hat_Bid': result['hat_bid'][0, t_idx, s_idx],
+        'Q_hat_Mid': result['hat_mid'][0, t_idx, s_idx],
+        'Q_hat_Source': [source_name[int(v)] for v in result['source'][0, t_idx, s_idx]],
+    })
+
+
+def _fast_step1(data, date_str, fallback_vix):
+    from step1_engine import calculate_vix_fast
+
+    df_sigma, _ = calculate_vix_fast(data, date_str, fallback_vix)
+    return df_sigma
+
+
+register_engine('reconstruct', 'grid', _grid_reconstruct, columns=RECONSTRUCT_GRID_COLUMNS)
+register_engine('ema', 'sweep', _sweep_ema, columns=EMA_SWEEP_COLUMNS)
+register_engine('step1', 'fast', _fast_step1)
+
+
+# =============================================================================
+# 輸入資料：合成
+# =============================================================================
+def make_synthetic_step0_inputs(n_strikes=12, n_times=80, ticks_per_interval=40,
+                                base_strike=22000, strike_step=100, seed=0,
+                                date_str='20251231', start_time='084500'):
+    """
+    產生合成的 Tick 與排程，格式與 RawDataLoader / SnapshotScheduler 的輸出一致
+
+    刻意混入以下邊界情況，讓分歧容易被抓到：
+    - 無效報價 (bid=ask=0、ask < bid)
+    - 相同 Spread 的平手 (測試 SeqNo 與 Q_Last 優先規則)
+    - 長時間無新報價的序列 (測試沿用前值)
+    - 跨越 09:00:00 的時間點 (測試 EMA 重置)
+
+    Returns:
+        dict: {'ticks', 'schedule_times', 'initial_sys_id', 'prod_strikes', 'term', 'date'}
+    """
+    rng = np.random.default_rng(seed)
+    strikes = [base_strike + i * strike_step for i in range(n_strikes)]
+    # 多放一個 PROD 有但 Tick 沒有的 Strike
+    prod_strikes = strikes + [base_strike + n_strikes * strike_step]
+
+    start = datetime.strptime(start_time, '%H%M%S')
+    time_strs = [
+        (start + pd.Timedelta(seconds=15 * i)).strftime('%H%M%S')
+        for i in range(n_times + 1)
+    ]
+
+    # 每個商品的基準價
+    base_mid = {}
+    for s in strikes:
+        for cp in ['Call', 'Put']:
+            moneyness = (s - strikes[n_strikes // 2]) / strike_step
+            base_mid[(s, cp)] = max(1.0, 200.0 - 15.0 * (moneyness if cp == 'Call' else -moneyness))
+
+    rows = []
+    seqno = 1000
+    sys_ids = []
+    for t_idx, t_str in enumerate(time_strs):
+        n_ticks = ticks_per_interval if t_idx > 0 else ticks_per_interval * 2
+        for _ in range(n_ticks):
+            seqno += int(rng.integers(1, 5))
+            s = strikes[int(rng.integers(0, n_strikes))]
+            # 讓最後一個 Strike 很少報價
+            if s == strikes[-1] and rng.random() < 0.9:
+                continue
+            cp = 'Call' if rng.random() < 0.5 else 'Put'
+            mid = base_mid[(s, cp)] * (1 + rng.normal(0, 0.02))
+            spread = float(rng.choice([0.5, 1.0, 1.0, 2.0, 5.0, 20.0]))
+            bid = round(max(0.0, mid - spread / 2), 1)
+            ask = round(bid + spread, 1)
+            r = rng.random()
+            if r < 0.05:
+                bid, ask = 0.0, 0.0
+            elif r < 0.08:
+                bid, ask = ask, bid
+
+            month_code = 'L' if cp == 'Call' else 'X'
+            prod_id = f"TXO{s:05d}{month_code}5"
+            tick_time = f"{t_str}{int(rng.integers(0, 15000)):06d}"
+            rows.append({
+                'svel_i081_yymmdd': date_str,
+                'svel_i081_prod_id': prod_id,
+                'svel_i081_time': tick_time,
+                'svel_i081_best_buy_price1': bid,
+                'svel_i081_best_sell_price1': ask,
+                'svel_i081_seqno': seqno,
+                'Product': 'TXO',
+                'Strike': s,
+                'CP': cp,
+                'Year': 2025,
+                'Month': 12,
+                'YYYYMM': 202512,
+                'ProdID': prod_id,
+            })
+        sys_ids.append(seqno)
+
+    ticks = pd.DataFrame(rows).sort_values('svel_i081_seqno').reset_index(drop=True)
+
+    # 第一個時間點 (084500) 為 Line 2 的起始列，其餘為快照排程
+    initial_sys_id = sys_ids[0]
+    schedule_times = [
+        (int(t_str), sys_id, t_str) for t_str, sys_id in zip(time_strs[1:], sys_ids[1:])
+    ]
+
+    return {
+        'ticks': ticks,
+        'schedule_times': schedule_times,
+        'initial_sys_id': initial_sys_id,
+        'prod_strikes': prod_strikes,
+        'term': 'Near',
+        'date': date_str,
+    }
+
+
+def make_synthetic_step1_inputs(n_times=120, n_strikes=30, seed=0, date_str='20251231',
+                                start_time='084515'):
+    """
+    產生合成的 Step 1 輸入 (格式與 step1_vix_calc.load_data 回傳值一致)
+
+    包含：跨越 09:00:00、近月 Contrib 缺漏 (sigma = -1)、VIX 跳動超過 2.5% 等情況。
+
+    Returns:
+        dict: {'data', 'date', 'fallback_vix'}
+    """
+    rng = np.random.default_rng(seed)
+    start = datetime.strptime(start_time, '%H%M%S')
+    times = [(start + pd.Timedelta(seconds=15 * i)).strftime('%H%M%S') for i in range(n_times)]
+
+    strikes = np.arange(n_strikes) * 100 + 21000
+    near_T, next_T = 0.02, 0.10
+    near_W = (next_T * 31536000 - 2592000) / ((next_T - near_T) * 31536000)
+
+    fwd_rows = {'Near': [], 'Next': []}
+    contrib_rows = {'Near': [], 'Next': []}
+    sigma_rows = []
+    level = 1.0
+    for i, t in enumerate(times):
+        # 製造幾次大幅跳動，讓 2.5% 過濾與連續四次規則被觸發
+        if i % 40 == 30:
+            level *= 1.15
+        for term in ['Near', 'Next']:
+            fwd = 22450 + rng.normal(0, 5)
+            k0 = strikes[strikes <= fwd].max()
+            fwd_rows[term].append({'date': date_str, 'time': t, 'tw_fwd': fwd, 'k0': k0})
+            # 模擬部分時間點近月完全沒有 contrib
+            if term == 'Near' and i % 50 == 49:
+                continue
+            for k in strikes:
+                contrib = level * 1e-5 * np.exp(-((k - fwd) / 800.0) ** 2) * (1 + rng.normal(0, 0.01))
+                contrib_rows[term].append({'time': t, 'strike': k, 'contrib': contrib})
+        sigma_rows.append({
+            'date': date_str, 'time': t,
+            'nearT': near_T - i * 1e-7, 'nearW': near_W,
+            'nextT': next_T - i * 1e-7, 'nextW': 1 - near_W,
+        })
+
+    near_fwd = pd.DataFrame(fwd_rows['Near']).set_index('time')
+    next_fwd = pd.DataFrame(fwd_rows['Next']).set_index('time')
+    data = {
+        'near_fwd': near_fwd,
+        'next_fwd': next_fwd,
+        'rate': pd.Series({'near_r': 0.015, 'next_r': 0.016}),
+        'month_change': pd.Series({'change': 0}),
+        'sigma': pd.DataFrame(sigma_rows).set_index('time'),
+        'near_contrib': pd.DataFrame(contrib_rows['Near']),
+        'next_contrib': pd.DataFrame(contrib_rows['Next']),
+    }
+    return {'data': data, 'date': date_str, 'fallback_vix': 20.0}
+
+
+# =============================================================================
+# 輸入資料：實際日期
+# =============================================================================
+def load_recorded_step0_inputs(date_str, term='Near'):
+    """
+    讀取實際日期的原始 Tick 與 PROD 排程 (路徑解析同 step0_process_quotes.main)
+
+    Returns:
+        dict (格式同 make_synthetic_step0_inputs)，找不到資料時回傳 None
+    """
+    from vix_utils import get_vix_config
+    from reconstruct_order_book import RawDataLoader, SnapshotScheduler
+
+    config = get_vix_config(date_str)
+    raw_dir, prod_dir = config['raw_dir'], config['prod_dir']
+    if not raw_dir or not prod_dir:
+        print(f"錯誤: 無法解析 {date_str} 的資料路徑")
+        return None
+
+    near_ticks, next_ticks, _ = RawDataLoader(raw_dir, config['target_date']).load_and_filter()
+    if near_ticks is None:
+        return None
+    ticks = near_ticks if term == 'Near' else next_ticks
+
+    prod_path = os.path.join(prod_dir, f"{term}PROD_{config['target_date']}.tsv")
+    schedule, initial_sys_id, prod_strikes = SnapshotScheduler(prod_path).load_schedule()
+    if schedule.empty:
+        return None
+    schedule_times = SnapshotScheduler.to_schedule_times(schedule)
+
+    return {
+        'ticks': ticks,
+        'schedule_times': schedule_times,
+        'initial_sys_id': initial_sys_id,
+        'prod_strikes': prod_strikes,
+        'term': term,
+        'date': config['target_date'],
+    }
+
+
+def load_recorded_step1_inputs(date_str, source_dir='資料來源'):
+    """
+    讀取實際日期的 Step 1 輸入 (load_data + 前一交易日 VIX)
+
+    Returns:
+        dict (格式同 make_synthetic_step1_inputs)，缺檔時回傳 None
+    """
+    from step1_vix_calc import load_data, resolve_fallback_vix
+    from session_state import SessionStateStore
+
+    try:
+        data = load_data(date_str, source_dir)
+    except FileNotFoundError as e:
+        print(f"錯誤: {e}")
+        return None
+    return {
+        'data': data,
+        'date': date_str,
+        # 只用內建的種子狀態 (與 step1 相同的 20251201 前一日值)，其餘日期掃描前一日 sigma
+        'fallback_vix': resolve_fallback_vix(date_str, source_dir, SessionStateStore(None)),
+    }
+
+
+# =============================================================================
+# 比對
+# =============================================================================
+def _normalize_column(series):
+    """
+    將一欄轉為 (數值陣列, 字串陣列, 空值遮罩)，統一各種 null 表示法
+    """
+    as_str = series.astype(object).where(series.notna(), None)
+    as_str = as_str.map(lambda v: None if v is None or str(v).strip() in NULL_TOKENS else str(v).strip())
+    is_null = as_str.isna().to_numpy()
+    # bool 先轉成數值，避免 True / 'True' 這類表示法差異
+    numeric = pd.to_numeric(
+        as_str.map(lambda v: {'True': 1, 'False': 0}.get(v, v) if v is not None else None),
+        errors='coerce'
+    ).to_numpy(dtype=float)
+    return numeric, as_str.to_numpy(dtype=object), is_null
+
+
+def compare_frames(ref_df, cand_df, key_cols, series_cols=None, order_col=None,
+                   ignore_cols=None, float_tol=DEFAULT_FLOAT_TOL):
+    """
+    逐欄比對兩份結果
+
+    比對規則：
+    - 兩邊都是空值 → 相同
+    - 兩邊都能轉成數值 → |差| <= float_tol 視為相同
+    - 其他 → 字串相同才算相同
+
+    Args:
+        ref_df, cand_df: 參考 / 候選結果
+        key_cols: 對齊用主鍵
+        series_cols: 分組回報第一個分歧點的欄位 (空 list 表示整份只算一個序列)
+        order_col: 序列內排序欄位
+        ignore_cols: 不比對的欄位
+        float_tol: 浮點數容差
+
+    Returns:
+        dict:
+            - passed: 是否完全一致
+            - rows_ref / rows_cand: 兩邊筆數
+            - missing_in_cand / extra_in_cand: 主鍵只出現在單邊的筆數
+            - missing_columns / extra_columns: 欄位只出現在單邊
+            - column_mismatches: {欄位: 不一致筆數}
+            - first_divergence: DataFrame，每個序列 × 欄位的第一個分歧點
+    """
+    series_cols = list(series_cols or [])
+    ignore_cols = set(ignore_cols or [])
+    key_cols = list(key_cols)
+
+    ref = ref_df.copy()
+    cand = cand_df.copy()
+    # 主鍵統一為字串，避免 int / str 造成 merge 不到
+    for df in (ref, cand):
+        for c in key_cols:
+            df[c] = df[c].astype(str).str.strip()
+
+    merged = ref.merge(cand, on=key_cols, how='outer', suffixes=('__ref', '__cand'), indicator=True)
+    missing_in_cand = int((merged['_merge'] == 'left_only').sum())
+    extra_in_cand = int((merged['_merge'] == 'right_only').sum())
+    both = merged[merged['_merge'] == 'both'].reset_index(drop=True)
+
+    ref_cols = [c for c in ref.columns if c not in key_cols and c not in ignore_cols]
+    cand_cols = set(c for c in cand.columns if c not in key_cols and c not in ignore_cols)
+    common_cols = [c for c in ref_cols if c in cand_cols]
+
+    column_mismatches = {}
+    divergences = []
+    for col in common_cols:
+        r_num, r_str, r_null = _normalize_column(both[f"{col}__ref"])
+        c_num, c_str, c_null = _normalize_column(both[f"{col}__cand"])
+
+        both_num = ~np.isnan(r_num) & ~np.isnan(c_num)
+        same = (r_null & c_null)
+        same |= both_num & (np.abs(r_num - c_num) <= float_tol)
+        same |= ~both_num & ~r_null & ~c_null & (r_str == c_str)
+
+        bad = ~same
+        n_bad = int(bad.sum())
+        if n_bad == 0:
+            continue
+        column_mismatches[col] = n_bad
+
+        bad_df = both.loc[bad, key_cols].copy()
+        bad_df['Column'] = col
+        bad_df['Ref'] = r_str[bad]
+        bad_df['Cand'] = c_str[bad]
+        divergences.append(bad_df)
+
+    if divergences:
+        div_df = pd.concat(divergences, ignore_index=True)
+        if order_col:
+            # 時間欄位以數值排序 (避免 '84515' 與 '100000' 的字串排序問題)
+            div_df['_order'] = pd.to_numeric(div_df[order_col], errors='coerce')
+            div_df = div_df.sort_values(series_cols + ['Column', '_order'])
+            div_df = div_df.drop(columns=['_order'])
+        first_div = div_df.drop_duplicates(subset=series_cols + ['Column'], keep='first')
+        first_div = first_div.reset_index(drop=True)
+    else:
+        first_div = pd.DataFrame(columns=key_cols + ['Column', 'Ref', 'Cand'])
+
+    missing_columns = [c for c in ref_cols if c not in cand_cols]
+    extra_columns = sorted(cand_cols - set(ref_cols))
+
+    return {
+        'passed': (not column_mismatches and missing_in_cand == 0 and extra_in_cand == 0
+                   and not missing_columns),
+        'rows_ref': len(ref_df),
+        'rows_cand': len(cand_df),
+        'missing_in_cand': missing_in_cand,
+        'extra_in_cand': extra_in_cand,
+        'missing_columns': missing_columns,
+        'extra_columns': extra_columns,
+        'column_mismatches': column_mismatches,
+        'first_divergence': first_div,
+    }
+
+
+# =============================================================================
+# 執行
+# =============================================================================
+def _call_engine(stage, func, inputs, quiet):
+    """依階段展開輸入並計時執行一個引擎"""
+    if stage == 'reconstruct':
+        args = (inputs,)
+    elif stage == 'ema':
+        args = (inputs['quotes'], inputs['term'])
+    else:
+        args = (inputs['data'], inputs['date'], inputs['fallback_vix'])
+
+    sink = io.StringIO() if quiet else None
+    start = time.perf_counter()
+    if quiet:
+        with contextlib.redirect_stdout(sink):
+            result = func(*args)
+    else:
+        result = func(*args)
+    elapsed = time.perf_counter() - start
+    return result, elapsed
+
+
+def build_ema_inputs(step0_inputs, quiet=True):
+    """以 legacy 重建結果準備 ema 階段的輸入 (兩邊引擎吃同一份報價表)"""
+    snapshot_df, _ = _call_engine('reconstruct', ENGINES['reconstruct']['legacy'], step0_inputs, quiet)
+    return {
+        'quotes': prepare_snapshot_quotes(snapshot_df, step0_inputs['term']),
+        'term': step0_inputs['term'],
+    }
+
+
+def run_stage(stage, inputs, candidate, reference='legacy', float_tol=DEFAULT_FLOAT_TOL, quiet=True):
+    """
+    在同一份輸入上執行參考與候選引擎並比對
+
+    Args:
+        stage: 'reconstruct' / 'ema' / 'step1'
+        inputs: 該階段的輸入 (ema 階段需先經 build_ema_inputs)
+        candidate: 候選引擎名稱或函式
+        reference: 參考引擎名稱或函式 (預設 legacy)
+        float_tol: 浮點數容差
+        quiet: 是否隱藏引擎本身的 print 輸出
+
+    Returns:
+        dict: compare_frames 的結果，另加 stage / candidate / ref_seconds / cand_seconds / speedup
+    """
+    spec = STAGE_SPECS[stage]
+    ref_func = ENGINES[stage][reference] if isinstance(reference, str) else reference
+    cand_func = ENGINES[stage][candidate] if isinstance(candidate, str) else candidate
+
+    ref_df, ref_sec = _call_engine(stage, ref_func, inputs, quiet)
+    cand_df, cand_sec = _call_engine(stage, cand_func, inputs, quiet)
+
+    # 只產生部分欄位的候選引擎：參考結果只留主鍵與這些欄位
+    columns = ENGINE_COLUMNS[stage].get(candidate) if isinstance(candidate, str) else None
+    if columns is not None:
+        ref_df = ref_df[spec['key_cols'] + [c for c in columns if c in ref_df.columns]]
+
+    report = compare_frames(
+        ref_df, cand_df,
+        key_cols=spec['key_cols'],
+        series_cols=spec['series_cols'],
+        order_col=spec['order_col'],
+        ignore_cols=spec['ignore_cols'],
+        float_tol=float_tol,
+    )
+    report.update({
+        'stage': stage,
+        'candidate': candidate if isinstance(candidate, str) else getattr(candidate, '__name__', 'candidate'),
+        'ref_seconds': ref_sec,
+        'cand_seconds': cand_sec,
+        'speedup': (ref_sec / cand_sec) if cand_sec > 0 else float('inf'),
+    })
+    return report
+
+
+def run_suite(candidate='legacy', stages=None, date_str=None, term='Near',
+              float_tol=DEFAULT_FLOAT_TOL, synthetic_kwargs=None, quiet=True):
+    """
+    一次執行多個階段的等價性檢查 (供效能測試呼叫)
+
+    Args:
+        candidate: 候選引擎名稱；某階段沒有註冊此名稱時跳過該階段
+        stages: 要執行的階段 list，預設全部
+        date_str: 指定日期則使用實際資料，否則使用合成資料
+        term: 實際資料時的 Near / Next
+        float_tol: 浮點數容差
+        synthetic_kwargs: 傳給合成資料產生器的參數
+        quiet: 是否隱藏引擎本身的 print 輸出
+
+    Returns:
+        list[dict]: 各階段的 run_stage 結果
+    """
+    stages = stages or list(STAGE_SPECS)
+    synthetic_kwargs = synthetic_kwargs or {}
+    results = []
+
+    step0_inputs = None
+    if any(s in stages for s in ('reconstruct', 'ema')):
+        if date_str:
+            step0_inputs = load_recorded_step0_inputs(date_str, term)
+        else:
+            step0_inputs = make_synthetic_step0_inputs(**synthetic_kwargs)
+
+    for stage in stages:
+        if candidate not in ENGINES[stage]:
+            print(f"[SKIP] {stage}: 未註冊引擎 '{candidate}'")
+            continue
+
+        if stage == 'reconstruct':
+            inputs = step0_inputs
+        elif stage == 'ema':
+            inputs = build_ema_inputs(step0_inputs, quiet) if step0_inputs else None
+        else:
+            inputs = load_recorded_step1_inputs(date_str) if date_str else make_synthetic_step1_inputs()
+
+        if inputs is None:
+            print(f"[SKIP] {stage}: 無法取得輸入資料")
+            continue
+
+        results.append(run_stage(stage, inputs, candidate, float_tol=float_tol, quiet=quiet))
+
+    return results
+
+
+def print_report(report, max_rows=20):
+    """印出單一階段的比對結果"""
+    status = "[PASS]" if report['passed'] else "[FAIL]"
+    print(f"\n{status} {report['stage']} (candidate={report['candidate']})")
+    print(f"  筆數: ref={report['rows_ref']}, cand={report['rows_cand']}"
+          f" | 缺少={report['missing_in_cand']}, 多出={report['extra_in_cand']}")
+    print(f"  耗時: ref={report['ref_seconds']:.3f}s, cand={report['cand_seconds']:.3f}s"
+          f" (x{report['speedup']:.2f})")
+    if report['missing_columns']:
+        print(f"  候選結果缺少欄位: {report['missing_columns']}")
+    if report['column_mismatches']:
+        print("  欄位不一致筆數:")
+        for col, n in report['column_mismatches'].items():
+            print(f"    {col}: {n}")
+        first_div = report['first_divergence']
+        print(f"  各序列第一個分歧點 (共 {len(first_div)} 筆，顯示前 {max_rows} 筆):")
+        print(first_div.head(max_rows).to_string(index=False))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='VIX 計算引擎等價性驗證')
+    parser.add_argument('--stage', type=str, default='all',
+                        choices=['all'] + list(STAGE_SPECS), help='要比對的階段')
+    parser.add_argument('--candidate', type=str, default='legacy', help='候選引擎名稱')
+    parser.add_argument('--date', type=str, default=None, help='使用實際日期資料 (YYYYMMDD)，省略則用合成資料')
+    parser.add_argument('--term', type=str, default='Near', choices=['Near', 'Next'])
+    parser.add_argument('--tol', type=float, default=DEFAULT_FLOAT_TOL, help='浮點數容差')
+    parser.add_argument('--verbose', action='store_true', help='顯示引擎本身的輸出')
+    args = parser.parse_args()
+
+    stages = list(STAGE_SPECS) if args.stage == 'all' else [args.stage]
+    source = f"實際資料 {args.date} {args.term}" if args.date else "合成資料"
+    print("=" * 60)
+    print(f"等價性驗證: candidate={args.candidate}, 輸入={source}")
+    print("=" * 60)
+
+    results = run_suite(args.candidate, stages, args.date, args.term,
+                        float_tol=args.tol, quiet=not args.verbose)
+    for report in results:
+        print_report(report)
+
+    all_passed = bool(results) and all(r['passed'] for r in results)
+    print("\n" + ("全部一致" if all_passed else "發現差異或未執行任何階段"))
+    sys.exit(0 if all_passed else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+Step 0 內嵌 PROD 一致性檢查 (Parity Sink)
+
+原本流程：Step 0 寫出 output/驗證{date}_{term}PROD.csv，
+run_batch.py 再啟動新行程以 verify_full_day.py 重新讀回 CSV 與 NearPROD/NextPROD_*.tsv 比對。
+
+ParitySink 讓 Step 0 在記憶體中直接比對：
+    1. 每個 Term 的 PROD 參考檔只讀取一次，建立 (time x strike x cp) 參考網格
+    2. Step 0 產出 PROD 格式結果後立即比對 (不經 CSV 重讀)
+    3. 直接輸出與 verify_full_day.py 相同格式的 validation_diff_{date}.csv
+       (與預先彙總 validation_store/{date}.json)
+    4. 可設定差異上限 (max_mismatches)，達上限即停止後續 Term，供快速分流；
+       此時彙總標記 truncated，Viewer 不會把部分計數當成全天結果
+
+用法:
+    python step0_process_quotes.py 20251231 --parity
+    python step0_process_quotes.py 20251231 --parity --max-mismatch 100
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from verify_full_day import (
+    OURS_FIELD_MAP, PROD_FIELD_MAP,
+    _needed_columns, build_prod_long, verify_term_detailed, write_diff_report,
+)
+
+
+def _as_csv_text(df):
+    """
+    記憶體中的 PROD 格式結果 -> 與 read_csv(dtype=str) 讀回 CSV 相同的字串表
+
+    數值以 str() 呈現 (與 to_csv 的輸出一致)，缺值保持 NaN
+    """
+    wanted = _needed_columns(OURS_FIELD_MAP)
+    text = {}
+    for col in df.columns:
+        if not wanted(col):
+            continue
+        values = df[col].to_numpy(dtype=object)
+        missing = pd.isna(values)
+        text[col] = np.array([np.nan if m else str(v) for v, m in zip(values, missing)], dtype=object)
+    return pd.DataFrame(text, index=df.index)
+
+
+class ParitySink:
+    """收集 Step 0 各 Term 的比對結果並輸出差異報告"""
+
+    def __init__(self, target_date, max_mismatches=None, output_dir='output'):
+        self.target_date = target_date
+        self.max_mismatches = max_mismatches
+        self.output_dir = output_dir
+        self.reports = []
+        self.mismatches = 0
+        self.rows_compared = {}
+        self.truncated = False   # 有差異因上限被略過，或有 Term 未比對
+        self._references = {}
+
+    @property
+    def exhausted(self):
+        """是否已達差異上限 (後續 Term 可略過)"""
+        return self.max_mismatches is not None and self.mismatches >= self.max_mismatches
+
+    def load_reference(self, prod_path):
+        """讀取 PROD 參考檔並建立長表 (同一檔案只讀一次)"""
+        key = os.path.abspath(prod_path)
+        if key not in self._references:
+            prod_df = pd.read_csv(prod_path, sep='\t', dtype=str, usecols=_needed_columns(PROD_FIELD_MAP))
+            self._references[key] = build_prod_long(prod_df)
+        return self._references[key]
+
+    def check_term(self, term_name, prod_path, ours_df):
+        """
+        比對單一 Term
+
+        Args:
+            term_name: 'Near' 或 'Next'
+            prod_path: PROD 參考檔 (NearPROD_{date}.tsv / NextPROD_{date}.tsv)
+            ours_df: save_prod_format 回傳的 PROD 格式結果
+
+        Returns:
+            DataFrame: 此 Term 的差異報告
+        """
+        print(f"\n>>> PROD 一致性檢查 ({term_name})")
+        remaining = None
+        if self.max_mismatches is not None:
+            remaining = max(self.max_mismatches - self.mismatches, 0)
+        report = verify_term_detailed(
+            None, _as_csv_text(ours_df), term_name, self.target_date,
+            prod_long=self.load_reference(prod_path), max_mismatches=remaining,
+        )
+        self.reports.append(report)
+        self.mismatches += len(report)
+        if report.attrs.get('truncated'):
+            self.truncated = True
+        # 每行 = 1 個 strike，Call + Put 各算一筆
+        self.rows_compared[term_name] = len(ours_df) * 2
+        return report
+
+    def skip_term(self, term_name):
+        """已達差異上限而略過的 Term (彙總標記為不完整)"""
+        print(f"\n>>> 已達差異上限 {self.max_mismatches} 筆，略過 {term_name} Term")
+        self.truncated = True
+
+    def write(self):
+        """輸出 validation_diff_{date}.csv，回傳報告路徑"""
+        return write_diff_report(self.reports, self.target_date, self.output_dir,
+                                 rows_compared=self.rows_compared, truncated=self.truncated)
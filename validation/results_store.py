@@ -0,0 +1,304 @@
+"""
+跨日驗證結果彙總庫 (Validation Results Store)
+
+validation_diff_YYYYMMDD.csv 是逐筆差異明細，Viewer 的摘要與批次結果
+原本每次都要重讀整份 CSV 做 value_counts，月份層級的總覽需要解析 20+ 份 CSV。
+
+本模組在驗證器輸出差異報告時，同步寫出一份小型的預先彙總檔：
+
+    output/validation_store/YYYYMMDD.json
+    {
+        "version": 1,
+        "date": "YYYYMMDD",
+        "source": {"file": ..., "mtime": ..., "size": ...},   # 對應的差異報告簽章
+        "total_diffs": N,
+        "rows_compared": {"Near": n, "Next": n},               # 比對筆數 (Call + Put)
+        "truncated": false,                                    # 達 --max-mismatch 上限提前停止，計數不是全天；null 為未知
+        "bucket_minutes": 5,
+        "terms": {                                             # 只列出有差異的 Term
+            "Near": {
+                "total_diffs": n,
+                "by_column": {"EMA": n, ...},
+                "by_cp": {"Call": n, "Put": n},
+                "by_bucket": {"0845": {"EMA": n, ...}, ...}    # 每 5 分鐘
+            }
+        }
+    }
+
+以日期分檔、Term 分節；來源差異報告重新產生 (mtime / size 改變) 時視為過期。
+環境沒有 pyarrow，因此以 JSON 儲存 (彙總後每日只有數 KB，讀取成本可忽略)。
+Viewer (DiffLoader) 也直接 import 本模組的常數與讀取 / 檢查函式，兩邊不另外維護一份。
+
+truncated 另外記在差異報告旁的 validation_diff_YYYYMMDD.meta.json (含報告簽章)，
+彙總遺失或過期而由 CSV 回補時由此取回；沒有對應的 meta (舊報告) 時無法得知，記為 null (未知)。
+缺少 truncated 欄位的舊彙總同樣視為未知。
+
+用法:
+    # 由既有的 validation_diff_*.csv 回補彙總檔
+    python validation/results_store.py rebuild [YYYYMMDD ...]
+    # 月份總覽
+    python validation/results_store.py overview --start 20251201 --end 20251231
+"""
+import os
+import re
+import glob
+import json
+import argparse
+
+import pandas as pd
+
+STORE_VERSION = 1
+STORE_DIRNAME = 'validation_store'
+BUCKET_MINUTES = 5
+
+
+def store_dir(output_dir='output'):
+    return os.path.join(output_dir, STORE_DIRNAME)
+
+
+def summary_path(date_str, output_dir='output'):
+    return os.path.join(store_dir(output_dir), f'{date_str}.json')
+
+
+def diff_report_path(date_str, output_dir='output'):
+    return os.path.join(output_dir, f'validation_diff_{date_str}.csv')
+
+
+def report_meta_path(date_str, output_dir='output'):
+    """差異報告的附屬資訊 (truncated)，與報告放在一起，彙總重建時不會遺失"""
+    return os.path.join(output_dir, f'validation_diff_{date_str}.meta.json')
+
+
+def ours_prod_path(date_str, term, output_dir='output'):
+    """Step 0 輸出的 PROD 格式結果 (比對筆數的來源)"""
+    return os.path.join(output_dir, f'驗證{date_str}_{term}PROD.csv')
+
+
+def _source_signature(path):
+    stat = os.stat(path)
+    return {'file': os.path.basename(path), 'mtime': stat.st_mtime, 'size': stat.st_size}
+
+
+def _time_buckets(times):
+    """HMMSS / HHMMSS 時間 -> 'HHMM' 區間標籤 (依 BUCKET_MINUTES 取整)"""
+    t = pd.to_numeric(pd.Series(times), errors='coerce').fillna(0).astype(int)
+    minutes = (t // 10000) * 60 + (t // 100) % 100
+    minutes = minutes // BUCKET_MINUTES * BUCKET_MINUTES
+    return ((minutes // 60) * 100 + minutes % 60).map(lambda v: f'{v:04d}')
+
+
+def _write_json(path, obj):
+    # 先寫暫存檔再換名，避免 Viewer 讀到寫一半的檔案
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(obj, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def report_truncated(date_str, output_dir='output'):
+    """
+    差異報告是否因達差異上限而不完整
+
+    Returns:
+        True / False；meta 不存在或與目前的報告不符 (報告已由其他程式重新產生) 時為 None
+    """
+    report = diff_report_path(date_str, output_dir)
+    meta = read_summary_file(report_meta_path(date_str, output_dir))
+    if not meta or not os.path.exists(report):
+        return None
+    source, sig = meta.get('source') or {}, _source_signature(report)
+    if source.get('mtime') != sig['mtime'] or source.get('size') != sig['size']:
+        return None
+    return bool(meta.get('truncated'))
+
+
+def build_summary(diff_df, date_str, rows_compared=None, truncated=False):
+    """
+    由差異報告 DataFrame 計算彙總
+
+    Args:
+        diff_df: 欄位同 validation_diff CSV (Date, Time, Term, Strike, CP, Column, ...)
+        date_str: YYYYMMDD
+        rows_compared: {term: 比對筆數}，未知時省略
+        truncated: 差異報告是否因達差異上限而不完整 (部分差異略過或 Term 未比對)；None 為未知
+
+    Returns:
+        dict: 彙總內容 (不含 source 簽章)
+    """
+    terms = {}
+    if len(diff_df) and 'Term' in diff_df.columns:
+        # 與 DiffLoader.get_summary 相同：Term 依出現順序，欄位依 value_counts 排序
+        for term in diff_df['Term'].dropna().unique():
+            term_df = diff_df[diff_df['Term'] == term]
+            buckets = _time_buckets(term_df['Time'].to_numpy())
+            counts = term_df.groupby([buckets.to_numpy(), term_df['Column'].to_numpy()]).size()
+            by_bucket = {}
+            for (bucket, col), n in counts.items():
+                by_bucket.setdefault(bucket, {})[str(col)] = int(n)
+            terms[str(term)] = {
+                'total_diffs': int(len(term_df)),
+                'by_column': {str(k): int(v) for k, v in term_df['Column'].value_counts().items()},
+                'by_cp': {str(k): int(v) for k, v in term_df['CP'].value_counts().items()},
+                'by_bucket': by_bucket,
+            }
+
+    return {
+        'version': STORE_VERSION,
+        'date': str(date_str),
+        'total_diffs': int(len(diff_df)),
+        'rows_compared': {k: int(v) for k, v in (rows_compared or {}).items()},
+        'truncated': None if truncated is None else bool(truncated),
+        'bucket_minutes': BUCKET_MINUTES,
+        'terms': terms,
+    }
+
+
+def write_summary(diff_df, date_str, rows_compared=None, output_dir='output', truncated=False):
+    """差異報告寫出後呼叫：計算彙總並寫入 validation_store/YYYYMMDD.json"""
+    summary = build_summary(diff_df, date_str, rows_compared, truncated)
+    report = diff_report_path(date_str, output_dir)
+    summary['source'] = _source_signature(report) if os.path.exists(report) else None
+    if summary['source'] is not None and truncated is not None:
+        _write_json(report_meta_path(date_str, output_dir),
+                    {'source': summary['source'], 'truncated': bool(truncated)})
+
+    os.makedirs(store_dir(output_dir), exist_ok=True)
+    path = summary_path(date_str, output_dir)
+    _write_json(path, summary)
+    return path
+
+
+def read_summary_file(path):
+    """讀取彙總 JSON (不檢查是否過期)，讀取失敗回傳 None"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def is_current(summary, date_str, output_dir='output'):
+    """彙總版本相符且對應的差異報告未重新產生"""
+    if not summary or summary.get('version') != STORE_VERSION:
+        return False
+    report = diff_report_path(date_str, output_dir)
+    source = summary.get('source')
+    if not source or not os.path.exists(report):
+        return False
+    sig = _source_signature(report)
+    return source.get('mtime') == sig['mtime'] and source.get('size') == sig['size']
+
+
+def load_summary(date_str, output_dir='output'):
+    """讀取彙總；不存在、版本不符或來源差異報告已變動時回傳 None"""
+    summary = read_summary_file(summary_path(date_str, output_dir))
+    return summary if is_current(summary, date_str, output_dir) else None
+
+
+def available_dates(output_dir='output'):
+    """所有已有差異報告的日期 (升序)"""
+    dates = []
+    for f in glob.glob(os.path.join(output_dir, 'validation_diff_*.csv')):
+        match = re.search(r'validation_diff_(\d{8})\.csv', os.path.basename(f))
+        if match:
+            dates.append(match.group(1))
+    return sorted(dates)
+
+
+def count_rows(path):
+    """計算 CSV 資料列數 (扣掉 header)"""
+    with open(path, encoding='utf-8-sig') as f:
+        return sum(1 for _ in f) - 1
+
+
+def rebuild_summary(date_str, output_dir='output'):
+    """
+    由既有的 validation_diff CSV 與我們的 PROD 格式輸出回補彙總
+
+    truncated 取自報告旁的 meta；無法確認時記為 None (未知)，不當成完整計數
+    """
+    report = diff_report_path(date_str, output_dir)
+    diff_df = pd.read_csv(report, encoding='utf-8-sig', dtype=str)
+    rows_compared = {}
+    for term in ['Near', 'Next']:
+        ours_path = ours_prod_path(date_str, term, output_dir)
+        if os.path.exists(ours_path):
+            # 每行 = 1 個 strike，Call + Put 各算一筆
+            rows_compared[term] = count_rows(ours_path) * 2
+    return write_summary(diff_df, date_str, rows_compared, output_dir,
+                         truncated=report_truncated(date_str, output_dir))
+
+
+def load_overview(start=None, end=None, output_dir='output', rebuild_missing=True):
+    """
+    跨日總覽：每日一列 (日期、總差異、各 Term 差異與比對筆數、各欄位差異)
+
+    Args:
+        start, end: YYYYMMDD 範圍 (含)，省略表示不限
+        rebuild_missing: 彙總不存在或過期時，是否由 CSV 回補
+
+    Returns:
+        list of dict (依日期升序)
+    """
+    rows = []
+    for date_str in available_dates(output_dir):
+        if (start and date_str < start) or (end and date_str > end):
+            continue
+        summary = load_summary(date_str, output_dir)
+        if summary is None:
+            if not rebuild_missing:
+                continue
+            rebuild_summary(date_str, output_dir)
+            summary = load_summary(date_str, output_dir)
+            if summary is None:
+                continue
+        row = {
+            'date': date_str,
+            'total_diffs': summary['total_diffs'],
+            'rows_compared': summary['rows_compared'],
+            'truncated': summary.get('truncated'),
+            'by_term': {t: s['total_diffs'] for t, s in summary['terms'].items()},
+            'by_column': {},
+        }
+        for term_summary in summary['terms'].values():
+            for col, n in term_summary['by_column'].items():
+                row['by_column'][col] = row['by_column'].get(col, 0) + n
+        rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="驗證結果彙總庫")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_rebuild = sub.add_parser('rebuild', help='由 validation_diff CSV 回補彙總')
+    p_rebuild.add_argument('dates', nargs='*', help='YYYYMMDD (省略表示全部)')
+    p_overview = sub.add_parser('overview', help='跨日總覽')
+    p_overview.add_argument('--start', type=str)
+    p_overview.add_argument('--end', type=str)
+    parser.add_argument('--output-dir', type=str, default='output')
+    args = parser.parse_args()
+
+    if args.command == 'rebuild':
+        for date_str in args.dates or available_dates(args.output_dir):
+            path = rebuild_summary(date_str, args.output_dir)
+            print(f"已寫入: {path}")
+        return
+
+    rows = load_overview(args.start, args.end, args.output_dir)
+    print(f"{'Date':<10} | {'Diffs':>8} | {'Near':>8} | {'Next':>8} | 主要差異欄位")
+    print("-" * 70)
+    for r in rows:
+        top = sorted(r['by_column'].items(), key=lambda kv: -kv[1])[:3]
+        top_str = ", ".join(f"{c}={n}" for c, n in top) or "-"
+        if r['truncated']:
+            top_str += " (達差異上限，非全天計數)"
+        elif r['truncated'] is None:
+            top_str += " (無法確認是否達差異上限)"
+        print(f"{r['date']:<10} | {r['total_diffs']:>8} | {r['by_term'].get('Near', 0):>8} | "
+              f"{r['by_term'].get('Next', 0):>8} | {top_str}")
+    print("-" * 70)
+    print(f"共 {len(rows)} 天，總差異 {sum(r['total_diffs'] for r in rows)} 筆")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,15 @@
 """
 VIX Step 0 驗證腳本（優化版 - 產出詳細差異報告）
 使用 pandas merge 取代逐筆比對，並產出詳細差異報表
+以 (time, strike, cp) 整數鍵對齊後，所有檢查項目一次算成布林矩陣，直接堆疊出差異報告
 """
 import pandas as pd
 import numpy as np
 from datetime import datetime
 import os
 
+from results_store import write_summary
+
 pd.set_option('display.width', 400)
 pd.set_option('display.max_columns', None)
 
@@ -44,8 +47,9 @@ def main():
     prod_next_path = f'資料來源/{target_date}/NextPROD_{target_date}.tsv'
     
     try:
-        near_prod = pd.read_csv(prod_near_path, sep='\t', dtype=str)
-        next_prod = pd.read_csv(prod_next_path, sep='\t', dtype=str)
+        prod_usecols = _needed_columns(PROD_FIELD_MAP)
+        near_prod = pd.read_csv(prod_near_path, sep='\t', dtype=str, usecols=prod_usecols)
+        next_prod = pd.read_csv(prod_next_path, sep='\t', dtype=str, usecols=prod_usecols)
     except FileNotFoundError as e:
         print(f"錯誤: 找不到 PROD 檔案 - {e}")
         return
@@ -55,8 +59,9 @@ def main():
     calc_next_path = f'output/驗證{target_date}_NextPROD.csv'
     
     try:
-        near_calc = pd.read_csv(calc_near_path, dtype=str)
-        next_calc = pd.read_csv(calc_next_path, dtype=str)
+        calc_usecols = _needed_columns(OURS_FIELD_MAP)
+        near_calc = pd.read_csv(calc_near_path, dtype=str, usecols=calc_usecols)
+        next_calc = pd.read_csv(calc_next_path, dtype=str, usecols=calc_usecols)
     except FileNotFoundError as e:
         print(f"錯誤: 找不到計算結果檔案 - {e}")
         return
@@ -72,33 +77,41 @@ def main():
     print("\n" + "=" * 80)
     print("驗證 Near Term")
     print("=" * 80)
-    diffs_near = verify_term_detailed(near_prod, near_calc, 'Near', target_date)
-    all_diffs.extend(diffs_near)
+    all_diffs.append(verify_term_detailed(near_prod, near_calc, 'Near', target_date))
     
     print("\n" + "=" * 80)
     print("驗證 Next Term")
     print("=" * 80)
-    diffs_next = verify_term_detailed(next_prod, next_calc, 'Next', target_date)
-    all_diffs.extend(diffs_next)
+    all_diffs.append(verify_term_detailed(next_prod, next_calc, 'Next', target_date))
     
     # ========== 輸出差異報告 ==========
-    output_file = f'output/validation_diff_{target_date}.csv'
-    
+    # 每行 = 1 個 strike，Call + Put 各算一筆
+    rows_compared = {'Near': len(near_calc) * 2, 'Next': len(next_calc) * 2}
+    write_diff_report(all_diffs, target_date, rows_compared=rows_compared)
+
+
+def write_diff_report(diff_frames, target_date, output_dir='output', rows_compared=None, truncated=False):
+    """
+    合併各 Term 的差異並輸出 validation_diff_{date}.csv (無差異時輸出空報告)
+
+    同時寫出預先彙總 (validation_store/{date}.json)，供 Viewer 與批次摘要直接讀取
+
+    Args:
+        rows_compared: {term: 比對筆數}，寫入彙總供計算一致率
+        truncated: 差異是否因達差異上限而不完整，寫入彙總供 Viewer 標示
+
+    Returns:
+        str: 報告路徑
+    """
+    output_file = os.path.join(output_dir, f'validation_diff_{target_date}.csv')
+
     # 確保 output 資料夾存在
-    if not os.path.exists('output'):
-        os.makedirs('output')
-
-    if all_diffs:
-        diff_df = pd.DataFrame(all_diffs)
-        # 調整欄位順序
-        cols = ['Date', 'Time', 'Term', 'Strike', 'CP', 'Column', 'Ours', 'PROD', 'SysID', 'Prev_SysID']
-        # 確保所有需要的欄位都存在
-        for col in cols:
-             if col not in diff_df.columns:
-                 diff_df[col] = ''
-        
-        diff_df = diff_df[cols]
-        
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    diff_df = pd.concat(diff_frames, ignore_index=True) if diff_frames else pd.DataFrame(columns=REPORT_COLUMNS)
+
+    if not diff_df.empty:
         diff_df.to_csv(output_file, index=False, encoding='utf-8-sig')
         print(f"\n差異報告已儲存至: {output_file}")
         print(f"總差異筆數: {len(diff_df)}")
@@ -107,9 +120,7 @@ def main():
         
         # 列出已驗證的欄位
         print("\n[已驗證欄位清單]")
-        # 不用硬編碼，從 verify_term_detailed 的 checks 列表獲取會更好，
-        # 但這裡 checks 是定義在 verify_term_detailed 內部的局部變數，
-        # 為了簡單起見，我們在此處列出主要的驗證項目
+        # 完整檢查項目定義於 CHECKS，此處依類別列出主要的驗證項目
         print("1. EMA (指數移動平均)")
         print("2. Gamma (寬容度係數)")
         print("3. Q_hat_Bid/Ask (最終買賣價)")
@@ -118,275 +129,238 @@ def main():
         # print("6. (已略過) Outlier 異常值標記")
 
         # 產生空檔案以示完成
-        pd.DataFrame(columns=['Date', 'Time', 'Term', 'Strike', 'CP', 'Column', 'Ours', 'PROD', 'SysID', 'Prev_SysID']).to_csv(output_file, index=False, encoding='utf-8-sig')
+        pd.DataFrame(columns=REPORT_COLUMNS).to_csv(output_file, index=False, encoding='utf-8-sig')
         print(f"\n已建立空報告: {output_file}")
 
-def verify_term_detailed(prod_df, calc_df, term_name, target_date):
-    """執行詳細比對並回傳差異列表"""
-    
-    diff_list = []
-    
-    print(f"  正在準備 {term_name} 資料...")
-    
-    # 1. 準備 PROD 資料（展開為 Call/Put 兩列）並保留 SysID
-    prod_valid = prod_df[prod_df['strike'].notna() & (prod_df['strike'] != '')].copy()
-    
-    # time_sysid_map 已棄用，改用 DataFrame 直接計算 Prev_SysID
-    # time_sysid_map logic removed
-    
-    # 取得由時間排序的唯一時間列表，用來找 Prev_SysID
-    # get_sysid_info 已棄用，改用 DataFrame 內建欄位
-    # get_sysid_info removed
+    write_summary(diff_df, target_date, rows_compared, output_dir, truncated=truncated)
+    return output_file
 
-    # 展開 PROD Call/Put
-    prod_valid['Time'] = prod_valid['time']
-    prod_valid['Strike'] = prod_valid['strike']
-    
-    # 欄位映射
-    prod_cols_base = ['Time', 'Strike']
-    
-    # Call Columns
-    prod_call_cols = prod_cols_base + [
-        'c.ema', 'c.gamma', 'c.last_outlier', 'c.min_outlier',
-        'c.bid', 'c.ask', 'c.last_bid', 'c.last_ask', 'c.min_bid', 'c.min_ask',
-        'c.last_sysID'
-    ]
-    # 檢查欄位是否存在
-    prod_call_cols = [c for c in prod_call_cols if c in prod_valid.columns]
-    
-    prod_call = prod_valid[prod_call_cols].copy()
-    prod_call['CP'] = 'Call'
-    
-    # 重新命名欄位以便統一處理 (需小心對應)
-    rename_map_c = {
-        'c.ema': 'PROD_EMA', 'c.gamma': 'PROD_Gamma', 
-        'c.last_outlier': 'PROD_Last_Outlier', 'c.min_outlier': 'PROD_Min_Outlier',
-        'c.bid': 'PROD_Q_hat_Bid', 'c.ask': 'PROD_Q_hat_Ask',
-        'c.last_bid': 'PROD_Last_Bid', 'c.last_ask': 'PROD_Last_Ask',
-        'c.min_bid': 'PROD_Min_Bid', 'c.min_ask': 'PROD_Min_Ask',
-        'c.last_sysID': 'SysID'
-    }
-    prod_call = prod_call.rename(columns=rename_map_c)
-
-    # Put Columns
-    prod_put_cols = prod_cols_base + [
-        'p.ema', 'p.gamma', 'p.last_outlier', 'p.min_outlier',
-        'p.bid', 'p.ask', 'p.last_bid', 'p.last_ask', 'p.min_bid', 'p.min_ask',
-        'p.last_sysID'
-    ]
-    # 檢查欄位是否存在
-    prod_put_cols = [c for c in prod_put_cols if c in prod_valid.columns]
-    
-    prod_put = prod_valid[prod_put_cols].copy()
-    prod_put['CP'] = 'Put'
-    
-    rename_map_p = {
-        'p.ema': 'PROD_EMA', 'p.gamma': 'PROD_Gamma', 
-        'p.last_outlier': 'PROD_Last_Outlier', 'p.min_outlier': 'PROD_Min_Outlier',
-        'p.bid': 'PROD_Q_hat_Bid', 'p.ask': 'PROD_Q_hat_Ask',
-        'p.last_bid': 'PROD_Last_Bid', 'p.last_ask': 'PROD_Last_Ask',
-        'p.min_bid': 'PROD_Min_Bid', 'p.min_ask': 'PROD_Min_Ask',
-        'p.last_sysID': 'SysID'
-    }
-    prod_put = prod_put.rename(columns=rename_map_p)
-    
-    prod_long = pd.concat([prod_call, prod_put], ignore_index=True)
-    
-    # 計算 Prev_SysID
-    # 1. 確保 SysID 為數值 (可能有空值)
+# =====================================================================
+# 比對設定
+# =====================================================================
+# 報告欄位
+REPORT_COLUMNS = ['Date', 'Time', 'Term', 'Strike', 'CP', 'Column', 'Ours', 'PROD', 'SysID', 'Prev_SysID']
+
+# PROD 欄位 (去掉 c./p. 前綴) -> 統一欄位名稱
+PROD_FIELD_MAP = {
+    'ema': 'PROD_EMA', 'gamma': 'PROD_Gamma',
+    'last_outlier': 'PROD_Last_Outlier', 'min_outlier': 'PROD_Min_Outlier',
+    'bid': 'PROD_Q_hat_Bid', 'ask': 'PROD_Q_hat_Ask',
+    'last_bid': 'PROD_Last_Bid', 'last_ask': 'PROD_Last_Ask',
+    'min_bid': 'PROD_Min_Bid', 'min_ask': 'PROD_Min_Ask',
+    'last_sysID': 'SysID',
+}
+
+# 我們的檢核報告欄位 (去掉 c./p. 前綴) -> 統一欄位名稱
+# PROD 格式的 c.bid 對應我們的 Q_hat；c.gamma 為最終 Gamma
+OURS_FIELD_MAP = {
+    'ema': 'EMA',
+    'gamma': 'Q_Last_Valid_Gamma',
+    'bid': 'Q_hat_Bid',
+    'ask': 'Q_hat_Ask',
+    'last_bid': 'Q_Last_Valid_Bid',
+    'last_ask': 'Q_Last_Valid_Ask',
+    'last_outlier': 'OURS_Last_Outlier_Str',
+    'min_bid': 'Q_Min_Valid_Bid',
+    'min_ask': 'Q_Min_Valid_Ask',
+    'min_outlier': 'OURS_Min_Outlier_Str',
+}
+
+# 檢查項目 (Display Name, Prod Col, Ours Col, Method)；順序即報告輸出順序
+CHECKS = [
+    ('EMA', 'PROD_EMA', 'EMA', 'float'),
+    ('Gamma', 'PROD_Gamma', 'Q_Last_Valid_Gamma', 'float'),
+    ('Q_hat_Bid', 'PROD_Q_hat_Bid', 'Q_hat_Bid', 'float'),
+    ('Q_hat_Ask', 'PROD_Q_hat_Ask', 'Q_hat_Ask', 'float'),
+    ('Q_Last_Bid', 'PROD_Last_Bid', 'Q_Last_Valid_Bid', 'float'),
+    ('Q_Last_Ask', 'PROD_Last_Ask', 'Q_Last_Valid_Ask', 'float'),
+    # ('Last_Outlier', 'PROD_Last_Outlier', 'OURS_Last_Outlier_Str', 'str'),  # 註解掉 outlier 檢查
+    ('Min_Bid', 'PROD_Min_Bid', 'Q_Min_Valid_Bid', 'float'),
+    ('Min_Ask', 'PROD_Min_Ask', 'Q_Min_Valid_Ask', 'float'),
+    # ('Min_Outlier', 'PROD_Min_Outlier', 'OURS_Min_Outlier_Str', 'str'),  # 註解掉 outlier 檢查
+]
+
+FLOAT_TOL = 1e-4
+
+
+def _needed_columns(field_map):
+    """read_csv usecols：只讀取比對會用到的欄位"""
+    wanted = {'time', 'strike'}
+    for prefix in ('c.', 'p.'):
+        wanted.update(prefix + f for f in field_map)
+    return lambda c: c in wanted
+
+
+def _to_long(df, field_map):
+    """
+    寬表 (c./p. 欄位) 轉為 Call/Put 長表，值保留原始字串 (報告中的 Ours/PROD 直接引用)
+
+    來源缺少的欄位不建立 (與 Call/Put 各自檢查欄位是否存在的規則一致)
+    """
+    parts = []
+    for cp, prefix in (('Call', 'c.'), ('Put', 'p.')):
+        part = {'Time': df['time'].to_numpy(), 'Strike': df['strike'].to_numpy()}
+        for field, name in field_map.items():
+            if prefix + field in df.columns:
+                part[name] = df[prefix + field].to_numpy()
+        part = pd.DataFrame(part)
+        part['CP'] = cp
+        parts.append(part)
+    return pd.concat(parts, ignore_index=True)
+
+
+def _key_int(series):
+    """Time / Strike 統一轉 int (避免前導零問題；非數字視為 0)"""
+    return pd.to_numeric(series, errors='coerce').fillna(0).astype(np.int64).to_numpy()
+
+
+def _float_values(values):
+    """
+    原始字串 -> float (無法解析視為 NaN)
+
+    報價字串重複度高，先 factorize 只解析唯一值再映射回來，
+    比整欄 to_numeric 快一個數量級。
+    """
+    codes, uniques = pd.factorize(values)
+    parsed = pd.to_numeric(pd.Series(uniques, dtype=object), errors='coerce').to_numpy(dtype=float)
+    return np.where(codes >= 0, parsed[codes], np.nan)
+
+
+def _normalize_str(values):
+    """字串比對前的標準化：去空白、去掉 .0 結尾、'-' 視同空值"""
+    s = pd.Series(values, dtype=object).fillna('').astype(str).str.strip()
+    s = s.where(~s.str.endswith('.0'), s.str.replace('.0', '', regex=False))
+    return s.replace('-', '').to_numpy(dtype=object)
+
+
+def build_prod_long(prod_df):
+    """
+    PROD 寬表 -> Call/Put 長表 (參考網格)，並計算 SysID / Prev_SysID 與整數鍵
+
+    同一份 PROD 檔只需建立一次，可重複用於多次比對 (見 validation/parity_sink.py)
+    """
+    # 準備 PROD 資料（展開為 Call/Put 兩列）並保留 SysID
+    prod_valid = prod_df[prod_df['strike'].notna() & (prod_df['strike'] != '')]
+    prod_long = _to_long(prod_valid, PROD_FIELD_MAP)
+    if 'SysID' not in prod_long.columns:
+        prod_long['SysID'] = np.nan
+
+    # 計算 Prev_SysID：依 Strike, CP, Time 排序後同序列前一筆 (第一筆為 0)
     prod_long['SysID'] = pd.to_numeric(prod_long['SysID'], errors='coerce').fillna(0).astype(int)
-    
-    # 2. 排序: Strike, CP, Time
-    # 假設 Time 是 HH:MM:SS 字串，可直接排序
     prod_long = prod_long.sort_values(['Strike', 'CP', 'Time'])
-    
-    # 3. GroupBy shift
-    prod_long['Prev_SysID'] = prod_long.groupby(['Strike', 'CP'])['SysID'].shift(1)
-    
-    # 第一筆的 Prev_SysID 設為 0
-    prod_long['Prev_SysID'] = prod_long['Prev_SysID'].fillna(0).astype(int)
+    prod_long['Prev_SysID'] = prod_long.groupby(['Strike', 'CP'])['SysID'].shift(1).fillna(0).astype(int)
+    prod_long = prod_long.reset_index(drop=True)
+
+    prod_long['Time_int'] = _key_int(prod_long['Time'])
+    prod_long['Strike_int'] = _key_int(prod_long['Strike'])
+    return prod_long
+
+
+def verify_term_detailed(prod_df, calc_df, term_name, target_date, prod_long=None, max_mismatches=None):
+    """
+    執行詳細比對並回傳差異報告 (DataFrame，欄位為 REPORT_COLUMNS)
+
+    以 (time, strike, cp) 整數鍵對齊 PROD 與我們的結果後，
+    所有檢查項目一次算成 (列 x 檢查項目) 的布林矩陣，
+    再依「檢查項目 -> 列」順序取出差異，不逐列 iterrows。
+
+    Args:
+        prod_df: PROD 寬表 (字串)；已提供 prod_long 時可為 None
+        calc_df: 我們的結果寬表 (字串，缺值為 NaN)
+        prod_long: 已建立的 PROD 參考長表 (build_prod_long)，省略時由 prod_df 建立
+        max_mismatches: 只保留時間最早的前 N 筆差異 (快速分流用)，None 表示全部；
+                        有差異被略過時回傳報告的 attrs['truncated'] 為 True
+    """
+    print(f"  正在準備 {term_name} 資料...")
+
+    # 1. 準備 PROD 資料
+    if prod_long is None:
+        prod_long = build_prod_long(prod_df)
 
     # 2. 準備我們的計算結果 (Wide Format -> Long Format)
     print(f"  正在準備我們的計算結果 (轉為 Long Format)...")
-    
-    # 標準化 Time/Strike
-    calc_df['Time'] = calc_df['time']
-    calc_df['Strike'] = calc_df['strike']
-    
-    # 準備 Call 部份
-    # 欄位映射: 原始 CSV 欄位 -> 統一欄位名稱
-    # 注意: CSV 欄位名稱需與 step 127 看到的完全一致 (全小寫 c.bid, c.ask...)
-    
-    # 定義需要的欄位與重新命名映射 (Call)
-    # 檢查 calc_df 的欄位名稱 (有些是 c.bid, 有些可能是 Q_Last... 取決於產生來源)
-    # 查看 step 127: c.bid, p.bid, c.last_bid, c.last_sysID, c.last_outlier, c.ema, c.gamma
-    
-    map_c = {
-        'c.ema': 'EMA',
-        'c.gamma': 'Q_Last_Valid_Gamma', # 假設檢核報告輸出的是最終 Gamma
-        'c.bid': 'Q_hat_Bid',    # PROD 格式的 c.bid 對應我們的 Q_hat
-        'c.ask': 'Q_hat_Ask',
-        'c.last_bid': 'Q_Last_Valid_Bid',
-        'c.last_ask': 'Q_Last_Valid_Ask',
-        'c.last_outlier': 'OURS_Last_Outlier_Str',
-        'c.min_bid': 'Q_Min_Valid_Bid',
-        'c.min_ask': 'Q_Min_Valid_Ask',
-        'c.min_outlier': 'OURS_Min_Outlier_Str'
-    }
-    
-    # 確保欄位存在
-    cols_c = ['Time', 'Strike'] + [c for c in map_c.keys() if c in calc_df.columns]
-    calc_call = calc_df[cols_c].copy()
-    calc_call['CP'] = 'Call'
-    calc_call = calc_call.rename(columns=map_c)
-    
-    # 準備 Put 部份
-    map_p = {
-        'p.ema': 'EMA',
-        'p.gamma': 'Q_Last_Valid_Gamma',
-        'p.bid': 'Q_hat_Bid', 
-        'p.ask': 'Q_hat_Ask',
-        'p.last_bid': 'Q_Last_Valid_Bid',
-        'p.last_ask': 'Q_Last_Valid_Ask',
-        'p.last_outlier': 'OURS_Last_Outlier_Str',
-        'p.min_bid': 'Q_Min_Valid_Bid',
-        'p.min_ask': 'Q_Min_Valid_Ask',
-        'p.min_outlier': 'OURS_Min_Outlier_Str'
-    }
-    
-    cols_p = ['Time', 'Strike'] + [c for c in map_p.keys() if c in calc_df.columns]
-    calc_put = calc_df[cols_p].copy()
-    calc_put['CP'] = 'Put'
-    calc_put = calc_put.rename(columns=map_p)
-    
-    # 合併 Call 與 Put
-    calc_subset = pd.concat([calc_call, calc_put], ignore_index=True)
-    
-    # 確保所有必要欄位存在 (若來源無該欄位則補 NaN)
-    required_cols = [
-        'EMA', 'Q_Last_Valid_Gamma', 'Q_hat_Bid', 'Q_hat_Ask', 
-        'Q_Last_Valid_Bid', 'Q_Last_Valid_Ask', 'OURS_Last_Outlier_Str',
-        'Q_Min_Valid_Bid', 'Q_Min_Valid_Ask', 'OURS_Min_Outlier_Str'
-    ]
-    for col in required_cols:
-        if col not in calc_subset.columns:
-            calc_subset[col] = np.nan
-
-    # 3. 合併比對
-    # 轉換型別以確保 merge 正確 (統一使用 int，避免前導零問題)
-    # 處理可能非數字的情況 (雖然理論上不應發生)
-    prod_long['Time_int'] = pd.to_numeric(prod_long['Time'], errors='coerce').fillna(0).astype(int)
-    prod_long['Strike_int'] = pd.to_numeric(prod_long['Strike'], errors='coerce').fillna(0).astype(int)
-    
-    calc_subset['Time_int'] = pd.to_numeric(calc_subset['Time'], errors='coerce').fillna(0).astype(int)
-    calc_subset['Strike_int'] = pd.to_numeric(calc_subset['Strike'], errors='coerce').fillna(0).astype(int)
-    
+    calc_long = _to_long(calc_df, OURS_FIELD_MAP)
+    # 若來源無該欄位則補 NaN
+    for col in OURS_FIELD_MAP.values():
+        if col not in calc_long.columns:
+            calc_long[col] = np.nan
+
+    # 3. 以 (Time_int, Strike_int, CP) 對齊，只合併列位置，值之後以陣列取用
     print(f"  開始合併資料...")
-    # 使用 int 欄位進行合併
-    merged = pd.merge(prod_long, calc_subset, left_on=['Time_int', 'Strike_int', 'CP'], right_on=['Time_int', 'Strike_int', 'CP'], how='inner')
-    print(f"  成功配對: {len(merged)} 筆")
-    
-    # 處理 merge 後的欄位後綴 (Time_x, Time_y 等)
-    if 'Time_x' in merged.columns:
-        merged['Time'] = merged['Time_x']
-    elif 'Time' not in merged.columns:
-        # Fallback if Time was used as key (shouldn't happen here)
-        merged['Time'] = merged['Time_int'].astype(str)
-        
-    if 'Strike_x' in merged.columns:
-        merged['Strike'] = merged['Strike_x']
-    elif 'Strike' not in merged.columns:
-        merged['Strike'] = merged['Strike_int'].astype(str)
-    
-    # 4. 定義比較邏輯
-    
-    # Helper to check float diff
-    def is_diff_float(series_prod, series_ours, tol=1e-4):
-        v_prod = pd.to_numeric(series_prod, errors='coerce')
-        v_ours = pd.to_numeric(series_ours, errors='coerce')
-        
-        # 兩者皆 NaN 視為相同
-        mask_both_nan = v_prod.isna() & v_ours.isna()
-        
-        # 處理一方有值一方無值
-        mask_mismatch_nan = v_prod.isna() ^ v_ours.isna()
-        
-        # 兩者皆有值才比較數值
-        mask_valid = v_prod.notna() & v_ours.notna()
-        diff = (v_prod - v_ours).abs()
-        
-        # 差異條件：(有值且差異過大) 或 (NaN 狀態不一致)
-        return mask_mismatch_nan | (mask_valid & (diff > tol))
-
-    # Helper to check string/int diff
-    def is_diff_str(series_prod, series_ours):
-        # 統一轉字串比較，處理 NaN
-        v_prod = series_prod.fillna('').astype(str).str.strip()
-        v_ours = series_ours.fillna('').astype(str).str.strip()
-        
-        # 處理 .0 結尾的差異 (e.g. "100" vs "100.0")
-        v_prod = v_prod.apply(lambda x: x.replace('.0', '') if x.endswith('.0') else x)
-        v_ours = v_ours.apply(lambda x: x.replace('.0', '') if x.endswith('.0') else x)
-        
-        # 特殊處理 Outlier: "-" 等同於空字串或 NaN
-        v_prod = v_prod.replace('-', '')
-        v_ours = v_ours.replace('-', '')
-        
-        return v_prod != v_ours
-
-    # 定義檢查項目 (Display Name, Prod Col, Ours Col, Method)
-    checks = [
-        ('EMA', 'PROD_EMA', 'EMA', is_diff_float),
-        ('Gamma', 'PROD_Gamma', 'Q_Last_Valid_Gamma', is_diff_float),
-        ('Q_hat_Bid', 'PROD_Q_hat_Bid', 'Q_hat_Bid', is_diff_float),
-        ('Q_hat_Ask', 'PROD_Q_hat_Ask', 'Q_hat_Ask', is_diff_float),
-        ('Q_Last_Bid', 'PROD_Last_Bid', 'Q_Last_Valid_Bid', is_diff_float),
-        ('Q_Last_Ask', 'PROD_Last_Ask', 'Q_Last_Valid_Ask', is_diff_float),
-        # ('Last_Outlier', 'PROD_Last_Outlier', 'OURS_Last_Outlier_Str', is_diff_str),  # 註解掉 outlier 檢查
-        ('Min_Bid', 'PROD_Min_Bid', 'Q_Min_Valid_Bid', is_diff_float),
-        ('Min_Ask', 'PROD_Min_Ask', 'Q_Min_Valid_Ask', is_diff_float),
-        # ('Min_Outlier', 'PROD_Min_Outlier', 'OURS_Min_Outlier_Str', is_diff_str),  # 註解掉 outlier 檢查
-    ]
-    
-    print(f"  開始逐項檢查差異...")
-    
-    for col_name, prod_col, ours_col, diff_func in checks:
-        if prod_col not in merged.columns or ours_col not in merged.columns:
+    prod_keys = pd.DataFrame({
+        'Time_int': prod_long['Time_int'].to_numpy(),
+        'Strike_int': prod_long['Strike_int'].to_numpy(),
+        'CP': prod_long['CP'].to_numpy(),
+        'prod_pos': np.arange(len(prod_long)),
+    })
+    calc_keys = pd.DataFrame({
+        'Time_int': _key_int(calc_long['Time']),
+        'Strike_int': _key_int(calc_long['Strike']),
+        'CP': calc_long['CP'].to_numpy(),
+        'calc_pos': np.arange(len(calc_long)),
+    })
+    pairs = pd.merge(prod_keys, calc_keys, on=['Time_int', 'Strike_int', 'CP'], how='inner')
+    prod_pos = pairs['prod_pos'].to_numpy()
+    calc_pos = pairs['calc_pos'].to_numpy()
+    print(f"  成功配對: {len(pairs)} 筆")
+
+    # 4. 所有檢查項目一次計算為布林矩陣
+    active = []
+    for check in CHECKS:
+        col_name, prod_col, ours_col, _ = check
+        if prod_col not in prod_long.columns or ours_col not in calc_long.columns:
             print(f"  警告: 缺少欄位 {prod_col} 或 {ours_col}，跳過比對")
             continue
-            
-        mask = diff_func(merged[prod_col], merged[ours_col])
-        diff_rows = merged[mask]
-        
-        if not diff_rows.empty:
-            print(f"  發現差異: {col_name} - {len(diff_rows)} 筆")
-            
-            # 批量獲取 SysID 資訊 (優化效能)
-            # 這裡簡單處理，逐筆查詢
-            # 若效能不足，可考慮向量化 map
-            
-            for idx, row in diff_rows.iterrows():
-                time_val = row['Time']
-                curr_sysid = row.get('SysID', 0)
-                prev_sysid = row.get('Prev_SysID', 0)
-                
-                diff_list.append({
-                    'Date': target_date,
-                    'Time': time_val,
-                    'Term': term_name,
-                    'Strike': row['Strike'],
-                    'CP': row['CP'],
-                    'Column': col_name,
-                    'Ours': row[ours_col],
-                    'PROD': row[prod_col],
-                    'SysID': curr_sysid,
-                    'Prev_SysID': prev_sysid
-                })
+        active.append(check)
+
+    print(f"  開始逐項檢查差異...")
+    n = len(pairs)
+    mask = np.zeros((len(active), n), dtype=bool)
+    prod_raw = np.empty((len(active), n), dtype=object)
+    ours_raw = np.empty((len(active), n), dtype=object)
+    for k, (col_name, prod_col, ours_col, method) in enumerate(active):
+        prod_raw[k] = prod_long[prod_col].to_numpy(dtype=object)[prod_pos]
+        ours_raw[k] = calc_long[ours_col].to_numpy(dtype=object)[calc_pos]
+        if method == 'float':
+            v_prod = _float_values(prod_raw[k])
+            v_ours = _float_values(ours_raw[k])
+            # 差異條件：(兩者皆有值且差異過大) 或 (NaN 狀態不一致)；兩者皆 NaN 視為相同
+            nan_prod = np.isnan(v_prod)
+            nan_ours = np.isnan(v_ours)
+            with np.errstate(invalid='ignore'):
+                mask[k] = (nan_prod ^ nan_ours) | (np.abs(v_prod - v_ours) > FLOAT_TOL)
         else:
-            # print(f"  {col_name}: 無差異")
-            pass
-                
-    return diff_list
+            mask[k] = _normalize_str(prod_raw[k]) != _normalize_str(ours_raw[k])
+
+        count = int(mask[k].sum())
+        if count:
+            print(f"  發現差異: {col_name} - {count} 筆")
+
+    # 5. 依 (檢查項目, 列) 順序堆疊差異
+    check_idx, row_idx = np.nonzero(mask)
+    truncated = max_mismatches is not None and len(row_idx) > max_mismatches
+    if truncated:
+        # 依快照時間取最早的 N 筆，保留的差異仍維持原本的輸出順序
+        diff_times = pairs['Time_int'].to_numpy()[row_idx]
+        first = np.sort(np.argsort(diff_times, kind='stable')[:max_mismatches])
+        check_idx, row_idx = check_idx[first], row_idx[first]
+        print(f"  已達差異上限 {max_mismatches} 筆，其餘差異略過")
+    diff_prod_pos = prod_pos[row_idx]
+    col_names = np.array([c[0] for c in active], dtype=object)
+    report = pd.DataFrame({
+        'Date': target_date,
+        'Time': prod_long['Time'].to_numpy(dtype=object)[diff_prod_pos],
+        'Term': term_name,
+        'Strike': prod_long['Strike'].to_numpy(dtype=object)[diff_prod_pos],
+        'CP': prod_long['CP'].to_numpy(dtype=object)[diff_prod_pos],
+        'Column': col_names[check_idx],
+        'Ours': ours_raw[check_idx, row_idx],
+        'PROD': prod_raw[check_idx, row_idx],
+        'SysID': prod_long['SysID'].to_numpy()[diff_prod_pos],
+        'Prev_SysID': prod_long['Prev_SysID'].to_numpy()[diff_prod_pos],
+    }, columns=REPORT_COLUMNS)
+    report.attrs['truncated'] = truncated
+    return report
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,222 @@
+"""
+契約日曆：存續期間 T 與插補權重 W (Contract Calendar)
+
+Step 1 原本直接取 PROD sigma_{date}.tsv 的 nearT / nextT / nearW / nextW，
+沒有 PROD 檔就無法計算。本模組依 docs/參考資料/官方編製方法.md 附錄7 自行計算：
+
+    T = [計算時點距當日午夜(24:00)秒數 + 計算日午夜距到期日 00:00 秒數 + 到期日 00:00 距 13:30 秒數] / 1年秒數
+      = (到期日距計算日天數 * 86400 + 48600 - 計算時點秒數) / 1年秒數
+
+    W1 = (T2 - N30/N年) / (T2 - T1)，W2 = 1 - W1
+
+1年秒數 N年 依計算日年度平年 365 日、閏年 366 日 (year_seconds)；
+ORI VIX 的年化係數 N年 / N30 也使用同一個值，閏年 (如 2024、2028) 不可再以 365 日年化。
+
+到期日來源 (皆為每日一列的小檔)：
+    rate_{date}.tsv          near_days / next_days：計算日距近月 / 次近月到期日的日曆天數
+    month_change_{date}.tsv  near_month / next_month 與換月旗標；未換月時 near_end_date 即近月到期日 (交叉檢查用)
+
+同一天整條時間軸以陣列一次算完，結果依 (date, schedule) 快取，
+可一次預先算好整年的日曆 (precompute)。
+
+用法:
+    python vix_calendar.py --start 20251201 --end 20251231   # 與 PROD sigma 的 T / W 比對
+"""
+import os
+import argparse
+import calendar as _calendar
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+SECONDS_PER_DAY = 86400
+EXPIRY_SECONDS = 13 * 3600 + 30 * 60   # 到期日 13:30:00
+N30 = 30 * SECONDS_PER_DAY             # 30 天秒數
+
+# 每日 08:45:15 ~ 13:45:00，每 15 秒一個時間點 (共 1,200 點，與 sigma 檔相同)
+SCHEDULE_START = 8 * 3600 + 45 * 60 + 15
+SCHEDULE_END = 13 * 3600 + 45 * 60
+SCHEDULE_STEP = 15
+
+
+def _hhmmss(seconds):
+    seconds = np.asarray(seconds, dtype=np.int64)
+    return seconds // 3600 * 10000 + seconds // 60 % 60 * 100 + seconds % 60
+
+
+DEFAULT_SCHEDULE = tuple(f"{t:06d}" for t in _hhmmss(np.arange(SCHEDULE_START, SCHEDULE_END + 1, SCHEDULE_STEP)))
+
+
+def year_seconds(date_str):
+    """計算日年度的全年秒數 (閏年 366 日)"""
+    year = int(str(date_str)[:4])
+    return (366 if _calendar.isleap(year) else 365) * SECONDS_PER_DAY
+
+
+# 日曆自我檢查：(計算日, 到期日, 計算時點秒數) -> (1年秒數, T)，含閏年與跨 2/29 的情形
+KNOWN_CASES = [
+    ("20251231", "20260121", 9 * 3600, 365 * SECONDS_PER_DAY, (21 * 86400 + 48600 - 32400) / 31536000),
+    ("20240228", "20240306", 9 * 3600, 366 * SECONDS_PER_DAY, (7 * 86400 + 48600 - 32400) / 31622400),
+    ("20281220", "20290117", 13 * 3600 + 45 * 60, 366 * SECONDS_PER_DAY, (28 * 86400 + 48600 - 49500) / 31622400),
+]
+
+
+def schedule_seconds(times):
+    """HHMMSS (字串或整數) -> 當日秒數 (np.int64 陣列)"""
+    t = np.asarray([int(x) for x in times], dtype=np.int64)
+    return t // 10000 * 3600 + t // 100 % 100 * 60 + t % 100
+
+
+def _add_days(date_str, days):
+    return (datetime.strptime(date_str, "%Y%m%d") + timedelta(days=int(days))).strftime("%Y%m%d")
+
+
+def _days_between(date_str, expiry_str):
+    return (datetime.strptime(expiry_str, "%Y%m%d") - datetime.strptime(date_str, "%Y%m%d")).days
+
+
+# =====================================================================
+# 到期日
+# =====================================================================
+@lru_cache(maxsize=512)
+def load_expiries(date_str, source_dir="資料來源"):
+    """
+    由 rate / month_change 取得當日近月與次近月到期日
+
+    Returns:
+        dict: near_expiry / next_expiry (YYYYMMDD)、near_month / next_month、change、year_seconds
+    """
+    folder = os.path.join(source_dir, date_str)
+    rate = pd.read_csv(os.path.join(folder, f"rate_{date_str}.tsv"), sep="\t").iloc[0]
+    month = pd.read_csv(os.path.join(folder, f"month_change_{date_str}.tsv"), sep="\t", dtype=str).iloc[0]
+
+    info = {
+        "near_expiry": _add_days(date_str, rate["near_days"]),
+        "next_expiry": _add_days(date_str, rate["next_days"]),
+        "near_month": str(month["near_month"]),
+        "next_month": str(month["next_month"]),
+        "change": int(month["change"]),
+        "year_seconds": year_seconds(date_str),
+    }
+    # 未換月時 month_change 的 near_end_date 就是近月到期日
+    if info["change"] == 0 and str(month["near_end_date"]) != info["near_expiry"]:
+        raise ValueError(
+            f"{date_str} 近月到期日不一致: rate near_days -> {info['near_expiry']}, "
+            f"month_change near_end_date={month['near_end_date']}"
+        )
+    return info
+
+
+# =====================================================================
+# T / W
+# =====================================================================
+def time_to_expiry(date_str, expiry_str, seconds, n_year=None):
+    """
+    附錄7 存續期間 (年)，seconds 為計算時點的當日秒數陣列
+    """
+    n_year = year_seconds(date_str) if n_year is None else n_year
+    remaining = _days_between(date_str, expiry_str) * SECONDS_PER_DAY + EXPIRY_SECONDS - np.asarray(seconds, dtype=np.int64)
+    return remaining / n_year
+
+
+def interpolation_weights(near_T, next_T, n_year):
+    """近月 / 次近月插補權重 (W1 + W2 = 1)；近月超過 30 天時 W1 >= 1"""
+    near_W = (next_T - N30 / n_year) / (next_T - near_T)
+    return near_W, 1.0 - near_W
+
+
+@lru_cache(maxsize=512)
+def _calendar_arrays(date_str, source_dir, schedule):
+    info = load_expiries(date_str, source_dir)
+    seconds = schedule_seconds(schedule)
+    n_year = info["year_seconds"]
+    near_T = time_to_expiry(date_str, info["near_expiry"], seconds, n_year)
+    next_T = time_to_expiry(date_str, info["next_expiry"], seconds, n_year)
+    near_W, next_W = interpolation_weights(near_T, next_T, n_year)
+    for arr in (near_T, next_T, near_W, next_W):
+        arr.setflags(write=False)
+    return near_T, near_W, next_T, next_W
+
+
+def day_calendar(date_str, source_dir="資料來源", schedule=None):
+    """
+    單日整條時間軸的 T / W (依 (date, schedule) 快取)
+
+    Args:
+        schedule: HHMMSS 字串序列，省略時使用 DEFAULT_SCHEDULE
+
+    Returns:
+        DataFrame: index 為 time (HHMMSS 字串)，欄位 nearT / nearW / nextT / nextW
+    """
+    schedule = DEFAULT_SCHEDULE if schedule is None else tuple(str(t).zfill(6) for t in schedule)
+    near_T, near_W, next_T, next_W = _calendar_arrays(date_str, source_dir, schedule)
+    return pd.DataFrame(
+        {"nearT": near_T, "nearW": near_W, "nextT": next_T, "nextW": next_W},
+        index=pd.Index(schedule, name="time"),
+    )
+
+
+def precompute(dates, source_dir="資料來源", schedule=None):
+    """預先計算多個日期的日曆 (缺 rate / month_change 的日期略過)，回傳 {date: DataFrame}"""
+    out = {}
+    for date_str in dates:
+        try:
+            out[date_str] = day_calendar(date_str, source_dir, schedule)
+        except FileNotFoundError:
+            continue
+    return out
+
+
+# =====================================================================
+# 與 PROD sigma 比對
+# =====================================================================
+def compare_with_sigma(date_str, source_dir="資料來源"):
+    """以 PROD sigma 的時間軸計算 T / W，回傳各欄最大絕對差異"""
+    sigma_path = os.path.join(source_dir, date_str, f"sigma_{date_str}.tsv")
+    df_sigma = pd.read_csv(sigma_path, sep="\t", dtype={"time": str})
+    df_sigma["time"] = df_sigma["time"].str.zfill(6)
+    cal = day_calendar(date_str, source_dir, df_sigma["time"])
+    return {col: float(np.max(np.abs(cal[col].to_numpy() - df_sigma[col].to_numpy())))
+            for col in ("nearT", "nearW", "nextT", "nextW")}
+
+
+def check_known_cases():
+    """以 KNOWN_CASES 檢查 1年秒數與 T (不需輸入檔)，回傳不符的案例"""
+    failed = []
+    for date_str, expiry_str, seconds, n_year, expected_T in KNOWN_CASES:
+        T = float(time_to_expiry(date_str, expiry_str, seconds))
+        if year_seconds(date_str) != n_year or abs(T - expected_T) > 1e-15:
+            failed.append((date_str, expiry_str, year_seconds(date_str), T))
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="契約日曆 T / W 計算與 PROD sigma 比對")
+    parser.add_argument("--start", type=str, required=True, help="開始日期 (YYYYMMDD)")
+    parser.add_argument("--end", type=str, required=True, help="結束日期 (YYYYMMDD)")
+    parser.add_argument("--source", type=str, default="資料來源", help="輸入資料夾路徑")
+    args = parser.parse_args()
+
+    failed = check_known_cases()
+    status = "[PASS]" if not failed else "[FAIL]"
+    print(f"{status} 日曆自我檢查 {len(KNOWN_CASES)} 例 (含閏年 2024 / 2028){'' if not failed else f': {failed}'}")
+
+    day = datetime.strptime(args.start, "%Y%m%d")
+    end = datetime.strptime(args.end, "%Y%m%d")
+    while day <= end:
+        date_str = day.strftime("%Y%m%d")
+        day += timedelta(days=1)
+        if not os.path.exists(os.path.join(args.source, date_str, f"sigma_{date_str}.tsv")):
+            continue
+        info = load_expiries(date_str, args.source)
+        diffs = compare_with_sigma(date_str, args.source)
+        worst = max(diffs.values())
+        status = "[PASS]" if worst < 1e-9 else "[FAIL]"
+        print(f"{status} {date_str} near={info['near_expiry']} next={info['next_expiry']} "
+              f"change={info['change']} 最大差異 {worst:.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -239,94 +239,8 @@ class RawDataLoader:
         
         return near_df, next_df, (near_ym, next_ym)
 
-class SnapshotScheduler:
-    """負責讀取 PROD 排程檔與解析快照時間"""
-    def __init__(self, prod_path):
-        self.prod_path = prod_path
-        
-    def load_schedule(self):
-        # 讀取 PROD 檔
-        # 需要 Line 2 的 Time/SysID
-        # 以及 Line 3+ 的 Time/SysID (去重)
-        
-        snapshots = []
-        
-        with open(self.prod_path, 'r', encoding='utf-8') as f:
-            header = f.readline() # Line 1
-            start_row = f.readline().strip().split('\t') # Line 2
-            
-            # Line 2: start_time, start_sys_id
-            # 格式: 84500 (HHMMSS) or 84500000000? -> 通常是 simplified
-            # 觀察 NearPROD: 84500	22934	...
-            
-            t_str = start_row[0]
-            if len(t_str) == 5: t_str = "0" + t_str # 84500 -> 084500
-            t_full = t_str.ljust(12, '0') # padding to microseconds if needed
-            
-            snapshots.append({
-                'orig_time_str': t_str, # Keep original string for matching
-                'time_obj': datetime.strptime(t_full[:6], "%H%M%S").replace(year=2025, month=12, day=31), # Mock date
-                'sys_id': int(start_row[1])
-            })
-            
-            # Line 3+
-            for line in f:
-                parts = line.strip().split('\t')
-                if len(parts) < 2: continue
-                
-                # Check for duplicate times? The file has many rows per time (one per strike)
-                # We want unique Times
-                t_val = parts[1] # Time column
-                # SysID? PROD columns 12/13/18?
-                # 根據先前的 grep: Last col is snapshot_sysID
-                # 14745778
-                
-                # 我們假設檔案最後一欄是 snapshot_sysID
-                # 但為了精確，我們應該用之前 grep 看到的 header index
-                # 但為求簡化，我們只紀錄唯一的時間點
-                pass # 我們改用讀取 dataframe 方式比較快且不重複?
-                
-        # 上面的 loop 太慢且複雜，改用 pandas read csv 只讀 time, snapshot_sysID (last col)
-        # 用 header 判斷
-        df = pd.read_csv(self.prod_path, sep='\t', header=0)
-        # Line 2 is actually data in pandas? No, header=0 reads line 1 as header.
-        # Check header names
-        # Headers: date time ... ... sysID
-        # We want to extract unique (Time, sysID) pairs
-        
-        # 為了更準確，我們直接讀取並去重
-        # 注意: PROD 檔案第一列是 header, 第二列是 start info, 第三列開始是 data
-        # Pandas 可能會把第二列當 data 讀入，導致 type error
-        
-        # 手動處理比較穩
-        schedule_data = {} # Time -> SysID
-        
-        # Add Line 2 manually
-        schedule_data[snapshots[0]['orig_time_str']] = snapshots[0]['sys_id']
-        
-        with open(self.prod_path, 'r', encoding='utf-8') as f:
-            f.readline() # Header
-            f.readline() # Line 2
-            for line in f:
-                parts = line.strip().split('\t')
-                if len(parts) > 1:
-                    t = parts[1]
-                    # SysID is usually the last one or close to end.
-                    # Based on user check: 14745778 is at the end.
-                    sysid = int(parts[-1]) 
-                    schedule_data[t] = sysid
-                    
-        # Convert to list
-        final_list = []
-        for t, sid in schedule_data.items():
-            t_pad = t.zfill(6)
-            final_list.append({
-                'orig_time_str': t,
-                'time_obj': datetime.strptime(t_pad, "%H%M%S").replace(year=2025, month=12, day=31),
-                'sys_id': sid
-            })
-            
-        return pd.DataFrame(final_list)
+# 快照排程 (SnapshotScheduler) 統一使用 reconstruct_order_book.SnapshotScheduler
+# (欄位選擇式讀取 + 快取)，此處不再保留重複實作
 
 def get_vix_config(target_date=None):
     """